@@ -1,38 +1,98 @@
 import json
 import signal
+import struct
 import time
 
 import paho.mqtt.client as mqtt
 from loguru import logger
 
+from message_pipeline import MessagePipeline, OVERFLOW_POLICY_BLOCK
 from secrets import CLIENT_NAME, MQTT_BROKER, TOPIC, USER_NAME, PASSWORD
 
+PIPELINE_WORKERS_COUNT = 2
+PIPELINE_MAX_QUEUE_SIZE = 10_000
+PIPELINE_OVERFLOW_POLICY = OVERFLOW_POLICY_BLOCK
+PIPELINE_STATS_INTERVAL_SECS = 60
+
+# First byte of binary telemetry sent by picow/003_minimizing_power_consumption, must be kept in
+# sync with host/002_influx_data_ingestor/telemetry_frame.py. JSON messages start with "{"
+BINARY_CONTENT_TYPES = {
+    0x01: "frame",
+    0x02: "batch",
+}
+
+# Sequence number of frame record, records count and sequence number of the first record of batch
+_FRAME_SEQUENCE_STRUCT = struct.Struct("<27xI")
+_BATCH_SEQUENCES_STRUCT = struct.Struct("<25xH4xI")
+
 
 def ctrl_c_handler(signum, frame):
     logger.warning("Exiting...")
     client.loop_stop()
+    pipeline.stop()
+    pipeline.log_stats()
     logger.info("Application finished")
     exit()
 
 
-def on_message(mqtt_client, userdata, message):
-    payload = str(message.payload.decode("utf-8"))
+def log_binary_message(raw_payload: bytes) -> None:
+    """
+    Binary frames are decoded by influx data ingestor, here only their kind, sender (which
+    follows content type and version bytes), size and sequence numbers of records are logged
+    """
+
+    content_type = BINARY_CONTENT_TYPES[raw_payload[0]]
+    machine_unique_id = raw_payload[2:10].hex(":")
+    message = f"Received binary {content_type} of {len(raw_payload)} bytes from '{machine_unique_id}'"
+
+    try:
+        if content_type == "frame":
+            first_sequence, = _FRAME_SEQUENCE_STRUCT.unpack_from(raw_payload)
+            records_count = 1
+        else:
+            records_count, first_sequence = _BATCH_SEQUENCES_STRUCT.unpack_from(raw_payload)
+    except struct.error:
+        logger.info(message)
+        return
+
+    if records_count:
+        message += f", sequences {first_sequence}..{first_sequence + records_count - 1}"
+
+    logger.info(message)
+
+
+def process_message(raw_payload: bytes) -> None:
+    if raw_payload and raw_payload[0] in BINARY_CONTENT_TYPES:
+        log_binary_message(raw_payload)
+        return
 
     try:
-        payload = json.loads(payload)
-    except:
+        payload = json.loads(raw_payload.decode("utf-8"))
+    except ValueError:
+        logger.warning(f"Skipping message which is not a JSON: {raw_payload[:64]!r}")
         return
 
     payload = json.dumps(payload, sort_keys=True, indent=4)
-    logger.info(f"Received message (userdata={userdata}): {payload}")
+    logger.info(f"Received message: {payload}")
+
+
+def on_message(mqtt_client, userdata, message):
+    pipeline.submit(message.payload)
 
 
 def main():
-    global client
+    global client, pipeline
 
     logger.info("Application started")
     signal.signal(signal.SIGINT, ctrl_c_handler)
 
+    pipeline = MessagePipeline(
+        process_message,
+        workers_count=PIPELINE_WORKERS_COUNT,
+        max_queue_size=PIPELINE_MAX_QUEUE_SIZE,
+        overflow_policy=PIPELINE_OVERFLOW_POLICY
+    )
+
     logger.info(f"Connecting to '{MQTT_BROKER}' as client '{CLIENT_NAME}' (user '{USER_NAME}') to listen topic '{TOPIC}'")
     client = mqtt.Client(CLIENT_NAME)
     client.username_pw_set(USER_NAME, PASSWORD)
@@ -42,9 +102,14 @@ def main():
     client.on_message = on_message
 
     client.loop_start()
+    last_stats_at = time.monotonic()
     while True:
         time.sleep(0.2)
 
+        if time.monotonic() - last_stats_at >= PIPELINE_STATS_INTERVAL_SECS:
+            pipeline.log_stats()
+            last_stats_at = time.monotonic()
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,119 @@
+import queue
+import threading
+import typing
+
+from loguru import logger
+
+# What to do with incoming message when queue is full
+OVERFLOW_POLICY_BLOCK = "block"  # wait for free slot up to block_timeout_secs, then drop
+OVERFLOW_POLICY_DROP = "drop"  # drop immediately
+
+_STOP = object()
+
+
+class MessagePipeline(object):
+    """
+    Bounded queue between MQTT receive loop and message processing. Receive loop only enqueues
+    raw payloads and pool of worker threads passes them to handler
+    """
+
+    def __init__(
+            self,
+            handler: typing.Callable[[bytes], None],
+            workers_count: int = 4,
+            max_queue_size: int = 10_000,
+            overflow_policy: str = OVERFLOW_POLICY_BLOCK,
+            block_timeout_secs: float = 1.0
+    ):
+        if workers_count < 1:
+            raise ValueError("The workers_count must be greater than 0")
+
+        if max_queue_size < 1:
+            raise ValueError("The max_queue_size must be greater than 0")
+
+        if overflow_policy not in (OVERFLOW_POLICY_BLOCK, OVERFLOW_POLICY_DROP):
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}'")
+
+        self.handler = handler
+        self.overflow_policy = overflow_policy
+        self.block_timeout_secs = block_timeout_secs
+
+        self.enqueued = 0
+        self.blocked = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.queue_high_watermark = 0
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"pipeline-worker-{index}", daemon=True)
+            for index in range(workers_count)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, payload: bytes) -> bool:
+        """
+        Enqueues raw payload, returns False when it was dropped because queue is full
+        """
+
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            if self.overflow_policy == OVERFLOW_POLICY_DROP:
+                self.dropped += 1
+                return False
+
+            self.blocked += 1
+            try:
+                self._queue.put(payload, timeout=self.block_timeout_secs)
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        if depth > self.queue_high_watermark:
+            self.queue_high_watermark = depth
+
+        return True
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Pipeline stats: queue depth - {self.queue_depth} (high watermark - {self.queue_high_watermark}), "
+            f"enqueued - {self.enqueued}, blocked - {self.blocked}, dropped - {self.dropped}, "
+            f"processed - {self.processed}, failed - {self.failed}"
+        )
+
+    def stop(self) -> None:
+        """
+        Processes all queued messages and stops workers
+        """
+
+        for _ in self._workers:
+            self._queue.put(_STOP)
+
+        for worker in self._workers:
+            worker.join()
+
+    def _worker_loop(self) -> None:
+        while True:
+            payload = self._queue.get()
+            if payload is _STOP:
+                return
+
+            try:
+                self.handler(payload)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                with self._stats_lock:
+                    self.failed += 1
+            else:
+                with self._stats_lock:
+                    self.processed += 1
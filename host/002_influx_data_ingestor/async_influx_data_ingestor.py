@@ -0,0 +1,169 @@
+"""
+Asyncio variant of influx_data_ingestor: MQTT client and Influx writes run on a single event
+loop, several batches may be written to Influx concurrently
+"""
+import asyncio
+import signal
+import time
+
+import paho.mqtt.client as mqtt
+from loguru import logger
+
+import secrets
+from async_influx_writer import AsyncBatchingInfluxWriter
+from device_registry import DeviceRegistry, UNKNOWN_DEVICE_POLICY_REGISTER
+from influx_data_ingestor import decode_readings
+import line_protocol
+from mqtt_message_stream import MqttMessageStream
+from payload_decoder import PayloadDecodeError
+from reading_deduplicator import ReadingDeduplicator
+
+INFLUX_BATCH_SIZE = 500
+INFLUX_FLUSH_INTERVAL_SECS = 1.0
+INFLUX_MAX_IN_FLIGHT_BATCHES = 4
+INFLUX_MAX_RETRIES = 3
+INFLUX_RETRY_DELAY_SECS = 1.0
+# Points queued while all batches are in flight, the oldest ones are dropped above this count
+INFLUX_MAX_PENDING_POINTS = 100_000
+
+MQTT_MAX_QUEUE_SIZE = 10_000
+STATS_INTERVAL_SECS = 60
+
+DEVICES_FILE_NAME = "devices.json"
+DEVICE_REGISTRY_UNKNOWN_DEVICE_POLICY = UNKNOWN_DEVICE_POLICY_REGISTER
+DEVICE_REGISTRY_MAX_DEVICES = 50_000
+DEVICE_REGISTRY_RELOAD_INTERVAL_SECS = 5
+
+
+class Ingestor(object):
+    """
+    Decodes messages from MQTT stream and writes them to Influx
+    """
+
+    def __init__(
+            self,
+            messages: MqttMessageStream,
+            influx_writer: AsyncBatchingInfluxWriter,
+            device_registry: DeviceRegistry,
+            reading_deduplicator: ReadingDeduplicator
+    ):
+        self.messages = messages
+        self.influx_writer = influx_writer
+        self.device_registry = device_registry
+        self.reading_deduplicator = reading_deduplicator
+
+        self.processed = 0
+        self.failed = 0
+
+    async def process_message(self, raw_payload: bytes) -> None:
+        try:
+            readings = decode_readings(raw_payload)
+        except PayloadDecodeError as e:
+            logger.warning(f"Skipping malformed message: {e}")
+            return
+
+        for reading in self.reading_deduplicator.filter(readings):
+            device = self.device_registry.lookup(reading.machine_unique_id)
+            if device is None:
+                continue
+
+            logger.info(
+                f"Data received from '{reading.machine_unique_id}': "
+                f"temp - {reading.temperature:.02f} humidity - {reading.humidity}"
+            )
+            await self.influx_writer.write(line_protocol.encode_reading(reading, device.name))
+
+    async def run(self) -> None:
+        async for raw_payload in self.messages:
+            try:
+                await self.process_message(raw_payload)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                self.failed += 1
+            else:
+                self.processed += 1
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Ingestor stats: queue depth - {self.messages.queue_depth} "
+            f"(high watermark - {self.messages.queue_high_watermark}), "
+            f"received - {self.messages.received}, reading paused - {self.messages.paused}, "
+            f"processed - {self.processed}, failed - {self.failed}, "
+            f"Influx batches in flight - {self.influx_writer.in_flight_batches} "
+            f"(high watermark - {self.influx_writer.in_flight_high_watermark}), "
+            f"Influx points dropped - {self.influx_writer.dropped_points}"
+        )
+        self.device_registry.log_stats()
+
+
+async def run_housekeeping(ingestor: Ingestor) -> None:
+    last_stats_at = time.monotonic()
+    last_devices_check_at = time.monotonic()
+    while True:
+        await asyncio.sleep(0.2)
+
+        if time.monotonic() - last_devices_check_at >= DEVICE_REGISTRY_RELOAD_INTERVAL_SECS:
+            ingestor.device_registry.update_activity()
+            ingestor.device_registry.reload_if_changed()
+            last_devices_check_at = time.monotonic()
+
+        if time.monotonic() - last_stats_at >= STATS_INTERVAL_SECS:
+            ingestor.log_stats()
+            last_stats_at = time.monotonic()
+
+
+async def run() -> None:
+    logger.info("Application started")
+
+    influx_writer = AsyncBatchingInfluxWriter(
+        url=secrets.INFLUX_URL,
+        token=secrets.TOKEN,
+        org=secrets.ORG,
+        bucket=secrets.BUCKET,
+        batch_size=INFLUX_BATCH_SIZE,
+        flush_interval_secs=INFLUX_FLUSH_INTERVAL_SECS,
+        max_in_flight_batches=INFLUX_MAX_IN_FLIGHT_BATCHES,
+        max_retries=INFLUX_MAX_RETRIES,
+        retry_delay_secs=INFLUX_RETRY_DELAY_SECS,
+        max_pending_points=INFLUX_MAX_PENDING_POINTS
+    )
+
+    device_registry = DeviceRegistry(
+        DEVICES_FILE_NAME,
+        unknown_device_policy=DEVICE_REGISTRY_UNKNOWN_DEVICE_POLICY,
+        max_devices=DEVICE_REGISTRY_MAX_DEVICES
+    )
+
+    logger.info(
+        f"Connecting to '{secrets.MQTT_BROKER}' as client '{secrets.CLIENT_NAME}' "
+        f"(user '{secrets.USER_NAME}') to listen topic '{secrets.TOPIC}'"
+    )
+    client = mqtt.Client(secrets.CLIENT_NAME)
+    client.username_pw_set(secrets.USER_NAME, secrets.PASSWORD)
+    messages = MqttMessageStream(client, secrets.TOPIC, max_queue_size=MQTT_MAX_QUEUE_SIZE)
+    messages.connect(secrets.MQTT_BROKER)
+
+    ingestor = Ingestor(messages, influx_writer, device_registry, ReadingDeduplicator())
+
+    stopped = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGINT, stopped.set)
+
+    ingestor_task = asyncio.create_task(ingestor.run())
+    housekeeping_task = asyncio.create_task(run_housekeeping(ingestor))
+    await stopped.wait()
+
+    print("Exiting...")
+    messages.disconnect()
+    await ingestor_task
+    housekeeping_task.cancel()
+    await influx_writer.close()
+    ingestor.log_stats()
+    logger.info("Application finished")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
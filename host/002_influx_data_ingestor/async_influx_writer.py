@@ -0,0 +1,184 @@
+import asyncio
+import collections
+import time
+import typing
+
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+from loguru import logger
+
+from influx_writer import is_retryable
+
+
+class AsyncBatchingInfluxWriter(object):
+    """
+    Asyncio counterpart of BatchingInfluxWriter. Accumulated points are written in batches when
+    batch is full or when flush interval elapses, up to max_in_flight_batches batches are written
+    concurrently. Batch which failed because Influx is unavailable or overloaded is retried up to
+    max_retries times with doubling delay, batches rejected by Influx (e.g. malformed points) aren't
+    retried. While all batches are in flight new points are queued, up to max_pending_points, then
+    the oldest queued points are dropped, so write never waits for Influx and memory is bounded
+    when Influx is down for long
+    """
+
+    def __init__(
+            self,
+            url: str,
+            token: str,
+            org: str,
+            bucket: str,
+            batch_size: int = 500,
+            flush_interval_secs: float = 1.0,
+            max_in_flight_batches: int = 4,
+            max_retries: int = 3,
+            retry_delay_secs: float = 1.0,
+            max_pending_points: int = 100_000
+    ):
+        if batch_size < 1:
+            raise ValueError("The batch_size must be greater than 0")
+
+        if flush_interval_secs <= 0:
+            raise ValueError("The flush_interval_secs must be greater than 0")
+
+        if max_in_flight_batches < 1:
+            raise ValueError("The max_in_flight_batches must be greater than 0")
+
+        if max_retries < 0:
+            raise ValueError("The max_retries must not be negative")
+
+        if retry_delay_secs < 0:
+            raise ValueError("The retry_delay_secs must not be negative")
+
+        if max_pending_points < batch_size:
+            raise ValueError("The max_pending_points must not be less than batch_size")
+
+        self.org = org
+        self.bucket = bucket
+        self.batch_size = batch_size
+        self.flush_interval_secs = flush_interval_secs
+        self.max_in_flight_batches = max_in_flight_batches
+        self.max_retries = max_retries
+        self.retry_delay_secs = retry_delay_secs
+        self.max_pending_points = max_pending_points
+
+        self.flushed_points = 0
+        self.failed_points = 0
+        self.dropped_points = 0
+        self.retried_batches = 0
+        self.last_batch_size = 0
+        self.last_flush_latency_ms = 0.0
+        self.in_flight_batches = 0
+        self.in_flight_high_watermark = 0
+
+        self._client = InfluxDBClientAsync(url=url, token=token, org=org)
+        self._write_api = self._client.write_api()
+
+        self._points = collections.deque()
+        self._dropped_since_flush = 0
+        self._tasks: typing.Set[asyncio.Task] = set()
+        self._stopped = asyncio.Event()
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def write(self, point: typing.Any) -> None:
+        """
+        Queues point or its line protocol for writing, never waits for Influx. Drops the oldest
+        queued point when there are max_pending_points of them already
+        """
+
+        if len(self._points) >= self.max_pending_points:
+            self._points.popleft()
+            self.dropped_points += 1
+            self._dropped_since_flush += 1
+
+        self._points.append(point)
+        if len(self._points) >= self.batch_size:
+            self._start_batches(full_only=True)
+
+    async def flush(self) -> None:
+        """
+        Starts writing queued points, including partial batch, in as many batches as there are
+        free in flight slots for
+        """
+
+        dropped, self._dropped_since_flush = self._dropped_since_flush, 0
+        if dropped:
+            logger.error(
+                f"Dropped {dropped} oldest points, more than {self.max_pending_points} were waiting "
+                f"for Influx (total dropped - {self.dropped_points})"
+            )
+
+        self._start_batches(full_only=False)
+
+    async def close(self) -> None:
+        """
+        Writes all pending points, waits for writes in flight and releases Influx client
+        """
+
+        self._stopped.set()
+        await self._flush_task
+
+        # more points may be queued than there are in flight slots
+        while self._points or self._tasks:
+            await self.flush()
+            await asyncio.wait(set(self._tasks), return_when=asyncio.FIRST_COMPLETED)
+
+        await self._client.close()
+
+    def _start_batches(self, full_only: bool) -> None:
+        while self._points and self.in_flight_batches < self.max_in_flight_batches:
+            if full_only and len(self._points) < self.batch_size:
+                return
+
+            points = [self._points.popleft() for _ in range(min(self.batch_size, len(self._points)))]
+            self.in_flight_batches += 1
+            if self.in_flight_batches > self.in_flight_high_watermark:
+                self.in_flight_high_watermark = self.in_flight_batches
+
+            task = asyncio.get_running_loop().create_task(self._write_batch(points))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write_batch(self, points: typing.List) -> None:
+        started_at = time.perf_counter()
+        retry_delay_secs = self.retry_delay_secs
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await self._write_api.write(self.bucket, self.org, points)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        self.failed_points += len(points)
+                        logger.error(f"Error writing batch of {len(points)} points to Influx: {e}")
+                        return
+
+                    self.retried_batches += 1
+                    logger.warning(
+                        f"Error writing batch of {len(points)} points to Influx, "
+                        f"retrying in {retry_delay_secs:.1f} s: {e}"
+                    )
+                    await asyncio.sleep(retry_delay_secs)
+                    retry_delay_secs *= 2
+        finally:
+            # backlog queued meanwhile is written without waiting for flush interval
+            self.in_flight_batches -= 1
+            self._start_batches(full_only=True)
+
+        self.last_batch_size = len(points)
+        self.last_flush_latency_ms = (time.perf_counter() - started_at) * 1000
+        self.flushed_points += len(points)
+
+        logger.info(
+            f"Flushed batch of {self.last_batch_size} points to Influx "
+            f"in {self.last_flush_latency_ms:.1f} ms (total flushed - {self.flushed_points}, "
+            f"failed - {self.failed_points}, retried batches - {self.retried_batches}, "
+            f"in flight - {self.in_flight_batches})"
+        )
+
+    async def _flush_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.flush_interval_secs)
+            except asyncio.TimeoutError:
+                pass
+
+            await self.flush()
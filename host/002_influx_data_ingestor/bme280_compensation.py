@@ -0,0 +1,167 @@
+import struct
+import typing
+
+import numpy as np
+
+# Must be kept in sync with picow/*/lib/bme280.py
+CALIBRATION_FORMAT = "<HhhHhhhhhhhhBhBhhb"
+CALIBRATION_SIZE = struct.calcsize(CALIBRATION_FORMAT)
+
+# Calibration registers 0x88..0xA1 followed by 0xE1..0xE7, as read from the sensor
+CALIBRATION_REGISTERS_SIZE = 26 + 7
+
+_COEFFICIENTS = (
+    "dig_T1", "dig_T2", "dig_T3",
+    "dig_P1", "dig_P2", "dig_P3", "dig_P4", "dig_P5", "dig_P6", "dig_P7", "dig_P8", "dig_P9",
+    "dig_H1", "dig_H2", "dig_H3", "dig_H4", "dig_H5", "dig_H6",
+)
+
+ArrayLike = typing.Union[np.ndarray, typing.Sequence[int]]
+
+
+class Bme280Calibration(object):
+    """
+    Calibration coefficients of a single BME280 sensor
+    """
+
+    __slots__ = _COEFFICIENTS
+
+    def __init__(self, *coefficients: int):
+        if len(coefficients) != len(_COEFFICIENTS):
+            raise ValueError(f"Expected {len(_COEFFICIENTS)} coefficients, got {len(coefficients)}")
+
+        for name, value in zip(_COEFFICIENTS, coefficients):
+            setattr(self, name, int(value))
+
+    @classmethod
+    def from_packed(cls, packed: bytes) -> "Bme280Calibration":
+        """
+        Creates calibration from coefficients packed on device by BME280.calibration
+        """
+
+        if len(packed) != CALIBRATION_SIZE:
+            raise ValueError(f"Unexpected calibration size {len(packed)}, expected {CALIBRATION_SIZE}")
+
+        return cls(*struct.unpack(CALIBRATION_FORMAT, packed))
+
+    @classmethod
+    def from_registers(cls, registers: bytes) -> "Bme280Calibration":
+        """
+        Parses raw calibration registers the same way as BME280 driver does
+        """
+
+        if len(registers) != CALIBRATION_REGISTERS_SIZE:
+            raise ValueError(
+                f"Unexpected calibration registers size {len(registers)}, expected {CALIBRATION_REGISTERS_SIZE}"
+            )
+
+        dig_88_a1 = registers[:26]
+        dig_e1_e7 = registers[26:]
+        (
+            dig_t1, dig_t2, dig_t3, dig_p1, dig_p2, dig_p3, dig_p4, dig_p5, dig_p6, dig_p7, dig_p8, dig_p9,
+            _, dig_h1
+        ) = struct.unpack("<HhhHhhhhhhhhBB", dig_88_a1)
+
+        dig_h2, dig_h3 = struct.unpack_from("<hB", dig_e1_e7)
+        e4_sign = struct.unpack_from("<b", dig_e1_e7, 3)[0]
+        dig_h4 = (e4_sign << 4) | (dig_e1_e7[4] & 0xF)
+        e6_sign = struct.unpack_from("<b", dig_e1_e7, 5)[0]
+        dig_h5 = (e6_sign << 4) | (dig_e1_e7[4] >> 4)
+        dig_h6 = struct.unpack_from("<b", dig_e1_e7, 6)[0]
+
+        return cls(
+            dig_t1, dig_t2, dig_t3, dig_p1, dig_p2, dig_p3, dig_p4, dig_p5, dig_p6, dig_p7, dig_p8, dig_p9,
+            dig_h1, dig_h2, dig_h3, dig_h4, dig_h5, dig_h6
+        )
+
+
+def _mul_shift(a: np.ndarray, factor: int, shift: int) -> np.ndarray:
+    """
+    Exact (a * factor) >> shift for 16-bit factor when product itself doesn't fit into int64
+    """
+
+    return ((a >> 16) * factor + (((a & 0xFFFF) * factor) >> 16)) >> (shift - 16)
+
+
+def _mul_div(a: np.ndarray, factor: int, divisor: np.ndarray) -> np.ndarray:
+    """
+    Exact floor(a * factor / divisor) for small factor when product itself doesn't fit into int64
+    """
+
+    quotient = a // divisor
+    remainder = a - quotient * divisor
+    return quotient * factor + (remainder * factor) // divisor
+
+
+def compensate_temperature(raw_temp: np.ndarray, cal: Bme280Calibration) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns temperature in 0.01 degC and t_fine used by pressure and humidity compensation
+    """
+
+    var1 = (((raw_temp >> 3) - (cal.dig_T1 << 1)) * cal.dig_T2) >> 11
+    var2 = (((((raw_temp >> 4) - cal.dig_T1) * ((raw_temp >> 4) - cal.dig_T1)) >> 12) * cal.dig_T3) >> 14
+    t_fine = var1 + var2
+    return (t_fine * 5 + 128) >> 8, t_fine
+
+
+def compensate_pressure(raw_press: np.ndarray, t_fine: np.ndarray, cal: Bme280Calibration) -> np.ndarray:
+    """
+    Returns pressure in Pa as Q24.8
+    """
+
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * cal.dig_P6
+    var2 = var2 + ((var1 * cal.dig_P5) << 17)
+    var2 = var2 + (cal.dig_P4 << 35)
+    var1 = ((var1 * var1 * cal.dig_P3) >> 8) + ((var1 * cal.dig_P2) << 12)
+    var1 = _mul_shift((1 << 47) + var1, cal.dig_P1, 33)
+
+    is_zero = var1 == 0
+    divisor = np.where(is_zero, 1, var1)
+
+    p = 1048576 - raw_press
+    p = _mul_div((p << 31) - var2, 3125, divisor)
+    var1 = (cal.dig_P9 * (p >> 13) * (p >> 13)) >> 25
+    var2 = (cal.dig_P8 * p) >> 19
+    pressure = ((p + var1 + var2) >> 8) + (cal.dig_P7 << 4)
+    return np.where(is_zero, 0, pressure)
+
+
+def compensate_humidity(raw_hum: np.ndarray, t_fine: np.ndarray, cal: Bme280Calibration) -> np.ndarray:
+    """
+    Returns relative humidity in % as Q22.10
+    """
+
+    h = t_fine - 76800
+    h = (
+        ((((raw_hum << 14) - (cal.dig_H4 << 20) - (cal.dig_H5 * h)) + 16384) >> 15) *
+        (((((((h * cal.dig_H6) >> 10) * (((h * cal.dig_H3) >> 11) + 32768)) >> 10) + 2097152) *
+          cal.dig_H2 + 8192) >> 14)
+    )
+    h = h - (((((h >> 15) * (h >> 15)) >> 7) * cal.dig_H1) >> 4)
+    h = np.clip(h, 0, 419430400)
+    return h >> 12
+
+
+def compensate(
+        raw_temperature: ArrayLike,
+        raw_pressure: ArrayLike,
+        raw_humidity: ArrayLike,
+        calibration: Bme280Calibration
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compensates batch of raw ADC readings of one sensor, results are the same as of
+    BME280.read_compensated_data on device: temperature in 0.01 degC, pressure in Pa as Q24.8
+    and humidity in % as Q22.10, all as int64 arrays. Intermediates which don't fit into int64 are
+    computed in parts, so results match for any reading which datasheet 64-bit reference code
+    handles without overflow
+    """
+
+    raw_temperature = np.asarray(raw_temperature, dtype=np.int64)
+    raw_pressure = np.asarray(raw_pressure, dtype=np.int64)
+    raw_humidity = np.asarray(raw_humidity, dtype=np.int64)
+
+    temperature, t_fine = compensate_temperature(raw_temperature, calibration)
+    pressure = compensate_pressure(raw_pressure, t_fine, calibration)
+    humidity = compensate_humidity(raw_humidity, t_fine, calibration)
+    return temperature, pressure, humidity
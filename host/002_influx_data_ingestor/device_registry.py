@@ -0,0 +1,232 @@
+import json
+import os
+import sys
+import threading
+import time
+import typing
+
+from loguru import logger
+
+# What to do with messages from devices which aren't listed in devices file
+UNKNOWN_DEVICE_POLICY_REGISTER = "register"  # register device using machine id as its name
+UNKNOWN_DEVICE_POLICY_QUARANTINE = "quarantine"  # drop messages and count them
+
+# Quarantined messages are counted individually for this many devices, the rest only in total
+MAX_QUARANTINED_DEVICES_TRACKED = 1_000
+
+
+class DeviceInfo(object):
+    """
+    Name and runtime state of a single device. Messages count and last seen time are updated
+    by DeviceRegistry.update_activity, so last seen time is accurate to its call interval
+    """
+
+    __slots__ = ("machine_unique_id", "name", "registered_automatically", "messages_count", "last_seen_at")
+
+    def __init__(self, machine_unique_id: str, name: str, registered_automatically: bool = False):
+        self.machine_unique_id = machine_unique_id
+        self.name = name
+        self.registered_automatically = registered_automatically
+        self.messages_count = 0
+        self.last_seen_at = 0.0
+
+
+class DeviceRegistry(object):
+    """
+    Maps machine unique ids to devices listed in JSON file with {"<machine unique id>": "<name>"}
+    pairs. File is re-read by reload_if_changed when it was modified, devices keep their state
+    over reloads. Lookups are dictionary reads without locking, messages are counted per worker
+    thread and summed up by update_activity. Unknown devices are registered automatically only while
+    there are less than max_devices devices, then they are quarantined
+    """
+
+    def __init__(
+            self,
+            file_name: str,
+            unknown_device_policy: str = UNKNOWN_DEVICE_POLICY_REGISTER,
+            max_devices: int = 50_000
+    ):
+        if unknown_device_policy not in (UNKNOWN_DEVICE_POLICY_REGISTER, UNKNOWN_DEVICE_POLICY_QUARANTINE):
+            raise ValueError(f"Unknown device policy '{unknown_device_policy}'")
+
+        if max_devices < 1:
+            raise ValueError("The max_devices must be greater than 0")
+
+        self.file_name = file_name
+        self.unknown_device_policy = unknown_device_policy
+        self.max_devices = max_devices
+
+        self.registered_automatically = 0
+        self.quarantined_messages = 0
+        self.quarantined_devices: typing.Dict[str, int] = {}
+
+        self._devices: typing.Dict[str, DeviceInfo] = {}
+        self._file_signature = None
+        self._lock = threading.Lock()
+
+        # messages count of every device which sent something, one dictionary per worker thread
+        self._worker = threading.local()
+        self._workers_counts: typing.List[typing.Dict[DeviceInfo, int]] = []
+
+        if not self.reload_if_changed():
+            logger.warning(f"No devices loaded from '{self.file_name}'")
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def _read_file_signature(self) -> typing.Optional[typing.Tuple[int, int]]:
+        try:
+            stat = os.stat(self.file_name)
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> typing.Dict[str, str]:
+        with open(self.file_name, "r") as f:
+            names = json.load(f)
+
+        if names.__class__ is not dict:
+            raise ValueError("Devices file must contain JSON object")
+
+        for machine_unique_id, name in names.items():
+            if name.__class__ is not str:
+                raise ValueError(f"Name of device '{machine_unique_id}' must be a string")
+
+        return names
+
+    def reload_if_changed(self) -> bool:
+        """
+        Re-reads devices file when it was modified, returns True when devices were reloaded. On errors
+        previously loaded devices are kept
+        """
+
+        signature = self._read_file_signature()
+        if signature is None or signature == self._file_signature:
+            return False
+
+        started_at = time.perf_counter()
+        try:
+            names = self._load()
+        except (OSError, ValueError) as e:
+            # broken file isn't read again until it is modified
+            self._file_signature = signature
+            logger.error(f"Error loading devices from '{self.file_name}': {e}")
+            return False
+
+        with self._lock:
+            devices = {}
+            for machine_unique_id, name in names.items():
+                machine_unique_id = sys.intern(machine_unique_id)
+                device = self._devices.get(machine_unique_id)
+                if device is None:
+                    device = DeviceInfo(machine_unique_id, name)
+                else:
+                    device.name = name
+                    device.registered_automatically = False
+
+                devices[machine_unique_id] = device
+
+            # automatically registered devices are kept until they are listed in file
+            for machine_unique_id, device in self._devices.items():
+                if device.registered_automatically and machine_unique_id not in devices:
+                    devices[machine_unique_id] = device
+
+            self._devices = devices
+            self.registered_automatically = sum(device.registered_automatically for device in devices.values())
+            self._file_signature = signature
+
+        logger.info(
+            f"Loaded {len(names)} devices from '{self.file_name}' in {(time.perf_counter() - started_at) * 1000:.1f} ms "
+            f"({self.registered_automatically} more registered automatically)"
+        )
+        return True
+
+    def _quarantine(self, machine_unique_id: str) -> None:
+        with self._lock:
+            self.quarantined_messages += 1
+            count = self.quarantined_devices.get(machine_unique_id)
+            if count is not None:
+                self.quarantined_devices[machine_unique_id] = count + 1
+            elif len(self.quarantined_devices) < MAX_QUARANTINED_DEVICES_TRACKED:
+                self.quarantined_devices[machine_unique_id] = 1
+                logger.warning(f"Messages from unknown device '{machine_unique_id}' are quarantined")
+
+    def _register(self, machine_unique_id: str) -> typing.Optional[DeviceInfo]:
+        with self._lock:
+            device = self._devices.get(machine_unique_id)
+            if device is not None:
+                return device
+
+            if len(self._devices) >= self.max_devices:
+                return None
+
+            machine_unique_id = sys.intern(machine_unique_id)
+            device = DeviceInfo(machine_unique_id, machine_unique_id, registered_automatically=True)
+            self._devices[machine_unique_id] = device
+            self.registered_automatically += 1
+
+        logger.info(f"Registered unknown device '{machine_unique_id}'")
+        return device
+
+    def _worker_counts(self) -> typing.Dict[DeviceInfo, int]:
+        counts = getattr(self._worker, "counts", None)
+        if counts is None:
+            counts = self._worker.counts = {}
+            with self._lock:
+                self._workers_counts.append(counts)
+
+        return counts
+
+    def lookup(self, machine_unique_id: str) -> typing.Optional[DeviceInfo]:
+        """
+        Returns device which sent message and counts the message, None when message must be dropped
+        because device is unknown and is quarantined or registry is full
+        """
+
+        device = self._devices.get(machine_unique_id)
+        if device is None:
+            if self.unknown_device_policy == UNKNOWN_DEVICE_POLICY_REGISTER:
+                device = self._register(machine_unique_id)
+
+            if device is None:
+                self._quarantine(machine_unique_id)
+                return None
+
+        # only this thread writes its counts, so there is no locking and nothing is stored per message
+        counts = self._worker_counts()
+        counts[device] = counts.get(device, 0) + 1
+        return device
+
+    def update_activity(self) -> int:
+        """
+        Sums up messages counted by worker threads into device state, devices which sent messages
+        since the previous call are seen now. Returns count of such devices
+        """
+
+        now = time.time()
+        with self._lock:
+            # copying dictionary is atomic, worker keeps counting meanwhile
+            workers_counts = [counts.copy() for counts in self._workers_counts]
+
+        totals: typing.Dict[DeviceInfo, int] = {}
+        for counts in workers_counts:
+            for device, count in counts.items():
+                totals[device] = totals.get(device, 0) + count
+
+        active_devices = 0
+        for device, count in totals.items():
+            if count != device.messages_count:
+                device.messages_count = count
+                device.last_seen_at = now
+                active_devices += 1
+
+        return active_devices
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Device registry stats: devices - {len(self._devices)} "
+            f"(registered automatically - {self.registered_automatically}), "
+            f"quarantined messages - {self.quarantined_messages} "
+            f"from {len(self.quarantined_devices)} devices"
+        )
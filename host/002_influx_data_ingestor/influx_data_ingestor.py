@@ -5,108 +5,211 @@ import typing
 from datetime import datetime
 
 import paho.mqtt.client as mqtt
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
 from loguru import logger
 
 import secrets
+from device_registry import DeviceRegistry, UNKNOWN_DEVICE_POLICY_REGISTER
+from influx_writer import BatchingInfluxWriter
+import line_protocol
+from message_pipeline import MessagePipeline, OVERFLOW_POLICY_BLOCK
+import telemetry_frame
+from payload_decoder import PayloadDecodeError, PicoWReading, decode_message
+from reading_deduplicator import ReadingDeduplicator
+
+MQTT_PORT = 1883
+
+INFLUX_BATCH_SIZE = 500
+INFLUX_FLUSH_INTERVAL_SECS = 1.0
+INFLUX_MAX_RETRIES = 3
+INFLUX_RETRY_DELAY_SECS = 1.0
+# Points queued while Influx is unavailable, the oldest ones are dropped above this count
+INFLUX_MAX_PENDING_POINTS = 100_000
+
+PIPELINE_WORKERS_COUNT = 4
+PIPELINE_MAX_QUEUE_SIZE = 10_000
+PIPELINE_OVERFLOW_POLICY = OVERFLOW_POLICY_BLOCK
+PIPELINE_STATS_INTERVAL_SECS = 60
+
+DEVICES_FILE_NAME = "devices.json"
+DEVICE_REGISTRY_UNKNOWN_DEVICE_POLICY = UNKNOWN_DEVICE_POLICY_REGISTER
+DEVICE_REGISTRY_MAX_DEVICES = 50_000
+DEVICE_REGISTRY_RELOAD_INTERVAL_SECS = 5
 
 mqtt_client = None
+influx_writer = None
+pipeline = None
+reading_deduplicator = None
+device_registry = None
+
+# optional predicate on raw payload, messages for which it returns False are left to other ingestors
+message_filter = None
+skipped_messages = 0
 
 
 def ctrl_c_handler(signum, frame):
     print("Exiting...")
-    mqtt_client.loop_stop()
-    logger.info("Application finished")
+    stop()
     exit()
 
 
-def send_data_to_influx(payload: typing.Dict) -> None:
-    MACHINES = {
-        "e6:61:41:04:03:24:ab:36": "PicoW-Sensor-1"
-    }
-
-    bme_data = payload["payload"]["bme280"]
+def send_data_to_influx(reading: PicoWReading) -> None:
+    device = device_registry.lookup(reading.machine_unique_id)
+    if device is None:
+        return
 
-    temperature = bme_data["temperature"]
-    temperature = str(temperature).replace("C", "")
-    temperature = float(temperature)
+    logger.info(
+        f"Data received from '{reading.machine_unique_id}': "
+        f"temp - {reading.temperature:.02f} humidity - {reading.humidity}"
+    )
 
-    humidity = bme_data["humidity"]
-    humidity = str(humidity).replace("%", "")
-    humidity = float(humidity)
+    influx_writer.write(line_protocol.encode_reading(reading, device.name))
 
-    pressure = bme_data["pressure"]
-    pressure = str(pressure).replace("hPa", "")
-    pressure = float(pressure)
 
-    metadata = payload["metadata"]
-    machine_unique_id = metadata["machine_unique_id"]
-    machine_metrics = metadata["machine_metrics"]
+def decode_readings(raw_payload: bytes) -> typing.List[PicoWReading]:
+    if telemetry_frame.is_frame(raw_payload):
+        logger.opt(lazy=True).debug("Received frame: {}", lambda: raw_payload.hex())
+        return [telemetry_frame.decode_frame(raw_payload)]
 
-    machine_power = machine_metrics["power"]
+    if telemetry_frame.is_batch(raw_payload):
+        logger.opt(lazy=True).debug("Received batch: {}", lambda: raw_payload.hex())
+        return telemetry_frame.decode_batch(raw_payload, received_at=datetime.utcnow())
 
-    logger.info(f"Data received from '{machine_unique_id}': temp - {temperature:.02f} humidity - {humidity:.02f}")
+    envelope, reading = decode_message(raw_payload)
+    logger.opt(lazy=True).debug(
+        "Received message: {}",
+        lambda: json.dumps(envelope, sort_keys=True, indent=4)
+    )
+    return [reading]
 
-    logger.info("Sending data to Influx...")
-    with InfluxDBClient(url=secrets.INFLUX_URL, token=secrets.TOKEN, org=secrets.ORG) as client:
-        write_api = client.write_api(write_options=SYNCHRONOUS)
 
-        point = Point("PicoWData") \
-            .tag("host", MACHINES[machine_unique_id]) \
-            .field("temperature", temperature) \
-            .field("humidity", humidity) \
-            .field("pressure", pressure) \
-            .field("current_voltage", machine_power["current_voltage"]) \
-            .field("charge_percentage", machine_power["charge_percentage"]) \
-            .field("cpu_temperature", machine_metrics["cpu_temperature"]) \
-            .field("mem_free", machine_metrics["mem_free"]) \
-            .time(datetime.utcnow(), WritePrecision.NS)
+def process_message(raw_payload: bytes) -> None:
+    try:
+        readings = decode_readings(raw_payload)
+    except PayloadDecodeError as e:
+        logger.warning(f"Skipping malformed message: {e}")
+        return
 
-        write_api.write(secrets.BUCKET, secrets.ORG, point)
+    for reading in reading_deduplicator.filter(readings):
+        send_data_to_influx(reading)
 
 
 def on_message(client, userdata, message):
-    payload = str(message.payload.decode("utf-8"))
+    global skipped_messages
 
-    try:
-        payload = json.loads(payload)
-    except:
+    if message_filter is not None and not message_filter(message.payload):
+        skipped_messages += 1
         return
 
-    send_data_to_influx(payload)
+    pipeline.submit(message.payload)
 
-    payload = json.dumps(payload, sort_keys=True, indent=4)
-    logger.info(f"Received message (userdata={userdata}): {payload}")
 
-
-def connect_to_mqtt() -> mqtt.Client:
+def connect_to_mqtt(client_name: str, topic: str) -> mqtt.Client:
     logger.info(
-        f"Connecting to '{secrets.MQTT_BROKER}' as client '{secrets.CLIENT_NAME}' "
-        f"(user '{secrets.USER_NAME}') to listen topic '{secrets.TOPIC}'"
+        f"Connecting to '{secrets.MQTT_BROKER}:{MQTT_PORT}' as client '{client_name}' "
+        f"(user '{secrets.USER_NAME}') to listen topic '{topic}'"
     )
-    client = mqtt.Client(secrets.CLIENT_NAME)
+    client = mqtt.Client(client_name)
     client.username_pw_set(secrets.USER_NAME, secrets.PASSWORD)
-    client.connect(secrets.MQTT_BROKER)
+    client.connect(secrets.MQTT_BROKER, MQTT_PORT)
 
     return client
 
 
-def main():
+def start(
+        client_name: typing.Optional[str] = None,
+        topic: typing.Optional[str] = None,
+        accept_message: typing.Optional[typing.Callable[[bytes], bool]] = None
+) -> None:
+    """
+    Creates Influx writer and message pipeline and starts receiving messages in background,
+    by default with client name and topic from secrets
+    """
+
+    global mqtt_client, influx_writer, pipeline, reading_deduplicator, device_registry, message_filter
+
+    client_name = client_name or secrets.CLIENT_NAME
+    topic = topic or secrets.TOPIC
+    message_filter = accept_message
+
+    influx_writer = BatchingInfluxWriter(
+        url=secrets.INFLUX_URL,
+        token=secrets.TOKEN,
+        org=secrets.ORG,
+        bucket=secrets.BUCKET,
+        batch_size=INFLUX_BATCH_SIZE,
+        flush_interval_secs=INFLUX_FLUSH_INTERVAL_SECS,
+        max_retries=INFLUX_MAX_RETRIES,
+        retry_delay_secs=INFLUX_RETRY_DELAY_SECS,
+        max_pending_points=INFLUX_MAX_PENDING_POINTS
+    )
 
-    global mqtt_client
-    logger.info("Application started")
-    signal.signal(signal.SIGINT, ctrl_c_handler)
+    device_registry = DeviceRegistry(
+        DEVICES_FILE_NAME,
+        unknown_device_policy=DEVICE_REGISTRY_UNKNOWN_DEVICE_POLICY,
+        max_devices=DEVICE_REGISTRY_MAX_DEVICES
+    )
+    reading_deduplicator = ReadingDeduplicator()
+    pipeline = MessagePipeline(
+        process_message,
+        workers_count=PIPELINE_WORKERS_COUNT,
+        max_queue_size=PIPELINE_MAX_QUEUE_SIZE,
+        overflow_policy=PIPELINE_OVERFLOW_POLICY
+    )
 
-    mqtt_client = connect_to_mqtt()
-    mqtt_client.subscribe(secrets.TOPIC)
+    mqtt_client = connect_to_mqtt(client_name, topic)
+    mqtt_client.subscribe(topic)
     mqtt_client.on_message = on_message
 
     mqtt_client.loop_start()
 
-    while True:
+
+def stop() -> None:
+    """
+    Stops receiving messages, processes already received ones and flushes them to Influx
+    """
+
+    mqtt_client.loop_stop()
+    pipeline.stop()
+    pipeline.log_stats()
+    device_registry.log_stats()
+    influx_writer.close()
+    logger.info("Application finished")
+
+
+def run_housekeeping(
+        should_stop: typing.Callable[[], bool] = lambda: False,
+        on_stats: typing.Optional[typing.Callable[[], None]] = None
+) -> None:
+    """
+    Periodically reloads devices and logs stats until should_stop returns True
+    """
+
+    last_stats_at = time.monotonic()
+    last_devices_check_at = time.monotonic()
+    while not should_stop():
         time.sleep(0.2)
 
+        if time.monotonic() - last_devices_check_at >= DEVICE_REGISTRY_RELOAD_INTERVAL_SECS:
+            device_registry.update_activity()
+            device_registry.reload_if_changed()
+            last_devices_check_at = time.monotonic()
+
+        if time.monotonic() - last_stats_at >= PIPELINE_STATS_INTERVAL_SECS:
+            pipeline.log_stats()
+            device_registry.log_stats()
+            if on_stats is not None:
+                on_stats()
+
+            last_stats_at = time.monotonic()
+
+
+def main():
+    logger.info("Application started")
+    signal.signal(signal.SIGINT, ctrl_c_handler)
+
+    start()
+    run_housekeeping()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,165 @@
+import collections
+import threading
+import time
+import typing
+
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS
+from loguru import logger
+
+
+def is_retryable(e: Exception) -> bool:
+    """
+    Tells whether failed write may succeed later: connection errors have no HTTP status, 429 and
+    5xx mean Influx is overloaded or unavailable, other statuses mean batch was rejected
+    """
+
+    status = getattr(e, "status", None)
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+class BatchingInfluxWriter(object):
+    """
+    Keeps one InfluxDB client for the whole application lifetime and writes accumulated points
+    in batches from a background thread, when batch is full or when flush interval elapses.
+    Batch which failed because Influx is unavailable or overloaded is retried up to max_retries
+    times with doubling delay, batches rejected by Influx (e.g. malformed points) aren't retried.
+    While batches are retried new points are queued, up to max_pending_points, then the oldest
+    queued points are dropped, so memory is bounded when Influx is down for long
+    """
+
+    def __init__(
+            self,
+            url: str,
+            token: str,
+            org: str,
+            bucket: str,
+            batch_size: int = 500,
+            flush_interval_secs: float = 1.0,
+            max_retries: int = 3,
+            retry_delay_secs: float = 1.0,
+            max_pending_points: int = 100_000
+    ):
+        if batch_size < 1:
+            raise ValueError("The batch_size must be greater than 0")
+
+        if flush_interval_secs <= 0:
+            raise ValueError("The flush_interval_secs must be greater than 0")
+
+        if max_retries < 0:
+            raise ValueError("The max_retries must not be negative")
+
+        if retry_delay_secs < 0:
+            raise ValueError("The retry_delay_secs must not be negative")
+
+        if max_pending_points < batch_size:
+            raise ValueError("The max_pending_points must not be less than batch_size")
+
+        self.org = org
+        self.bucket = bucket
+        self.batch_size = batch_size
+        self.flush_interval_secs = flush_interval_secs
+        self.max_retries = max_retries
+        self.retry_delay_secs = retry_delay_secs
+        self.max_pending_points = max_pending_points
+
+        self.flushed_points = 0
+        self.failed_points = 0
+        self.dropped_points = 0
+        self.retried_batches = 0
+        self.last_batch_size = 0
+        self.last_flush_latency_ms = 0.0
+
+        self._client = InfluxDBClient(url=url, token=token, org=org)
+        self._write_api = self._client.write_api(write_options=SYNCHRONOUS)
+
+        self._points = collections.deque()
+        self._dropped_since_flush = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="influx-writer", daemon=True)
+        self._flush_thread.start()
+
+    def write(self, point: typing.Any) -> None:
+        """
+        Queues point or its line protocol for writing, never blocks on network. Drops the oldest
+        queued point when there are max_pending_points of them already
+        """
+
+        with self._lock:
+            if len(self._points) >= self.max_pending_points:
+                self._points.popleft()
+                self.dropped_points += 1
+                self._dropped_since_flush += 1
+
+            self._points.append(point)
+            is_batch_full = len(self._points) >= self.batch_size
+
+        if is_batch_full:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            points, self._points = list(self._points), collections.deque()
+            dropped, self._dropped_since_flush = self._dropped_since_flush, 0
+
+        if dropped:
+            logger.error(
+                f"Dropped {dropped} oldest points, more than {self.max_pending_points} were waiting "
+                f"for Influx (total dropped - {self.dropped_points})"
+            )
+
+        for offset in range(0, len(points), self.batch_size):
+            self._write_batch(points[offset:offset + self.batch_size])
+
+    def close(self) -> None:
+        """
+        Flushes all pending points and releases Influx client
+        """
+
+        self._stopped = True
+        self._wakeup.set()
+        self._flush_thread.join()
+
+        self._client.close()
+
+    def _write_batch(self, points: typing.List) -> None:
+        started_at = time.perf_counter()
+        retry_delay_secs = self.retry_delay_secs
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._write_api.write(self.bucket, self.org, points)
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    self.failed_points += len(points)
+                    logger.error(f"Error writing batch of {len(points)} points to Influx: {e}")
+                    return
+
+                self.retried_batches += 1
+                logger.warning(
+                    f"Error writing batch of {len(points)} points to Influx, "
+                    f"retrying in {retry_delay_secs:.1f} s: {e}"
+                )
+                time.sleep(retry_delay_secs)
+                retry_delay_secs *= 2
+
+        self.last_batch_size = len(points)
+        self.last_flush_latency_ms = (time.perf_counter() - started_at) * 1000
+        self.flushed_points += len(points)
+
+        logger.info(
+            f"Flushed batch of {self.last_batch_size} points to Influx "
+            f"in {self.last_flush_latency_ms:.1f} ms (total flushed - {self.flushed_points}, "
+            f"failed - {self.failed_points}, retried batches - {self.retried_batches})"
+        )
+
+    def _flush_loop(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval_secs)
+            self._wakeup.clear()
+            self.flush()
+
+        self.flush()
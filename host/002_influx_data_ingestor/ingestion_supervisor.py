@@ -0,0 +1,241 @@
+"""
+Runs several influx_data_ingestor worker processes, so ingestion isn't limited by a single core.
+Messages are split between workers by hash of machine unique id, so all messages of a device are
+processed by the same worker and its reading deduplicator sees re-sent readings. Alternatively
+broker can split them with MQTT shared subscription.
+
+Devices publish to a single topic, so broker can't route messages of a device to the same worker:
+shared subscriptions of common brokers are round-robin. With hash partitioning every worker
+receives every message instead and skips messages of other workers after peeking at machine unique
+id, which doesn't decode message. That is paid for in CPU time growing with workers count:
+host/003_fleet_benchmark with 500 devices at 500 messages/sec used 0.62-0.67 ms of CPU per reading
+with 4 workers against 0.55-0.57 ms with shared subscription, and 0.98 ms against 0.77 ms with
+8 workers. Shared subscription is cheaper when devices don't re-send readings (always-on sensors)
+or when duplicates are acceptable. Compare both on your fleet with
+fleet_benchmark.py --ingestor influx-sharded --partitioning hash|shared --workers N
+"""
+import functools
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import time
+import typing
+import zlib
+
+from loguru import logger
+
+import secrets
+import influx_data_ingestor
+import telemetry_frame
+
+# How messages are split between workers
+# Every worker receives all messages and processes ones of its devices, see its CPU cost in module docstring
+PARTITIONING_HASH = "hash"
+# Broker delivers every message to one worker of the group, so messages of a device are spread over
+# workers and re-sent buffered readings may be written twice, as every worker deduplicates on its own
+PARTITIONING_SHARED_SUBSCRIPTION = "shared"
+
+WORKERS_COUNT = os.cpu_count() or 1
+PARTITIONING = PARTITIONING_HASH
+SHARED_SUBSCRIPTION_GROUP = "picow-ingestors"
+
+WORKER_STOP_TIMEOUT_SECS = 30
+WORKER_RESTART_DELAY_SECS = 5
+STATS_INTERVAL_SECS = influx_data_ingestor.PIPELINE_STATS_INTERVAL_SECS
+
+_JSON_MACHINE_UNIQUE_ID = re.compile(rb'"machine_unique_id"\s*:\s*"([0-9a-fA-F:]*)"')
+
+stop_event = None
+metrics_queue = None
+workers: typing.List[multiprocessing.Process] = []
+workers_started_at: typing.List[float] = []
+workers_metrics: typing.Dict[int, typing.Dict] = {}
+
+
+def partition_key(raw_payload: bytes) -> bytes:
+    """
+    Returns raw machine unique id of message without decoding it, so all messages of a device go
+    to the same worker. Payload itself is the key when machine unique id can't be found
+    """
+
+    if telemetry_frame.is_frame(raw_payload) or telemetry_frame.is_batch(raw_payload):
+        return telemetry_frame.peek_machine_unique_id(raw_payload) or raw_payload
+
+    match = _JSON_MACHINE_UNIQUE_ID.search(raw_payload)
+    if match is None:
+        return raw_payload
+
+    try:
+        return bytes.fromhex(match.group(1).replace(b":", b"").decode("ascii"))
+    except ValueError:
+        return match.group(1)
+
+
+def is_own_message(raw_payload: bytes, worker_index: int, workers_count: int) -> bool:
+    # crc32 is the same in all processes unlike hash()
+    return zlib.crc32(partition_key(raw_payload)) % workers_count == worker_index
+
+
+def collect_metrics(worker_index: int) -> typing.Dict:
+    pipeline = influx_data_ingestor.pipeline
+    influx_writer = influx_data_ingestor.influx_writer
+    return {
+        "worker": worker_index,
+        "pid": os.getpid(),
+        "skipped": influx_data_ingestor.skipped_messages,
+        "enqueued": pipeline.enqueued,
+        "dropped": pipeline.dropped,
+        "processed": pipeline.processed,
+        "failed": pipeline.failed,
+        "queue_high_watermark": pipeline.queue_high_watermark,
+        "flushed_points": influx_writer.flushed_points,
+        "failed_points": influx_writer.failed_points,
+        "dropped_points": influx_writer.dropped_points,
+        "quarantined_messages": influx_data_ingestor.device_registry.quarantined_messages,
+        "duplicates": influx_data_ingestor.reading_deduplicator.duplicates
+    }
+
+
+def run_worker(
+        worker_index: int,
+        workers_count: int,
+        partitioning: str,
+        worker_stop_event: multiprocessing.Event,
+        worker_metrics_queue: multiprocessing.Queue
+) -> None:
+    # Ctrl+C reaches the whole process group, workers are stopped by supervisor instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    client_name = f"{secrets.CLIENT_NAME}-{worker_index}"
+    if partitioning == PARTITIONING_SHARED_SUBSCRIPTION:
+        topic = f"$share/{SHARED_SUBSCRIPTION_GROUP}/{secrets.TOPIC}"
+        accept_message = None
+    else:
+        topic = secrets.TOPIC
+        accept_message = functools.partial(is_own_message, worker_index=worker_index, workers_count=workers_count)
+
+    def report_metrics():
+        worker_metrics_queue.put(collect_metrics(worker_index))
+
+    influx_data_ingestor.start(client_name=client_name, topic=topic, accept_message=accept_message)
+    influx_data_ingestor.run_housekeeping(worker_stop_event.is_set, on_stats=report_metrics)
+    influx_data_ingestor.stop()
+    report_metrics()
+
+
+def start_worker(worker_index: int) -> None:
+    process = multiprocessing.Process(
+        target=run_worker,
+        args=(worker_index, WORKERS_COUNT, PARTITIONING, stop_event, metrics_queue),
+        name=f"ingestor-worker-{worker_index}"
+    )
+    process.start()
+    logger.info(f"Started worker {worker_index} (pid {process.pid})")
+
+    if worker_index < len(workers):
+        workers[worker_index] = process
+        workers_started_at[worker_index] = time.monotonic()
+    else:
+        workers.append(process)
+        workers_started_at.append(time.monotonic())
+
+
+def receive_metrics() -> None:
+    while True:
+        try:
+            metrics = metrics_queue.get_nowait()
+        except queue.Empty:
+            return
+
+        workers_metrics[metrics["worker"]] = metrics
+
+
+def log_metrics() -> None:
+    totals = {}
+    for worker_index in sorted(workers_metrics):
+        metrics = workers_metrics[worker_index]
+        logger.info(
+            f"Worker {worker_index} (pid {metrics['pid']}): skipped - {metrics['skipped']}, "
+            f"enqueued - {metrics['enqueued']}, dropped - {metrics['dropped']}, "
+            f"processed - {metrics['processed']}, failed - {metrics['failed']}, "
+            f"queue high watermark - {metrics['queue_high_watermark']}, "
+            f"flushed points - {metrics['flushed_points']}, failed points - {metrics['failed_points']}, "
+            f"dropped points - {metrics['dropped_points']}, quarantined - {metrics['quarantined_messages']}, duplicates - {metrics['duplicates']}"
+        )
+        for name, value in metrics.items():
+            if name not in ("worker", "pid", "queue_high_watermark"):
+                totals[name] = totals.get(name, 0) + value
+
+    if totals:
+        logger.info(
+            f"All {len(workers_metrics)} workers: skipped - {totals['skipped']}, "
+            f"enqueued - {totals['enqueued']}, dropped - {totals['dropped']}, "
+            f"processed - {totals['processed']}, failed - {totals['failed']}, "
+            f"flushed points - {totals['flushed_points']}, failed points - {totals['failed_points']}"
+        )
+
+
+def stop_workers() -> None:
+    """
+    Asks workers to process received messages and exit, terminates ones which didn't stop in time
+    """
+
+    stop_event.set()
+    deadline = time.monotonic() + WORKER_STOP_TIMEOUT_SECS
+    for worker_index, process in enumerate(workers):
+        # queue is read while waiting, worker can't exit while its metrics aren't received
+        while process.is_alive() and time.monotonic() < deadline:
+            process.join(0.2)
+            receive_metrics()
+
+        if process.is_alive():
+            logger.warning(f"Worker {worker_index} didn't stop in time, terminating it")
+            process.terminate()
+            process.join()
+
+    receive_metrics()
+
+
+def ctrl_c_handler(signum, frame):
+    print("Exiting...")
+    stop_workers()
+    log_metrics()
+    logger.info("Application finished")
+    exit()
+
+
+def main():
+    global stop_event, metrics_queue
+
+    logger.info(f"Application started with {WORKERS_COUNT} workers, partitioning - '{PARTITIONING}'")
+    if PARTITIONING == PARTITIONING_SHARED_SUBSCRIPTION and WORKERS_COUNT > 1:
+        logger.warning("Readings re-sent by devices are deduplicated only when they reach the same worker")
+    stop_event = multiprocessing.Event()
+    metrics_queue = multiprocessing.Queue()
+    signal.signal(signal.SIGINT, ctrl_c_handler)
+
+    for worker_index in range(WORKERS_COUNT):
+        start_worker(worker_index)
+
+    last_stats_at = time.monotonic()
+    while True:
+        time.sleep(0.2)
+        receive_metrics()
+
+        for worker_index, process in enumerate(workers):
+            if process.is_alive():
+                continue
+
+            if time.monotonic() - workers_started_at[worker_index] >= WORKER_RESTART_DELAY_SECS:
+                logger.error(f"Worker {worker_index} exited with code {process.exitcode}, restarting it")
+                start_worker(worker_index)
+
+        if time.monotonic() - last_stats_at >= STATS_INTERVAL_SECS:
+            log_metrics()
+            last_stats_at = time.monotonic()
+
+
+if __name__ == "__main__":
+    main()
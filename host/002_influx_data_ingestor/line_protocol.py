@@ -0,0 +1,110 @@
+import functools
+import math
+import time
+import typing
+from datetime import datetime, timezone
+
+from payload_decoder import PicoWReading
+
+MEASUREMENT = "PicoWData"
+
+_EPOCH = datetime(1970, 1, 1)
+
+_ESCAPE_TAG = str.maketrans({
+    ",": r"\,",
+    "=": r"\=",
+    " ": r"\ ",
+    "\n": r"\n",
+    "\t": r"\t",
+    "\r": r"\r",
+})
+
+_ESCAPE_STRING = str.maketrans({
+    '"': r"\"",
+    "\\": r"\\",
+})
+
+
+@functools.lru_cache(maxsize=65_536)
+def escape_tag_value(value: str) -> str:
+    """
+    Escapes tag value, cached as the same few device names are escaped over and over
+    """
+
+    value = value.translate(_ESCAPE_TAG)
+    # trailing backslash would escape separator after tag set
+    if value.endswith("\\"):
+        value += " "
+
+    return value
+
+
+def format_field_value(value: typing.Any) -> typing.Optional[str]:
+    """
+    Formats field value the same way as influxdb_client Point does, returns None for values which
+    Point skips: None and non-finite floats
+    """
+
+    value_type = value.__class__
+    if value_type is float:
+        if not math.isfinite(value):
+            return None
+
+        text = repr(value)
+        return text[:-2] if text.endswith(".0") else text
+
+    if value_type is int:
+        return f"{value}i"
+
+    if value is None:
+        return None
+
+    if value_type is bool:
+        return "true" if value else "false"
+
+    if value_type is str:
+        return f'"{value.translate(_ESCAPE_STRING)}"'
+
+    raise ValueError(f"Type '{value_type.__name__}' of field value is not supported")
+
+
+def timestamp_ns(value: typing.Optional[datetime]) -> int:
+    """
+    Converts measurement time to nanoseconds since epoch, naive datetime is UTC. Current time
+    is used when measurement time is unknown
+    """
+
+    if value is None:
+        return time.time_ns()
+
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+
+def encode_reading(reading: PicoWReading, host: str) -> str:
+    """
+    Returns line protocol for PicoWData point of a single reading, the same as influxdb_client
+    Point with the same fields gives, but without building Point. Fields are in sorted order
+    """
+
+    fields = []
+    for name, value in (
+        ("charge_percentage", reading.charge_percentage),
+        ("cpu_temperature", reading.cpu_temperature),
+        ("current_voltage", reading.current_voltage),
+        ("humidity", reading.humidity),
+        ("mem_free", reading.mem_free),
+        ("pressure", reading.pressure),
+        ("temperature", reading.temperature),
+        ("wifi_connect_time_ms", reading.wifi_connect_time_ms)
+    ):
+        text = format_field_value(value)
+        if text is not None:
+            fields.append(f"{name}={text}")
+
+    host = escape_tag_value(host)
+    tags = f",host={host}" if host else ""
+    return f"{MEASUREMENT}{tags} {','.join(fields)} {timestamp_ns(reading.measured_at)}"
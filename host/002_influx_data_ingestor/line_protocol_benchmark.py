@@ -0,0 +1,70 @@
+"""
+Measures how many PicoWData points per second single core can serialize into line protocol,
+comparing influxdb_client Point with line_protocol encoder. Both give the same output, which is
+checked by tests/host/influx_ingestor/test_line_protocol.py
+"""
+import argparse
+import time
+import typing
+from datetime import datetime
+
+from influxdb_client import Point, WritePrecision
+
+from line_protocol import encode_reading
+from payload_decoder import PicoWReading
+
+HOST = "PicoW-Sensor-1"
+
+SAMPLE_READING = PicoWReading(
+    machine_unique_id="e6:61:41:04:03:24:ab:36",
+    temperature=23.45,
+    humidity=45.12,
+    pressure=1013.25,
+    current_voltage=4.05,
+    charge_percentage=89.3,
+    cpu_temperature=24.8,
+    mem_free=153216,
+    measured_at=datetime(2022, 11, 20, 12, 34, 56, 123456),
+    wifi_connect_time_ms=1830
+)
+
+def encode_point(reading: PicoWReading, host: str) -> str:
+    point = Point("PicoWData") \
+        .tag("host", host) \
+        .field("temperature", reading.temperature) \
+        .field("humidity", reading.humidity) \
+        .field("pressure", reading.pressure) \
+        .field("current_voltage", reading.current_voltage) \
+        .field("charge_percentage", reading.charge_percentage) \
+        .field("cpu_temperature", reading.cpu_temperature) \
+        .field("mem_free", reading.mem_free) \
+        .field("wifi_connect_time_ms", reading.wifi_connect_time_ms) \
+        .time(reading.measured_at, WritePrecision.NS)
+
+    return point.to_line_protocol()
+
+
+def measure(name: str, function: typing.Callable, iterations: int) -> float:
+    started_at = time.process_time()
+    for _ in range(iterations):
+        function(SAMPLE_READING, HOST)
+    elapsed = time.process_time() - started_at
+
+    points_per_second = iterations / elapsed
+    print(f"{name:<10} {points_per_second:>12,.0f} points/sec ({elapsed * 1e6 / iterations:.2f} us/point)")
+    return points_per_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"Serializing point {args.iterations} times on a single core: {encode_reading(SAMPLE_READING, HOST)}")
+    before = measure("Point", encode_point, args.iterations)
+    after = measure("encoder", encode_reading, args.iterations)
+    print(f"Speed-up: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import asyncio
+import collections
+import typing
+
+import paho.mqtt.client as mqtt
+from loguru import logger
+
+RECONNECT_MIN_DELAY_SECS = 1
+RECONNECT_MAX_DELAY_SECS = 60
+
+
+class MqttMessageStream(object):
+    """
+    Runs paho client on asyncio event loop instead of its network thread: client socket is watched
+    by the loop and received payloads are returned by async iteration. When max_queue_size
+    payloads are waiting, socket isn't read until half of them are processed, so backpressure
+    reaches the broker instead of growing memory
+    """
+
+    def __init__(self, client: mqtt.Client, topic: str, max_queue_size: int = 10_000):
+        if max_queue_size < 1:
+            raise ValueError("The max_queue_size must be greater than 0")
+
+        self.client = client
+        self.topic = topic
+        self.max_queue_size = max_queue_size
+
+        self.received = 0
+        self.paused = 0
+        self.queue_high_watermark = 0
+
+        self._loop = asyncio.get_running_loop()
+        self._queue: typing.Deque[bytes] = collections.deque()
+        self._message_available = asyncio.Event()
+        self._socket = None
+        self._is_reading = False
+        self._is_closed = False
+        self._misc_task = None
+
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def connect(self, host: str, port: int = 1883) -> None:
+        self.client.connect(host, port)
+        self._misc_task = self._loop.create_task(self._misc_loop())
+
+    def disconnect(self) -> None:
+        """
+        Stops receiving, iteration ends when already received payloads are processed
+        """
+
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+
+        self._is_closed = True
+        self._message_available.set()
+        self.client.disconnect()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def __aiter__(self) -> "MqttMessageStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        while not self._queue:
+            if self._is_closed:
+                raise StopAsyncIteration
+
+            self._message_available.clear()
+            await self._message_available.wait()
+
+        payload = self._queue.popleft()
+        if not self._is_reading and len(self._queue) <= self.max_queue_size // 2:
+            self._resume_reading()
+
+        return payload
+
+    def _on_connect(self, client, userdata, flags, rc) -> None:
+        if rc != mqtt.CONNACK_ACCEPTED:
+            logger.error(f"MQTT connection refused: {mqtt.connack_string(rc)}")
+            return
+
+        # subscribing here also restores subscription after reconnect
+        client.subscribe(self.topic)
+        logger.info(f"Listening topic '{self.topic}'")
+
+    def _on_message(self, client, userdata, message) -> None:
+        self._queue.append(message.payload)
+        self.received += 1
+        self._message_available.set()
+
+        depth = len(self._queue)
+        if depth > self.queue_high_watermark:
+            self.queue_high_watermark = depth
+
+        if depth >= self.max_queue_size and self._is_reading:
+            self._pause_reading()
+
+    def _pause_reading(self) -> None:
+        self.paused += 1
+        self._is_reading = False
+        self._loop.remove_reader(self._socket)
+
+    def _resume_reading(self) -> None:
+        if self._socket is None:
+            return
+
+        self._is_reading = True
+        self._loop.add_reader(self._socket, self.client.loop_read)
+
+    def _on_socket_open(self, client, userdata, sock) -> None:
+        self._socket = sock
+        if len(self._queue) < self.max_queue_size:
+            self._resume_reading()
+
+    def _on_socket_close(self, client, userdata, sock) -> None:
+        if self._is_reading:
+            self._loop.remove_reader(sock)
+
+        self._is_reading = False
+        self._socket = None
+
+    def _on_socket_register_write(self, client, userdata, sock) -> None:
+        self._loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock) -> None:
+        self._loop.remove_writer(sock)
+
+    async def _misc_loop(self) -> None:
+        """
+        Keeps connection alive and reconnects when it was lost
+        """
+
+        reconnect_delay = RECONNECT_MIN_DELAY_SECS
+        while True:
+            await asyncio.sleep(1)
+            if self.client.loop_misc() != mqtt.MQTT_ERR_NO_CONN:
+                reconnect_delay = RECONNECT_MIN_DELAY_SECS
+                continue
+
+            logger.warning(f"MQTT connection lost, reconnecting in {reconnect_delay} seconds")
+            await asyncio.sleep(reconnect_delay)
+            try:
+                self.client.reconnect()
+            except OSError as e:
+                logger.error(f"Error reconnecting to MQTT broker: {e}")
+                reconnect_delay = min(reconnect_delay * 2, RECONNECT_MAX_DELAY_SECS)
@@ -0,0 +1,162 @@
+import json
+import typing
+from datetime import datetime
+
+
+class PayloadDecodeError(ValueError):
+    pass
+
+
+class PicoWReading(object):
+    """
+    Flat record with all values from a single Pico W message which we store in Influx
+    """
+
+    __slots__ = (
+        "machine_unique_id",
+        "temperature",
+        "humidity",
+        "pressure",
+        "current_voltage",
+        "charge_percentage",
+        "cpu_temperature",
+        "mem_free",
+        "measured_at",
+        "wifi_connect_time_ms",
+        "epoch",
+        "sequence"
+    )
+
+    def __init__(
+            self,
+            machine_unique_id: str,
+            temperature: float,
+            humidity: typing.Optional[float],
+            pressure: typing.Optional[float],
+            current_voltage: typing.Optional[float],
+            charge_percentage: typing.Optional[float],
+            cpu_temperature: float,
+            mem_free: int,
+            measured_at: typing.Optional[datetime] = None,
+            wifi_connect_time_ms: typing.Optional[int] = None,
+            epoch: typing.Optional[int] = None,
+            sequence: typing.Optional[int] = None
+    ):
+        self.machine_unique_id = machine_unique_id
+        self.temperature = temperature
+        self.humidity = humidity
+        self.pressure = pressure
+        self.current_voltage = current_voltage
+        self.charge_percentage = charge_percentage
+        self.cpu_temperature = cpu_temperature
+        self.mem_free = mem_free
+        self.measured_at = measured_at
+        self.wifi_connect_time_ms = wifi_connect_time_ms
+
+        # set for measurements buffered on device, used to drop ones which were already received
+        self.epoch = epoch
+        self.sequence = sequence
+
+
+def _parse_measurement(value: typing.Any, unit: str, name: str) -> typing.Optional[float]:
+    """
+    Parses values like "23.45C", "1013.25hPa" or "45.12%" sent by Pico W, None when the value
+    wasn't measured
+    """
+
+    if value is None:
+        return None
+
+    value_type = value.__class__
+    if value_type is str:
+        if value.endswith(unit):
+            value = value[:-len(unit)]
+    elif value_type is not float and value_type is not int:
+        raise PayloadDecodeError(f"Unexpected type of '{name}': {value_type.__name__}")
+
+    try:
+        return float(value)
+    except ValueError:
+        raise PayloadDecodeError(f"Invalid value of '{name}': {value!r}") from None
+
+
+def _parse_number(value: typing.Any, name: str) -> typing.Optional[float]:
+    if value is None:
+        return None
+
+    value_type = value.__class__
+    if value_type is not float and value_type is not int:
+        raise PayloadDecodeError(f"Unexpected type of '{name}': {value_type.__name__}")
+
+    return value
+
+
+def decode_envelope(envelope: typing.Dict) -> PicoWReading:
+    """
+    Converts already parsed JSON message from Pico W into a flat record
+    """
+
+    try:
+        bme_data = envelope["payload"]["bme280"]
+        metadata = envelope["metadata"]
+        machine_unique_id = metadata["machine_unique_id"]
+        machine_metrics = metadata["machine_metrics"]
+
+        temperature = bme_data["temperature"]
+        # aren't sent when their oversampling is skipped on device
+        humidity = bme_data.get("humidity")
+        pressure = bme_data.get("pressure")
+        cpu_temperature = machine_metrics["cpu_temperature"]
+        mem_free = machine_metrics["mem_free"]
+
+        # sent by devices which buffer measurements until they are delivered
+        journal = metadata.get("journal") or {}
+        epoch = journal.get("epoch")
+        sequence = journal.get("sequence")
+    except (KeyError, TypeError, AttributeError) as e:
+        raise PayloadDecodeError(f"Missing or malformed field in message: {e}") from None
+
+    if temperature is None:
+        raise PayloadDecodeError("Missing or malformed field in message: 'temperature'")
+
+    # devices without battery don't send power information
+    machine_power = machine_metrics.get("power") or {}
+
+    if machine_unique_id.__class__ is not str:
+        raise PayloadDecodeError("Unexpected type of 'machine_unique_id'")
+
+    if mem_free.__class__ is not int:
+        raise PayloadDecodeError("Unexpected type of 'mem_free'")
+
+    if (epoch is not None and epoch.__class__ is not int) or (sequence is not None and sequence.__class__ is not int):
+        raise PayloadDecodeError("Unexpected type of 'journal'")
+
+    return PicoWReading(
+        machine_unique_id=machine_unique_id,
+        temperature=_parse_measurement(temperature, "C", "temperature"),
+        humidity=_parse_measurement(humidity, "%", "humidity"),
+        pressure=_parse_measurement(pressure, "hPa", "pressure"),
+        current_voltage=_parse_number(machine_power.get("current_voltage"), "current_voltage"),
+        charge_percentage=_parse_number(machine_power.get("charge_percentage"), "charge_percentage"),
+        cpu_temperature=_parse_number(cpu_temperature, "cpu_temperature"),
+        mem_free=mem_free,
+        wifi_connect_time_ms=_parse_number(machine_metrics.get("wifi_connect_time_ms"), "wifi_connect_time_ms"),
+        epoch=epoch,
+        sequence=sequence
+    )
+
+
+def decode_message(raw_payload: bytes) -> typing.Tuple[typing.Dict, PicoWReading]:
+    """
+    Parses raw MQTT payload, returns parsed envelope and flat record
+    """
+
+    try:
+        envelope = json.loads(raw_payload)
+    except ValueError as e:
+        raise PayloadDecodeError(f"Message is not a valid JSON: {e}") from None
+
+    if envelope.__class__ is not dict:
+        raise PayloadDecodeError("Message is not a JSON object")
+
+    return envelope, decode_envelope(envelope)
@@ -0,0 +1,91 @@
+"""
+Measures how many Pico W messages per second single core can decode, comparing the previous
+parsing approach with payload_decoder
+"""
+import argparse
+import json
+import time
+import typing
+
+from payload_decoder import decode_message
+
+SAMPLE_MESSAGE = json.dumps(
+    {
+        "payload": {
+            "bme280": {
+                "temperature": "23.45C",
+                "pressure": "1013.25hPa",
+                "humidity": "45.12%"
+            }
+        },
+        "metadata": {
+            "wifi_mac_address": "28:cd:c1:00:a1:b2",
+            "machine_unique_id": "e6:61:41:04:03:24:ab:36",
+            "measurement_time": "2022-11-20 12:34:56",
+            "machine_metrics": {
+                "uptime": 2310,
+                "python_version": "1.19.1",
+                "cpu_temperature": 24.8,
+                "mem_free": 153216,
+                "frequency": 125000000,
+                "flash_free_space_bytes": 802816,
+                "power": {
+                    "current_voltage": 4.05,
+                    "charge_percentage": 89.3
+                }
+            }
+        }
+    }
+).encode("utf-8")
+
+
+def decode_previous(raw_payload: bytes) -> typing.Tuple:
+    payload = str(raw_payload.decode("utf-8"))
+    payload = json.loads(payload)
+
+    bme_data = payload["payload"]["bme280"]
+    temperature = float(str(bme_data["temperature"]).replace("C", ""))
+    humidity = float(str(bme_data["humidity"]).replace("%", ""))
+    pressure = float(str(bme_data["pressure"]).replace("hPa", ""))
+
+    machine_metrics = payload["metadata"]["machine_metrics"]
+    machine_power = machine_metrics["power"]
+    result = (
+        payload["metadata"]["machine_unique_id"],
+        temperature,
+        humidity,
+        pressure,
+        machine_power["current_voltage"],
+        machine_power["charge_percentage"],
+        machine_metrics["cpu_temperature"],
+        machine_metrics["mem_free"]
+    )
+
+    json.dumps(payload, sort_keys=True, indent=4)
+    return result
+
+
+def measure(name: str, function: typing.Callable, iterations: int) -> float:
+    started_at = time.process_time()
+    for _ in range(iterations):
+        function(SAMPLE_MESSAGE)
+    elapsed = time.process_time() - started_at
+
+    messages_per_second = iterations / elapsed
+    print(f"{name:<10} {messages_per_second:>12,.0f} messages/sec ({elapsed * 1e6 / iterations:.2f} us/message)")
+    return messages_per_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"Decoding {len(SAMPLE_MESSAGE)} bytes message {args.iterations} times on a single core")
+    before = measure("before", decode_previous, args.iterations)
+    after = measure("after", decode_message, args.iterations)
+    print(f"Speed-up: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import threading
+import typing
+from collections import OrderedDict
+
+from loguru import logger
+
+from payload_decoder import PicoWReading
+
+# Sequence numbers are tracked exactly within this distance from the newest one of a device, it
+# covers whole flash buffer of a device re-sent at once (MEASUREMENTS_BUFFER_CAPACITY on Pico W)
+DEFAULT_WINDOW_SIZE = 512
+
+DEFAULT_MAX_TRACKED_DEVICES = 50_000
+
+
+class ReadingDeduplicator(object):
+    """
+    Drops readings buffered on device which were already received, e.g. when device re-sent its
+    buffer because it was reset before clearing it. Devices number buffered readings sequentially
+    within an epoch, which changes when device loses its buffer state. Readings without sequence
+    numbers are always accepted.
+
+    For every device and epoch the newest sequence number and a bitmask of window_size sequence
+    numbers before it are kept, like in anti-replay window of IPsec. So readings which were
+    reordered by parallel workers are still accepted, readings older than the window are dropped.
+    Only max_tracked_devices least recently seen (device, epoch) pairs are kept, so memory is
+    bounded, replays of a device which was forgotten are accepted again
+    """
+
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE, max_tracked_devices: int = DEFAULT_MAX_TRACKED_DEVICES):
+        if window_size < 1:
+            raise ValueError("The window_size must be greater than 0")
+
+        if max_tracked_devices < 1:
+            raise ValueError("The max_tracked_devices must be greater than 0")
+
+        self.window_size = window_size
+        self.max_tracked_devices = max_tracked_devices
+        self.duplicates = 0
+        self.forgotten_devices = 0
+
+        self._window_mask = (1 << window_size) - 1
+        self._lock = threading.Lock()
+        # (machine unique id, epoch) -> [newest sequence number, bitmask of seen ones, bit 0 is the newest]
+        self._windows: typing.OrderedDict[typing.Tuple[str, int], typing.List[int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _is_new(self, key: typing.Tuple[str, int], sequence: int) -> bool:
+        window = self._windows.get(key)
+        if window is None:
+            if len(self._windows) >= self.max_tracked_devices:
+                self._windows.popitem(last=False)
+                self.forgotten_devices += 1
+
+            self._windows[key] = [sequence, 1]
+            return True
+
+        self._windows.move_to_end(key)
+        newest, seen = window
+        if sequence > newest:
+            shift = sequence - newest
+            window[0] = sequence
+            window[1] = ((seen << shift) | 1) & self._window_mask if shift < self.window_size else 1
+            return True
+
+        offset = newest - sequence
+        if offset >= self.window_size or (seen >> offset) & 1:
+            return False
+
+        window[1] = seen | (1 << offset)
+        return True
+
+    def filter(self, readings: typing.List[PicoWReading]) -> typing.List[PicoWReading]:
+        """
+        Returns readings which weren't seen before, in the same order
+        """
+
+        accepted = []
+        with self._lock:
+            for reading in readings:
+                if reading.sequence is None or self._is_new((reading.machine_unique_id, reading.epoch), reading.sequence):
+                    accepted.append(reading)
+                else:
+                    self.duplicates += 1
+
+        if len(accepted) != len(readings):
+            logger.info(f"Dropped {len(readings) - len(accepted)} already received readings")
+
+        return accepted
@@ -0,0 +1,242 @@
+import struct
+import typing
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from payload_decoder import PayloadDecodeError, PicoWReading
+
+# Must be kept in sync with picow/003_minimizing_power_consumption/telemetry_frame.py
+CONTENT_TYPE_FRAME = 0x01
+CONTENT_TYPE_BATCH = 0x02
+
+FORMAT_VERSION = 1
+
+# content type, version, machine unique id, Wi-Fi MAC address, Python version, CPU frequency,
+# Wi-Fi connection time, journal epoch, sequence number of the (first) record
+FRAME_HEADER_FORMAT = "<BB8s6sBBBIHHI"
+# same as frame header with records count and nominal interval between records before epoch
+BATCH_HEADER_FORMAT = "<BB8s6sBBBIHHHHI"
+RECORD_FORMAT = "<IiIIhIIHH"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+NOT_AVAILABLE_U16 = 0xFFFF
+NOT_AVAILABLE_U32 = 0xFFFFFFFF
+
+FRAME_HEADER_DTYPE = np.dtype([
+    ("content_type", "u1"),
+    ("version", "u1"),
+    ("machine_unique_id", "u1", (8,)),
+    ("wifi_mac_address", "u1", (6,)),
+    ("python_version", "u1", (3,)),
+    ("frequency", "<u4"),
+    ("wifi_connect_time_ms", "<u2"),
+    ("epoch", "<u2"),
+    ("sequence", "<u4"),
+])
+
+RECORD_DTYPE = np.dtype([
+    ("uptime", "<u4"),
+    ("temperature", "<i4"),
+    ("pressure", "<u4"),
+    ("humidity", "<u4"),
+    ("cpu_temperature", "<i2"),
+    ("mem_free", "<u4"),
+    ("flash_free_space_bytes", "<u4"),
+    ("current_voltage", "<u2"),
+    ("charge_percentage", "<u2"),
+])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+FRAME_DTYPE = np.dtype(FRAME_HEADER_DTYPE.descr + RECORD_DTYPE.descr)
+
+_frame_header_struct = struct.Struct(FRAME_HEADER_FORMAT)
+_batch_header_struct = struct.Struct(BATCH_HEADER_FORMAT)
+_record_struct = struct.Struct(RECORD_FORMAT)
+assert FRAME_HEADER_DTYPE.itemsize == _frame_header_struct.size
+
+
+def is_frame(raw_payload: bytes) -> bool:
+    return bool(raw_payload) and raw_payload[0] == CONTENT_TYPE_FRAME
+
+
+def is_batch(raw_payload: bytes) -> bool:
+    return bool(raw_payload) and raw_payload[0] == CONTENT_TYPE_BATCH
+
+
+def peek_machine_unique_id(raw_payload: bytes) -> typing.Optional[bytes]:
+    """
+    Returns raw machine unique id of frame or batch without decoding it, both headers start
+    with content type, version and machine unique id
+    """
+
+    if len(raw_payload) < 10:
+        return None
+
+    return raw_payload[2:10]
+
+
+def _format_id(raw_id: bytes) -> str:
+    return raw_id.hex(":")
+
+
+def _u16_or_none(value: int, scale: float) -> typing.Optional[float]:
+    return None if value == NOT_AVAILABLE_U16 else value / scale
+
+
+def _u32_or_none(value: int, scale: float) -> typing.Optional[float]:
+    return None if value == NOT_AVAILABLE_U32 else value / scale
+
+
+def _connect_time_or_none(value: int) -> typing.Optional[int]:
+    return None if value == NOT_AVAILABLE_U16 else value
+
+
+def _check_header(raw_payload: bytes, expected_content_type: int, header_size: int) -> None:
+    if len(raw_payload) < 2 or raw_payload[0] != expected_content_type:
+        raise PayloadDecodeError(f"Unexpected content type, expected {expected_content_type}")
+
+    if raw_payload[1] != FORMAT_VERSION:
+        raise PayloadDecodeError(f"Unsupported version {raw_payload[1]} of content type {expected_content_type}")
+
+    if len(raw_payload) < header_size:
+        raise PayloadDecodeError(f"Message is too short ({len(raw_payload)} bytes)")
+
+
+def _records_to_readings(
+        records: np.ndarray,
+        machine_unique_ids: typing.List[str],
+        measured_at: typing.List[typing.Optional[datetime]],
+        wifi_connect_time_ms: typing.List[typing.Optional[int]],
+        epochs: typing.List[int],
+        sequences: typing.List[int]
+) -> typing.List[PicoWReading]:
+    temperature = (records["temperature"] / 100).tolist()
+    humidity = (records["humidity"] / 1024).tolist()
+    humidity_na = (records["humidity"] == NOT_AVAILABLE_U32).tolist()
+    pressure = (records["pressure"] / 25600).tolist()
+    pressure_na = (records["pressure"] == NOT_AVAILABLE_U32).tolist()
+    cpu_temperature = (records["cpu_temperature"] / 100).tolist()
+    current_voltage = (records["current_voltage"] / 1000).tolist()
+    current_voltage_na = (records["current_voltage"] == NOT_AVAILABLE_U16).tolist()
+    charge_percentage = (records["charge_percentage"] / 100).tolist()
+    charge_percentage_na = (records["charge_percentage"] == NOT_AVAILABLE_U16).tolist()
+    mem_free = records["mem_free"].tolist()
+
+    return [
+        PicoWReading(
+            machine_unique_id=machine_unique_ids[index],
+            temperature=temperature[index],
+            humidity=None if humidity_na[index] else humidity[index],
+            pressure=None if pressure_na[index] else pressure[index],
+            current_voltage=None if current_voltage_na[index] else current_voltage[index],
+            charge_percentage=None if charge_percentage_na[index] else charge_percentage[index],
+            cpu_temperature=cpu_temperature[index],
+            mem_free=mem_free[index],
+            measured_at=measured_at[index],
+            wifi_connect_time_ms=wifi_connect_time_ms[index],
+            epoch=epochs[index],
+            sequence=sequences[index]
+        )
+        for index in range(len(records))
+    ]
+
+
+def decode_frame(raw_payload: bytes) -> PicoWReading:
+    """
+    Decodes single binary frame received from Pico W
+    """
+
+    _check_header(raw_payload, CONTENT_TYPE_FRAME, _frame_header_struct.size)
+    if len(raw_payload) != FRAME_DTYPE.itemsize:
+        raise PayloadDecodeError(f"Unexpected frame size {len(raw_payload)}, expected {FRAME_DTYPE.itemsize}")
+
+    header = _frame_header_struct.unpack_from(raw_payload)
+    machine_unique_id = header[2]
+    wifi_connect_time_ms, epoch, sequence = header[8:11]
+
+    (
+        _, temperature, pressure, humidity, cpu_temperature, mem_free, _, current_voltage, charge_percentage
+    ) = _record_struct.unpack_from(raw_payload, _frame_header_struct.size)
+
+    return PicoWReading(
+        machine_unique_id=_format_id(machine_unique_id),
+        temperature=temperature / 100,
+        humidity=_u32_or_none(humidity, 1024),
+        pressure=_u32_or_none(pressure, 25600),
+        current_voltage=_u16_or_none(current_voltage, 1000),
+        charge_percentage=_u16_or_none(charge_percentage, 100),
+        cpu_temperature=cpu_temperature / 100,
+        mem_free=mem_free,
+        wifi_connect_time_ms=_connect_time_or_none(wifi_connect_time_ms),
+        epoch=epoch,
+        sequence=sequence
+    )
+
+
+def decode_frames(buffer: bytes) -> typing.List[PicoWReading]:
+    """
+    Decodes many concatenated binary frames at once, e.g. archived raw messages
+    """
+
+    if not buffer:
+        return []
+
+    _check_header(buffer, CONTENT_TYPE_FRAME, _frame_header_struct.size)
+    if len(buffer) % FRAME_DTYPE.itemsize:
+        raise PayloadDecodeError(f"Buffer size {len(buffer)} is not a multiple of frame size {FRAME_DTYPE.itemsize}")
+
+    frames = np.frombuffer(buffer, dtype=FRAME_DTYPE)
+    if np.any(frames["content_type"] != CONTENT_TYPE_FRAME) or np.any(frames["version"] != FORMAT_VERSION):
+        raise PayloadDecodeError("Frames of different content types or versions in buffer")
+
+    machine_unique_ids = [_format_id(raw_id.tobytes()) for raw_id in frames["machine_unique_id"]]
+    wifi_connect_time_ms = [_connect_time_or_none(value) for value in frames["wifi_connect_time_ms"].tolist()]
+
+    return _records_to_readings(
+        frames,
+        machine_unique_ids,
+        [None] * len(frames),
+        wifi_connect_time_ms,
+        frames["epoch"].tolist(),
+        frames["sequence"].tolist()
+    )
+
+
+def decode_batch(raw_payload: bytes, received_at: datetime) -> typing.List[PicoWReading]:
+    """
+    Decodes batch of records buffered on Pico W. Device has no wall clock, so records are
+    timestamped backwards from the time when batch was received by their uptime, which device
+    counts across wake-ups. The last record is measured on the wake-up when batch is sent
+    """
+
+    _check_header(raw_payload, CONTENT_TYPE_BATCH, _batch_header_struct.size)
+    header = _batch_header_struct.unpack_from(raw_payload)
+    machine_unique_id = header[2]
+    wifi_connect_time_ms, records_count, _, epoch, first_sequence = header[8:13]
+
+    expected_size = _batch_header_struct.size + records_count * RECORD_SIZE
+    if len(raw_payload) != expected_size:
+        raise PayloadDecodeError(f"Unexpected batch size {len(raw_payload)}, expected {expected_size}")
+
+    records = np.frombuffer(raw_payload, dtype=RECORD_DTYPE, offset=_batch_header_struct.size)
+    # uptime is truncated to 32 bits, so it's compared modulo 2 ** 32. Uptime newer than the last one is
+    # left when device lost power before saving its uptime, such records are taken as received now
+    ms_ago = (records["uptime"][-1:] - records["uptime"]).astype(np.int32).clip(min=0).tolist()
+    measured_at = [received_at - timedelta(milliseconds=value) for value in ms_ago]
+
+    # connection was made to send the most recent record only
+    connect_times = [None] * records_count
+    if records_count:
+        connect_times[-1] = _connect_time_or_none(wifi_connect_time_ms)
+
+    sequences = [(first_sequence + index) & 0xFFFFFFFF for index in range(records_count)]
+
+    return _records_to_readings(
+        records,
+        [_format_id(machine_unique_id)] * records_count,
+        measured_at,
+        connect_times,
+        [epoch] * records_count,
+        sequences
+    )
@@ -0,0 +1,85 @@
+import gzip
+import re
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fleet_generator import TRACE_MEM_FREE
+
+# host tag (benchmark devices are registered by machine unique id) and free memory field of a point
+_TRACED_POINT = re.compile(rb"^[^ ,]+,host=([^ ,]+) (?:[^ ]*,)?mem_free=(\d+)i[ ,]", re.MULTILINE)
+
+
+class _WriteHandler(BaseHTTPRequestHandler):
+    server: "FakeInfluxServer"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _reply(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        # health checks and pings
+        self._reply(204)
+
+    def do_POST(self) -> None:
+        if not self.path.startswith("/api/v2/write"):
+            self._reply(404)
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        self.server.on_write(body)
+        self._reply(204)
+
+
+class FakeInfluxServer(ThreadingHTTPServer):
+    """
+    Accepts InfluxDB v2 line protocol writes and discards them, only recording when point with
+    every trace key (see fleet_generator.py) was received
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _WriteHandler)
+
+        self.received_at: typing.Dict[typing.Tuple[str, str, int], float] = {}
+        self.requests = 0
+        self.points = 0
+        self.bytes_received = 0
+
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def on_write(self, body: bytes) -> None:
+        now = time.monotonic()
+        trace_keys = [
+            (match.group(1).decode(), TRACE_MEM_FREE, int(match.group(2))) for match in _TRACED_POINT.finditer(body)
+        ]
+        with self._lock:
+            self.requests += 1
+            self.points += len(body.splitlines())
+            self.bytes_received += len(body)
+            for trace_key in trace_keys:
+                self.received_at.setdefault(trace_key, now)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-influx", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
@@ -0,0 +1,433 @@
+"""
+Emulates a fleet of Pico W sensors publishing to a local MQTT broker and measures how the host
+ingestor keeps up: sustained messages per second, end-to-end latency from publishing until point
+reaches Influx (or until message is logged by events receiver) and ingestor memory growth
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import typing
+from pathlib import Path
+
+from loguru import logger
+
+from fake_influx import FakeInfluxServer
+from fleet_generator import (
+    ENVELOPE_BATTERY, ENVELOPES, TELEMETRY_FORMATS, TELEMETRY_JSON, TRACE_MEM_FREE, TRACE_SEQUENCE, FleetGenerator,
+    TraceKey
+)
+
+HOST_DIR = Path(__file__).resolve().parent.parent
+
+INGESTOR_INFLUX = "influx"
+INGESTOR_INFLUX_ASYNC = "influx-async"
+INGESTOR_INFLUX_SHARDED = "influx-sharded"
+INGESTOR_EVENTS = "events"
+
+# Must be kept in sync with host/002_influx_data_ingestor/ingestion_supervisor.py
+PARTITIONING_HASH = "hash"
+PARTITIONING_SHARED_SUBSCRIPTION = "shared"
+
+INGESTOR_SCRIPTS = {
+    INGESTOR_INFLUX: HOST_DIR / "002_influx_data_ingestor" / "influx_data_ingestor.py",
+    INGESTOR_INFLUX_ASYNC: HOST_DIR / "002_influx_data_ingestor" / "async_influx_data_ingestor.py",
+    INGESTOR_INFLUX_SHARDED: HOST_DIR / "002_influx_data_ingestor" / "ingestion_supervisor.py",
+    INGESTOR_EVENTS: HOST_DIR / "001-wireless-sensor" / "events_receiver.py"
+}
+
+SECRETS_TEMPLATE = """MQTT_BROKER = {broker!r}
+CLIENT_NAME = "fleet-benchmark-ingestor"
+USER_NAME = {user_name!r}
+PASSWORD = {password!r}
+TOPIC = {topic!r}
+
+INFLUX_URL = {influx_url!r}
+TOKEN = "fleet-benchmark"
+ORG = "fleet-benchmark"
+BUCKET = "fleet-benchmark"
+"""
+
+# JSON messages are logged indented with sorted keys, so free memory precedes machine unique id,
+# binary ones as summary with sender and sequence numbers of their records
+_LOGGED_MEM_FREE = re.compile(r'"mem_free": (\d+)')
+_LOGGED_MACHINE_UNIQUE_ID = re.compile(r'"machine_unique_id": "([^"]+)"')
+_LOGGED_SEQUENCES = re.compile(r"from '([^']+)', sequences (\d+)\.\.(\d+)")
+
+RSS_SAMPLE_INTERVAL_SECS = 0.5
+
+
+class LogSink(object):
+    """
+    Records when events receiver logged every reading, by reading its log from pipe. Readings
+    are recorded by their trace keys (see fleet_generator.py)
+    """
+
+    def __init__(self, stream: typing.IO[str]):
+        self.received_at: typing.Dict[TraceKey, float] = {}
+        self._stream = stream
+        self._thread = threading.Thread(target=self._read_loop, name="events-log-reader", daemon=True)
+        self._thread.start()
+
+    def _read_loop(self) -> None:
+        mem_free = None
+        for line in self._stream:
+            match = _LOGGED_MEM_FREE.search(line)
+            if match:
+                mem_free = int(match.group(1))
+                continue
+
+            match = _LOGGED_MACHINE_UNIQUE_ID.search(line)
+            if match:
+                if mem_free is not None:
+                    self.received_at.setdefault((match.group(1), TRACE_MEM_FREE, mem_free), time.monotonic())
+                    mem_free = None
+                continue
+
+            match = _LOGGED_SEQUENCES.search(line)
+            if match:
+                now = time.monotonic()
+                for sequence in range(int(match.group(2)), int(match.group(3)) + 1):
+                    self.received_at.setdefault((match.group(1), TRACE_SEQUENCE, sequence), now)
+
+
+class RssSampler(object):
+    """
+    Periodically samples resident set size of a process together with its child processes, also
+    tells CPU time they used so far. Works only on Linux
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.samples: typing.List[typing.Tuple[float, int]] = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, name="rss-sampler", daemon=True)
+
+    @staticmethod
+    def _process_rss_kb(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+
+        return 0
+
+    @staticmethod
+    def _children(pid: int) -> typing.List[int]:
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+                return [int(child) for child in f.read().split()]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _process_cpu_secs(pid: int) -> float:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                # user and system time follow process name, which may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            return 0.0
+
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def _pids(self) -> typing.List[int]:
+        pids = [self.pid]
+        for pid in pids:
+            pids.extend(self._children(pid))
+
+        return pids
+
+    def rss_kb(self) -> typing.Optional[int]:
+        rss = sum(self._process_rss_kb(pid) for pid in self._pids())
+        return rss or None
+
+    def cpu_secs(self) -> float:
+        """
+        CPU time of running processes, time of child processes which already exited isn't counted
+        """
+
+        return sum(self._process_cpu_secs(pid) for pid in self._pids())
+
+    def _sample_loop(self) -> None:
+        while not self._stopped.wait(RSS_SAMPLE_INTERVAL_SECS):
+            rss = self.rss_kb()
+            if rss is not None:
+                self.samples.append((time.monotonic(), rss))
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+def percentile(sorted_values: typing.List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def start_ingestor(args, work_dir: Path, influx_url: str) -> subprocess.Popen:
+    with open(work_dir / "secrets.py", "w") as f:
+        f.write(
+            SECRETS_TEMPLATE.format(
+                broker=args.broker,
+                user_name=args.user_name,
+                password=args.password,
+                topic=args.topic,
+                influx_url=influx_url
+            )
+        )
+
+    # supervisor settings are module constants, they are replaced before main() is called
+    settings = {}
+    if args.ingestor == INGESTOR_INFLUX_SHARDED:
+        if args.partitioning is not None:
+            settings["PARTITIONING"] = args.partitioning
+
+        if args.workers is not None:
+            settings["WORKERS_COUNT"] = args.workers
+
+    # our secrets.py must shadow both real secrets next to the ingestor and standard library module
+    script = INGESTOR_SCRIPTS[args.ingestor]
+    bootstrap = (
+        "import importlib, sys; "
+        f"sys.path[:0] = [{str(work_dir)!r}, {str(script.parent)!r}]; "
+        f"ingestor = importlib.import_module({script.stem!r}); "
+        f"vars(ingestor).update({settings!r}); "
+        "ingestor.main()"
+    )
+
+    logger.info(f"Starting '{script.name}'")
+    if args.ingestor == INGESTOR_EVENTS:
+        return subprocess.Popen(
+            [sys.executable, "-c", bootstrap],
+            cwd=str(script.parent),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+
+    # ingestor gets its own descriptor of the log, ours is closed once it's started
+    with open(work_dir / "ingestor.log", "w") as log:
+        return subprocess.Popen(
+            [sys.executable, "-c", bootstrap],
+            cwd=str(script.parent),
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+            text=True
+        )
+
+
+def stop_ingestor(process: subprocess.Popen, timeout_secs: float = 30.0) -> None:
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout_secs)
+    except subprocess.TimeoutExpired:
+        logger.warning("Ingestor didn't stop in time, killing it")
+        process.kill()
+        process.wait()
+
+
+def wait_for_delivery(
+        sent_count: int,
+        received_at: typing.Dict[TraceKey, float],
+        timeout_secs: float
+) -> None:
+    deadline = time.monotonic() + timeout_secs
+    while len(received_at) < sent_count and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+def build_report(
+        args,
+        generator: FleetGenerator,
+        received_at: typing.Dict[TraceKey, float],
+        rss_samples: typing.List[typing.Tuple[float, int]],
+        load_started_at: float,
+        cpu_secs: float
+) -> typing.Dict:
+    sent_at = generator.sent_at
+    received_at_by_id = {}
+    for trace_key, received in received_at.items():
+        message_id = generator.message_ids.get(trace_key)
+        if message_id is not None:
+            received_at_by_id.setdefault(message_id, received)
+
+    latencies_ms = sorted(
+        (received - sent_at[message_id]) * 1000
+        for message_id, received in received_at_by_id.items()
+    )
+    delivered = len(latencies_ms)
+
+    report = {
+        "ingestor": args.ingestor,
+        "partitioning": args.partitioning,
+        "workers": args.workers,
+        "envelope": args.envelope,
+        "telemetry": args.telemetry,
+        "readings_per_message": generator.readings_per_message,
+        "devices": args.devices,
+        "target_messages_per_second": args.rate,
+        "published": generator.published,
+        "publish_failed": generator.failed,
+        "delivered": delivered,
+        "lost": len(sent_at) - delivered,
+        "sustained_messages_per_second": None,
+        "latency_p50_ms": None,
+        "latency_p99_ms": None,
+        "latency_max_ms": None,
+        "cpu_secs": round(cpu_secs, 2),
+        "cpu_ms_per_reading": None,
+        "rss_start_kb": None,
+        "rss_end_kb": None,
+        "rss_peak_kb": None,
+        "rss_growth_kb": None
+    }
+
+    if delivered:
+        # from the first publish until the last delivered message
+        elapsed = max(received_at_by_id.values()) - load_started_at
+        report["sustained_messages_per_second"] = round(delivered / elapsed, 1)
+        report["latency_p50_ms"] = round(percentile(latencies_ms, 0.50), 2)
+        report["latency_p99_ms"] = round(percentile(latencies_ms, 0.99), 2)
+        report["latency_max_ms"] = round(latencies_ms[-1], 2)
+        report["cpu_ms_per_reading"] = round(cpu_secs * 1000 / delivered, 3)
+
+    load_samples = [rss for sampled_at, rss in rss_samples if sampled_at >= load_started_at]
+    if load_samples:
+        report["rss_start_kb"] = load_samples[0]
+        report["rss_end_kb"] = load_samples[-1]
+        report["rss_peak_kb"] = max(load_samples)
+        report["rss_growth_kb"] = load_samples[-1] - load_samples[0]
+
+    return report
+
+
+def print_report(report: typing.Dict) -> None:
+    print(
+        f"{report['devices']} devices ({report['envelope']} envelope, {report['telemetry']} telemetry) at "
+        f"{report['target_messages_per_second']:,.0f} messages/sec -> '{report['ingestor']}' ingestor"
+    )
+    if report["partitioning"] is not None or report["workers"] is not None:
+        print(f"{report['workers'] or 'default'} workers, partitioning - {report['partitioning'] or 'default'}")
+
+    if report["readings_per_message"] > 1:
+        print(f"{report['readings_per_message']} readings per message, counts below are readings")
+
+    print(
+        f"published - {report['published']}, failed to publish - {report['publish_failed']}, "
+        f"delivered - {report['delivered']}, lost - {report['lost']}"
+    )
+
+    if report["sustained_messages_per_second"] is not None:
+        print(f"sustained  {report['sustained_messages_per_second']:>12,.1f} messages/sec")
+        print(
+            f"latency    p50 {report['latency_p50_ms']:.2f} ms, p99 {report['latency_p99_ms']:.2f} ms, "
+            f"max {report['latency_max_ms']:.2f} ms"
+        )
+
+    if report["cpu_ms_per_reading"] is not None:
+        print(f"cpu        {report['cpu_secs']:.2f} s, {report['cpu_ms_per_reading']:.3f} ms per reading")
+
+    if report["rss_start_kb"] is not None:
+        print(
+            f"memory     {report['rss_start_kb']:,} kB -> {report['rss_end_kb']:,} kB "
+            f"(growth {report['rss_growth_kb']:+,} kB, peak {report['rss_peak_kb']:,} kB)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ingestor", choices=tuple(INGESTOR_SCRIPTS), default=INGESTOR_INFLUX)
+    parser.add_argument("--broker", default="127.0.0.1", help="broker must listen on port 1883 for ingestors")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--topic", default="fleet-benchmark/measurements")
+    parser.add_argument("--user-name", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=1000, help="total messages per second from all devices")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load")
+    parser.add_argument("--connections", type=int, default=4, help="MQTT connections shared by emulated devices")
+    parser.add_argument("--envelope", choices=ENVELOPES, default=ENVELOPE_BATTERY, help="JSON telemetry only")
+    parser.add_argument("--telemetry", choices=TELEMETRY_FORMATS, default=TELEMETRY_JSON)
+    parser.add_argument("--batch-size", type=int, default=6, help="readings per message of batch telemetry")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=1)
+    parser.add_argument("--startup-secs", type=float, default=3, help="time given to ingestor to subscribe")
+    parser.add_argument("--drain-secs", type=float, default=30, help="how long to wait for delivery after load")
+    parser.add_argument(
+        "--partitioning",
+        choices=(PARTITIONING_HASH, PARTITIONING_SHARED_SUBSCRIPTION),
+        default=None,
+        help="how sharded ingestor splits messages between workers, its own default when not given"
+    )
+    parser.add_argument("--workers", type=int, default=None, help="workers of sharded ingestor, CPU count by default")
+    parser.add_argument("--report", default=None, help="also write report as JSON to this file")
+    args = parser.parse_args()
+
+    influx = FakeInfluxServer()
+    influx.start()
+
+    with tempfile.TemporaryDirectory(prefix="fleet-benchmark-") as work_dir:
+        ingestor = start_ingestor(args, Path(work_dir), influx.url)
+        if args.ingestor == INGESTOR_EVENTS:
+            received_at = LogSink(ingestor.stderr).received_at
+        else:
+            received_at = influx.received_at
+
+        rss_sampler = RssSampler(ingestor.pid)
+        rss_sampler.start()
+        generator = None
+        try:
+            time.sleep(args.startup_secs)
+            if ingestor.poll() is not None:
+                raise RuntimeError(f"Ingestor exited with code {ingestor.returncode}")
+
+            generator = FleetGenerator(
+                broker=args.broker,
+                port=args.port,
+                topic=args.topic,
+                devices_count=args.devices,
+                messages_per_second=args.rate,
+                connections_count=args.connections,
+                envelope=args.envelope,
+                telemetry=args.telemetry,
+                batch_size=args.batch_size,
+                qos=args.qos,
+                user_name=args.user_name,
+                password=args.password
+            )
+
+            load_started_at = time.monotonic()
+            cpu_secs = -rss_sampler.cpu_secs()
+            generator.run(args.duration)
+            wait_for_delivery(len(generator.sent_at), received_at, args.drain_secs)
+            cpu_secs += rss_sampler.cpu_secs()
+        finally:
+            rss_sampler.stop()
+            if generator is not None:
+                generator.stop()
+
+            stop_ingestor(ingestor)
+            influx.stop()
+
+    report = build_report(args, generator, received_at, rss_sampler.samples, load_started_at, cpu_secs)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
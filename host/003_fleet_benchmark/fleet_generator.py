@@ -0,0 +1,378 @@
+import json
+import random
+import struct
+import threading
+import time
+import typing
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+from loguru import logger
+
+# Envelope of picow/001_wireless_sensor, always powered, possibly with several BME280 sensors
+ENVELOPE_MULTI_SENSOR = "multi-sensor"
+
+# Envelope of picow/002_battery_powered_wireless_sensor and picow/003_minimizing_power_consumption
+ENVELOPE_BATTERY = "battery"
+
+ENVELOPES = (ENVELOPE_MULTI_SENSOR, ENVELOPE_BATTERY)
+
+# JSON messages of the envelope above, single binary frames or binary batches of several records
+# sent by picow/003_minimizing_power_consumption
+TELEMETRY_JSON = "json"
+TELEMETRY_FRAME = "frame"
+TELEMETRY_BATCH = "batch"
+
+TELEMETRY_FORMATS = (TELEMETRY_JSON, TELEMETRY_FRAME, TELEMETRY_BATCH)
+
+# Must be kept in sync with picow/003_minimizing_power_consumption/telemetry_frame.py
+CONTENT_TYPE_FRAME = 0x01
+CONTENT_TYPE_BATCH = 0x02
+FORMAT_VERSION = 1
+FRAME_HEADER_FORMAT = "<BB8s6sBBBIHHI"
+BATCH_HEADER_FORMAT = "<BB8s6sBBBIHHHHI"
+RECORD_FORMAT = "<IiIIhIIHH"
+
+_frame_header_struct = struct.Struct(FRAME_HEADER_FORMAT)
+_batch_header_struct = struct.Struct(BATCH_HEADER_FORMAT)
+_record_struct = struct.Struct(RECORD_FORMAT)
+
+
+# Readings are traced by values which ingestors pass through as is, message id of every reading is
+# found by its trace keys: machine unique id with free memory, which reaches Influx points and JSON
+# logged by events receiver, and for binary messages also machine unique id with sequence number,
+# which events receiver logs
+TRACE_MEM_FREE = "mem_free"
+TRACE_SEQUENCE = "sequence"
+
+MEM_FREE_RANGE = range(140_000, 160_000)
+
+TraceKey = typing.Tuple[str, str, int]
+
+
+class SyntheticDevice(object):
+    """
+    Emulated Pico W which produces the same messages as send_measurements on device. Every method
+    returns message with trace keys of its readings, free memory is random but never repeats
+    on the same device, so it identifies reading together with machine unique id
+    """
+
+    __slots__ = (
+        "index", "machine_unique_id", "wifi_mac_address", "envelope", "epoch", "next_sequence",
+        "_used_mem_free", "_random"
+    )
+
+    def __init__(self, index: int, envelope: str):
+        if envelope not in ENVELOPES:
+            raise ValueError(f"Unknown envelope '{envelope}'")
+
+        self.index = index
+        self.machine_unique_id = ":".join(f"{b:02x}" for b in (0xFE0000000000 + index).to_bytes(8, "big"))
+        self.wifi_mac_address = ":".join(f"{b:02x}" for b in (0x28CDC1000000 + index).to_bytes(6, "big"))
+        self.envelope = envelope
+        self._random = random.Random(index)
+        self.epoch = self._random.getrandbits(16)
+        self.next_sequence = 0
+        self._used_mem_free: typing.Set[int] = set()
+
+    def _bme280_measurements(self) -> typing.Dict:
+        return {
+            "temperature": f"{self._random.uniform(15.0, 30.0):.2f}C",
+            "pressure": f"{self._random.uniform(980.0, 1040.0):.2f}hPa",
+            "humidity": f"{self._random.uniform(20.0, 80.0):.2f}%"
+        }
+
+    def _mem_free(self) -> int:
+        if len(self._used_mem_free) == len(MEM_FREE_RANGE):
+            raise RuntimeError(f"Device {self.index} can't trace more than {len(MEM_FREE_RANGE)} readings")
+
+        while True:
+            mem_free = self._random.choice(MEM_FREE_RANGE)
+            if mem_free not in self._used_mem_free:
+                self._used_mem_free.add(mem_free)
+                return mem_free
+
+    def _take_sequences(self, count: int) -> int:
+        sequence = self.next_sequence
+        self.next_sequence += count
+        return sequence
+
+    def message(self) -> typing.Tuple[bytes, typing.List[typing.List[TraceKey]]]:
+        """
+        Returns JSON message of the device envelope. Always powered device (001) sends live readings
+        without journal, it's added only to readings drained from flash, battery powered ones
+        (002 and 003) journal every reading
+        """
+
+        measurement_time = datetime.utcnow().replace(microsecond=0).isoformat()
+        mem_free = self._mem_free()
+        if self.envelope == ENVELOPE_MULTI_SENSOR:
+            primary = self._bme280_measurements()
+            payload = {
+                "payload": {
+                    "bme280": primary,
+                    "bme280_sensors": {"i2c0:0x76": primary, "i2c1:0x77": self._bme280_measurements()}
+                },
+                "metadata": {
+                    "wifi_mac_address": self.wifi_mac_address,
+                    "machine_unique_id": self.machine_unique_id,
+                    "measurement_time": measurement_time,
+                    "machine_metrics": {
+                        "cpu_temperature": round(self._random.uniform(20.0, 40.0), 2),
+                        "mem_free": mem_free,
+                        "flash_free_space_bytes": 802816
+                    }
+                }
+            }
+        else:
+            payload = {
+                "payload": {
+                    "bme280": self._bme280_measurements()
+                },
+                "metadata": {
+                    "wifi_mac_address": self.wifi_mac_address,
+                    "machine_unique_id": self.machine_unique_id,
+                    "measurement_time": measurement_time,
+                    "journal": {"epoch": self.epoch, "sequence": self._take_sequences(1)},
+                    "machine_metrics": {
+                        "python_version": "1.19.1",
+                        "cpu_temperature": round(self._random.uniform(20.0, 40.0), 2),
+                        "mem_free": mem_free,
+                        "frequency": 125000000,
+                        "flash_free_space_bytes": 802816,
+                        "power": {
+                            "current_voltage": round(self._random.uniform(3.3, 4.2), 2),
+                            "charge_percentage": round(self._random.uniform(5.0, 100.0), 1)
+                        }
+                    }
+                }
+            }
+
+        return json.dumps(payload).encode("utf-8"), [[(self.machine_unique_id, TRACE_MEM_FREE, mem_free)]]
+
+    def _record(self, uptime_ms: int, sequence: int) -> typing.Tuple[bytes, typing.List[TraceKey]]:
+        mem_free = self._mem_free()
+        record = _record_struct.pack(
+            uptime_ms & 0xFFFFFFFF,
+            self._random.randrange(1500, 3000),
+            self._random.randrange(98_000, 104_000) * 256,
+            self._random.randrange(20, 80) * 1024,
+            self._random.randrange(2000, 4000),
+            mem_free,
+            802816,
+            self._random.randrange(3300, 4200),
+            self._random.randrange(500, 10000)
+        )
+        return record, [
+            (self.machine_unique_id, TRACE_MEM_FREE, mem_free),
+            (self.machine_unique_id, TRACE_SEQUENCE, sequence)
+        ]
+
+    def _binary_header_values(self) -> tuple:
+        return (
+            (0xFE0000000000 + self.index).to_bytes(8, "big"),
+            (0x28CDC1000000 + self.index).to_bytes(6, "big"),
+            1, 19, 1,
+            125_000_000,
+            self._random.randrange(300, 3000)
+        )
+
+    def frame(self, interval_secs: int = 300) -> typing.Tuple[bytes, typing.List[typing.List[TraceKey]]]:
+        """
+        Returns binary frame with the next sequence number
+        """
+
+        sequence = self._take_sequences(1)
+        header = _frame_header_struct.pack(
+            CONTENT_TYPE_FRAME,
+            FORMAT_VERSION,
+            *self._binary_header_values(),
+            self.epoch,
+            sequence & 0xFFFFFFFF
+        )
+        record, trace_keys = self._record(sequence * interval_secs * 1000, sequence)
+        return header + record, [trace_keys]
+
+    def batch(
+            self,
+            records_count: int,
+            interval_secs: int = 300
+    ) -> typing.Tuple[bytes, typing.List[typing.List[TraceKey]]]:
+        """
+        Returns binary batch of records_count records with consecutive sequence numbers
+        """
+
+        first_sequence = self._take_sequences(records_count)
+        header = _batch_header_struct.pack(
+            CONTENT_TYPE_BATCH,
+            FORMAT_VERSION,
+            *self._binary_header_values(),
+            records_count,
+            interval_secs,
+            self.epoch,
+            first_sequence & 0xFFFFFFFF
+        )
+        # device timestamps records by uptime, which grows by interval between wake-ups
+        records = [
+            self._record(sequence * interval_secs * 1000, sequence)
+            for sequence in range(first_sequence, first_sequence + records_count)
+        ]
+        return header + b"".join(record for record, _ in records), [trace_keys for _, trace_keys in records]
+
+
+class FleetGenerator(object):
+    """
+    Publishes messages of devices_count emulated devices at a constant total rate. Devices are
+    multiplexed over connections_count MQTT connections, one publishing thread per connection.
+    Send time of every reading is kept in sent_at, indexed by message id, and message_ids maps
+    trace keys of readings to their message ids. Batches carry batch_size readings with consecutive
+    message ids
+    """
+
+    def __init__(
+            self,
+            broker: str,
+            port: int,
+            topic: str,
+            devices_count: int,
+            messages_per_second: float,
+            connections_count: int = 4,
+            envelope: str = ENVELOPE_BATTERY,
+            telemetry: str = TELEMETRY_JSON,
+            batch_size: int = 6,
+            qos: int = 1,
+            user_name: typing.Optional[str] = None,
+            password: typing.Optional[str] = None
+    ):
+        if devices_count < 1:
+            raise ValueError("The devices_count must be greater than 0")
+
+        if messages_per_second <= 0:
+            raise ValueError("The messages_per_second must be greater than 0")
+
+        if connections_count < 1:
+            raise ValueError("The connections_count must be greater than 0")
+
+        if telemetry not in TELEMETRY_FORMATS:
+            raise ValueError(f"Unknown telemetry format '{telemetry}'")
+
+        if batch_size < 1:
+            raise ValueError("The batch_size must be greater than 0")
+
+        self.topic = topic
+        self.telemetry = telemetry
+        self.readings_per_message = batch_size if telemetry == TELEMETRY_BATCH else 1
+        self.qos = qos
+        self.messages_per_second = messages_per_second
+        self.devices = [SyntheticDevice(index, envelope) for index in range(devices_count)]
+
+        self.sent_at: typing.List[float] = []
+        self.message_ids: typing.Dict[TraceKey, int] = {}
+        self.published = 0
+        self.failed = 0
+
+        # every device is published by a single thread, so its state isn't shared
+        self._clients = []
+        for index in range(min(connections_count, devices_count)):
+            client = mqtt.Client(f"fleet-benchmark-{index}")
+            if user_name:
+                client.username_pw_set(user_name, password)
+
+            client.max_inflight_messages_set(1000)
+            client.max_queued_messages_set(0)
+            client.connect(broker, port)
+            client.loop_start()
+            self._clients.append(client)
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def _next_message_id(self, trace_keys: typing.List[typing.List[TraceKey]]) -> int:
+        """
+        Reserves ids of readings of the next message, given trace keys of every reading, returns
+        the first one
+        """
+
+        with self._lock:
+            message_id = len(self.sent_at)
+            self.sent_at.extend([0.0] * len(trace_keys))
+            for index, reading_trace_keys in enumerate(trace_keys, message_id):
+                for trace_key in reading_trace_keys:
+                    self.message_ids[trace_key] = index
+
+            return message_id
+
+    def _message(self, device: SyntheticDevice) -> typing.Tuple[bytes, typing.List[typing.List[TraceKey]]]:
+        if self.telemetry == TELEMETRY_FRAME:
+            return device.frame()
+
+        if self.telemetry == TELEMETRY_BATCH:
+            return device.batch(self.readings_per_message)
+
+        return device.message()
+
+    def _publish_loop(self, client: mqtt.Client, devices: typing.List[SyntheticDevice], deadline: float) -> None:
+        interval = len(self._clients) / self.messages_per_second
+        next_send_at = time.monotonic()
+        device_index = 0
+
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            if now >= deadline:
+                return
+
+            if now < next_send_at:
+                time.sleep(min(next_send_at - now, 0.05))
+                continue
+
+            device = devices[device_index]
+            device_index = (device_index + 1) % len(devices)
+
+            message, trace_keys = self._message(device)
+            message_id = self._next_message_id(trace_keys)
+            sent_at = time.monotonic()
+            for index in range(message_id, message_id + len(trace_keys)):
+                self.sent_at[index] = sent_at
+
+            info = client.publish(self.topic, message, qos=self.qos)
+            with self._lock:
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self.published += 1
+                else:
+                    self.failed += 1
+
+            # don't try to catch up after stall for longer than a second, it would be a burst
+            next_send_at = max(next_send_at + interval, now - 1.0)
+
+    def run(self, duration_secs: float) -> None:
+        """
+        Publishes for duration_secs, blocks until done
+        """
+
+        deadline = time.monotonic() + duration_secs
+        connections_count = len(self._clients)
+        for index, client in enumerate(self._clients):
+            devices = self.devices[index::connections_count]
+            thread = threading.Thread(
+                target=self._publish_loop,
+                args=(client, devices, deadline),
+                name=f"fleet-publisher-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        for thread in self._threads:
+            thread.join()
+
+        logger.info(f"Published {self.published} messages from {len(self.devices)} devices, failed - {self.failed}")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+        for client in self._clients:
+            client.loop_stop()
+            client.disconnect()
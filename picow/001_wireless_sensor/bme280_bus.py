@@ -0,0 +1,157 @@
+import time
+from array import array
+
+import bme280
+
+try:
+    from typing import List, Tuple
+except ImportError:
+    pass
+
+
+BME280_ADDRESSES = (0x76, 0x77)
+BME280_REGISTER_CHIP_ID = 0xD0
+BME280_CHIP_ID = 0x60
+
+
+class BME280BusManager(object):
+    """
+    Discovers all BME280 sensors on given I2C buses and reads them together: conversions are
+    started on every sensor first, so their waits overlap. Sensor which doesn't acknowledge I2C
+    transfers, e.g. because of loose wire, is left out of readings until it responds again
+    """
+
+    def __init__(self, buses: List[Tuple], int32_compensation: bool = False, **kwargs):
+        """
+        buses - list of (name, machine.I2C) pairs, int32_compensation selects heap-free
+        BME280.compensate_int32() instead of BME280.compensate(), kwargs are passed to every BME280
+        """
+
+        # sensors are used one at a time, so they share the same scratch buffers
+        self._l1_barray = bytearray(1)
+        self._l8_barray = bytearray(8)
+        self._l3_resultarray = array("i", [0, 0, 0])
+        self._l3_resultlist = [0, 0, 0]
+        self.int32_compensation = int32_compensation
+
+        self.last_conversion_us = 0
+        self.sensors = []
+        for name, i2c in buses:
+            self._discover(name, i2c, **kwargs)
+
+        if not self.sensors:
+            raise OSError("No BME280 sensors found")
+
+        # sensors which acknowledged all transfers since the last start_conversions()
+        self._responding = [True] * len(self.sensors)
+
+    def _discover(self, name: str, i2c, **kwargs) -> None:
+        found_addresses = i2c.scan()
+        for address in BME280_ADDRESSES:
+            if address not in found_addresses:
+                continue
+
+            # BMP280 and other devices may use the same addresses
+            i2c.readfrom_mem_into(address, BME280_REGISTER_CHIP_ID, self._l1_barray)
+            if self._l1_barray[0] != BME280_CHIP_ID:
+                continue
+
+            sensor = bme280.BME280(address=address, i2c=i2c, **kwargs)
+            sensor._l1_barray = self._l1_barray
+            sensor._l8_barray = self._l8_barray
+            sensor._l3_resultarray = self._l3_resultarray
+
+            key = f"{name}:0x{address:02x}"
+            print(f"Found BME280 sensor {key}")
+            self.sensors.append((key, sensor))
+
+    def configure_normal_mode(self, **kwargs) -> int:
+        """
+        Switches all sensors to normal mode, returns time in microseconds until all of them have first result
+        """
+
+        return max(sensor.configure_normal_mode(**kwargs) for _, sensor in self.sensors)
+
+    def _not_responding(self, index: int, error: OSError) -> None:
+        print(f"BME280 sensor {self.sensors[index][0]} doesn't respond: {error}")
+        self._responding[index] = False
+
+    def start_conversions(self) -> int:
+        """
+        Starts conversion on all sensors, returns worst case time in microseconds until all of them are done
+        """
+
+        conversion_time_us = 0
+        for index, (_, sensor) in enumerate(self.sensors):
+            try:
+                conversion_time_us = max(conversion_time_us, sensor.start_conversion())
+                self._responding[index] = True
+            except OSError as e:
+                self._not_responding(index, e)
+
+        return conversion_time_us
+
+    def typical_conversion_time(self) -> int:
+        return max(sensor.typical_conversion_time() for _, sensor in self.sensors)
+
+    def is_measuring(self) -> bool:
+        for index, (_, sensor) in enumerate(self.sensors):
+            if not self._responding[index]:
+                continue
+
+            try:
+                if sensor.is_measuring():
+                    return True
+            except OSError as e:
+                self._not_responding(index, e)
+
+        return False
+
+    def read_results(self) -> List[Tuple[str, bme280.BME280Reading]]:
+        """
+        Reads results of the last conversion from all responding sensors, in order of discovery
+        """
+
+        raw = self._l3_resultarray
+        result = []
+        for index, (key, sensor) in enumerate(self.sensors):
+            if not self._responding[index]:
+                continue
+
+            try:
+                sensor.read_raw_result(raw)
+            except OSError as e:
+                self._not_responding(index, e)
+                continue
+
+            if self.int32_compensation:
+                t, p, h = sensor.compensate_int32(raw, self._l3_resultlist)
+            else:
+                t, p, h = sensor.compensate(raw)
+
+            result.append((key, bme280.BME280Reading(t, p, h)))
+
+        if not result:
+            raise OSError("No BME280 sensor responded")
+
+        return result
+
+    def read_all(self) -> List[Tuple[str, bme280.BME280Reading]]:
+        """
+        Reads all sensors, total wait is the one of the slowest sensor
+        """
+
+        conversion_time_us = self.start_conversions()
+        if conversion_time_us:
+            started = time.ticks_us()
+            time.sleep_us(min(self.typical_conversion_time(), conversion_time_us))
+            while self.is_measuring():
+                elapsed = time.ticks_diff(time.ticks_us(), started)
+                if elapsed >= conversion_time_us:
+                    break
+
+                time.sleep_us(min(bme280.BME280_STATUS_POLL_INTERVAL, conversion_time_us - elapsed))
+
+            self.last_conversion_us = time.ticks_diff(time.ticks_us(), started)
+
+        return self.read_results()
@@ -2,3 +2,32 @@ SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_TRANSMISSION_SECONDS = 5
 WDT_MAX_INTERVAL_IN_SECONDS = 10_000 + SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_TRANSMISSION_SECONDS * 1000
 SLEEP_INTERVAL_ON_ERROR_IN_MAIN_LOOP = 5
 MAX_WDT_INTERVAL_FOR_RP2040 = 8388
+
+# Run sampling, publishing, keepalive, watchdog and LED as uasyncio tasks instead of a blocking loop
+USE_ASYNCIO = True
+MAX_PENDING_READINGS = 20
+WDT_FEED_INTERVAL_MSECS = 1000
+# Publishing task gives up and the board reconnects when broker doesn't accept a message in time
+MQTT_WRITE_TIMEOUT_MSECS = 10_000
+
+# BME280 runs in normal mode and converts continuously, standby is 1000 ms, IIR filter coefficient is 4.
+# Values are BME280_STANDBY_* and BME280_IIR_FILTER_* from lib/bme280.py
+BME280_NORMAL_MODE = True
+BME280_STANDBY = 5
+BME280_IIR_FILTER = 2
+
+# Compensate BME280 readings with 32-bit integer formulas, which don't allocate memory and give
+# pressure in whole Pa instead of 64-bit ones, which allocate big integers on every reading
+BME280_INT32_COMPENSATION = True
+
+# I2C controllers scanned for BME280 sensors at 0x76 and 0x77: (controller id, SDA pin, SCL pin)
+I2C_BUSES = (
+    (0, 0, 1),
+    (1, 2, 3),
+)
+
+# Readings which couldn't be published are journaled in flash and sent after the next successful connection,
+# the oldest ones are dropped when journal is full (30 minutes of readings)
+READINGS_JOURNAL_CAPACITY = 360
+# After failed connection next one is tried after 2 ** failures readings, up to this exponent (about 5 minutes)
+UPLINK_MAX_BACKOFF_EXPONENT = 6
@@ -2,7 +2,7 @@ from utime import ticks_ms,ticks_diff
 from .  import simple2
 class MQTTClient(simple2.MQTTClient):
 	DEBUG=False;KEEP_QOS0=True;NO_QUEUE_DUPS=True;MSG_QUEUE_MAX=5;CONFIRM_QUEUE_MAX=10;RESUBSCRIBE=True
-	def __init__(A,*B,**C):super().__init__(*B,**C);A.subs=[];A.msg_to_send=[];A.sub_to_send=[];A.msg_to_confirm={};A.sub_to_confirm={};A.conn_issue=None
+	def __init__(A,*B,**C):super().__init__(*B,**C);A.subs=[];A.msg_to_send=[];A.sub_to_send=[];A.msg_to_confirm={};A.sub_to_confirm={};A.pid_to_confirm={};A.conn_issue=None
 	def is_keepalive(A):
 		B=ticks_diff(ticks_ms(),A.last_cpacket)//1000
 		if 0<A.keepalive<B:A.conn_issue=simple2.MQTTException(7),9;return False
@@ -12,24 +12,24 @@ class MQTTClient(simple2.MQTTClient):
 		E=stat;D=pid
 		try:A._cbstat(D,E)
 		except AttributeError:pass
-		for (B,C) in A.msg_to_confirm.items():
-			if D in C:
-				if E==0:
-					if B not in A.msg_to_send:A.msg_to_send.insert(0,B)
-					C.remove(D)
-					if not C:A.msg_to_confirm.pop(B)
-				elif E in(1,2):A.msg_to_confirm.pop(B)
-				return
-		for (B,C) in A.sub_to_confirm.items():
-			if D in C:
-				if E==0:
-					if B not in A.sub_to_send:A.sub_to_send.append(B)
-					C.remove(D)
-					if not C:A.sub_to_confirm.pop(B)
-				elif E in(1,2):A.sub_to_confirm.pop(B)
+		F=A.pid_to_confirm.pop(D,None)
+		if F is None:return
+		G,B=F;H=A.sub_to_confirm if G else A.msg_to_confirm;C=H.get(B)
+		if not C or D not in C:return
+		if E==0:
+			I=A.sub_to_send if G else A.msg_to_send
+			if B not in I:
+				if G:I.append(B)
+				else:I.insert(0,B)
+			C.remove(D)
+			if not C:H.pop(B)
+		elif E in(1,2):H.pop(B)
+	def _add_to_confirm(A,confirm,key,pid,is_sub):
+		B=confirm.setdefault(key,[]);B.append(pid);A.pid_to_confirm[pid]=is_sub,key
+		if len(B)>A.CONFIRM_QUEUE_MAX:A.pid_to_confirm.pop(B.pop(0),None)
 	def connect(A,clean_session=True):
 		B=clean_session
-		if B:A.msg_to_send[:]=[];A.msg_to_confirm.clear()
+		if B:A.msg_to_send[:]=[];A.msg_to_confirm.clear();A.pid_to_confirm.clear()
 		try:C=super().connect(B);A.conn_issue=None;return C
 		except (OSError,simple2.MQTTException)as D:A.conn_issue=D,1
 	def log(A):
@@ -51,7 +51,7 @@ class MQTTClient(simple2.MQTTClient):
 			if 0<E<65535:
 				B=None
 				for (F,D) in A.msg_to_confirm.items():
-					if D and D[0]==E:del D[0];B=F;break
+					if D and D[0]==E:A.pid_to_confirm.pop(D.pop(0),None);B=F;break
 				if B and B in A.msg_to_confirm and not A.msg_to_confirm[B]:A.msg_to_confirm.pop(B)
 			else:A.msg_to_send.pop(0)
 			C-=1
@@ -68,9 +68,7 @@ class MQTTClient(simple2.MQTTClient):
 		if D:A.msg_to_send[:]=[B for B in A.msg_to_send if not(E==B[0]and D==B[2])]
 		try:
 			F=super().publish(E,msg,D,B,False)
-			if B==1:
-				A.msg_to_confirm.setdefault(C,[]).append(F)
-				if len(A.msg_to_confirm[C])>A.CONFIRM_QUEUE_MAX:A.msg_to_confirm.pop(0)
+			if B==1:A._add_to_confirm(A.msg_to_confirm,C,F,False)
 			return F
 		except (OSError,simple2.MQTTException)as G:
 			A.conn_issue=G,2
@@ -84,9 +82,7 @@ class MQTTClient(simple2.MQTTClient):
 			if C not in dict(A.subs):A.subs.append(B)
 		A.sub_to_send[:]=[B for B in A.sub_to_send if C!=B[0]]
 		try:
-			D=super().subscribe(C,qos);A.sub_to_confirm.setdefault(B,[]).append(D)
-			if len(A.sub_to_confirm[B])>A.CONFIRM_QUEUE_MAX:A.sub_to_confirm.pop(0)
-			return D
+			D=super().subscribe(C,qos);A._add_to_confirm(A.sub_to_confirm,B,D,True);return D
 		except (OSError,simple2.MQTTException)as E:
 			A.conn_issue=E,3
 			if A.NO_QUEUE_DUPS:
@@ -98,13 +94,13 @@ class MQTTClient(simple2.MQTTClient):
 			E,I,J,C=B
 			try:
 				F=super().publish(E,I,J,C,False)
-				if C==1:A.msg_to_confirm.setdefault(B,[]).append(F)
+				if C==1:A._add_to_confirm(A.msg_to_confirm,B,F,False)
 				D.append(B)
 			except (OSError,simple2.MQTTException)as G:A.conn_issue=G,5;return False
 		A.msg_to_send[:]=[B for B in A.msg_to_send if B not in D];del D;H=[]
 		for B in A.sub_to_send:
 			E,C=B
-			try:F=super().subscribe(E,C);A.sub_to_confirm.setdefault(B,[]).append(F);H.append(B)
+			try:F=super().subscribe(E,C);A._add_to_confirm(A.sub_to_confirm,B,F,True);H.append(B)
 			except (OSError,simple2.MQTTException)as G:A.conn_issue=G,5;return False
 		A.sub_to_send[:]=[B for B in A.sub_to_send if B not in H];return True
 	def is_conn_issue(A):
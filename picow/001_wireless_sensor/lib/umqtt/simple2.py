@@ -12,15 +12,21 @@ class MQTTClient:
 		A.client_id=client_id;A.sock=None;A.poller_r=None;A.poller_w=None;A.server=server;A.port=B;A.ssl=ssl;A.ssl_params=C if C else{};A.newpid=pid_gen()
 		if not getattr(A,'cb',None):A.cb=None
 		if not getattr(A,'cbstat',None):A.cbstat=lambda p,s:None
-		A.user=user;A.pswd=password;A.keepalive=keepalive;A.lw_topic=None;A.lw_msg=None;A.lw_qos=0;A.lw_retain=False;A.rcv_pids={};A.last_ping=ticks_ms();A.last_cpacket=ticks_ms();A.socket_timeout=socket_timeout;A.message_timeout=message_timeout
+		A.user=user;A.pswd=password;A.keepalive=keepalive;A.lw_topic=None;A.lw_msg=None;A.lw_qos=0;A.lw_retain=False;A.rcv_pids={};A.last_ping=ticks_ms();A.last_cpacket=ticks_ms();A.socket_timeout=socket_timeout;A.message_timeout=message_timeout;A._rbuf=bytearray(64);A._rmv=memoryview(A._rbuf)
 	def _read(A,n):
+		if n>len(A._rbuf):A._rbuf=bytearray(n);A._rmv=memoryview(A._rbuf)
+		B=A._rmv;C=0
 		try:
-			B=b''
-			for C in range(n):A._sock_timeout(A.poller_r,A.socket_timeout);B+=A.sock.read(1)
+			while 1:
+				D=A.sock.readinto(B[C:n])
+				if D==0:break
+				if D:C+=D
+				if C>=n:break
+				A._sock_timeout(A.poller_r,A.socket_timeout)
 		except AttributeError:raise MQTTException(8)
-		if B==b'':raise MQTTException(1)
-		if len(B)!=n:raise MQTTException(2)
-		return B
+		if C==0:raise MQTTException(1)
+		if C!=n:raise MQTTException(2)
+		return bytes(B[:n])
 	def _write(A,bytes_wr,length=-1):
 		D=bytes_wr;B=length
 		try:A._sock_timeout(A.poller_w,A.socket_timeout);C=A.sock.write(D,B)
@@ -50,7 +56,7 @@ class MQTTClient:
 	def set_callback_status(A,f):A.cbstat=f
 	def set_last_will(A,topic,msg,retain=False,qos=0):B=topic;assert 0<=qos<=2;assert B;A.lw_topic=B;A.lw_msg=msg;A.lw_qos=qos;A.lw_retain=retain
 	def connect(A,clean_session=True):
-		E=clean_session;A.sock=socket.socket();G=socket.getaddrinfo(A.server,A.port)[0][-1];A.sock.connect(G)
+		E=clean_session;A.sock=socket.socket();G=socket.getaddrinfo(A.server,A.port)[0][-1];A.sock.connect(G);A.sock.settimeout(A.socket_timeout)
 		if A.ssl:import ussl;A.sock=ussl.wrap_socket(A.sock,**A.ssl_params)
 		A.poller_r=uselect.poll();A.poller_r.register(A.sock,uselect.POLLIN);A.poller_w=uselect.poll();A.poller_w.register(A.sock,uselect.POLLOUT);F=bytearray(b'\x10\x00\x00\x00\x00\x00');B=bytearray(b'\x00\x04MQTT\x04\x00\x00\x00');D=10+2+len(A.client_id);B[7]=bool(E)<<1
 		if bool(E):A.rcv_pids.clear()
@@ -120,4 +126,11 @@ class MQTTClient:
 		if B&6==2:A._write(b'@\x02');A._write(E.to_bytes(2,'big'))
 		elif B&6==4:raise NotImplementedError()
 		elif B&6==6:raise MQTTException(-1)
-	def wait_msg(A):B=A.socket_timeout;A.socket_timeout=None;C=A.check_msg();A.socket_timeout=B;return C
\ No newline at end of file
+	def wait_msg(A):
+		B=A.socket_timeout;A.socket_timeout=None
+		if A.sock:A.sock.settimeout(None)
+		try:C=A.check_msg()
+		finally:
+			A.socket_timeout=B
+			if A.sock:A.sock.settimeout(B)
+		return C
\ No newline at end of file
@@ -11,25 +11,47 @@ from retry_exception import retry_exception
 from ucollections import namedtuple
 
 import bme280
+from bme280_bus import BME280BusManager
 
 from umqtt.simple2 import MQTTClient
 
 import secrets
 from internal_temperature_sensor import InternalTemperatureSensor
 from misc import get_machine_unique_id
+from readings_journal import ReadingsJournal
+from uptime_counter import UptimeCounter
 import consts
+import sensor_tasks
 
 try:
-    from typing import Callable, Dict, Tuple
+    from typing import Callable, Dict, List, Tuple
 except ImportError:
     pass
 
 
 Bme280Data = namedtuple("Bme280Data", ("temperature", "pressure", "humidity"))
 
-i2c = machine.I2C(0, sda=machine.Pin(0), scl=machine.Pin(1), freq=400_000)
-bme = bme280.BME280(i2c=i2c)
+i2c_buses = [
+    (f"i2c{bus_id}", machine.I2C(bus_id, sda=machine.Pin(sda), scl=machine.Pin(scl), freq=400_000))
+    for bus_id, sda, scl in consts.I2C_BUSES
+]
+sensors = BME280BusManager(i2c_buses, int32_compensation=consts.BME280_INT32_COMPENSATION)
 led = machine.Pin("LED", machine.Pin.OUT)
+uptime_counter = UptimeCounter()
+# readings which couldn't be published are kept in flash and sent after the next successful connection
+readings_journal = ReadingsJournal([key for key, _ in sensors.sensors], capacity=consts.READINGS_JOURNAL_CAPACITY)
+
+
+def configure_bme280() -> None:
+    if not consts.BME280_NORMAL_MODE:
+        return
+
+    # sensor converts continuously, so reads never wait for a conversion
+    first_result_us = sensors.configure_normal_mode(
+        standby=consts.BME280_STANDBY,
+        iir_filter=consts.BME280_IIR_FILTER
+    )
+    time.sleep_us(first_result_us)
 
 
 def blink_hello_sequence() -> None:
@@ -53,19 +75,33 @@ def setup_current_timestamp() -> None:
         raise
 
 
-def get_current_timestamp_iso() -> str:
-    localtime = time.localtime()
+def get_current_timestamp_iso(seconds_ago: int = 0) -> str:
+    localtime = time.localtime(time.time() - seconds_ago)
     return f"{localtime[0]}-{localtime[1]:02}-{localtime[2]:02} {localtime[3]:02}:{localtime[4]:02}:{localtime[5]:02}"
 
 
-def read_bme280_values() -> Bme280Data:
+def to_bme280_data(reading: bme280.BME280Reading) -> Bme280Data:
+    temperature, pressure, humidity = bme280.format_reading(reading)
     return Bme280Data(
-        temperature=bme.values[0],
-        pressure=bme.values[1],
-        humidity=bme.values[2]
+        temperature=temperature,
+        pressure=pressure,
+        humidity=humidity
     )
 
 
+def bme280_data_to_dict(measurements: Bme280Data) -> Dict:
+    data = {"temperature": measurements.temperature}
+
+    # channels with skipped oversampling aren't measured, so they aren't sent at all
+    if measurements.pressure is not None:
+        data["pressure"] = measurements.pressure
+
+    if measurements.humidity is not None:
+        data["humidity"] = measurements.humidity
+
+    return data
+
+
 def connect_to_wifi() -> Tuple[str, str]:
     """
     Connects to Wi-Fi and returns IP and adapter MAC address
@@ -127,47 +163,117 @@ def get_fs_free_space_in_bytes() -> int:
 def enrich_metadata(
         packet: Dict,
         mac_address: str,
-        internal_temp_sensor: InternalTemperatureSensor
+        internal_temp_sensor: InternalTemperatureSensor,
+        measured_secs_ago: int = 0,
+        journal: Dict = None
 ):
     """
-    Enriches payload with additional metadata
+    Enriches payload with additional metadata, journal epoch and sequence number are sent with
+    readings from the flash journal, so host drops ones which were already received
     """
 
     packet["metadata"] = {
         "wifi_mac_address": mac_address,
         "machine_unique_id": get_machine_unique_id(),
-        "measurement_time": get_current_timestamp_iso(),
+        "measurement_time": get_current_timestamp_iso(measured_secs_ago),
         "machine_metrics": {
             "cpu_temperature": internal_temp_sensor.current_temperature(),
             "mem_free": gc.mem_free(),
             "flash_free_space_bytes": get_fs_free_space_in_bytes()
         }
     }
+    if journal is not None:
+        packet["metadata"]["journal"] = journal
 
 
-def send_measurements(
-        client: MQTTClient,
-        measurements: Bme280Data,
-        enricher: Callable
-) -> None:
+def build_payload(measurements: List[Tuple[str, Bme280Data]], enricher: Callable, **kwargs) -> str:
     payload = {
         "payload": {
-            "bme280": {
-                "temperature": measurements.temperature,
-                "pressure": measurements.pressure,
-                "humidity": measurements.humidity
-            },
+            # primary sensor, kept for consumers which know about a single sensor only. It is the first
+            # sensor which responded, so it changes while the first discovered one doesn't respond
+            "bme280": bme280_data_to_dict(measurements[0][1]),
+            "bme280_sensors": {key: bme280_data_to_dict(data) for key, data in measurements}
         },
 
     }
-    enricher(payload)
+    enricher(payload, **kwargs)
     payload = ujson.dumps(payload)
 
     print(f"Sending measurements via MQTT: {payload}")
-    client.publish(secrets.MQTT_TOPIC_PUB, msg=payload)
+    return payload
+
+
+def encode_readings(
+        uptime_ms: int,
+        readings: List[Tuple[str, bme280.BME280Reading]],
+        enricher: Callable,
+        **kwargs
+) -> str:
+    measurements = [(key, to_bme280_data(reading)) for key, reading in readings]
+    return build_payload(
+        measurements=measurements,
+        enricher=enricher,
+        measured_secs_ago=uptime_counter.ms_since(uptime_ms) // 1000,
+        **kwargs
+    )
+
 
+def journal_pending_readings(state: sensor_tasks.SensorState) -> None:
+    """
+    Moves readings which weren't published from memory to flash journal
+    """
+
+    if not state.readings:
+        return
+
+    print(f"Journaling {len(state.readings)} measurements which weren't published")
+    for uptime_ms, readings in state.readings:
+        readings_journal.append(uptime_ms, readings)
+
+    del state.readings[:]
+    # counter must not go back behind journaled readings when power is lost
+    uptime_counter.save()
+
+
+def sample_offline(state: sensor_tasks.SensorState, samples_count: int) -> None:
+    """
+    Takes samples_count readings at the usual interval while there is no connection, they are
+    collected in memory and journaled in bulk, so flash is written once per MAX_PENDING_READINGS
+    """
+
+    for _ in range(samples_count):
+        try:
+            state.add_reading(sensors.read_all())
+        except OSError as e:
+            print(f"Error reading sensors: {e}")
 
-def send_measurements_in_loop(client: MQTTClient, enricher: Callable) -> None:
+        if len(state.readings) >= consts.MAX_PENDING_READINGS:
+            journal_pending_readings(state)
+
+        time.sleep(consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_TRANSMISSION_SECONDS)
+
+    journal_pending_readings(state)
+
+
+def send_journaled_readings(client: MQTTClient, enricher: Callable) -> None:
+    """
+    Sends journaled readings oldest first, journal is cleared when all of them were sent
+    """
+
+    journaled_count = readings_journal.count()
+    if not journaled_count:
+        return
+
+    print(f"Sending {journaled_count} journaled measurements")
+    for index, (uptime_ms, readings) in enumerate(readings_journal.records()):
+        journal = {"epoch": readings_journal.epoch, "sequence": (readings_journal.first_sequence + index) & 0xFFFFFFFF}
+        payload = encode_readings(uptime_ms, readings, enricher=enricher, journal=journal)
+        client.publish(secrets.MQTT_TOPIC_PUB, msg=payload)
+
+    readings_journal.clear()
+
+
+def send_measurements_in_loop(client: MQTTClient, enricher: Callable, state: sensor_tasks.SensorState) -> None:
     wdt_interval = min(consts.WDT_MAX_INTERVAL_IN_SECONDS, consts.MAX_WDT_INTERVAL_FOR_RP2040)
     wdt = machine. WDT(timeout=wdt_interval)
     
@@ -178,8 +284,10 @@ def send_measurements_in_loop(client: MQTTClient, enricher: Callable) -> None:
             (not last_measurement) or
             (time.ticks_diff(now, last_measurement) >= consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_TRANSMISSION_SECONDS)
         ):
-            bme280_data = read_bme280_values()
-            send_measurements(client=client, measurements=bme280_data, enricher=enricher)
+            state.add_reading(sensors.read_all())
+            uptime_ms, readings = state.readings[0]
+            client.publish(secrets.MQTT_TOPIC_PUB, msg=encode_readings(uptime_ms, readings, enricher=enricher))
+            state.readings.pop(0)
             last_measurement = time.ticks_ms()
             
         time.sleep(min(5000, consts.MAX_WDT_INTERVAL_FOR_RP2040) / 1000);
@@ -188,10 +296,14 @@ def send_measurements_in_loop(client: MQTTClient, enricher: Callable) -> None:
 
 def main():
     internal_temp_sensor = InternalTemperatureSensor()
+    configure_bme280()
 
     blink_hello_sequence()
     print(f"Current timestamp is: {get_current_timestamp_iso()}")
-    
+
+    # readings which weren't published yet
+    state = sensor_tasks.SensorState(uptime_counter)
+    failed_uplinks = 0
     while True:
         try:
             _, mac_address = connect_to_wifi()
@@ -202,20 +314,50 @@ def main():
             print(f"Current timestamp is: {get_current_timestamp_iso()}")
 
             client = mqtt_connect()
+        except Exception as e:
+            print(f"Error connecting: {e}")
+            import sys
+            sys.print_exception(e)
+
+            # measurements are journaled meanwhile, next attempt is made exponentially later
+            failed_uplinks += 1
+            samples_count = 1 << min(failed_uplinks, consts.UPLINK_MAX_BACKOFF_EXPONENT)
+            print(f"Uplink failed {failed_uplinks} times in a row, next attempt after {samples_count} measurements")
+            set_led_state(0)
+            sample_offline(state, samples_count)
+            continue
+
+        failed_uplinks = 0
+        try:
             enricher = functools.partial(
                 enrich_metadata,
                 mac_address=mac_address,
                 internal_temp_sensor=internal_temp_sensor
             )
-
-            send_measurements_in_loop(
-                client,
-                enricher=enricher
-            )
+            send_journaled_readings(client, enricher=enricher)
+
+            if consts.USE_ASYNCIO:
+                encoder = functools.partial(encode_readings, enricher=enricher)
+                sensor_tasks.run(
+                    sensors=sensors,
+                    client=client,
+                    led=led,
+                    topic=secrets.MQTT_TOPIC_PUB,
+                    encoder=encoder,
+                    state=state
+                )
+            else:
+                send_measurements_in_loop(
+                    client,
+                    enricher=enricher,
+                    state=state
+                )
         except Exception as e:
             print(f"Error in main loop: {e}")
             import sys
             sys.print_exception(e)
+            journal_pending_readings(state)
+            uptime_counter.save(sleep_ms=consts.SLEEP_INTERVAL_ON_ERROR_IN_MAIN_LOOP * 1000)
             time.sleep(consts.SLEEP_INTERVAL_ON_ERROR_IN_MAIN_LOOP)
             machine.reset()
 
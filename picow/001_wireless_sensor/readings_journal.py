@@ -0,0 +1,93 @@
+import ustruct
+
+import bme280
+from measurements_buffer import MeasurementsBuffer
+
+try:
+    from typing import Iterator, List, Tuple
+except ImportError:
+    pass
+
+# uptime (ms, see uptime_counter.py), then temperature, pressure and humidity of every sensor in discovery order
+RECORD_HEADER_FORMAT = "<I"
+SENSOR_FORMAT = "iII"
+
+# used for sensors which didn't respond and for channels with skipped oversampling
+NOT_AVAILABLE_I32 = -0x80000000
+NOT_AVAILABLE_U32 = 0xFFFFFFFF
+
+
+class ReadingsJournal(object):
+    """
+    Readings which couldn't be published, kept in flash until the next successful connection.
+    Every record holds readings of all sensors found on start, journals of different numbers
+    of sensors are kept in different files, so records of other layout are never misread
+    """
+
+    def __init__(self, sensor_keys: List[str], capacity: int):
+        self.sensor_keys = sensor_keys
+        self.record_format = RECORD_HEADER_FORMAT + SENSOR_FORMAT * len(sensor_keys)
+        self.buffer = MeasurementsBuffer(
+            record_size=ustruct.calcsize(self.record_format),
+            capacity=capacity,
+            file_name_prefix=f"journal{len(sensor_keys)}_",
+            state_file_name=f"journal{len(sensor_keys)}_state.bin"
+        )
+
+    @property
+    def epoch(self) -> int:
+        return self.buffer.epoch
+
+    @property
+    def first_sequence(self) -> int:
+        return self.buffer.first_sequence
+
+    def count(self) -> int:
+        return self.buffer.count()
+
+    def append(self, uptime_ms: int, readings: List[Tuple[str, bme280.BME280Reading]]) -> None:
+        """
+        Appends readings returned by BME280BusManager.read_all() taken at given uptime
+        """
+
+        values = [uptime_ms & 0xFFFFFFFF]
+        by_key = dict(readings)
+        for key in self.sensor_keys:
+            reading = by_key.get(key)
+            if reading is None:
+                values.extend((NOT_AVAILABLE_I32, NOT_AVAILABLE_U32, NOT_AVAILABLE_U32))
+                continue
+
+            temperature, pressure, humidity = reading
+            values.append(temperature)
+            values.append(NOT_AVAILABLE_U32 if pressure is None else pressure)
+            values.append(NOT_AVAILABLE_U32 if humidity is None else humidity)
+
+        self.buffer.append(ustruct.pack(self.record_format, *values))
+
+    def records(self) -> Iterator[Tuple[int, List[Tuple[str, bme280.BME280Reading]]]]:
+        """
+        Yields (uptime, readings) pairs, oldest first, readings leave out sensors which didn't respond.
+        Records are unpacked one at a time, so the whole journal is never unpacked in memory
+        """
+
+        records = self.buffer.read_all()
+        record_size = self.buffer.record_size
+        for offset in range(0, len(records), record_size):
+            values = ustruct.unpack_from(self.record_format, records, offset)
+            readings = []
+            for index, key in enumerate(self.sensor_keys):
+                temperature, pressure, humidity = values[1 + 3 * index:4 + 3 * index]
+                if temperature == NOT_AVAILABLE_I32:
+                    continue
+
+                readings.append((key, bme280.BME280Reading(
+                    temperature,
+                    None if pressure == NOT_AVAILABLE_U32 else pressure,
+                    None if humidity == NOT_AVAILABLE_U32 else humidity
+                )))
+
+            yield values[0], readings
+
+    def clear(self) -> None:
+        self.buffer.clear()
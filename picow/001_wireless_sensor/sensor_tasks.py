@@ -0,0 +1,234 @@
+import time
+
+import machine
+import uasyncio as asyncio
+
+from bme280_bus import BME280BusManager
+import consts
+from umqtt.simple import PUBLISH_OVERHEAD, pack_publish
+
+try:
+    from typing import Callable
+except ImportError:
+    pass
+
+
+class MqttWriter(object):
+    """
+    Writes MQTT packets to non-blocking client socket without blocking other tasks, packets written
+    by different tasks are never interleaved
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = asyncio.Lock()
+        self._stream = asyncio.StreamWriter(client.sock, {})
+        # reusable buffer where outgoing PUBLISH packets are assembled
+        self._publish_buffer = bytearray(128)
+
+    async def _write(self, packet) -> None:
+        self._stream.write(packet)
+
+        # partially written packet breaks the session, so timeout ends up in reconnect
+        await asyncio.wait_for_ms(self._stream.drain(), consts.MQTT_WRITE_TIMEOUT_MSECS)
+
+    async def write(self, packet: bytes) -> None:
+        async with self._lock:
+            await self._write(packet)
+
+    async def publish(self, topic: str, payload: str) -> None:
+        """
+        Publishes payload with QoS 0, same packet as MQTTClient.publish() sends
+        """
+
+        topic = topic.encode()
+        payload = payload.encode()
+        async with self._lock:
+            size = PUBLISH_OVERHEAD + len(topic) + len(payload)
+            if len(self._publish_buffer) < size:
+                self._publish_buffer = bytearray(size)
+
+            end = pack_publish(self._publish_buffer, 0, topic, payload)
+            await self._write(memoryview(self._publish_buffer)[:end])
+
+    async def ping(self) -> None:
+        await self.write(b"\xc0\x00")
+        self.client.last_ping = time.ticks_ms()
+
+
+class SensorState(object):
+    """
+    State shared between cooperative tasks of the sensor. Readings waiting for publishing are
+    (uptime, readings) pairs, uptime tells how long ago they were measured
+    """
+
+    def __init__(self, uptime_counter):
+        self.uptime_counter = uptime_counter
+        self.readings = []
+        self.new_readings = asyncio.Event()
+        self.last_sample_ms = time.ticks_ms()
+        self.last_publish_ms = time.ticks_ms()
+
+    def add_reading(self, sample: list) -> None:
+        self.last_sample_ms = time.ticks_ms()
+
+        if len(self.readings) >= consts.MAX_PENDING_READINGS:
+            print("Too many pending measurements, dropping the oldest one")
+            self.readings.pop(0)
+
+        self.readings.append((self.uptime_counter.uptime_ms(), sample))
+        self.new_readings.set()
+
+
+async def read_bme280_snapshots(sensors: BME280BusManager) -> list:
+    """
+    Same as BME280BusManager.read_all(), but other tasks run while conversions are in progress
+    """
+
+    conversion_time_us = sensors.start_conversions()
+    if conversion_time_us:
+        started = time.ticks_us()
+        await asyncio.sleep_ms(sensors.typical_conversion_time() // 1000)
+
+        # data is ready as soon as status registers say so, but no later than worst case
+        while sensors.is_measuring() and time.ticks_diff(time.ticks_us(), started) < conversion_time_us:
+            await asyncio.sleep_ms(1)
+
+        sensors.last_conversion_us = time.ticks_diff(time.ticks_us(), started)
+
+    return sensors.read_results()
+
+
+async def sample_task(sensors: BME280BusManager, state: SensorState) -> None:
+    interval_ms = consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_TRANSMISSION_SECONDS * 1000
+
+    next_sample_ms = time.ticks_ms()
+    while True:
+        state.add_reading(await read_bme280_snapshots(sensors))
+
+        # keep steady cadence regardless of how long sampling took
+        next_sample_ms = time.ticks_add(next_sample_ms, interval_ms)
+        delay_ms = time.ticks_diff(next_sample_ms, time.ticks_ms())
+        if delay_ms < 0:
+            next_sample_ms = time.ticks_ms()
+            delay_ms = 0
+
+        await asyncio.sleep_ms(delay_ms)
+
+
+async def publish_task(writer: MqttWriter, topic: str, encoder: Callable, state: SensorState) -> None:
+    while True:
+        await state.new_readings.wait()
+        state.new_readings.clear()
+
+        while state.readings:
+            uptime_ms, sample = state.readings[0]
+            payload = encoder(uptime_ms, sample)
+            await asyncio.sleep_ms(0)
+
+            await writer.publish(topic, payload)
+            state.readings.pop(0)
+            state.last_publish_ms = time.ticks_ms()
+
+            # let sampling and watchdog tasks run between messages
+            await asyncio.sleep_ms(0)
+
+
+async def receive_task(client) -> None:
+    """
+    Reads packets sent by broker, sensor doesn't subscribe to anything, so only PINGRESP is
+    expected. Time of the last packet tells keepalive_task that connection is alive
+    """
+
+    stream = asyncio.StreamReader(client.sock)
+    while True:
+        packet_type, length_byte = await stream.readexactly(2)
+        remaining_length = length_byte & 0x7F
+        shift = 7
+        while length_byte & 0x80:
+            length_byte = (await stream.readexactly(1))[0]
+            remaining_length |= (length_byte & 0x7F) << shift
+            shift += 7
+
+        if remaining_length:
+            await stream.readexactly(remaining_length)
+
+        client.last_cpacket = time.ticks_ms()
+        if packet_type != 0xD0:
+            print(f"Ignoring unexpected MQTT packet of type {packet_type >> 4}")
+
+
+async def keepalive_task(client, writer: MqttWriter, keepalive_secs: int) -> None:
+    if keepalive_secs <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(keepalive_secs // 2)
+
+        # nothing came from broker since the previous ping, so connection is gone
+        if time.ticks_diff(client.last_cpacket, client.last_ping) < 0:
+            raise OSError("No PINGRESP from MQTT broker")
+
+        await writer.ping()
+
+
+async def watchdog_task(state: SensorState) -> None:
+    wdt_interval = min(consts.WDT_MAX_INTERVAL_IN_SECONDS, consts.MAX_WDT_INTERVAL_FOR_RP2040)
+    wdt = machine.WDT(timeout=wdt_interval)
+
+    max_silence_ms = 2 * consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_TRANSMISSION_SECONDS * 1000 + wdt_interval
+    while True:
+        # when sampling or publishing got stuck, tasks are stopped, so main loop journals pending readings
+        # before reset. Watchdog resets the board when event loop itself is blocked
+        now = time.ticks_ms()
+        if time.ticks_diff(now, state.last_sample_ms) >= max_silence_ms:
+            raise OSError("Sampling is stuck")
+
+        if state.readings and time.ticks_diff(now, state.last_publish_ms) >= max_silence_ms:
+            raise OSError("Publishing is stuck")
+
+        wdt.feed()
+        await asyncio.sleep_ms(consts.WDT_FEED_INTERVAL_MSECS)
+
+
+async def led_task(led: machine.Pin, state: SensorState) -> None:
+    while True:
+        if len(state.readings) > 1:
+            # blink while measurements are waiting for slow network
+            led.toggle()
+        else:
+            led.value(1)
+
+        await asyncio.sleep_ms(250)
+
+
+async def run_tasks(
+        sensors: BME280BusManager,
+        client,
+        led: machine.Pin,
+        topic: str,
+        encoder: Callable,
+        state: SensorState
+) -> None:
+    # from now on socket is used only by tasks, which wait for it in event loop
+    client.sock.setblocking(False)
+
+    writer = MqttWriter(client)
+    await asyncio.gather(
+        sample_task(sensors, state),
+        publish_task(writer, topic, encoder, state),
+        receive_task(client),
+        keepalive_task(client, writer, client.keepalive),
+        watchdog_task(state),
+        led_task(led, state)
+    )
+
+
+def run(sensors: BME280BusManager, client, led: machine.Pin, topic: str, encoder: Callable, state: SensorState) -> None:
+    """
+    Runs sampling, publishing, MQTT receiving and keepalive, watchdog feeding and LED status as
+    cooperative tasks, encoder turns uptime and readings into payload published to topic. Readings
+    which weren't published when tasks fail are left in state
+    """
+
+    asyncio.run(run_tasks(sensors=sensors, client=client, led=led, topic=topic, encoder=encoder, state=state))
@@ -6,3 +6,15 @@ MAX_WDT_INTERVAL_FOR_RP2040 = 8388
 
 SLEEP_INTERVAL_ON_ERROR_SECS = 30
 SLEEP_INTERVAL_BETWEEN_MEASUREMENTS = 30
+
+# Compensate BME280 readings with 32-bit integer formulas, which don't allocate memory and give
+# pressure in whole Pa instead of 64-bit ones, which allocate big integers on every reading
+BME280_INT32_COMPENSATION = True
+
+# Measurements which couldn't be sent are kept in flash and sent after the next successful connection,
+# the oldest ones are dropped when buffer is full (one hour of measurements)
+MEASUREMENTS_BUFFER_CAPACITY = 120
+
+# After failed uplink next one is tried 2 ** failures wake-ups later, up to this exponent,
+# measurements stay buffered meanwhile
+UPLINK_MAX_BACKOFF_EXPONENT = 4
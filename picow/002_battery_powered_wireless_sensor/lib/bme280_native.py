@@ -0,0 +1,76 @@
+# Compiled compensation kernels for bme280.py. Results are the same as of the
+# interpreted formulas in BME280.compensate.
+#
+# Calibration is passed as array("i") in the CALIBRATION_* order below.
+# Temperature and humidity formulas are 32-bit, so they are viper functions
+# working on machine words. Pressure formula needs 64-bit intermediates and
+# is compiled with the native emitter, which keeps Python integer semantics.
+#
+# Importing this module fails on ports without native code emitter, bme280.py
+# then uses interpreted formulas.
+
+import micropython
+
+CALIBRATION_T1 = 0
+CALIBRATION_T2 = 1
+CALIBRATION_T3 = 2
+CALIBRATION_P1 = 3
+CALIBRATION_P2 = 4
+CALIBRATION_P3 = 5
+CALIBRATION_P4 = 6
+CALIBRATION_P5 = 7
+CALIBRATION_P6 = 8
+CALIBRATION_P7 = 9
+CALIBRATION_P8 = 10
+CALIBRATION_P9 = 11
+CALIBRATION_H1 = 12
+CALIBRATION_H2 = 13
+CALIBRATION_H3 = 14
+CALIBRATION_H4 = 15
+CALIBRATION_H5 = 16
+CALIBRATION_H6 = 17
+CALIBRATION_SIZE = 18
+
+
+@micropython.viper
+def t_fine(raw_temp: int, cal: ptr32) -> int:
+    t1 = cal[0]
+    var1 = (((raw_temp >> 3) - (t1 << 1)) * cal[1]) >> 11
+    d = (raw_temp >> 4) - t1
+    var2 = (((d * d) >> 12) * cal[2]) >> 14
+    return var1 + var2
+
+
+@micropython.native
+def pressure(raw_press, t_fine, cal):
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * cal[8]
+    var2 = var2 + ((var1 * cal[7]) << 17)
+    var2 = var2 + (cal[6] << 35)
+    var1 = (((var1 * var1 * cal[5]) >> 8) +
+            ((var1 * cal[4]) << 12))
+    var1 = (((1 << 47) + var1) * cal[3]) >> 33
+    if var1 == 0:
+        return 0
+
+    p = 1048576 - raw_press
+    p = (((p << 31) - var2) * 3125) // var1
+    var1 = (cal[11] * (p >> 13) * (p >> 13)) >> 25
+    var2 = (cal[10] * p) >> 19
+    return ((p + var1 + var2) >> 8) + (cal[9] << 4)
+
+
+@micropython.viper
+def humidity(raw_hum: int, t_fine: int, cal: ptr32) -> int:
+    h = t_fine - 76800
+    h = (((((raw_hum << 14) - (cal[15] << 20) -
+            (cal[16] * h)) + 16384)
+          >> 15) * (((((((h * cal[17]) >> 10) *
+                        (((h * cal[14]) >> 11) + 32768)) >> 10) +
+                      2097152) * cal[13] + 8192) >> 14))
+    h = h - (((((h >> 15) * (h >> 15)) >> 7) * cal[12]) >> 4)
+    if h < 0:
+        h = 0
+    if h > 419430400:
+        h = 419430400
+    return h >> 12
@@ -1,14 +1,45 @@
 import usocket as socket
 import ustruct as struct
-from ubinascii import hexlify
+
+# Maximum size of PUBLISH packet header: fixed header, remaining
+# length, topic length and packet id
+PUBLISH_OVERHEAD = 9
+
+# Assembles complete PUBLISH packet in buf starting at offset, returns
+# offset right after the packet. buf must have room for
+# PUBLISH_OVERHEAD + len(topic) + len(msg) bytes after offset.
+def pack_publish(buf, offset, topic, msg, retain=False, qos=0, pid=0):
+    buf[offset] = 0x30 | qos << 1 | retain
+    sz = 2 + len(topic) + len(msg)
+    if qos > 0:
+        sz += 2
+    assert sz < 2097152
+    i = offset + 1
+    while sz > 0x7f:
+        buf[i] = (sz & 0x7f) | 0x80
+        sz >>= 7
+        i += 1
+    buf[i] = sz
+    i += 1
+    struct.pack_into("!H", buf, i, len(topic))
+    i += 2
+    buf[i:i + len(topic)] = topic
+    i += len(topic)
+    if qos > 0:
+        struct.pack_into("!H", buf, i, pid)
+        i += 2
+    buf[i:i + len(msg)] = msg
+    return i + len(msg)
 
 class MQTTException(Exception):
     pass
 
 class MQTTClient:
 
+    _PUBLISH_OVERHEAD = PUBLISH_OVERHEAD
+
     def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
-                 ssl=False, ssl_params={}):
+                 ssl=False, ssl_params={}, socket_timeout=None):
         if port == 0:
             port = 8883 if ssl else 1883
         self.client_id = client_id
@@ -22,10 +53,15 @@ class MQTTClient:
         self.user = user
         self.pswd = password
         self.keepalive = keepalive
+        # None blocks until data arrives, otherwise reads fail with ETIMEDOUT
+        # after socket_timeout seconds, e.g. when broker doesn't send PUBACK
+        self.socket_timeout = socket_timeout
         self.lw_topic = None
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
+        # reusable buffer where outgoing PUBLISH packets are assembled
+        self._pub_buf = bytearray(128)
 
     def _send_str(self, s):
         self.sock.write(struct.pack("!H", len(s)))
@@ -56,6 +92,7 @@ class MQTTClient:
         self.sock = socket.socket()
         addr = socket.getaddrinfo(self.server, self.port)[0][-1]
         self.sock.connect(addr)
+        self.sock.settimeout(self.socket_timeout)
         if self.ssl:
             import ussl
             self.sock = ussl.wrap_socket(self.sock, **self.ssl_params)
@@ -85,7 +122,6 @@ class MQTTClient:
 
         self.sock.write(premsg, i + 2)
         self.sock.write(msg)
-        #print(hex(len(msg)), hexlify(msg, ":"))
         self._send_str(self.client_id)
         if self.lw_topic:
             self._send_str(self.lw_topic)
@@ -106,47 +142,100 @@ class MQTTClient:
     def ping(self):
         self.sock.write(b"\xc0\0")
 
-    def publish(self, topic, msg, retain=False, qos=0):
-        pkt = bytearray(b"\x30\0\0\0")
-        pkt[0] |= qos << 1 | retain
-        sz = 2 + len(topic) + len(msg)
-        if qos > 0:
-            sz += 2
-        assert sz < 2097152
-        i = 1
-        while sz > 0x7f:
-            pkt[i] = (sz & 0x7f) | 0x80
-            sz >>= 7
-            i += 1
-        pkt[i] = sz
-        #print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt, i + 1)
-        self._send_str(topic)
+    def _to_bytes(self, s):
+        return s.encode() if isinstance(s, str) else s
+
+    def _publish_buffer(self, size):
+        if len(self._pub_buf) < size:
+            self._pub_buf = bytearray(size)
+        return memoryview(self._pub_buf)
+
+    def _pack_publish(self, buf, offset, topic, msg, retain, qos):
+        # Same as pack_publish, takes the next packet id for qos=1,
+        # returns offset right after the packet and packet id
+        pid = 0
         if qos > 0:
-            self.pid += 1
+            self.pid = self.pid + 1 if self.pid < 65535 else 1
             pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.write(pkt, 2)
-        self.sock.write(msg)
+        return pack_publish(buf, offset, topic, msg, retain, qos, pid), pid
+
+    def _wait_puback(self):
+        # Waits for the next PUBACK and returns its packet id
+        while 1:
+            op = self.wait_msg()
+            if op == 0x40:
+                sz = self.sock.read(1)
+                assert sz == b"\x02"
+                rcv_pid = self.sock.read(2)
+                return rcv_pid[0] << 8 | rcv_pid[1]
+
+    def _poll_puback(self):
+        # Returns packet id of already received PUBACK, None if there is none
+        self.sock.setblocking(False)
+        op = self.wait_msg()
+        if op == 0x40:
+            sz = self.sock.read(1)
+            assert sz == b"\x02"
+            rcv_pid = self.sock.read(2)
+            return rcv_pid[0] << 8 | rcv_pid[1]
+        return None
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        assert qos in (0, 1)
+        topic = self._to_bytes(topic)
+        msg = self._to_bytes(msg)
+        buf = self._publish_buffer(self._PUBLISH_OVERHEAD + len(topic) + len(msg))
+        end, pid = self._pack_publish(buf, 0, topic, msg, retain, qos)
+        self.sock.write(buf[:end])
         if qos == 1:
-            while 1:
-                op = self.wait_msg()
-                if op == 0x40:
-                    sz = self.sock.read(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.read(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
-                    if pid == rcv_pid:
-                        return
-        elif qos == 2:
-            assert 0
+            while self._wait_puback() != pid:
+                pass
+
+    # Publishes messages to the same topic with qos=1 keeping up to window of
+    # them unacknowledged, so delivery isn't limited by broker round trip.
+    # Free part of the window is filled with a single socket write, all
+    # PUBACKs which already arrived are taken at once. msgs can be any
+    # iterable, e.g. a generator, messages are taken from it only when
+    # there is room in the window. Returns after all messages are
+    # acknowledged.
+    def publish_pipelined(self, topic, msgs, retain=False, window=16):
+        assert 0 < window < 65535
+        topic = self._to_bytes(topic)
+        msgs = iter(msgs)
+        more = True
+        inflight = {}
+        while more or inflight:
+            batch = []
+            while more and len(inflight) + len(batch) < window:
+                try:
+                    batch.append(self._to_bytes(next(msgs)))
+                except StopIteration:
+                    more = False
+            if batch:
+                size = 0
+                for msg in batch:
+                    size += self._PUBLISH_OVERHEAD + len(topic) + len(msg)
+                buf = self._publish_buffer(size)
+                end = 0
+                for msg in batch:
+                    end, pid = self._pack_publish(buf, end, topic, msg, retain, 1)
+                    inflight[pid] = True
+                self.sock.write(buf[:end])
+            if not inflight:
+                break
+
+            inflight.pop(self._wait_puback(), None)
+            while inflight:
+                pid = self._poll_puback()
+                if pid is None:
+                    break
+                inflight.pop(pid, None)
 
     def subscribe(self, topic, qos=0):
         assert self.cb is not None, "Subscribe callback is not set"
         pkt = bytearray(b"\x82\0\0\0")
         self.pid += 1
         struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self.pid)
-        #print(hex(len(pkt)), hexlify(pkt, ":"))
         self.sock.write(pkt)
         self._send_str(topic)
         self.sock.write(qos.to_bytes(1, "little"))
@@ -166,7 +255,7 @@ class MQTTClient:
     # messages processed internally.
     def wait_msg(self):
         res = self.sock.read(1)
-        self.sock.setblocking(True)
+        self.sock.settimeout(self.socket_timeout)
         if res is None:
             return None
         if res == b"":
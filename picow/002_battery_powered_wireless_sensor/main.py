@@ -13,15 +13,18 @@ from ucollections import namedtuple
 from umqtt.simple2 import MQTTClient
 
 import consts
-import functools
 import secrets
+import telemetry_frame
 from battery_info import PicoWBatteryInfo
 from internal_temperature_sensor import InternalTemperatureSensor
+from measurements_buffer import MeasurementsBuffer
 from misc import get_machine_unique_id
 from retry_exception import retry_exception
+from uplink_backoff import UplinkBackoff
+from uptime_counter import UptimeCounter
 
 try:
-    from typing import Callable, Dict, Tuple
+    from typing import Dict, Tuple
 except ImportError:
     pass
 
@@ -29,6 +32,7 @@ Bme280Data = namedtuple("Bme280Data", ("temperature", "pressure", "humidity"))
 
 i2c = machine.I2C(0, sda=machine.Pin(0), scl=machine.Pin(1), freq=400_000)
 bme = bme280.BME280(i2c=i2c)
+uptime_counter = UptimeCounter()
 
 
 @retry_exception(attempts=3, delay_seconds=5)
@@ -40,18 +44,30 @@ def setup_current_timestamp() -> None:
         raise
 
 
-def get_current_timestamp_iso() -> str:
-    localtime = time.localtime()
+def get_current_timestamp_iso(seconds_ago: int = 0) -> str:
+    localtime = time.localtime(time.time() - seconds_ago)
     return f"{localtime[0]}-{localtime[1]:02}-{localtime[2]:02} {localtime[3]:02}:{localtime[4]:02}:{localtime[5]:02}"
 
 
 @retry_exception(attempts=3, delay_seconds=5)
-def read_bme280_values() -> Bme280Data:
-    return Bme280Data(
-        temperature=bme.values[0],
-        pressure=bme.values[1],
-        humidity=bme.values[2]
-    )
+def read_bme280_reading() -> tuple:
+    if consts.BME280_INT32_COMPENSATION:
+        return bme.read_int32()
+
+    return bme.read_snapshot()
+
+
+def bme280_data_to_dict(measurements: Bme280Data) -> Dict:
+    data = {"temperature": measurements.temperature}
+
+    # channels with skipped oversampling aren't measured, so they aren't sent at all
+    if measurements.pressure is not None:
+        data["pressure"] = measurements.pressure
+
+    if measurements.humidity is not None:
+        data["humidity"] = measurements.humidity
+
+    return data
 
 
 @retry_exception(attempts=3, delay_seconds=5)
@@ -115,53 +131,88 @@ def get_python_version() -> str:
     return f"{v[0]}.{v[1]}.{v[2]}"
 
 
-def enrich_metadata(
-        packet: Dict,
-        mac_address: str,
+def pack_measurements_record(
         internal_temp_sensor: InternalTemperatureSensor,
         current_voltage: float = None,
         charge_percentage: float = None
-):
+) -> bytes:
+    """
+    Packs measurements taken after this reset into compact binary record
     """
-    Enriches payload with additional metadata
+
+    return telemetry_frame.pack_record(
+        uptime_ms=uptime_counter.uptime_ms(),
+        bme280_reading=read_bme280_reading(),
+        cpu_temperature=internal_temp_sensor.current_temperature(),
+        mem_free=gc.mem_free(),
+        flash_free_space_bytes=get_fs_free_space_in_bytes(),
+        current_voltage=current_voltage,
+        charge_percentage=charge_percentage
+    )
+
+
+def record_to_payload(record: bytes, mac_address: str, epoch: int, sequence: int) -> Dict:
     """
+    Converts buffered record into JSON message, journal epoch and sequence number let host drop
+    messages which were already received. Measurement time is told by record uptime, so it's
+    right also for records buffered during failed uplinks
+    """
+
+    (
+        uptime_ms, bme280_reading, cpu_temperature, mem_free, flash_free_space_bytes, current_voltage, charge_percentage
+    ) = telemetry_frame.unpack_record(record)
+    measured_secs_ago = uptime_counter.ms_since(uptime_ms) // 1000
 
-    packet["metadata"] = {
-        "wifi_mac_address": mac_address,
-        "machine_unique_id": get_machine_unique_id(),
-        "measurement_time": get_current_timestamp_iso(),
-        "machine_metrics": {
-            "python_version": get_python_version(),
-            "cpu_temperature": internal_temp_sensor.current_temperature(),
-            "mem_free": gc.mem_free(),
-            "frequency": machine.freq(),
-            "flash_free_space_bytes": get_fs_free_space_in_bytes(),
-            "power": {
-                "current_voltage": current_voltage,
-                "charge_percentage": charge_percentage
+    return {
+        "payload": {
+            "bme280": bme280_data_to_dict(Bme280Data(*bme280.format_reading(bme280_reading))),
+        },
+        "metadata": {
+            "wifi_mac_address": mac_address,
+            "machine_unique_id": get_machine_unique_id(),
+            "measurement_time": get_current_timestamp_iso(measured_secs_ago),
+            "journal": {
+                "epoch": epoch,
+                "sequence": sequence
+            },
+            "machine_metrics": {
+                "python_version": get_python_version(),
+                "cpu_temperature": cpu_temperature,
+                "mem_free": mem_free,
+                "frequency": machine.freq(),
+                "flash_free_space_bytes": flash_free_space_bytes,
+                "power": {
+                    "current_voltage": current_voltage,
+                    "charge_percentage": charge_percentage
+                }
             }
         }
     }
 
 
-def send_measurements(client: MQTTClient, enricher: Callable) -> None:
-    bme280_data = read_bme280_values()
+def send_measurements(client: MQTTClient, mac_address: str, epoch: int, first_sequence: int, records: bytes) -> None:
+    """
+    Sends buffered records as JSON messages, one per record, oldest first
+    """
 
-    payload = {
-        "payload": {
-            "bme280": {
-                "temperature": bme280_data.temperature,
-                "pressure": bme280_data.pressure,
-                "humidity": bme280_data.humidity
-            },
-        },
+    records_count = len(records) // telemetry_frame.RECORD_SIZE
+    for index in range(records_count):
+        payload = record_to_payload(
+            records[index * telemetry_frame.RECORD_SIZE:(index + 1) * telemetry_frame.RECORD_SIZE],
+            mac_address=mac_address,
+            epoch=epoch,
+            sequence=(first_sequence + index) & 0xFFFFFFFF
+        )
+        payload = ujson.dumps(payload)
+
+        print(f"Sending measurements via MQTT: {payload}")
+        client.publish(secrets.MQTT_TOPIC_PUB, msg=payload)
 
-    }
-    enricher(payload)
-    payload = ujson.dumps(payload)
 
-    print(f"Sending measurements via MQTT: {payload}")
-    client.publish(secrets.MQTT_TOPIC_PUB, msg=payload)
+def sleep_and_reset(interval_secs: int) -> None:
+    uptime_counter.save(sleep_ms=interval_secs * 1000)
+    time.sleep(interval_secs)
+    machine.reset()
 
 
 def main():
@@ -175,36 +226,55 @@ def main():
         print(f"Current battery voltage level: {current_voltage}")
         print(f"Battery charge percentage level: {charge_percentage}")
 
-        print("Connecting to Wi-Fi")
-        _, mac_address = connect_to_wifi()
+        # measurement is kept in flash until it is delivered, so it survives failed uplinks
+        measurements_buffer = MeasurementsBuffer(
+            record_size=telemetry_frame.RECORD_SIZE,
+            capacity=consts.MEASUREMENTS_BUFFER_CAPACITY
+        )
+        measurements_buffer.append(
+            pack_measurements_record(
+                internal_temp_sensor=InternalTemperatureSensor(),
+                current_voltage=current_voltage,
+                charge_percentage=charge_percentage
+            )
+        )
+
+        uplink_backoff = UplinkBackoff(every_n_wakeups=1, max_backoff_exponent=consts.UPLINK_MAX_BACKOFF_EXPONENT)
+        buffered_count = measurements_buffer.count()
+        if not uplink_backoff.should_try(buffered_count):
+            print(f"Buffered {buffered_count} measurements, skipping uplink")
+            sleep_and_reset(consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS)
 
-        print("Confuguring current timestamp")
-        setup_current_timestamp()
+        try:
+            print("Connecting to Wi-Fi")
+            _, mac_address = connect_to_wifi()
 
-        client = mqtt_connect()
+            print("Confuguring current timestamp")
+            setup_current_timestamp()
 
-        internal_temp_sensor = InternalTemperatureSensor()
-        enricher = functools.partial(
-            enrich_metadata,
-            mac_address=mac_address,
-            internal_temp_sensor=internal_temp_sensor,
-            current_voltage=current_voltage,
-            charge_percentage=charge_percentage
-        )
+            client = mqtt_connect()
+        except Exception:
+            # buffered measurements are kept, next attempt is made a few wake-ups later
+            uplink_backoff.on_failure()
+            print(f"Uplink failed {uplink_backoff.failed_uplinks} times in a row")
+            raise
 
         send_measurements(
             client,
-            enricher=enricher
+            mac_address=mac_address,
+            epoch=measurements_buffer.epoch,
+            first_sequence=measurements_buffer.first_sequence,
+            records=measurements_buffer.read_all()
         )
+        measurements_buffer.clear()
+        uplink_backoff.on_success()
 
-        time.sleep(consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS)
-        machine.reset()
+        sleep_and_reset(consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS)
     except Exception as e:
         print(f"Error in main loop: {e}")
         import sys
         sys.print_exception(e)
-        time.sleep(consts.SLEEP_INTERVAL_ON_ERROR_SECS)
-        machine.reset()
+        sleep_and_reset(consts.SLEEP_INTERVAL_ON_ERROR_SECS)
 
 
 if __name__ == "__main__":
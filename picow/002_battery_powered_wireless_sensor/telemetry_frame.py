@@ -0,0 +1,166 @@
+import ustruct
+
+# First byte of every MQTT message tells host how to decode it, JSON messages always start with "{"
+CONTENT_TYPE_FRAME = 0x01
+CONTENT_TYPE_BATCH = 0x02
+
+# Version of frame and batch layouts below
+FORMAT_VERSION = 1
+
+# content type, format version, machine unique id, Wi-Fi MAC address, Python version (major, minor, micro),
+# CPU frequency (Hz), Wi-Fi connection time (ms), journal epoch, record sequence number
+FRAME_HEADER_FORMAT = "<BB8s6sBBBIHHI"
+
+# content type, format version, machine unique id, Wi-Fi MAC address, Python version (major, minor, micro),
+# CPU frequency (Hz), Wi-Fi connection time (ms), records count, nominal interval between records (seconds),
+# journal epoch, sequence number of the first record (next records have consecutive numbers)
+BATCH_HEADER_FORMAT = "<BB8s6sBBBIHHHHI"
+
+# uptime (ms), temperature (0.01 degC), pressure (Pa, Q24.8), humidity (%RH, Q22.10), CPU temperature (0.01 degC),
+# free memory (bytes), free flash space (bytes), battery voltage (mV), battery charge (0.01 %).
+# Pressure and humidity are NOT_AVAILABLE_U32 when their oversampling is skipped. Uptime is counted across
+# wake-ups (see uptime_counter.py), so differences of uptimes tell when buffered records were measured
+RECORD_FORMAT = "<IiIIhIIHH"
+RECORD_SIZE = ustruct.calcsize(RECORD_FORMAT)
+
+# Single measurement frame is a frame header followed by one record
+FRAME_FORMAT = FRAME_HEADER_FORMAT + RECORD_FORMAT[1:]
+FRAME_SIZE = ustruct.calcsize(FRAME_FORMAT)
+
+# Used for values which can't be measured on a particular device, like battery voltage
+NOT_AVAILABLE_U16 = 0xFFFF
+NOT_AVAILABLE_U32 = 0xFFFFFFFF
+
+
+def _to_u16_or_na(value: float, scale: int, max_value: int) -> int:
+    if value is None:
+        return NOT_AVAILABLE_U16
+
+    value = int(value * scale)
+    if value < 0:
+        return 0
+
+    return max_value if value > max_value else value
+
+
+def pack_record(
+        uptime_ms: int,
+        bme280_reading: tuple,
+        cpu_temperature: float,
+        mem_free: int,
+        flash_free_space_bytes: int,
+        current_voltage: float = None,
+        charge_percentage: float = None
+) -> bytes:
+    """
+    Packs measurements taken during one wake-up into fixed layout record
+    """
+
+    temperature, pressure, humidity = bme280_reading
+    return ustruct.pack(
+        RECORD_FORMAT,
+        uptime_ms & 0xFFFFFFFF,
+        temperature,
+        NOT_AVAILABLE_U32 if pressure is None else pressure,
+        NOT_AVAILABLE_U32 if humidity is None else humidity,
+        int(cpu_temperature * 100),
+        mem_free,
+        flash_free_space_bytes,
+        _to_u16_or_na(current_voltage, 1000, 0xFFFE),
+        _to_u16_or_na(charge_percentage, 100, 10000)
+    )
+
+
+def _u16_or_none(value: int, scale: int) -> float:
+    return None if value == NOT_AVAILABLE_U16 else value / scale
+
+
+def unpack_record(record: bytes) -> tuple:
+    """
+    Reverse of pack_record, returns its arguments in the same order with None for values which
+    weren't available
+    """
+
+    (
+        uptime_ms, temperature, pressure, humidity, cpu_temperature, mem_free, flash_free_space_bytes,
+        current_voltage, charge_percentage
+    ) = ustruct.unpack(RECORD_FORMAT, record)
+
+    return (
+        uptime_ms,
+        (
+            temperature,
+            None if pressure == NOT_AVAILABLE_U32 else pressure,
+            None if humidity == NOT_AVAILABLE_U32 else humidity
+        ),
+        cpu_temperature / 100,
+        mem_free,
+        flash_free_space_bytes,
+        _u16_or_none(current_voltage, 1000),
+        _u16_or_none(charge_percentage, 100)
+    )
+
+
+def pack_frame(
+        machine_unique_id: bytes,
+        mac_address: bytes,
+        python_version: tuple,
+        frequency: int,
+        wifi_connect_time_ms: int,
+        epoch: int,
+        sequence: int,
+        record: bytes
+) -> bytes:
+    """
+    Packs single record into binary frame
+    """
+
+    header = ustruct.pack(
+        FRAME_HEADER_FORMAT,
+        CONTENT_TYPE_FRAME,
+        FORMAT_VERSION,
+        machine_unique_id,
+        mac_address,
+        python_version[0],
+        python_version[1],
+        python_version[2],
+        frequency,
+        _to_u16_or_na(wifi_connect_time_ms, 1, 0xFFFE),
+        epoch,
+        sequence
+    )
+    return header + record
+
+
+def pack_batch(
+        machine_unique_id: bytes,
+        mac_address: bytes,
+        python_version: tuple,
+        frequency: int,
+        wifi_connect_time_ms: int,
+        interval_secs: int,
+        epoch: int,
+        first_sequence: int,
+        records: bytes
+) -> bytes:
+    """
+    Packs concatenated records (oldest first), normally taken every interval_secs, into binary batch
+    """
+
+    header = ustruct.pack(
+        BATCH_HEADER_FORMAT,
+        CONTENT_TYPE_BATCH,
+        FORMAT_VERSION,
+        machine_unique_id,
+        mac_address,
+        python_version[0],
+        python_version[1],
+        python_version[2],
+        frequency,
+        _to_u16_or_na(wifi_connect_time_ms, 1, 0xFFFE),
+        len(records) // RECORD_SIZE,
+        interval_secs,
+        epoch,
+        first_sequence
+    )
+    return header + records
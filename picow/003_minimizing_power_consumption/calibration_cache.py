@@ -0,0 +1,78 @@
+import ubinascii
+import ustruct
+
+import bme280
+
+# chip id, I2C address, first 4 bytes of calibration registers (dig_T1 and dig_T2) as read from the sensor,
+# parsed calibration coefficients, followed by CRC32 of all of this
+_HEADER_FORMAT = "<BB4s"
+_HEADER_SIZE = ustruct.calcsize(_HEADER_FORMAT)
+_CALIBRATION_SIZE = ustruct.calcsize(bme280.BME280_CALIBRATION_FORMAT)
+_CRC_FORMAT = "<I"
+_FILE_SIZE = _HEADER_SIZE + _CALIBRATION_SIZE + ustruct.calcsize(_CRC_FORMAT)
+
+BME280_REGISTER_CHIP_ID = 0xD0
+BME280_REGISTER_CALIBRATION = 0x88
+
+
+class CalibrationCache(object):
+    """
+    Keeps parsed BME280 calibration coefficients in flash, so next wake-up doesn't read and parse
+    calibration registers. Cached coefficients are used only when checksum is valid and sensor
+    still reports the same chip id and first calibration bytes, otherwise they are read again
+    """
+
+    def __init__(self, file_name: str = "bme280_calibration.bin"):
+        self.file_name = file_name
+
+    @staticmethod
+    def _read_header(i2c, address: int) -> bytes:
+        chip_id = i2c.readfrom_mem(address, BME280_REGISTER_CHIP_ID, 1)[0]
+        spot_check = i2c.readfrom_mem(address, BME280_REGISTER_CALIBRATION, 4)
+        return ustruct.pack(_HEADER_FORMAT, chip_id, address, spot_check)
+
+    def load(self, i2c, address: int):
+        """
+        Returns calibration to be passed to bme280.BME280 or None when nothing valid is cached for this sensor
+        """
+
+        try:
+            with open(self.file_name, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if len(data) != _FILE_SIZE:
+            return None
+
+        crc_offset = _FILE_SIZE - ustruct.calcsize(_CRC_FORMAT)
+        if ustruct.unpack_from(_CRC_FORMAT, data, crc_offset)[0] != ubinascii.crc32(data[:crc_offset]):
+            print("Cached BME280 calibration is corrupted")
+            return None
+
+        if data[:_HEADER_SIZE] != self._read_header(i2c, address):
+            print("BME280 sensor was changed, cached calibration is outdated")
+            return None
+
+        return data[_HEADER_SIZE:crc_offset]
+
+    def save(self, i2c, address: int, calibration: bytes) -> None:
+        data = self._read_header(i2c, address) + calibration
+        with open(self.file_name, "wb") as f:
+            f.write(data)
+            f.write(ustruct.pack(_CRC_FORMAT, ubinascii.crc32(data)))
+
+    def create_sensor(self, i2c, address: int = bme280.BME280_I2CADDR, **kwargs) -> bme280.BME280:
+        """
+        Creates bme280.BME280 with cached calibration, calibration is read from the sensor and cached
+        when nothing valid is cached for it. kwargs are passed to bme280.BME280
+        """
+
+        calibration = self.load(i2c, address)
+        sensor = bme280.BME280(address=address, i2c=i2c, calibration=calibration, **kwargs)
+
+        if calibration is None:
+            print("Caching BME280 calibration")
+            self.save(i2c, address, sensor.calibration)
+
+        return sensor
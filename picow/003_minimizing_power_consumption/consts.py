@@ -5,3 +5,31 @@ MAX_WDT_INTERVAL_FOR_RP2040 = 8388
 
 SLEEP_INTERVAL_ON_ERROR_SECS = 5 * 60
 SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_SECS = 5 * 60
+
+TELEMETRY_FORMAT_JSON = "json"
+TELEMETRY_FORMAT_BINARY = "binary"
+TELEMETRY_FORMAT = TELEMETRY_FORMAT_BINARY
+
+# Measurements are buffered in flash until they are delivered. With binary telemetry Wi-Fi is turned on
+# every N wake-ups to send all of them in a single MQTT message, JSON telemetry is sent on every wake-up
+UPLINK_EVERY_N_WAKEUPS = 6
+MEASUREMENTS_BUFFER_CAPACITY = 288
+
+# Reuse access point and IP configuration of the last successful connection (static IP, no scan and DHCP)
+WIFI_FAST_JOIN = True
+WIFI_FAST_JOIN_TIMEOUT_MSECS = 3000
+WIFI_POLLING_INTERVAL_MSECS = 10
+
+# BME280 oversampling per channel (BME280_OSAMPLE_* from lib/bme280.py: 1 = x1 ... 5 = x16), pressure and
+# humidity can be skipped with 0, e.g. humidity on barometer-only nodes, which shortens conversion
+BME280_OSAMPLE_TEMPERATURE = 1
+BME280_OSAMPLE_PRESSURE = 1
+BME280_OSAMPLE_HUMIDITY = 1
+
+# After failed uplink next one is tried UPLINK_EVERY_N_WAKEUPS * 2 ** failures wake-ups later, up to this exponent,
+# measurements stay buffered meanwhile
+UPLINK_MAX_BACKOFF_EXPONENT = 3
+
+# Buffered JSON messages are published with QoS 1, up to this many of them are sent before their PUBACKs arrive
+MQTT_PUBLISH_WINDOW = 8
+MQTT_SOCKET_TIMEOUT_SECS = 10
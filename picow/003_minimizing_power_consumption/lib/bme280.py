@@ -34,21 +34,117 @@
 
 
 import time
-from ustruct import unpack, unpack_from
+from ucollections import namedtuple
+from ustruct import pack, unpack, unpack_from
 from array import array
 
+# compiled compensation kernels, not available on every port
+try:
+    import bme280_native
+except (ImportError, SyntaxError):
+    bme280_native = None
+
 # BME280 default address.
 BME280_I2CADDR = 0x76
 
 # Operating Modes
+BME280_OSAMPLE_SKIP = 0
 BME280_OSAMPLE_1 = 1
 BME280_OSAMPLE_2 = 2
 BME280_OSAMPLE_4 = 3
 BME280_OSAMPLE_8 = 4
 BME280_OSAMPLE_16 = 5
 
+# Standby time between conversions in normal mode
+BME280_STANDBY_0_5 = 0
+BME280_STANDBY_62_5 = 1
+BME280_STANDBY_125 = 2
+BME280_STANDBY_250 = 3
+BME280_STANDBY_500 = 4
+BME280_STANDBY_1000 = 5
+BME280_STANDBY_10 = 6
+BME280_STANDBY_20 = 7
+
+# IIR filter coefficient
+BME280_IIR_FILTER_OFF = 0
+BME280_IIR_FILTER_2 = 1
+BME280_IIR_FILTER_4 = 2
+BME280_IIR_FILTER_8 = 3
+BME280_IIR_FILTER_16 = 4
+
+# Power modes (ctrl_meas bits 1:0)
+BME280_MODE_SLEEP = 0
+BME280_MODE_FORCED = 1
+BME280_MODE_NORMAL = 3
+
 BME280_REGISTER_CONTROL_HUM = 0xF2
+BME280_REGISTER_STATUS = 0xF3
 BME280_REGISTER_CONTROL = 0xF4
+BME280_REGISTER_CONFIG = 0xF5
+
+# status register bit set while conversion is running
+BME280_STATUS_MEASURING = 0x08
+
+# delay between status register reads while waiting for conversion, us
+BME280_STATUS_POLL_INTERVAL = 250
+
+# Parsed calibration coefficients dig_T1 .. dig_H6, as returned by
+# BME280.calibration
+BME280_CALIBRATION_FORMAT = "<HhhHhhhhhhhhBhBhhb"
+
+# Compensated measurements taken from a single conversion:
+# temperature in 0.01 degC, pressure in Pa as Q24.8, humidity in %RH as Q22.10,
+# None for channels with skipped oversampling
+BME280Reading = namedtuple("BME280Reading",
+                           ("temperature", "pressure", "humidity"))
+
+
+def format_reading(reading):
+    """ Formats a compensated reading as human readable strings.
+
+        Args:
+            reading: BME280Reading or alike with compensated values, in
+            temperature, pressure, humidity order
+        Returns:
+            tuple of temperature, pressure and humidity strings, None for
+            skipped channels
+    """
+
+    t, p, h = reading
+
+    pressure = None
+    if p is not None:
+        p = p // 256
+        pi = p // 100
+        pd = p - pi * 100
+        pressure = "{}.{:02d}hPa".format(pi, pd)
+
+    humidity = None
+    if h is not None:
+        hi = h // 1024
+        hd = h * 100 // 1024 - hi * 100
+        humidity = "{}.{:02d}%".format(hi, hd)
+
+    return ("{}C".format(t / 100), pressure, humidity)
+
+
+def _check_oversampling(value, name, allow_skip=True):
+    if value == BME280_OSAMPLE_SKIP and allow_skip:
+        return value
+
+    if value not in [BME280_OSAMPLE_1, BME280_OSAMPLE_2, BME280_OSAMPLE_4,
+                     BME280_OSAMPLE_8, BME280_OSAMPLE_16]:
+        raise ValueError(
+            'Unexpected {0} oversampling value {1}. Set it to one of '
+            'BME280_OSAMPLE_* values'.format(name, value))
+    return value
+
+
+def _channel_time(osrs, per_sample, overhead):
+    # skipped channel isn't measured at all
+    if osrs == BME280_OSAMPLE_SKIP:
+        return 0
+    return per_sample * (1 << (osrs - 1)) + overhead
 
 
 class BME280:
@@ -57,6 +153,10 @@ class BME280:
                  mode=BME280_OSAMPLE_1,
                  address=BME280_I2CADDR,
                  i2c=None,
+                 osrs_t=None,
+                 osrs_p=None,
+                 osrs_h=None,
+                 calibration=None,
                  **kwargs):
         # Check that mode is valid.
         if mode not in [BME280_OSAMPLE_1, BME280_OSAMPLE_2, BME280_OSAMPLE_4,
@@ -66,11 +166,59 @@ class BME280:
                 'BME280_ULTRALOWPOWER, BME280_STANDARD, BME280_HIGHRES, or '
                 'BME280_ULTRAHIGHRES'.format(mode))
         self._mode = mode
+        self._set_oversampling(osrs_t, osrs_p, osrs_h)
+        self._normal_mode = False
         self.address = address
         if i2c is None:
             raise ValueError('An I2C object is required.')
         self.i2c = i2c
 
+        if calibration is None:
+            self._read_calibration()
+        else:
+            # coefficients parsed earlier, e.g. cached in flash
+            self.dig_T1, self.dig_T2, self.dig_T3, self.dig_P1, \
+                self.dig_P2, self.dig_P3, self.dig_P4, self.dig_P5, \
+                self.dig_P6, self.dig_P7, self.dig_P8, self.dig_P9, \
+                self.dig_H1, self.dig_H2, self.dig_H3, self.dig_H4, \
+                self.dig_H5, self.dig_H6 = unpack(BME280_CALIBRATION_FORMAT,
+                                                  calibration)
+
+        # calibration in the order expected by bme280_native kernels
+        self._calibration = array("i", (
+            self.dig_T1, self.dig_T2, self.dig_T3, self.dig_P1, self.dig_P2,
+            self.dig_P3, self.dig_P4, self.dig_P5, self.dig_P6, self.dig_P7,
+            self.dig_P8, self.dig_P9, self.dig_H1, self.dig_H2, self.dig_H3,
+            self.dig_H4, self.dig_H5, self.dig_H6))
+
+        # sensor which was set up before keeps its registers, every forced
+        # conversion writes control registers anyway
+        if calibration is None:
+            self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
+                                 bytearray([0x3F]))
+        self.t_fine = 0
+
+        # duration of the last forced mode conversion, measured by status
+        # register polling, us
+        self.last_conversion_us = 0
+
+        # temporary data holders which stay allocated
+        self._l1_barray = bytearray(1)
+        self._l8_barray = bytearray(8)
+        self._l3_resultarray = array("i", [0, 0, 0])
+        self._l3_resultlist = [0, 0, 0]
+
+    def _write_control(self, power_mode):
+        # changes of ctrl_hum become effective only after ctrl_meas is written
+        self._l1_barray[0] = self._osrs_h
+        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL_HUM,
+                             self._l1_barray)
+        self._l1_barray[0] = (self._osrs_t << 5 | self._osrs_p << 2 |
+                              power_mode)
+        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
+                             self._l1_barray)
+
+    def _read_calibration(self):
         # load calibration data
         dig_88_a1 = self.i2c.readfrom_mem(self.address, 0x88, 26)
         dig_e1_e7 = self.i2c.readfrom_mem(self.address, 0xE1, 7)
@@ -79,7 +227,7 @@ class BME280:
             self.dig_P6, self.dig_P7, self.dig_P8, self.dig_P9, \
             _, self.dig_H1 = unpack("<HhhHhhhhhhhhBB", dig_88_a1)
 
-        self.dig_H2, self.dig_H3 = unpack("<hB", dig_e1_e7)
+        self.dig_H2, self.dig_H3 = unpack_from("<hB", dig_e1_e7)
         e4_sign = unpack_from("<b", dig_e1_e7, 3)[0]
         self.dig_H4 = (e4_sign << 4) | (dig_e1_e7[4] & 0xF)
 
@@ -88,14 +236,126 @@ class BME280:
 
         self.dig_H6 = unpack_from("<b", dig_e1_e7, 6)[0]
 
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
-                             bytearray([0x3F]))
-        self.t_fine = 0
+    @property
+    def calibration(self):
+        """ Parsed calibration coefficients packed as
+            BME280_CALIBRATION_FORMAT, may be given to the constructor later
+            to skip reading them from the sensor
+        """
 
-        # temporary data holders which stay allocated
-        self._l1_barray = bytearray(1)
-        self._l8_barray = bytearray(8)
-        self._l3_resultarray = array("i", [0, 0, 0])
+        return pack(BME280_CALIBRATION_FORMAT, self.dig_T1, self.dig_T2,
+                    self.dig_T3, self.dig_P1, self.dig_P2, self.dig_P3,
+                    self.dig_P4, self.dig_P5, self.dig_P6, self.dig_P7,
+                    self.dig_P8, self.dig_P9, self.dig_H1, self.dig_H2,
+                    self.dig_H3, self.dig_H4, self.dig_H5, self.dig_H6)
+
+    def _set_oversampling(self, osrs_t, osrs_p, osrs_h):
+        # temperature is always needed, pressure and humidity compensation
+        # depend on it
+        self._osrs_t = _check_oversampling(
+            self._mode if osrs_t is None else osrs_t, 'temperature', False)
+        self._osrs_p = _check_oversampling(
+            self._mode if osrs_p is None else osrs_p, 'pressure')
+        self._osrs_h = _check_oversampling(
+            self._mode if osrs_h is None else osrs_h, 'humidity')
+
+    def conversion_time(self):
+        """ Returns maximum duration of one conversion in microseconds """
+
+        return (1250 + _channel_time(self._osrs_t, 2300, 0) +
+                _channel_time(self._osrs_p, 2300, 575) +
+                _channel_time(self._osrs_h, 2300, 575))
+
+    def typical_conversion_time(self):
+        """ Returns typical duration of one conversion in microseconds """
+
+        return (1000 + _channel_time(self._osrs_t, 2000, 0) +
+                _channel_time(self._osrs_p, 2000, 500) +
+                _channel_time(self._osrs_h, 2000, 500))
+
+    def is_measuring(self):
+        """ Returns True while a conversion is running """
+
+        self.i2c.readfrom_mem_into(self.address, BME280_REGISTER_STATUS,
+                                   self._l1_barray)
+        return bool(self._l1_barray[0] & BME280_STATUS_MEASURING)
+
+    def wait_for_conversion(self, max_time_us):
+        """ Waits until conversion started by start_conversion is finished.
+            Sleeps for the typical conversion time and then polls status
+            register, so it returns as soon as the data is ready but no later
+            than max_time_us. Measured time is kept in last_conversion_us.
+
+            Args:
+                max_time_us: worst case conversion time, as returned by
+                start_conversion
+            Returns:
+                None
+        """
+
+        started = time.ticks_us()
+        if not max_time_us:
+            self.last_conversion_us = 0
+            return
+
+        time.sleep_us(min(self.typical_conversion_time(), max_time_us))
+        while self.is_measuring():
+            elapsed = time.ticks_diff(time.ticks_us(), started)
+            if elapsed >= max_time_us:
+                break
+
+            time.sleep_us(min(BME280_STATUS_POLL_INTERVAL,
+                              max_time_us - elapsed))
+
+        self.last_conversion_us = time.ticks_diff(time.ticks_us(), started)
+
+    def configure_normal_mode(self,
+                              standby=BME280_STANDBY_1000,
+                              iir_filter=BME280_IIR_FILTER_OFF,
+                              osrs_t=None,
+                              osrs_p=None,
+                              osrs_h=None):
+        """ Switches the sensor to normal mode, where it converts
+            continuously and the latest result is read without waiting.
+
+            Args:
+                standby: one of BME280_STANDBY_* values, inactive time
+                between conversions
+                iir_filter: one of BME280_IIR_FILTER_* values
+                osrs_t, osrs_p, osrs_h: BME280_OSAMPLE_* values for
+                temperature, pressure and humidity, mode given to the
+                constructor is used when None. Pressure and humidity may be
+                BME280_OSAMPLE_SKIP
+            Returns:
+                time in microseconds until the first result is available
+        """
+
+        self._set_oversampling(osrs_t, osrs_p, osrs_h)
+
+        # config register writes may be ignored outside of sleep mode
+        self._write_control(BME280_MODE_SLEEP)
+        self._l1_barray[0] = (standby & 0x7) << 5 | (iir_filter & 0x7) << 2
+        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONFIG,
+                             self._l1_barray)
+        self._write_control(BME280_MODE_NORMAL)
+        self._normal_mode = True
+
+        return self.conversion_time()
+
+    def start_conversion(self):
+        """ Triggers a forced mode conversion without waiting for it. Does
+            nothing in normal mode, where the sensor converts on its own.
+
+            Returns:
+                time in microseconds after which the result can be read
+                with read_raw_result
+        """
+
+        if self._normal_mode:
+            return 0
+
+        self._write_control(BME280_MODE_FORCED)
+        return self.conversion_time()
 
     def read_raw_data(self, result):
         """ Reads the raw (uncompensated) data from the sensor.
@@ -107,17 +367,18 @@ class BME280:
                 None
         """
 
-        self._l1_barray[0] = self._mode
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL_HUM,
-                             self._l1_barray)
-        self._l1_barray[0] = self._mode << 5 | self._mode << 2 | 1
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
-                             self._l1_barray)
+        self.wait_for_conversion(self.start_conversion())
+        self.read_raw_result(result)
 
-        sleep_time = 1250 + 2300 * (1 << self._mode)
-        sleep_time = sleep_time + 2300 * (1 << self._mode) + 575
-        sleep_time = sleep_time + 2300 * (1 << self._mode) + 575
-        time.sleep_us(sleep_time)  # Wait the required time
+    def read_raw_result(self, result):
+        """ Reads the raw (uncompensated) result of the last conversion.
+
+            Args:
+                result: array of length 3 or alike where the result will be
+                stored, in temperature, pressure, humidity order
+            Returns:
+                None
+        """
 
         # burst readout from 0xF7 to 0xFE, recommended by datasheet
         self.i2c.readfrom_mem_into(self.address, 0xF7, self._l8_barray)
@@ -137,24 +398,71 @@ class BME280:
         """ Reads the data from the sensor and returns the compensated data.
 
             Args:
-                result: array of length 3 or alike where the result will be
+                result: list of length 3 or alike where the result will be
                 stored, in temperature, pressure, humidity order. You may use
                 this to read out the sensor without allocating heap memory
 
             Returns:
-                array with temperature, pressure, humidity. Will be the one from
-                the result parameter if not None
+                list with temperature, pressure, humidity. Will be the one from
+                the result parameter if not None. Skipped channels are None
         """
         self.read_raw_data(self._l3_resultarray)
-        raw_temp, raw_press, raw_hum = self._l3_resultarray
+        return self.compensate(self._l3_resultarray, result)
+
+    def compensate(self, raw, result=None):
+        """ Compensates raw data using the sensor calibration.
+
+            Args:
+                raw: array of length 3 or alike with raw data, in temperature,
+                pressure, humidity order
+                result: list of length 3 or alike where the result will be
+                stored, may be the same as raw. Skipped channels are stored
+                as None, so it may be an array only when none are skipped
+
+            Returns:
+                list with temperature, pressure, humidity. Will be the one from
+                the result parameter if not None. Skipped channels are None
+        """
+        raw_temp, raw_press, raw_hum = raw
         # temperature
-        var1 = ((raw_temp >> 3) - (self.dig_T1 << 1)) * (self.dig_T2 >> 11)
+        temp = self._compensate_temperature(raw_temp)
+
+        # pressure
+        if self._osrs_p == BME280_OSAMPLE_SKIP:
+            pressure = None
+        else:
+            pressure = self._compensate_pressure(raw_press)
+
+        # humidity
+        if self._osrs_h == BME280_OSAMPLE_SKIP:
+            humidity = None
+        else:
+            humidity = self._compensate_humidity(raw_hum)
+
+        if result:
+            result[0] = temp
+            result[1] = pressure
+            result[2] = humidity
+            return result
+
+        return [temp, pressure, humidity]
+
+    def _compensate_temperature(self, raw_temp):
+        if bme280_native:
+            self.t_fine = bme280_native.t_fine(raw_temp, self._calibration)
+            return (self.t_fine * 5 + 128) >> 8
+
+        var1 = (((raw_temp >> 3) - (self.dig_T1 << 1)) * self.dig_T2) >> 11
         var2 = (((((raw_temp >> 4) - self.dig_T1) *
                   ((raw_temp >> 4) - self.dig_T1)) >> 12) * self.dig_T3) >> 14
         self.t_fine = var1 + var2
-        temp = (self.t_fine * 5 + 128) >> 8
+        return (self.t_fine * 5 + 128) >> 8
+
+    def _compensate_pressure(self, raw_press):
+        if bme280_native:
+            return bme280_native.pressure(raw_press, self.t_fine,
+                                          self._calibration)
 
-        # pressure
         var1 = self.t_fine - 128000
         var2 = var1 * var1 * self.dig_P6
         var2 = var2 + ((var1 * self.dig_P5) << 17)
@@ -163,15 +471,19 @@ class BME280:
                 ((var1 * self.dig_P2) << 12))
         var1 = (((1 << 47) + var1) * self.dig_P1) >> 33
         if var1 == 0:
-            pressure = 0
-        else:
-            p = 1048576 - raw_press
-            p = (((p << 31) - var2) * 3125) // var1
-            var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
-            var2 = (self.dig_P8 * p) >> 19
-            pressure = ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
+            return 0
+
+        p = 1048576 - raw_press
+        p = (((p << 31) - var2) * 3125) // var1
+        var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
+        var2 = (self.dig_P8 * p) >> 19
+        return ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
+
+    def _compensate_humidity(self, raw_hum):
+        if bme280_native:
+            return bme280_native.humidity(raw_hum, self.t_fine,
+                                          self._calibration)
 
-        # humidity
         h = self.t_fine - 76800
         h = (((((raw_hum << 14) - (self.dig_H4 << 20) -
                 (self.dig_H5 * h)) + 16384)
@@ -181,27 +493,125 @@ class BME280:
         h = h - (((((h >> 15) * (h >> 15)) >> 7) * self.dig_H1) >> 4)
         h = 0 if h < 0 else h
         h = 419430400 if h > 419430400 else h
-        humidity = h >> 12
+        return h >> 12
 
-        if result:
-            result[0] = temp
-            result[1] = pressure
-            result[2] = humidity
-            return result
+    def _compensate_pressure_int32(self, raw_press):
+        # datasheet 32-bit integer formula, result in Pa. MicroPython small
+        # ints have 31 bits, so products which need more are split into
+        # exact steps, all of them stay below 2 ** 30 from -40 to 85 degC
+        var1 = (self.t_fine >> 1) - 64000
 
-        return array("i", (temp, pressure, humidity))
+        # ((var1 >> 2) * (var1 >> 2)) >> 11, square of 16-bit value by bytes
+        v = var1 >> 2
+        if v < 0:
+            v = -v
+        vh = v >> 8
+        vl = v & 0xFF
+        square = ((vh * vh) << 5) + ((((vh * vl) << 9) + vl * vl) >> 11)
 
-    @property
-    def values(self):
-        """ human readable values """
+        var2 = square * self.dig_P6
+        var2 = var2 + ((var1 * self.dig_P5) << 1)
+        # ((var2 >> 2) + (dig_P4 << 16)) >> 12, it's used only shifted
+        var2 = (var2 >> 14) + (self.dig_P4 << 4)
+
+        # (((dig_P3 * (square >> 2)) >> 3) + ((dig_P2 * var1) >> 1)) >> 18,
+        # the same as (2 * p3_term + dig_P2 * var1) >> 19 where var1 is
+        # split into its high and low 10 bits
+        square = square >> 2
+        p3_term = (self.dig_P3 * (square >> 3) +
+                   ((self.dig_P3 * (square & 0x7)) >> 3))
+        var1 = ((((p3_term << 1) + self.dig_P2 * (var1 & 0x3FF)) >> 10) +
+                self.dig_P2 * (var1 >> 10)) >> 9
+
+        # ((32768 + var1) * dig_P1) >> 15 with both products below 2 ** 30
+        var1 = 32768 + var1
+        var1 = ((var1 * (self.dig_P1 >> 8)) +
+                ((var1 * (self.dig_P1 & 0xFF)) >> 8)) >> 7
+        if var1 == 0:
+            return 0
+
+        # p * 3125 is unsigned 32-bit in the datasheet, here the division is
+        # done on quotient and remainder so no product exceeds 2 ** 30
+        p = (1048576 - raw_press) - var2
+        q = p // var1
+        rem = p - q * var1
+        if p < 687195:  # p * 3125 < 0x80000000
+            p = q * 6250 + (rem * 6250) // var1
+        else:
+            p = (q * 3125 + (rem * 3125) // var1) * 2
+
+        var1 = (self.dig_P9 * (((p >> 3) * (p >> 3)) >> 13)) >> 12
+        var2 = ((p >> 2) * self.dig_P8) >> 13
+        return p + ((var1 + var2 + self.dig_P7) >> 4)
+
+    def compensate_int32(self, raw, result=None):
+        """ Compensates raw data with the datasheet 32-bit integer formulas.
+            All intermediate values are MicroPython small ints, so nothing
+            is allocated on the heap when result is given.
+
+            Args:
+                raw: array of length 3 or alike with raw data, in temperature,
+                pressure, humidity order
+                result: list of length 3 or alike where the result will be
+                stored, may be the same as raw when no channel is skipped
+
+            Returns:
+                list with temperature (0.01 degC), pressure (Pa as Q24.8,
+                in whole Pa) and humidity (%RH as Q22.10), the same units as
+                compensate() returns. Will be the one from the result
+                parameter if not None. Skipped channels are None
+        """
+        if result is None:
+            result = [0, 0, 0]
+
+        # raw values are taken before result is written, it may be raw itself
+        raw_press = raw[1]
+        raw_hum = raw[2]
+        result[0] = self._compensate_temperature(raw[0])
+        if self._osrs_p == BME280_OSAMPLE_SKIP:
+            result[1] = None
+        else:
+            result[1] = self._compensate_pressure_int32(raw_press) << 8
+
+        if self._osrs_h == BME280_OSAMPLE_SKIP:
+            result[2] = None
+        else:
+            result[2] = self._compensate_humidity(raw_hum)
+
+        return result
+
+    def read_int32(self, result=None):
+        """ Reads the data from the sensor and compensates it with
+            compensate_int32, without allocating heap memory.
+
+            Args:
+                result: list of length 3 or alike where the result will be
+                stored. When None, internal list is used and overwritten
+                by the next read
+
+            Returns:
+                list with temperature (0.01 degC), pressure (Pa as Q24.8)
+                and humidity (%RH as Q22.10), skipped channels are None
+        """
+        self.read_raw_data(self._l3_resultarray)
+        if result is None:
+            result = self._l3_resultlist
+
+        return self.compensate_int32(self._l3_resultarray, result)
+
+    def read_snapshot(self):
+        """ Reads all three channels from a single conversion.
+
+            Returns:
+                BME280Reading with compensated temperature, pressure and
+                humidity, all taken at the same instant
+        """
 
         t, p, h = self.read_compensated_data()
+        return BME280Reading(t, p, h)
 
-        p = p // 256
-        pi = p // 100
-        pd = p - pi * 100
+    @property
+    def values(self):
+        """ human readable values """
 
-        hi = h // 1024
-        hd = h * 100 // 1024 - hi * 100
-        return ("{}C".format(t / 100), "{}.{:02d}hPa".format(pi, pd),
-                "{}.{:02d}%".format(hi, hd))
+        return format_reading(self.read_snapshot())
@@ -13,23 +13,42 @@ from ucollections import namedtuple
 from umqtt.simple import MQTTClient
 
 import consts
-import functools
 import secrets
+import telemetry_frame
 from battery_info import PicoWBatteryInfo
+from calibration_cache import CalibrationCache
 from internal_temperature_sensor import InternalTemperatureSensor
+from measurements_buffer import MeasurementsBuffer
 from misc import get_machine_unique_id
 from retry_exception import retry_exception
+from uplink_backoff import UplinkBackoff
 from uptime_counter import UptimeCounter
+from wifi_cache import WiFiConnectionCache
+from wifi_join import join_wifi
 
 try:
-    from typing import Callable, Dict, Tuple
+    from typing import Dict, Tuple
 except ImportError:
     pass
 
 Bme280Data = namedtuple("Bme280Data", ("temperature", "pressure", "humidity"))
 
 i2c = machine.I2C(0, sda=machine.Pin(0), scl=machine.Pin(1), freq=400_000)
-bme = bme280.BME280(i2c=i2c)
+wifi_cache = WiFiConnectionCache()
+calibration_cache = CalibrationCache()
+uptime_counter = UptimeCounter()
+
+
+def create_bme280() -> bme280.BME280:
+    return calibration_cache.create_sensor(
+        i2c,
+        osrs_t=consts.BME280_OSAMPLE_TEMPERATURE,
+        osrs_p=consts.BME280_OSAMPLE_PRESSURE,
+        osrs_h=consts.BME280_OSAMPLE_HUMIDITY
+    )
+
+
+bme = create_bme280()
 
 
 @retry_exception(attempts=3, delay_seconds=5)
@@ -41,51 +60,50 @@ def setup_current_timestamp() -> None:
         raise
 
 
-def get_current_timestamp_iso() -> str:
-    localtime = time.localtime()
+def get_current_timestamp_iso(seconds_ago: int = 0) -> str:
+    localtime = time.localtime(time.time() - seconds_ago)
     return f"{localtime[0]}-{localtime[1]:02}-{localtime[2]:02} {localtime[3]:02}:{localtime[4]:02}:{localtime[5]:02}"
 
 
 @retry_exception(attempts=2, delay_seconds=5)
-def read_bme280_values() -> Bme280Data:
-    return Bme280Data(
-        temperature=bme.values[0],
-        pressure=bme.values[1],
-        humidity=bme.values[2]
-    )
+def read_bme280_snapshot() -> bme280.BME280Reading:
+    reading = bme.read_snapshot()
+    print(f"BME280 conversion took {bme.last_conversion_us} us (worst case {bme.conversion_time()} us)")
+    return reading
+
+
+def bme280_data_to_dict(measurements: Bme280Data) -> Dict:
+    data = {"temperature": measurements.temperature}
+
+    # channels with skipped oversampling aren't measured, so they aren't sent at all
+    if measurements.pressure is not None:
+        data["pressure"] = measurements.pressure
+
+    if measurements.humidity is not None:
+        data["humidity"] = measurements.humidity
+
+    return data
 
 
 @retry_exception(attempts=3, delay_seconds=5)
-def connect_to_wifi() -> Tuple[str, str]:
+def connect_to_wifi() -> Tuple[str, str, int]:
     """
-    Connects to Wi-Fi and returns IP and adapter MAC address
+    Connects to Wi-Fi and returns IP, adapter MAC address and connection time in milliseconds
     """
 
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
 
-    print(f"Trying connect to WiFi (SSID = {secrets.WIFI_SSID})")
-    wlan.connect(secrets.WIFI_SSID, secrets.WIFI_PASSWORD)
-
-    MAX_OPERATION_TIME_MSECS = 60 * 1000
-    CONNECTION_POLLING_INTERVAL_SECS = 1
-
     ticks_start = time.ticks_ms()
-    while not wlan.isconnected():
-        print("Waitinig for WiFi connection ... ")
-        # led.toggle()
-        now = time.ticks_ms()
-        if time.ticks_diff(now, ticks_start) > MAX_OPERATION_TIME_MSECS:
-            raise Exception("Can't connect to Wi-Fi")
-
-        time.sleep(CONNECTION_POLLING_INTERVAL_SECS)
+    join_wifi(wlan, wifi_cache)
+    connection_time_ms = time.ticks_diff(time.ticks_ms(), ticks_start)
 
     ip = wlan.ifconfig()[0]
-    print(f"Connected on {ip}")
+    print(f"Connected on {ip} in {connection_time_ms} ms")
     print(f"Full config: {wlan.ifconfig()}")
 
     mac_address = ubinascii.hexlify(network.WLAN().config('mac'), ':').decode()
-    return ip, mac_address
+    return ip, mac_address, connection_time_ms
 
 
 @retry_exception(attempts=2, delay_seconds=5)
@@ -98,7 +116,9 @@ def mqtt_connect() -> MQTTClient:
         password=secrets.MQTT_PASSWORD,
         keepalive=60,
         ssl=False,
-        ssl_params={}
+        ssl_params={},
+        # waiting for PUBACK which never comes mustn't keep radio on until battery is flat
+        socket_timeout=consts.MQTT_SOCKET_TIMEOUT_SECS
     )
     client.connect(clean_session=True)
     print(f'Connected to MQTT Broker {secrets.MQTT_SERVER}...')
@@ -116,55 +136,151 @@ def get_python_version() -> str:
     return f"{v[0]}.{v[1]}.{v[2]}"
 
 
-def enrich_metadata(
-        packet: Dict,
-        mac_address: str,
+def pack_measurements_record(
         internal_temp_sensor: InternalTemperatureSensor,
-        uptime_counter: UptimeCounter,
         current_voltage: float = None,
         charge_percentage: float = None
-):
+) -> bytes:
     """
-    Enriches payload with additional metadata
+    Packs measurements taken during this wake-up into compact binary record
     """
 
-    packet["metadata"] = {
-        "wifi_mac_address": mac_address,
-        "machine_unique_id": get_machine_unique_id(),
-        "measurement_time": get_current_timestamp_iso(),
-        "machine_metrics": {
-            "uptime": uptime_counter.uptime_ms(),
-            "python_version": get_python_version(),
-            "cpu_temperature": internal_temp_sensor.current_temperature(),
-            "mem_free": gc.mem_free(),
-            "frequency": machine.freq(),
-            "flash_free_space_bytes": get_fs_free_space_in_bytes(),
-            "power": {
-                "current_voltage": current_voltage,
-                "charge_percentage": charge_percentage
+    return telemetry_frame.pack_record(
+        uptime_ms=uptime_counter.uptime_ms(),
+        bme280_reading=read_bme280_snapshot(),
+        cpu_temperature=internal_temp_sensor.current_temperature(),
+        mem_free=gc.mem_free(),
+        flash_free_space_bytes=get_fs_free_space_in_bytes(),
+        current_voltage=current_voltage,
+        charge_percentage=charge_percentage
+    )
+
+
+def send_measurements_records(
+        client: MQTTClient,
+        mac_address: str,
+        wifi_connect_time_ms: int,
+        epoch: int,
+        first_sequence: int,
+        records: bytes
+) -> None:
+    """
+    Sends buffered records as a single frame or, when there are several of them, as one batch
+    """
+
+    records_count = len(records) // telemetry_frame.RECORD_SIZE
+    machine_unique_id = machine.unique_id()
+    mac_address = ubinascii.unhexlify(mac_address.replace(":", ""))
+
+    if records_count == 1:
+        message = telemetry_frame.pack_frame(
+            machine_unique_id=machine_unique_id,
+            mac_address=mac_address,
+            python_version=sys.version_info,
+            frequency=machine.freq(),
+            wifi_connect_time_ms=wifi_connect_time_ms,
+            epoch=epoch,
+            sequence=first_sequence,
+            record=records
+        )
+    else:
+        message = telemetry_frame.pack_batch(
+            machine_unique_id=machine_unique_id,
+            mac_address=mac_address,
+            python_version=sys.version_info,
+            frequency=machine.freq(),
+            wifi_connect_time_ms=wifi_connect_time_ms,
+            interval_secs=consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_SECS,
+            epoch=epoch,
+            first_sequence=first_sequence,
+            records=records
+        )
+
+    print(f"Sending {records_count} measurements ({len(message)} bytes) via MQTT")
+    # with QoS 1 buffer is cleared only after broker confirmed the message
+    client.publish_pipelined(secrets.MQTT_TOPIC_PUB, [message])
+
+
+def record_to_payload(
+        record: bytes,
+        mac_address: str,
+        wifi_connect_time_ms: int,
+        epoch: int,
+        sequence: int
+) -> Dict:
+    """
+    Converts buffered record into JSON message, journal epoch and sequence number let host drop
+    messages which were already received. Measurement time is told by record uptime, so it's
+    right also for records buffered during failed uplinks
+    """
+
+    (
+        uptime_ms, bme280_reading, cpu_temperature, mem_free, flash_free_space_bytes, current_voltage, charge_percentage
+    ) = telemetry_frame.unpack_record(record)
+    measured_secs_ago = uptime_counter.ms_since(uptime_ms) // 1000
+
+    return {
+        "payload": {
+            "bme280": bme280_data_to_dict(Bme280Data(*bme280.format_reading(bme280_reading))),
+        },
+        "metadata": {
+            "wifi_mac_address": mac_address,
+            "machine_unique_id": get_machine_unique_id(),
+            "measurement_time": get_current_timestamp_iso(measured_secs_ago),
+            "journal": {
+                "epoch": epoch,
+                "sequence": sequence
+            },
+            "machine_metrics": {
+                "uptime": uptime_ms,
+                "python_version": get_python_version(),
+                "cpu_temperature": cpu_temperature,
+                "mem_free": mem_free,
+                "frequency": machine.freq(),
+                "flash_free_space_bytes": flash_free_space_bytes,
+                "wifi_connect_time_ms": wifi_connect_time_ms,
+                "power": {
+                    "current_voltage": current_voltage,
+                    "charge_percentage": charge_percentage
+                }
             }
         }
     }
 
 
-def send_measurements(client: MQTTClient, enricher: Callable) -> None:
-    bme280_data = read_bme280_values()
+def send_measurements_json(
+        client: MQTTClient,
+        mac_address: str,
+        wifi_connect_time_ms: int,
+        epoch: int,
+        first_sequence: int,
+        records: bytes
+) -> None:
+    """
+    Sends buffered records as JSON messages, one per record, oldest first. Messages are published
+    with QoS 1 and several of them are unconfirmed at a time, so a long backlog isn't sent at one
+    broker round trip per message. They are encoded only when there is room in the window
+    """
 
-    payload = {
-        "payload": {
-            "bme280": {
-                "temperature": bme280_data.temperature,
-                "pressure": bme280_data.pressure,
-                "humidity": bme280_data.humidity
-            },
-        },
+    records_count = len(records) // telemetry_frame.RECORD_SIZE
 
-    }
-    enricher(payload)
-    payload = ujson.dumps(payload)
+    def payloads():
+        for index in range(records_count):
+            newer_records_count = records_count - 1 - index
+            payload = record_to_payload(
+                records[index * telemetry_frame.RECORD_SIZE:(index + 1) * telemetry_frame.RECORD_SIZE],
+                mac_address=mac_address,
+                # connection was made to send the most recent record only
+                wifi_connect_time_ms=None if newer_records_count else wifi_connect_time_ms,
+                epoch=epoch,
+                sequence=(first_sequence + index) & 0xFFFFFFFF
+            )
+            payload = ujson.dumps(payload)
 
-    print(f"Sending measurements via MQTT: {payload}")
-    client.publish(secrets.MQTT_TOPIC_PUB, msg=payload)
+            print(f"Sending measurements via MQTT: {payload}")
+            yield payload
+
+    client.publish_pipelined(secrets.MQTT_TOPIC_PUB, payloads(), window=consts.MQTT_PUBLISH_WINDOW)
 
 
 def deactivate_wifi() -> None:
@@ -172,9 +288,16 @@ def deactivate_wifi() -> None:
     wlan.active(False)
 
 
+def deep_sleep(interval_secs: int) -> None:
+    uptime_counter.save(sleep_ms=interval_secs * 1000)
+    machine.Pin("WL_GPIO1", machine.Pin.OUT).low()
+    machine.Pin(23, machine.Pin.OUT).low()
+    machine.deepsleep(interval_secs * 1000)
+    machine.reset()
+
+
 def main():
     try:
-        uptime_counter = UptimeCounter()
         print(f"Current timestamp is: {get_current_timestamp_iso()}")
 
         print("Measuring battery charge level")
@@ -184,41 +307,67 @@ def main():
         print(f"Current battery voltage level: {current_voltage}")
         print(f"Battery charge percentage level: {charge_percentage}")
 
-        print("Connecting to Wi-Fi")
-        _, mac_address = connect_to_wifi()
-
-        print("Confuguring current timestamp")
-        # setup_current_timestamp()
-
-        mqtt_client = mqtt_connect()
-
         internal_temp_sensor = InternalTemperatureSensor()
-        enricher = functools.partial(
-            enrich_metadata,
-            mac_address=mac_address,
-            internal_temp_sensor=internal_temp_sensor,
-            current_voltage=current_voltage,
-            charge_percentage=charge_percentage,
-            uptime_counter=uptime_counter
+        use_binary_format = consts.TELEMETRY_FORMAT == consts.TELEMETRY_FORMAT_BINARY
+
+        # measurement is kept in flash until it is delivered, so it survives failed uplinks
+        measurements_buffer = MeasurementsBuffer(
+            record_size=telemetry_frame.RECORD_SIZE,
+            capacity=consts.MEASUREMENTS_BUFFER_CAPACITY
+        )
+        measurements_buffer.append(
+            pack_measurements_record(
+                internal_temp_sensor=internal_temp_sensor,
+                current_voltage=current_voltage,
+                charge_percentage=charge_percentage
+            )
         )
 
+        uplink_backoff = UplinkBackoff(
+            every_n_wakeups=consts.UPLINK_EVERY_N_WAKEUPS if use_binary_format else 1,
+            max_backoff_exponent=consts.UPLINK_MAX_BACKOFF_EXPONENT
+        )
+        buffered_count = measurements_buffer.count()
+        if not uplink_backoff.should_try(buffered_count):
+            print(f"Buffered {buffered_count} measurements, skipping uplink")
+            deep_sleep(consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_SECS)
+
+        try:
+            print("Connecting to Wi-Fi")
+            _, mac_address, wifi_connect_time_ms = connect_to_wifi()
+
+            print("Confuguring current timestamp")
+            # setup_current_timestamp()
+
+            mqtt_client = mqtt_connect()
+        except Exception:
+            # buffered measurements are kept, next attempt is made a few wake-ups later
+            uplink_backoff.on_failure()
+            print(f"Uplink failed {uplink_backoff.failed_uplinks} times in a row")
+            raise
+
+        send_measurements = send_measurements_records if use_binary_format else send_measurements_json
         send_measurements(
             mqtt_client,
-            enricher=enricher
+            mac_address=mac_address,
+            wifi_connect_time_ms=wifi_connect_time_ms,
+            epoch=measurements_buffer.epoch,
+            first_sequence=measurements_buffer.first_sequence,
+            records=measurements_buffer.read_all()
         )
+        measurements_buffer.clear()
+        uplink_backoff.on_success()
 
         mqtt_client.disconnect()
         deactivate_wifi()
         time.sleep(1)
 
-        machine.Pin("WL_GPIO1", machine.Pin.OUT).low()
-        machine.Pin(23, machine.Pin.OUT).low()
-        machine.deepsleep(consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_SECS * 1000)
-        machine.reset()
+        deep_sleep(consts.SLEEP_INTERVAL_BETWEEN_MEASUREMENTS_SECS)
     except Exception as e:
         print(f"Error in main loop: {e}")
         import sys
         sys.print_exception(e)
+        uptime_counter.save(sleep_ms=consts.SLEEP_INTERVAL_ON_ERROR_SECS * 1000)
         machine.deepsleep(consts.SLEEP_INTERVAL_ON_ERROR_SECS * 1000)
         machine.reset()
 
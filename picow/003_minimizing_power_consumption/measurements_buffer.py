@@ -0,0 +1,149 @@
+import os
+
+import ustruct
+
+# journal epoch, sequence number of the first buffered record, number of the oldest segment file
+_STATE_FORMAT = "<HII"
+_STATE_SIZE = ustruct.calcsize(_STATE_FORMAT)
+
+
+class MeasurementsBuffer(object):
+    """
+    Buffer of fixed size records stored in flash files, so it survives deep sleep and resets.
+    Records are appended to segment files of segment_size records, when buffer is full the
+    oldest segment file is removed whole, so flash is never rewritten. Capacity is rounded down
+    to whole segments.
+
+    Every record ever appended gets the next sequence number, so receiver can drop records it has
+    already seen. Sequence numbers start from 0 in a new random epoch when state file is lost
+    """
+
+    def __init__(
+            self,
+            record_size: int,
+            capacity: int,
+            segment_size: int = 24,
+            file_name_prefix: str = "measurements_",
+            state_file_name: str = "measurements_state.bin"
+    ):
+        if record_size < 1:
+            raise ValueError("The record_size must be greater than 0")
+
+        if segment_size < 1:
+            raise ValueError("The segment_size must be greater than 0")
+
+        if capacity < segment_size:
+            raise ValueError("The capacity must not be less than segment_size")
+
+        self.record_size = record_size
+        self.segment_size = segment_size
+        self.max_segments = capacity // segment_size
+        self.capacity = self.max_segments * segment_size
+        self.file_name_prefix = file_name_prefix
+        self.state_file_name = state_file_name
+        self.epoch, self.first_sequence, self.first_segment = self._load_state()
+
+        # left when power was lost after the oldest segment was dropped from state
+        self._remove(self._segment_file_name(self.first_segment - 1))
+
+    def _load_state(self) -> tuple:
+        try:
+            with open(self.state_file_name, "rb") as f:
+                data = f.read()
+
+            if len(data) == _STATE_SIZE:
+                return ustruct.unpack(_STATE_FORMAT, data)
+        except OSError:
+            pass
+
+        epoch = ustruct.unpack("<H", os.urandom(2))[0]
+        self._save_state(epoch, 0, 0)
+        return epoch, 0, 0
+
+    def _save_state(self, epoch: int, first_sequence: int, first_segment: int) -> None:
+        with open(self.state_file_name, "wb") as f:
+            f.write(ustruct.pack(_STATE_FORMAT, epoch, first_sequence & 0xFFFFFFFF, first_segment & 0xFFFFFFFF))
+
+    def _segment_file_name(self, segment: int) -> str:
+        return f"{self.file_name_prefix}{segment & 0xFFFFFFFF}.bin"
+
+    @staticmethod
+    def _remove(file_name: str) -> None:
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
+
+    def _segments(self) -> list:
+        """
+        Returns (segment number, size in bytes) of segment files, oldest first
+        """
+
+        segments = []
+        segment = self.first_segment
+        while True:
+            try:
+                size = os.stat(self._segment_file_name(segment))[6]
+            except OSError:
+                return segments
+
+            segments.append((segment, size))
+            segment += 1
+
+    def count(self) -> int:
+        return sum(size // self.record_size for _, size in self._segments())
+
+    def append(self, record: bytes) -> None:
+        if len(record) != self.record_size:
+            raise ValueError(f"Unexpected record size {len(record)}, expected {self.record_size}")
+
+        segments = self._segments()
+        if not segments:
+            segment = self.first_segment
+        else:
+            segment, size = segments[-1]
+            # partially written record, e.g. after power loss during append, stays at the end of its segment
+            if size >= self.segment_size * self.record_size or size % self.record_size:
+                segment += 1
+                if len(segments) >= self.max_segments:
+                    self._drop_oldest(segments[0][1])
+
+        with open(self._segment_file_name(segment), "ab") as f:
+            f.write(record)
+
+    def read_all(self) -> bytes:
+        """
+        Returns all buffered records concatenated, oldest first
+        """
+
+        records = []
+        for segment, size in self._segments():
+            with open(self._segment_file_name(segment), "rb") as f:
+                records.append(f.read(size - size % self.record_size))
+
+        return b"".join(records)
+
+    def clear(self) -> None:
+        """
+        Drops all records, e.g. after they were delivered. Their sequence numbers are never reused
+        """
+
+        segments = self._segments()
+        if not segments:
+            return
+
+        records_count = sum(size // self.record_size for _, size in segments)
+        self.first_sequence = (self.first_sequence + records_count) & 0xFFFFFFFF
+        self.first_segment = 0
+        self._save_state(self.epoch, self.first_sequence, self.first_segment)
+
+        for segment, _ in segments:
+            self._remove(self._segment_file_name(segment))
+
+    def _drop_oldest(self, size: int) -> None:
+        # state is saved first, so records of removed segment are never numbered twice
+        segment = self.first_segment
+        self.first_sequence = (self.first_sequence + size // self.record_size) & 0xFFFFFFFF
+        self.first_segment = (segment + 1) & 0xFFFFFFFF
+        self._save_state(self.epoch, self.first_sequence, self.first_segment)
+        self._remove(self._segment_file_name(segment))
@@ -0,0 +1,62 @@
+import os
+
+import ujson
+
+
+class UplinkBackoff(object):
+    """
+    Decides on which wake-up to connect and send buffered measurements. After each failed
+    connection the next attempt is made exponentially later, so outages of Wi-Fi or MQTT broker
+    don't cost radio time on every wake-up. State is kept in flash
+    """
+
+    def __init__(self, every_n_wakeups: int, max_backoff_exponent: int, file_name: str = "uplink_backoff.json"):
+        if every_n_wakeups < 1:
+            raise ValueError("The every_n_wakeups must be greater than 0")
+
+        self.every_n_wakeups = every_n_wakeups
+        self.max_backoff_exponent = max_backoff_exponent
+        self.file_name = file_name
+        self.failed_uplinks, self.wakeups_to_skip = self._load()
+
+    def _load(self) -> tuple:
+        try:
+            with open(self.file_name, "r") as f:
+                data = ujson.load(f)
+
+            return data["failed_uplinks"], data["wakeups_to_skip"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0, 0
+
+    def _save(self) -> None:
+        with open(self.file_name, "w") as f:
+            ujson.dump({"failed_uplinks": self.failed_uplinks, "wakeups_to_skip": self.wakeups_to_skip}, f)
+
+    def should_try(self, buffered_count: int) -> bool:
+        """
+        Called once per wake-up, returns True when uplink should be made now
+        """
+
+        if self.wakeups_to_skip > 0:
+            self.wakeups_to_skip -= 1
+            self._save()
+            return False
+
+        return buffered_count >= self.every_n_wakeups
+
+    def on_failure(self) -> None:
+        self.failed_uplinks += 1
+        exponent = min(self.failed_uplinks, self.max_backoff_exponent)
+        self.wakeups_to_skip = self.every_n_wakeups * (1 << exponent) - 1
+        self._save()
+
+    def on_success(self) -> None:
+        if not self.failed_uplinks and not self.wakeups_to_skip:
+            return
+
+        self.failed_uplinks = 0
+        self.wakeups_to_skip = 0
+        try:
+            os.remove(self.file_name)
+        except OSError:
+            pass
@@ -1,9 +1,61 @@
 import time
 
+import ustruct
+
+# uptime (ms) at the moment of saving, including planned sleep
+STATE_FORMAT = "<Q"
+
 
 class UptimeCounter(object):
-    def __init__(self):
-        self._uptime = time.ticks_ms()
+    """
+    Milliseconds since the first boot, counted across deep sleeps and resets, so uptime stored with
+    buffered records tells how long ago they were measured, also when some wake-ups failed. Counter
+    is kept in flash by save(), called before deep sleep or reset. Time without power isn't counted
+    and counter goes back to the last saved value when power is lost
+    """
+
+    def __init__(self, file_name: str = "uptime.bin"):
+        self.file_name = file_name
+        self._uptime_ms = self._load()
+        # ticks_ms starts from 0 on every boot
+        self._last_ticks = 0
+
+    def _load(self) -> int:
+        try:
+            with open(self.file_name, "rb") as f:
+                data = f.read()
+        except OSError:
+            return 0
+
+        if len(data) != ustruct.calcsize(STATE_FORMAT):
+            return 0
+
+        return ustruct.unpack(STATE_FORMAT, data)[0]
 
     def uptime_ms(self) -> int:
-        return time.ticks_ms() - self._uptime
+        # ticks wrap after a few days, so they are accumulated on every call
+        now = time.ticks_ms()
+        self._uptime_ms += time.ticks_diff(now, self._last_ticks)
+        self._last_ticks = now
+        return self._uptime_ms
+
+    def ms_since(self, uptime_ms: int) -> int:
+        """
+        Returns time elapsed since given uptime, which may be truncated to 32 bits like in telemetry records.
+        Uptime ahead of the counter, left by power loss before save(), is taken as now
+        """
+
+        elapsed_ms = (self.uptime_ms() - uptime_ms) & 0xFFFFFFFF
+        return 0 if elapsed_ms & 0x80000000 else elapsed_ms
+
+    def save(self, sleep_ms: int = 0) -> None:
+        """
+        Called before deep sleep or reset, sleep_ms is time until the next boot
+        """
+
+        try:
+            with open(self.file_name, "wb") as f:
+                f.write(ustruct.pack(STATE_FORMAT, self.uptime_ms() + sleep_ms))
+        except OSError as e:
+            # it's called on error paths too, clock is only a bit behind when it can't be saved
+            print(f"Can't save uptime: {e}")
@@ -0,0 +1,48 @@
+import os
+
+import ubinascii
+import ujson
+
+
+class WiFiConnectionCache(object):
+    """
+    Keeps parameters of the last successful Wi-Fi connection (access point BSSID and IP
+    configuration) in flash, so next wake-up can join without scan and DHCP. Channel isn't kept,
+    rp2 port can't select it when joining
+    """
+
+    def __init__(self, file_name: str = "wifi_cache.json"):
+        self.file_name = file_name
+
+    def load(self):
+        """
+        Returns tuple of BSSID (bytes or None) and IP configuration tuple or None when there is
+        nothing cached
+        """
+
+        try:
+            with open(self.file_name, "r") as f:
+                data = ujson.load(f)
+
+            bssid = data["bssid"]
+            if bssid:
+                bssid = ubinascii.unhexlify(bssid)
+
+            return bssid, tuple(data["ifconfig"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, bssid, ifconfig: tuple) -> None:
+        data = {
+            "bssid": ubinascii.hexlify(bssid).decode() if bssid else None,
+            "ifconfig": list(ifconfig)
+        }
+
+        with open(self.file_name, "w") as f:
+            ujson.dump(data, f)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.file_name)
+        except OSError:
+            pass
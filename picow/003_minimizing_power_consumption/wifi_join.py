@@ -0,0 +1,96 @@
+import time
+
+import network
+
+import consts
+import secrets
+from wifi_cache import WiFiConnectionCache
+
+# Time given to regular join with scan and DHCP
+WIFI_JOIN_TIMEOUT_MSECS = 60 * 1000
+
+
+def wait_for_wifi_connection(wlan: network.WLAN, timeout_msecs: int) -> bool:
+    ticks_start = time.ticks_ms()
+    while not wlan.isconnected():
+        if wlan.status() < 0:
+            # connection failed, e.g. access point not found or wrong password
+            return False
+
+        if time.ticks_diff(time.ticks_ms(), ticks_start) > timeout_msecs:
+            return False
+
+        time.sleep_ms(consts.WIFI_POLLING_INTERVAL_MSECS)
+
+    return True
+
+
+def find_access_point(wlan: network.WLAN) -> bytes:
+    """
+    Returns BSSID of the strongest access point with our SSID or None when none is visible,
+    e.g. when SSID is hidden
+    """
+
+    best_bssid, best_rssi = None, None
+    for ssid, bssid, _, rssi, _, _ in wlan.scan():
+        if ssid.decode() != secrets.WIFI_SSID:
+            continue
+
+        if best_rssi is None or rssi > best_rssi:
+            best_bssid, best_rssi = bssid, rssi
+
+    return best_bssid
+
+
+def connect(wlan: network.WLAN, bssid: bytes = None) -> None:
+    if bssid:
+        wlan.connect(secrets.WIFI_SSID, secrets.WIFI_PASSWORD, bssid=bssid)
+    else:
+        wlan.connect(secrets.WIFI_SSID, secrets.WIFI_PASSWORD)
+
+
+def fast_join_wifi(wlan: network.WLAN, wifi_cache: WiFiConnectionCache) -> bool:
+    """
+    Joins access point using cached BSSID and static IP configuration, without scan and DHCP
+    """
+
+    cached = wifi_cache.load()
+    if not cached:
+        return False
+
+    bssid, ifconfig = cached
+    print(f"Trying fast connect to WiFi (SSID = {secrets.WIFI_SSID}, IP = {ifconfig[0]})")
+
+    wlan.ifconfig(ifconfig)
+    connect(wlan, bssid)
+    if wait_for_wifi_connection(wlan, consts.WIFI_FAST_JOIN_TIMEOUT_MSECS):
+        return True
+
+    print("Fast connect failed, dropping cached WiFi configuration")
+    wifi_cache.clear()
+    wlan.disconnect()
+    wlan.ifconfig("dhcp")
+    return False
+
+
+def join_wifi(wlan: network.WLAN, wifi_cache: WiFiConnectionCache) -> bool:
+    """
+    Joins Wi-Fi, with fast join enabled tries cached access point first. Otherwise scans once
+    to pick the strongest access point, joins it with DHCP and caches it for next wake-ups.
+    Returns True when cached configuration was used
+    """
+
+    if consts.WIFI_FAST_JOIN and fast_join_wifi(wlan, wifi_cache):
+        return True
+
+    print(f"Trying connect to WiFi (SSID = {secrets.WIFI_SSID})")
+    bssid = find_access_point(wlan) if consts.WIFI_FAST_JOIN else None
+    connect(wlan, bssid)
+
+    if not wait_for_wifi_connection(wlan, WIFI_JOIN_TIMEOUT_MSECS):
+        raise Exception("Can't connect to Wi-Fi")
+
+    if consts.WIFI_FAST_JOIN:
+        wifi_cache.save(bssid, wlan.ifconfig())
+
+    return False
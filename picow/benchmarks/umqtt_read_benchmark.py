@@ -0,0 +1,231 @@
+"""
+Compares byte-at-a-time reads which umqtt.simple2 used before with buffered reads into
+preallocated buffer. Client receives QoS 0 PUBLISH packets from broker stand-in listening on
+local TCP port, when sockets aren't available (or loopback doesn't work) packets are delivered
+from memory in TCP-segment sized pieces instead.
+
+Run with unix port of MicroPython from repository root:
+
+    micropython picow/benchmarks/umqtt_read_benchmark.py
+
+or copy it to Pico W which has lib/umqtt and run it there
+"""
+import gc
+import sys
+
+from utime import ticks_diff, ticks_us
+
+try:
+    sys.path.insert(0, __file__.rsplit("/", 2)[0] + "/003_minimizing_power_consumption/lib")
+except NameError:
+    pass
+
+from umqtt import simple2
+
+try:
+    import usocket as socket
+    import uselect
+except ImportError:
+    socket = None
+
+ROUNDS = 20
+PACKETS_PER_ROUND = 40
+# byte-at-a-time reads allocate quadratically to payload size, so it is kept small enough for Pico W heap
+PAYLOAD_SIZES = (16, 64, 256)
+SEGMENT_SIZE = 1460
+TOPIC = b"picow/benchmark"
+BROKER_PORT = 18830
+
+
+class ByteAtATimeClient(simple2.MQTTClient):
+    """
+    Client with _read of umqtt.simple2 before buffered reads: poll and read(1) for every byte
+    """
+
+    def _read(self, n):
+        try:
+            data = b""
+            for _ in range(n):
+                self._sock_timeout(self.poller_r, self.socket_timeout)
+                data += self.sock.read(1)
+        except AttributeError:
+            raise simple2.MQTTException(8)
+
+        if data == b"":
+            raise simple2.MQTTException(1)
+
+        if len(data) != n:
+            raise simple2.MQTTException(2)
+
+        return data
+
+
+def make_publish_packet(payload_size: int) -> bytes:
+    payload = b"x" * payload_size
+    remaining_length = 2 + len(TOPIC) + len(payload)
+    header = bytearray(b"\x30")
+    while True:
+        digit = remaining_length & 0x7F
+        remaining_length >>= 7
+        header.append(digit | (0x80 if remaining_length else 0))
+        if not remaining_length:
+            break
+
+    return bytes(header) + len(TOPIC).to_bytes(2, "big") + TOPIC + payload
+
+
+class MemoryStream(object):
+    """
+    Delivers written data in pieces of at most segment_size bytes, like TCP socket does
+    """
+
+    def __init__(self, segment_size: int):
+        self.segment_size = segment_size
+        self._data = b""
+        self._offset = 0
+
+    def feed(self, data: bytes) -> None:
+        self._data = self._data[self._offset:] + data
+        self._offset = 0
+
+    def pending(self) -> int:
+        return len(self._data) - self._offset
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.segment_size, self.pending())
+        buffer[:size] = self._data[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+    def read(self, size: int) -> bytes:
+        size = min(size, self.segment_size, self.pending())
+        data = self._data[self._offset:self._offset + size]
+        self._offset += size
+        return data
+
+    def write(self, data, length=-1) -> int:
+        return len(data) if length < 0 else length
+
+
+class MemoryPoller(object):
+    def __init__(self, stream: MemoryStream):
+        self.stream = stream
+
+    def poll(self, timeout):
+        return [(self.stream, 1)] if self.stream.pending() else []
+
+
+class TcpConnection(object):
+    """
+    Broker stand-in: accepted connection on local port which writes packets to the client
+    """
+
+    def __init__(self):
+        listener = socket.socket()
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(socket.getaddrinfo("127.0.0.1", BROKER_PORT)[0][-1])
+        listener.listen(1)
+
+        self.client_sock = socket.socket()
+        self.client_sock.connect(socket.getaddrinfo("127.0.0.1", BROKER_PORT)[0][-1])
+        self.client_sock.settimeout(5)
+        self.broker_sock, _ = listener.accept()
+        listener.close()
+
+    def attach(self, client: simple2.MQTTClient) -> None:
+        client.sock = self.client_sock
+        client.poller_r = uselect.poll()
+        client.poller_r.register(self.client_sock, uselect.POLLIN)
+        client.poller_w = uselect.poll()
+        client.poller_w.register(self.client_sock, uselect.POLLOUT)
+
+    def feed(self, data: bytes) -> None:
+        self.broker_sock.write(data)
+
+    def close(self) -> None:
+        self.client_sock.close()
+        self.broker_sock.close()
+
+
+class MemoryConnection(object):
+    def __init__(self):
+        self.stream = MemoryStream(SEGMENT_SIZE)
+
+    def attach(self, client: simple2.MQTTClient) -> None:
+        client.sock = self.stream
+        client.poller_r = client.poller_w = MemoryPoller(self.stream)
+
+    def feed(self, data: bytes) -> None:
+        self.stream.feed(data)
+
+    def close(self) -> None:
+        pass
+
+
+def open_connection():
+    if socket is not None:
+        try:
+            return TcpConnection(), "local TCP broker stand-in"
+        except (OSError, AttributeError):
+            pass
+
+    return MemoryConnection(), f"in-memory stream ({SEGMENT_SIZE} byte segments)"
+
+
+def run(client_class, payload_size: int) -> tuple:
+    """
+    Returns microseconds and heap bytes allocated per received packet. Time is measured with
+    garbage collector enabled, so it includes collections caused by allocations
+    """
+
+    connection, _ = open_connection()
+    client = client_class("benchmark", "127.0.0.1")
+    client.set_callback(lambda topic, msg, retained, dup: None)
+    connection.attach(client)
+
+    packets = make_publish_packet(payload_size) * PACKETS_PER_ROUND
+    elapsed_us = 0
+    allocated = 0
+    try:
+        for _ in range(ROUNDS):
+            connection.feed(packets)
+            gc.collect()
+            started_at = ticks_us()
+            for _ in range(PACKETS_PER_ROUND):
+                client.check_msg()
+
+            elapsed_us += ticks_diff(ticks_us(), started_at)
+
+        # garbage collector is disabled only while single packet is read, heap can't fit more
+        connection.feed(packets)
+        for _ in range(PACKETS_PER_ROUND):
+            gc.collect()
+            gc.disable()
+            allocated_before = gc.mem_alloc()
+            client.check_msg()
+            allocated += gc.mem_alloc() - allocated_before
+            gc.enable()
+    finally:
+        gc.enable()
+        client.sock = None
+        connection.close()
+
+    return elapsed_us / (ROUNDS * PACKETS_PER_ROUND), allocated / PACKETS_PER_ROUND
+
+
+def main():
+    connection, description = open_connection()
+    connection.close()
+    print(f"{ROUNDS * PACKETS_PER_ROUND} PUBLISH packets per run from {description}")
+
+    for payload_size in PAYLOAD_SIZES:
+        old_us, old_bytes = run(ByteAtATimeClient, payload_size)
+        new_us, new_bytes = run(simple2.MQTTClient, payload_size)
+        print(
+            f"payload {payload_size:>4} bytes: byte-at-a-time {old_us:>8.1f} us {old_bytes:>8.0f} B, "
+            f"buffered {new_us:>8.1f} us {new_bytes:>8.0f} B per packet "
+            f"(x{old_us / new_us:.1f} faster, x{old_bytes / max(new_bytes, 1):.1f} less heap)"
+        )
+
+
+main()
@@ -0,0 +1,41 @@
+"""
+Golden vectors of BME280 compensation shared by all kernels: interpreted and compiled ones in
+picow/*/lib and NumPy one on the host. Expected values are results of the datasheet integer
+formulas from bme280_reference.compensate(), raw readings span the operating range of every
+calibration set: -40..85 degC, 300..1100 hPa and 0..100 %RH. The first vector is the datasheet
+example
+"""
+
+# index in bme280_reference.CALIBRATIONS, raw temperature, raw pressure, raw humidity,
+# temperature (0.01 degC), pressure (Pa as Q24.8), humidity (%RH as Q22.10)
+GOLDEN_VECTORS = (
+    (0, 519888, 415148, 27000, 2508, 25767233, 39190),
+    (0, 313709, 813184, 0, -4000, 7679951, 0),
+    (0, 408368, 602366, 23493, -1000, 16639967, 20482),
+    (0, 440064, 486699, 26393, 0, 21759978, 35846),
+    (0, 519625, 411184, 28205, 2500, 25939136, 46077),
+    (0, 567583, 375384, 30787, 4000, 28159857, 61438),
+    (0, 631788, 503379, 34020, 6000, 23039936, 81916),
+    (0, 712472, 414927, 36960, 8500, 28159965, 102400),
+    (1, 330225, 741245, 0, -4000, 7679961, 0),
+    (1, 424382, 525557, 24716, -1000, 16639928, 20481),
+    (1, 455760, 406414, 27459, 0, 21759995, 35846),
+    (1, 534192, 329439, 28881, 2500, 25939150, 46089),
+    (1, 581240, 293022, 31229, 4000, 28159954, 61450),
+    (1, 643959, 426958, 34149, 6000, 23039891, 81928),
+    (1, 722337, 336372, 36698, 8500, 28159974, 102400),
+    (2, 320230, 728283, 0, -4000, 7679955, 0),
+    (2, 414851, 515739, 25094, -1000, 16639958, 20477),
+    (2, 446384, 398174, 28040, 0, 21759986, 35840),
+    (2, 525202, 322717, 29876, 2500, 25939136, 46081),
+    (2, 572482, 287109, 32498, 4000, 28159951, 61446),
+    (2, 635509, 420086, 35780, 6000, 23039911, 81917),
+    (2, 714273, 331194, 38763, 8500, 28159953, 102400),
+    (3, 323204, 770176, 0, -4000, 7679963, 0),
+    (3, 419087, 559599, 23323, -1000, 16639911, 20482),
+    (3, 451040, 443510, 26193, 0, 21759988, 35847),
+    (3, 530908, 367857, 27990, 2500, 25939130, 46086),
+    (3, 578818, 331958, 30546, 4000, 28159963, 61445),
+    (3, 642684, 461373, 33747, 6000, 23039914, 81922),
+    (3, 722496, 372518, 36659, 8500, 28159971, 102400),
+)
@@ -0,0 +1,201 @@
+"""
+BME280 compensation formulas from the Bosch datasheet (section 4.2.3 and 8.1), used as reference
+for the driver in picow/*/lib/bme280.py, and raw readings for given physical conditions
+"""
+import typing
+
+# dig_T1 .. dig_H6 in BME280_CALIBRATION_FORMAT order. The first one is the datasheet example
+# completed with typical humidity coefficients, others were read from real sensors
+CALIBRATIONS = (
+    (27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000, 75, 362, 0, 313, 50, 30),
+    (28485, 26735, 50, 37799, -10592, 3024, 6617, -53, -7, 9900, -10230, 4285, 75, 362, 0, 326, 0, 30),
+    (27899, 26604, 50, 37379, -10610, 3024, 7463, -133, -7, 9900, -10230, 4285, 75, 356, 0, 337, 50, 30),
+    (28190, 26254, 50, 36883, -10598, 3024, 5371, 57, -7, 12300, -7800, 4285, 75, 366, 0, 311, 50, 30),
+)
+
+# operating range of the sensor
+MIN_TEMPERATURE = -40.0
+MAX_TEMPERATURE = 85.0
+MIN_PRESSURE = 300.0
+MAX_PRESSURE = 1100.0
+
+MAX_RAW_20_BITS = (1 << 20) - 1
+MAX_RAW_16_BITS = (1 << 16) - 1
+
+
+def t_fine_double(raw_temp: int, calibration: typing.Sequence[int]) -> float:
+    t1, t2, t3 = calibration[0:3]
+    var1 = (raw_temp / 16384.0 - t1 / 1024.0) * t2
+    var2 = (raw_temp / 131072.0 - t1 / 8192.0) * (raw_temp / 131072.0 - t1 / 8192.0) * t3
+    return var1 + var2
+
+
+def pressure_double(raw_press: int, t_fine: float, calibration: typing.Sequence[int]) -> float:
+    """
+    Pressure in Pa
+    """
+
+    p1, p2, p3, p4, p5, p6, p7, p8, p9 = calibration[3:12]
+    var1 = t_fine / 2.0 - 64000.0
+    var2 = var1 * var1 * p6 / 32768.0
+    var2 = var2 + var1 * p5 * 2.0
+    var2 = var2 / 4.0 + p4 * 65536.0
+    var1 = (p3 * var1 * var1 / 524288.0 + p2 * var1) / 524288.0
+    var1 = (1.0 + var1 / 32768.0) * p1
+    if var1 == 0:
+        return 0.0
+
+    p = 1048576.0 - raw_press
+    p = (p - var2 / 4096.0) * 6250.0 / var1
+    var1 = p9 * p * p / 2147483648.0
+    var2 = p * p8 / 32768.0
+    return p + (var1 + var2 + p7) / 16.0
+
+
+def humidity_double(raw_hum: int, t_fine: float, calibration: typing.Sequence[int]) -> float:
+    """
+    Relative humidity in %
+    """
+
+    h1, h2, h3, h4, h5, h6 = calibration[12:18]
+    h = t_fine - 76800.0
+    h = (raw_hum - (h4 * 64.0 + h5 / 16384.0 * h)) * (
+        h2 / 65536.0 * (1.0 + h6 / 67108864.0 * h * (1.0 + h3 / 67108864.0 * h))
+    )
+    h = h * (1.0 - h1 * h / 524288.0)
+    return min(100.0, max(0.0, h))
+
+
+def t_fine_int32(raw_temp: int, calibration: typing.Sequence[int]) -> int:
+    t1, t2, t3 = calibration[0:3]
+    var1 = (((raw_temp >> 3) - (t1 << 1)) * t2) >> 11
+    var2 = (((((raw_temp >> 4) - t1) * ((raw_temp >> 4) - t1)) >> 12) * t3) >> 14
+    return var1 + var2
+
+
+def pressure_int64(raw_press: int, t_fine: int, calibration: typing.Sequence[int]) -> int:
+    """
+    BME280_compensate_P_int64, pressure in Pa as Q24.8
+    """
+
+    p1, p2, p3, p4, p5, p6, p7, p8, p9 = calibration[3:12]
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * p6
+    var2 = var2 + ((var1 * p5) << 17)
+    var2 = var2 + (p4 << 35)
+    var1 = ((var1 * var1 * p3) >> 8) + ((var1 * p2) << 12)
+    var1 = (((1 << 47) + var1) * p1) >> 33
+    if var1 == 0:
+        return 0
+
+    # both operands are positive, so floor division is the same as in C
+    p = 1048576 - raw_press
+    p = (((p << 31) - var2) * 3125) // var1
+    var1 = (p9 * (p >> 13) * (p >> 13)) >> 25
+    var2 = (p8 * p) >> 19
+    return ((p + var1 + var2) >> 8) + (p7 << 4)
+
+
+def pressure_int32(raw_press: int, t_fine: int, calibration: typing.Sequence[int]) -> int:
+    """
+    BME280_compensate_P_int32, pressure in Pa
+    """
+
+    p1, p2, p3, p4, p5, p6, p7, p8, p9 = calibration[3:12]
+    var1 = (t_fine >> 1) - 64000
+    var2 = (((var1 >> 2) * (var1 >> 2)) >> 11) * p6
+    var2 = var2 + ((var1 * p5) << 1)
+    var2 = (var2 >> 2) + (p4 << 16)
+    var1 = (((p3 * (((var1 >> 2) * (var1 >> 2)) >> 13)) >> 3) + ((p2 * var1) >> 1)) >> 18
+    var1 = ((32768 + var1) * p1) >> 15
+    if var1 == 0:
+        return 0
+
+    p = ((1048576 - raw_press) - (var2 >> 12)) * 3125
+    if p < 0x80000000:
+        p = (p << 1) // var1
+    else:
+        p = (p // var1) * 2
+
+    var1 = (p9 * (((p >> 3) * (p >> 3)) >> 13)) >> 12
+    var2 = ((p >> 2) * p8) >> 13
+    return p + ((var1 + var2 + p7) >> 4)
+
+
+def humidity_int32(raw_hum: int, t_fine: int, calibration: typing.Sequence[int]) -> int:
+    """
+    BME280_compensate_H_int32, relative humidity in % as Q22.10
+    """
+
+    h1, h2, h3, h4, h5, h6 = calibration[12:18]
+    h = t_fine - 76800
+    h = (((((raw_hum << 14) - (h4 << 20) - (h5 * h)) + 16384) >> 15) *
+         (((((((h * h6) >> 10) * (((h * h3) >> 11) + 32768)) >> 10) + 2097152) * h2 + 8192) >> 14))
+    h = h - (((((h >> 15) * (h >> 15)) >> 7) * h1) >> 4)
+    h = min(419430400, max(0, h))
+    return h >> 12
+
+
+def compensate(raw: typing.Sequence[int], calibration: typing.Sequence[int]) -> typing.Tuple[int, int, int]:
+    """
+    Returns temperature in 0.01 degC, pressure in Pa as Q24.8 and relative humidity in % as Q22.10,
+    the same units as BME280.compensate
+    """
+
+    t_fine = t_fine_int32(raw[0], calibration)
+    return (
+        (t_fine * 5 + 128) >> 8,
+        pressure_int64(raw[1], t_fine, calibration),
+        humidity_int32(raw[2], t_fine, calibration)
+    )
+
+
+def _bisect(value_at: typing.Callable[[int], float], target: float, low: int, high: int) -> int:
+    """
+    Returns raw value in [low, high] for which increasing value_at is the closest to target
+    """
+
+    while low < high:
+        middle = (low + high) // 2
+        if value_at(middle) < target:
+            low = middle + 1
+        else:
+            high = middle
+
+    return low
+
+
+def raw_reading(
+        temperature: float,
+        pressure: float,
+        humidity: float,
+        calibration: typing.Sequence[int]
+) -> typing.Tuple[int, int, int]:
+    """
+    Returns raw (temperature, pressure, humidity) which sensor with given calibration reports at
+    temperature in degC, pressure in hPa and relative humidity in %
+    """
+
+    raw_temp = _bisect(lambda raw: t_fine_double(raw, calibration) / 5120.0, temperature, 0, MAX_RAW_20_BITS)
+    t_fine = t_fine_double(raw_temp, calibration)
+
+    # pressure decreases with raw value
+    raw_press = _bisect(
+        lambda raw: -pressure_double(raw, t_fine, calibration), -pressure * 100, 0, MAX_RAW_20_BITS
+    )
+    raw_hum = _bisect(lambda raw: humidity_double(raw, t_fine, calibration), humidity, 0, MAX_RAW_16_BITS)
+    return raw_temp, raw_press, raw_hum
+
+
+def operating_range_readings(calibration: typing.Sequence[int]) -> typing.List[typing.Tuple[int, int, int]]:
+    """
+    Raw readings over the whole operating range of the sensor, including its corners
+    """
+
+    readings = []
+    for temperature in (MIN_TEMPERATURE, -20.0, 0.0, 25.0, 50.0, 70.0, MAX_TEMPERATURE):
+        for pressure in (MIN_PRESSURE, 700.0, 1013.25, MAX_PRESSURE):
+            for humidity in (0.0, 50.0, 100.0):
+                readings.append(raw_reading(temperature, pressure, humidity, calibration))
+
+    return readings
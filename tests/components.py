@@ -0,0 +1,104 @@
+"""
+Helpers for importing modules of repository components. Components aren't packages and some
+of them have equally named modules (message_pipeline, telemetry_frame, consts, main), so test
+module has to select its component before importing anything from it
+"""
+import binascii
+import collections
+import contextlib
+import importlib.util
+import json
+import struct
+import sys
+import types
+import typing
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+TESTS_DIR = REPO_DIR / "tests"
+
+HOST_INFLUX_INGESTOR_DIR = REPO_DIR / "host" / "002_influx_data_ingestor"
+HOST_EVENTS_RECEIVER_DIR = REPO_DIR / "host" / "001-wireless-sensor"
+HOST_FLEET_BENCHMARK_DIR = REPO_DIR / "host" / "003_fleet_benchmark"
+PICOW_ALWAYS_ON_DIR = REPO_DIR / "picow" / "001_wireless_sensor"
+PICOW_BATTERY_DIR = REPO_DIR / "picow" / "002_battery_powered_wireless_sensor"
+PICOW_LOW_POWER_DIR = REPO_DIR / "picow" / "003_minimizing_power_consumption"
+
+PICOW_DIRS = (PICOW_ALWAYS_ON_DIR, PICOW_BATTERY_DIR, PICOW_LOW_POWER_DIR)
+
+
+def _is_repo_module(module: types.ModuleType) -> bool:
+    file_name = getattr(module, "__file__", None)
+    if not file_name:
+        return False
+
+    path = Path(file_name).resolve()
+    return REPO_DIR in path.parents and TESTS_DIR not in path.parents
+
+
+def use_component(*component_dirs: Path) -> None:
+    """
+    Puts component directories first on sys.path and forgets modules imported from other
+    components, already imported test modules keep their references
+    """
+
+    for name, module in list(sys.modules.items()):
+        if _is_repo_module(module):
+            del sys.modules[name]
+
+    sys.path[:] = [path for path in sys.path if Path(path or ".").resolve() not in _all_component_dirs()]
+    sys.path[:0] = [str(component_dir) for component_dir in component_dirs]
+
+
+def _all_component_dirs() -> set:
+    return {
+        HOST_INFLUX_INGESTOR_DIR,
+        HOST_EVENTS_RECEIVER_DIR,
+        HOST_FLEET_BENCHMARK_DIR,
+        *PICOW_DIRS,
+        *(picow_dir / "lib" for picow_dir in PICOW_DIRS)
+    }
+
+
+@contextlib.contextmanager
+def fake_secrets(**values) -> typing.Iterator[types.ModuleType]:
+    """
+    Host programs import MQTT and Influx settings from git-ignored secrets.py, this module is
+    imported in its place while the context is active, standard library module is restored after
+    """
+
+    module = types.ModuleType("secrets")
+    module.__dict__.update(values)
+
+    previous = sys.modules.get("secrets")
+    sys.modules["secrets"] = module
+    try:
+        yield module
+    finally:
+        if previous is None:
+            del sys.modules["secrets"]
+        else:
+            sys.modules["secrets"] = previous
+
+
+# MicroPython modules with CPython counterparts which are enough to run device code on host
+MICROPYTHON_ALIASES = {
+    "ucollections": collections,
+    "ustruct": struct,
+    "ubinascii": binascii,
+    "ujson": json,
+}
+
+
+def load_device_module(file_name: Path, module_name: str) -> types.ModuleType:
+    """
+    Imports Pico W module under another name, so it doesn't clash with equally named host module
+    """
+
+    for alias, module in MICROPYTHON_ALIASES.items():
+        sys.modules.setdefault(alias, module)
+
+    spec = importlib.util.spec_from_file_location(module_name, file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
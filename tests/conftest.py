@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# makes test helpers importable from test modules in subdirectories
+sys.path.insert(0, str(Path(__file__).resolve().parent))
@@ -0,0 +1,107 @@
+"""
+Register level stand-in for machine.I2C with BME280 sensors attached, used to test device code on host
+"""
+import struct
+import typing
+
+BME280_CHIP_ID = 0x60
+# I2C transfer which wasn't acknowledged fails with EIO on rp2
+EIO = 5
+
+
+def calibration_registers(calibration: typing.Sequence[int]) -> typing.Dict[int, bytes]:
+    """
+    Returns contents of calibration registers 0x88..0xA1 and 0xE1..0xE7 holding given dig_T1 .. dig_H6
+    """
+
+    t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6 = calibration
+    return {
+        0x88: struct.pack("<HhhHhhhhhhhhBB", t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, 0, h1),
+        0xE1: struct.pack("<hBbBbb", h2, h3, h4 >> 4, (h4 & 0xF) | (h5 & 0xF) << 4, h5 >> 4, h6),
+    }
+
+
+def data_registers(raw_temp: int, raw_press: int, raw_hum: int) -> bytes:
+    """
+    Returns contents of data registers 0xF7..0xFE holding given raw readings
+    """
+
+    return (
+        (raw_press << 4).to_bytes(3, "big") +
+        (raw_temp << 4).to_bytes(3, "big") +
+        raw_hum.to_bytes(2, "big")
+    )
+
+
+class FakeBME280(object):
+    """
+    Register map of one sensor. Status register returns status_sequence values one per read,
+    the last one is repeated. Sensor which naks doesn't acknowledge any transfer
+    """
+
+    def __init__(
+            self,
+            calibration: typing.Sequence[int],
+            raw: typing.Tuple[int, int, int],
+            chip_id: int = BME280_CHIP_ID,
+            status_sequence: typing.Sequence[int] = (0,)
+    ):
+        self.registers = bytearray(256)
+        self.registers[0xD0] = chip_id
+        for register, data in calibration_registers(calibration).items():
+            self.registers[register:register + len(data)] = data
+
+        self.set_raw(*raw)
+        self.status_sequence = list(status_sequence)
+        self.naks = False
+
+    def set_raw(self, raw_temp: int, raw_press: int, raw_hum: int) -> None:
+        self.registers[0xF7:0xFF] = data_registers(raw_temp, raw_press, raw_hum)
+
+    def read(self, register: int, size: int) -> bytes:
+        if register == 0xF3:
+            self.registers[0xF3] = self.status_sequence.pop(0) if len(self.status_sequence) > 1 else self.status_sequence[0]
+
+        return bytes(self.registers[register:register + size])
+
+    def write(self, register: int, data: bytes) -> None:
+        self.registers[register:register + len(data)] = data
+
+
+class FakeI2C(object):
+    """
+    I2C controller with sensors at given addresses, every transfer is logged as
+    (operation, address, register, bytes)
+    """
+
+    def __init__(self, devices: typing.Dict[int, FakeBME280]):
+        self.devices = devices
+        self.log = []
+
+    def _device(self, address: int) -> FakeBME280:
+        device = self.devices.get(address)
+        if device is None or device.naks:
+            raise OSError(EIO)
+
+        return device
+
+    def scan(self) -> typing.List[int]:
+        return sorted(self.devices)
+
+    def readfrom_mem(self, address: int, register: int, size: int) -> bytes:
+        data = self._device(address).read(register, size)
+        self.log.append(("read", address, register, data))
+        return data
+
+    def readfrom_mem_into(self, address: int, register: int, buffer: bytearray) -> None:
+        buffer[:] = self.readfrom_mem(address, register, len(buffer))
+
+    def writeto_mem(self, address: int, register: int, buffer: bytes) -> None:
+        self._device(address).write(register, bytes(buffer))
+        self.log.append(("write", address, register, bytes(buffer)))
+
+    def writes(self) -> typing.List[typing.Tuple[int, int, bytes]]:
+        return [(address, register, data) for operation, address, register, data in self.log if operation == "write"]
+
+    def reads(self, register: int) -> int:
+        return sum(1 for operation, _, logged_register, _ in self.log if operation == "read" and logged_register == register)
@@ -0,0 +1,92 @@
+import gzip
+import threading
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _WriteHandler(BaseHTTPRequestHandler):
+    server: "FakeInfluxEndpoint"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _reply(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        self._reply(204)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        self._reply(self.server.on_write(self.path, body))
+
+
+class FakeInfluxEndpoint(ThreadingHTTPServer):
+    """
+    Local InfluxDB v2 write endpoint, keeps line protocol of every accepted write request.
+    Statuses queued with fail_next are returned for the next writes instead of accepting them
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _WriteHandler)
+
+        self.writes: typing.List[typing.List[str]] = []
+        self.rejected_writes = 0
+
+        self._statuses: typing.List[int] = []
+        self._lock = threading.Lock()
+        self._write_received = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-influx-endpoint", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def lines(self) -> typing.List[str]:
+        with self._lock:
+            return [line for write in self.writes for line in write]
+
+    def fail_next(self, *statuses: int) -> None:
+        with self._lock:
+            self._statuses.extend(statuses)
+
+    def on_write(self, path: str, body: bytes) -> int:
+        if not path.startswith("/api/v2/write"):
+            return 404
+
+        with self._lock:
+            if self._statuses:
+                self.rejected_writes += 1
+                return self._statuses.pop(0)
+
+            self.writes.append(body.decode("utf-8").splitlines())
+            self._write_received.notify_all()
+
+        return 204
+
+    def wait_for_lines(self, count: int, timeout_secs: float = 10.0) -> typing.List[str]:
+        with self._lock:
+            self._write_received.wait_for(
+                lambda: sum(len(write) for write in self.writes) >= count,
+                timeout_secs
+            )
+
+        return self.lines
+
+    def __enter__(self) -> "FakeInfluxEndpoint":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
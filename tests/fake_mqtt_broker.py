@@ -0,0 +1,195 @@
+import socket
+import socketserver
+import struct
+import threading
+import typing
+
+CONNECT = 0x10
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x80
+PINGREQ = 0xC0
+DISCONNECT = 0xE0
+
+
+def _encode_remaining_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        length, digit = divmod(length, 128)
+        encoded.append(digit | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def _matches(topic_filter: str, topic: str) -> bool:
+    if topic_filter.endswith("#"):
+        return topic.startswith(topic_filter[:-1])
+
+    return topic_filter == topic
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    server: "FakeMqttBroker"
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Client disconnected")
+
+            data += chunk
+
+        return data
+
+    def _read_packet(self) -> typing.Tuple[int, bytes]:
+        packet_type = self._read_exactly(1)[0]
+        length, multiplier = 0, 1
+        while True:
+            digit = self._read_exactly(1)[0]
+            length += (digit & 0x7F) * multiplier
+            multiplier *= 128
+            if not digit & 0x80:
+                break
+
+        return packet_type, self._read_exactly(length)
+
+    def send(self, packet: bytes) -> None:
+        with self.server.lock:
+            self.request.sendall(packet)
+
+    def handle(self) -> None:
+        try:
+            while True:
+                packet_type, body = self._read_packet()
+                kind = packet_type & 0xF0
+                if kind == CONNECT:
+                    self.send(b"\x20\x02\x00\x00")
+                elif kind == SUBSCRIBE:
+                    self._subscribe(body)
+                elif kind == PUBLISH:
+                    self._publish(packet_type, body)
+                elif kind == PINGREQ:
+                    self.send(b"\xd0\x00")
+                elif kind == DISCONNECT:
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.server.unsubscribe(self)
+
+    def _subscribe(self, body: bytes) -> None:
+        offset, granted = 2, b""
+        while offset < len(body):
+            length = struct.unpack_from("!H", body, offset)[0]
+            topic_filter = body[offset + 2:offset + 2 + length].decode("utf-8")
+            offset += 3 + length
+
+            group = None
+            if topic_filter.startswith("$share/"):
+                _, group, topic_filter = topic_filter.split("/", 2)
+
+            self.server.subscribe(self, topic_filter, group)
+            granted += b"\x00"
+
+        self.send(bytes([0x90]) + _encode_remaining_length(2 + len(granted)) + body[:2] + granted)
+
+    def _publish(self, packet_type: int, body: bytes) -> None:
+        topic_length = struct.unpack_from("!H", body)[0]
+        offset = 2 + topic_length
+        topic = body[2:offset].decode("utf-8")
+        if packet_type & 0x06:
+            self.send(b"\x40\x02" + body[offset:offset + 2])
+            offset += 2
+
+        self.server.route(topic, body[offset:])
+
+
+class FakeMqttBroker(socketserver.ThreadingTCPServer):
+    """
+    Minimal MQTT 3.1.1 broker for tests: accepts every client, acknowledges QoS 1 publishes,
+    forwards messages to subscribers with QoS 0 and supports $share/<group>/<filter> shared
+    subscriptions with round-robin delivery inside of group
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _ClientHandler)
+
+        self.lock = threading.RLock()
+        self.published = 0
+        self._subscriptions: typing.List[typing.Tuple[_ClientHandler, str, typing.Optional[str]]] = []
+        self._next_in_group: typing.Dict[typing.Tuple[str, str], int] = {}
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-mqtt-broker", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def subscriptions_count(self) -> int:
+        with self.lock:
+            return len(self._subscriptions)
+
+    def subscribe(self, client: _ClientHandler, topic_filter: str, group: typing.Optional[str]) -> None:
+        with self.lock:
+            self._subscriptions.append((client, topic_filter, group))
+
+    def unsubscribe(self, client: _ClientHandler) -> None:
+        with self.lock:
+            self._subscriptions = [
+                subscription for subscription in self._subscriptions if subscription[0] is not client
+            ]
+
+    def route(self, topic: str, payload: bytes) -> None:
+        encoded_topic = topic.encode("utf-8")
+        body = struct.pack("!H", len(encoded_topic)) + encoded_topic + payload
+        packet = bytes([PUBLISH]) + _encode_remaining_length(len(body)) + body
+
+        with self.lock:
+            self.published += 1
+            groups: typing.Dict[typing.Tuple[str, str], typing.List[_ClientHandler]] = {}
+            for client, topic_filter, group in self._subscriptions:
+                if not _matches(topic_filter, topic):
+                    continue
+
+                if group is None:
+                    self._send_quietly(client, packet)
+                else:
+                    groups.setdefault((group, topic_filter), []).append(client)
+
+            for key, clients in groups.items():
+                index = self._next_in_group.get(key, 0)
+                self._next_in_group[key] = index + 1
+                self._send_quietly(clients[index % len(clients)], packet)
+
+    def disconnect_clients(self) -> None:
+        """
+        Closes connections of all subscribed clients, like broker restart does
+        """
+
+        with self.lock:
+            for client, _, _ in self._subscriptions:
+                try:
+                    client.request.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _send_quietly(client: _ClientHandler, packet: bytes) -> None:
+        try:
+            client.request.sendall(packet)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "FakeMqttBroker":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self._thread.join()
+        self.disconnect_clients()
+        self.server_close()
@@ -0,0 +1,24 @@
+"""
+Stand-in for MicroPython time module in device code running on host
+"""
+
+
+class FakeClock(object):
+    """
+    utime microsecond ticks which advance only while sleeping
+    """
+
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def ticks_us(self) -> int:
+        return self.now
+
+    @staticmethod
+    def ticks_diff(end: int, start: int) -> int:
+        return end - start
+
+    def sleep_us(self, us: int) -> None:
+        self.sleeps.append(us)
+        self.now += us
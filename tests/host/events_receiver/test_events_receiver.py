@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from loguru import logger
+
+from components import HOST_EVENTS_RECEIVER_DIR, PICOW_LOW_POWER_DIR, fake_secrets, load_device_module, use_component
+
+use_component(HOST_EVENTS_RECEIVER_DIR)
+
+with fake_secrets(MQTT_BROKER="127.0.0.1", CLIENT_NAME="test", TOPIC="test/#", USER_NAME=None, PASSWORD=None):
+    import events_receiver  # noqa: E402
+
+device_frame = load_device_module(PICOW_LOW_POWER_DIR / "telemetry_frame.py", "device_telemetry_frame")
+
+MACHINE_UNIQUE_ID = bytes.fromhex("e66141040324ab36")
+
+
+@pytest.fixture
+def log_records():
+    records = []
+    handler_id = logger.add(lambda message: records.append(message.record), level="DEBUG")
+    yield records
+    logger.remove(handler_id)
+
+
+def test_json_message_is_logged_pretty_printed(log_records):
+    events_receiver.process_message(b'{"payload": {"bme280": {"temperature": "23.31C"}}, "metadata": {}}')
+
+    assert log_records[-1]["level"].name == "INFO"
+    assert log_records[-1]["message"].startswith("Received message: {\n")
+    assert json.loads(log_records[-1]["message"].split(": ", 1)[1])["payload"]["bme280"]["temperature"] == "23.31C"
+
+
+@pytest.mark.parametrize("content_type, name", [(0x01, "frame"), (0x02, "batch")])
+def test_binary_telemetry_is_recognised_by_content_type(log_records, content_type, name):
+    raw_payload = bytes([content_type, 1]) + MACHINE_UNIQUE_ID + b"\xff" * 6
+
+    events_receiver.process_message(raw_payload)
+
+    assert [record["message"] for record in log_records] == [
+        f"Received binary {name} of 16 bytes from 'e6:61:41:04:03:24:ab:36'"
+    ]
+
+
+def test_sequences_of_binary_records_are_logged(log_records):
+    header = dict(
+        machine_unique_id=MACHINE_UNIQUE_ID,
+        mac_address=bytes(6),
+        python_version=(1, 19, 1),
+        frequency=125_000_000,
+        wifi_connect_time_ms=850,
+        epoch=4242
+    )
+    record = device_frame.pack_record(0, (2331, 25697540, 55893), 27.5, 150_000, 800_000)
+
+    events_receiver.process_message(device_frame.pack_frame(sequence=17, record=record, **header))
+    events_receiver.process_message(device_frame.pack_batch(interval_secs=300, first_sequence=18, records=record * 3, **header))
+
+    assert [record["message"].split(", ")[-1] for record in log_records] == ["sequences 17..17", "sequences 18..20"]
+
+
+@pytest.mark.parametrize("raw_payload", [b"not a json", b"\xfe\xff{", b""])
+def test_messages_which_are_not_json_are_skipped(log_records, raw_payload):
+    events_receiver.process_message(raw_payload)
+
+    assert [record["level"].name for record in log_records] == ["WARNING"]
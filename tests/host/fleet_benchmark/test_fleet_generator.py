@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import time
+import typing
+from datetime import datetime, timedelta
+
+import pytest
+
+from components import (
+    HOST_FLEET_BENCHMARK_DIR, HOST_INFLUX_INGESTOR_DIR, PICOW_LOW_POWER_DIR, load_device_module, use_component
+)
+
+use_component(HOST_FLEET_BENCHMARK_DIR, HOST_INFLUX_INGESTOR_DIR)
+
+import fake_influx  # noqa: E402
+import fleet_benchmark  # noqa: E402
+import fleet_generator  # noqa: E402
+import line_protocol  # noqa: E402
+import telemetry_frame  # noqa: E402
+from payload_decoder import decode_message  # noqa: E402
+
+device_frame = load_device_module(PICOW_LOW_POWER_DIR / "telemetry_frame.py", "device_telemetry_frame")
+
+
+def test_binary_layouts_match_device():
+    assert fleet_generator.FORMAT_VERSION == device_frame.FORMAT_VERSION
+    assert fleet_generator.FRAME_HEADER_FORMAT == device_frame.FRAME_HEADER_FORMAT
+    assert fleet_generator.BATCH_HEADER_FORMAT == device_frame.BATCH_HEADER_FORMAT
+    assert fleet_generator.RECORD_FORMAT == device_frame.RECORD_FORMAT
+
+
+def write_to_fake_influx(lines: typing.List[str]) -> typing.Dict:
+    influx = fake_influx.FakeInfluxServer()
+    try:
+        influx.on_write("\n".join(lines).encode())
+    finally:
+        influx.server_close()
+
+    return influx.received_at
+
+
+@pytest.mark.parametrize("envelope", fleet_generator.ENVELOPES)
+def test_json_reading_is_traced_in_influx_by_machine_id_and_mem_free(envelope):
+    device = fleet_generator.SyntheticDevice(7, envelope)
+
+    message, trace_keys = device.message()
+    _, reading = decode_message(message)
+    line = line_protocol.encode_reading(reading, reading.machine_unique_id)
+
+    assert trace_keys == [[(device.machine_unique_id, fleet_generator.TRACE_MEM_FREE, reading.mem_free)]]
+    assert reading.mem_free in fleet_generator.MEM_FREE_RANGE
+    assert list(write_to_fake_influx([line])) == trace_keys[0]
+
+
+def test_multi_sensor_message_matches_always_on_sensor_envelope():
+    device = fleet_generator.SyntheticDevice(7, fleet_generator.ENVELOPE_MULTI_SENSOR)
+
+    envelope = json.loads(device.message()[0])
+
+    assert list(envelope["payload"]["bme280_sensors"]) == ["i2c0:0x76", "i2c1:0x77"]
+    assert "journal" not in envelope["metadata"]
+
+
+def test_battery_messages_have_consecutive_journal_sequences():
+    device = fleet_generator.SyntheticDevice(7, fleet_generator.ENVELOPE_BATTERY)
+
+    readings = [decode_message(device.message()[0])[1] for _ in range(3)]
+
+    assert [(reading.epoch, reading.sequence) for reading in readings] == [(device.epoch, index) for index in range(3)]
+
+
+def test_mem_free_never_repeats_on_the_same_device():
+    device = fleet_generator.SyntheticDevice(7, fleet_generator.ENVELOPE_BATTERY)
+
+    mem_free = [decode_message(device.message()[0])[1].mem_free for _ in range(1000)]
+
+    assert len(set(mem_free)) == 1000
+
+
+def test_frame_is_traced_by_mem_free_and_sequence():
+    device = fleet_generator.SyntheticDevice(7, fleet_generator.ENVELOPE_BATTERY)
+    device.frame()
+
+    frame, trace_keys = device.frame()
+    reading = telemetry_frame.decode_frame(frame)
+
+    assert reading.machine_unique_id == device.machine_unique_id
+    assert (reading.epoch, reading.sequence) == (device.epoch, 1)
+    assert trace_keys == [[
+        (device.machine_unique_id, fleet_generator.TRACE_MEM_FREE, reading.mem_free),
+        (device.machine_unique_id, fleet_generator.TRACE_SEQUENCE, 1)
+    ]]
+    assert 15 <= reading.temperature <= 30
+
+
+def test_batch_carries_consecutive_sequences():
+    device = fleet_generator.SyntheticDevice(7, fleet_generator.ENVELOPE_BATTERY)
+    device.batch(6)
+
+    batch, trace_keys = device.batch(6)
+    readings = telemetry_frame.decode_batch(batch, received_at=datetime(2023, 1, 1))
+    lines = [line_protocol.encode_reading(reading, reading.machine_unique_id) for reading in readings]
+
+    assert [reading.sequence for reading in readings] == list(range(6, 12))
+    assert [keys[1][2] for keys in trace_keys] == list(range(6, 12))
+    assert readings[-1].measured_at - readings[0].measured_at == timedelta(seconds=5 * 300)
+    assert {reading.machine_unique_id for reading in readings} == {device.machine_unique_id}
+    assert list(write_to_fake_influx(lines)) == [keys[0] for keys in trace_keys]
+
+
+def test_log_sink_traces_json_and_binary_messages():
+    log = io.StringIO(
+        '2023-01-01 | INFO | Received message: {\n'
+        '    "metadata": {\n'
+        '        "machine_metrics": {\n'
+        '            "mem_free": 151234\n'
+        '        },\n'
+        '        "machine_unique_id": "fe:00:00:00:00:00:00:07",\n'
+        "2023-01-01 | INFO | Received binary batch of 227 bytes from 'fe:00:00:00:00:00:00:08', sequences 6..8\n"
+    )
+
+    sink = fleet_benchmark.LogSink(log)
+    sink._thread.join(timeout=5)
+
+    assert sorted(sink.received_at) == [
+        ("fe:00:00:00:00:00:00:07", fleet_generator.TRACE_MEM_FREE, 151234),
+        ("fe:00:00:00:00:00:00:08", fleet_generator.TRACE_SEQUENCE, 6),
+        ("fe:00:00:00:00:00:00:08", fleet_generator.TRACE_SEQUENCE, 7),
+        ("fe:00:00:00:00:00:00:08", fleet_generator.TRACE_SEQUENCE, 8),
+    ]
+    assert all(received_at <= time.monotonic() for received_at in sink.received_at.values())
+
+
+def test_cpu_time_of_ingestor_is_measured():
+    sampler = fleet_benchmark.RssSampler(os.getpid())
+    before = sampler.cpu_secs()
+
+    deadline = time.process_time() + 0.2
+    while time.process_time() < deadline:
+        pass
+
+    assert sampler.cpu_secs() - before >= 0.15
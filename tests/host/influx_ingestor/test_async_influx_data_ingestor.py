@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, PICOW_LOW_POWER_DIR, fake_secrets, load_device_module, use_component
+from fake_influx_endpoint import FakeInfluxEndpoint
+from fake_mqtt_broker import FakeMqttBroker
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+with fake_secrets(
+        MQTT_BROKER="127.0.0.1",
+        CLIENT_NAME="test-ingestor",
+        USER_NAME=None,
+        PASSWORD=None,
+        TOPIC="test/measurements"
+) as secrets:
+    import async_influx_data_ingestor  # noqa: E402
+    from async_influx_writer import AsyncBatchingInfluxWriter  # noqa: E402
+    from device_registry import DeviceRegistry  # noqa: E402
+    from mqtt_message_stream import MqttMessageStream  # noqa: E402
+    from reading_deduplicator import ReadingDeduplicator  # noqa: E402
+
+device_frame = load_device_module(PICOW_LOW_POWER_DIR / "telemetry_frame.py", "device_telemetry_frame")
+
+KNOWN_DEVICE_ID = "e6:61:41:04:03:24:ab:36"
+
+
+def make_message(machine_unique_id: str, index: int) -> bytes:
+    return json.dumps(
+        {
+            "metadata": {
+                "machine_unique_id": machine_unique_id,
+                "machine_metrics": {"cpu_temperature": 25.5, "mem_free": 100_000 + index}
+            },
+            "payload": {
+                "bme280": {"temperature": f"{20 + index / 100:.2f}C", "humidity": "45.00%", "pressure": "1000.00hPa"}
+            }
+        }
+    ).encode("utf-8")
+
+
+def make_batch(machine_unique_id: str, records_count: int) -> bytes:
+    records = b"".join(
+        device_frame.pack_record(index * 300_000, (2331, None, None), 27.5, 200_000 + index, 800_000)
+        for index in range(records_count)
+    )
+    return device_frame.pack_batch(
+        machine_unique_id=bytes.fromhex(machine_unique_id.replace(":", "")),
+        mac_address=bytes(6),
+        python_version=(1, 19, 1),
+        frequency=125_000_000,
+        wifi_connect_time_ms=850,
+        interval_secs=300,
+        epoch=1,
+        first_sequence=0,
+        records=records
+    )
+
+
+async def wait_until(condition, timeout_secs: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout_secs
+    while not condition():
+        assert time.monotonic() < deadline, "Condition wasn't met in time"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def ingestor_environment(tmp_path):
+    with FakeMqttBroker() as broker, FakeInfluxEndpoint() as endpoint:
+        devices_file_name = tmp_path / "devices.json"
+        devices_file_name.write_text(json.dumps({KNOWN_DEVICE_ID: "PicoW-Sensor-1"}))
+        yield broker, endpoint, str(devices_file_name)
+
+
+def ingest(environment, payloads, expected_lines: int):
+    """
+    Runs ingestor until expected_lines reach Influx, returns the ingestor after it's stopped
+    """
+
+    broker, endpoint, devices_file_name = environment
+
+    async def run():
+        influx_writer = AsyncBatchingInfluxWriter(
+            url=endpoint.url,
+            token="token",
+            org="org",
+            bucket="bucket",
+            batch_size=10,
+            flush_interval_secs=0.1,
+            retry_delay_secs=0.01
+        )
+        messages = MqttMessageStream(mqtt.Client(secrets.CLIENT_NAME), secrets.TOPIC)
+        messages.connect("127.0.0.1", broker.port)
+        ingestor = async_influx_data_ingestor.Ingestor(
+            messages, influx_writer, DeviceRegistry(devices_file_name), ReadingDeduplicator()
+        )
+        ingestor_task = asyncio.create_task(ingestor.run())
+
+        await wait_until(lambda: broker.subscriptions_count == 1)
+        for payload in payloads:
+            broker.route(secrets.TOPIC, payload)
+
+        await wait_until(lambda: len(endpoint.lines) >= expected_lines)
+        messages.disconnect()
+        await ingestor_task
+        await influx_writer.close()
+        return ingestor
+
+    return asyncio.run(asyncio.wait_for(run(), 20))
+
+
+def test_json_and_binary_messages_reach_influx_after_retry(ingestor_environment):
+    _, endpoint, _ = ingestor_environment
+    endpoint.fail_next(503)
+    payloads = [make_message(KNOWN_DEVICE_ID, index) for index in range(15)]
+    payloads.append(make_batch("fe:00:00:00:00:00:00:07", 6))
+
+    ingestor = ingest(ingestor_environment, payloads, 21)
+
+    # the first batch is retried while the next ones are written, so lines may be reordered
+    lines = endpoint.lines
+    known_device_lines = [line for line in lines if line.startswith("PicoWData,host=PicoW-Sensor-1 ")]
+    # device which isn't listed is registered by its machine id
+    new_device_lines = [line for line in lines if line.startswith("PicoWData,host=fe:00:00:00:00:00:00:07 ")]
+    assert len(lines) == 21
+    assert (len(known_device_lines), len(new_device_lines)) == (15, 6)
+    assert {line.split("mem_free=")[1].split("i")[0] for line in known_device_lines} == {
+        str(100_000 + index) for index in range(15)
+    }
+    assert all(len(write) <= 10 for write in endpoint.writes)
+    assert endpoint.rejected_writes == 1
+    assert ingestor.influx_writer.retried_batches == 1
+    assert (ingestor.processed, ingestor.failed) == (16, 0)
+
+
+def test_malformed_messages_are_skipped(ingestor_environment):
+    _, endpoint, _ = ingestor_environment
+
+    ingestor = ingest(ingestor_environment, [b"not a json", make_message(KNOWN_DEVICE_ID, 1)], 1)
+
+    assert len(endpoint.lines) == 1
+    assert (ingestor.processed, ingestor.failed) == (2, 0)
+
+
+def test_duplicated_readings_are_written_once(ingestor_environment):
+    _, endpoint, _ = ingestor_environment
+    batch = make_batch(KNOWN_DEVICE_ID, 3)
+
+    # the same batch delivered again after lost PUBACK, then a new message to know when to stop
+    ingestor = ingest(ingestor_environment, [batch, batch, make_message(KNOWN_DEVICE_ID, 1)], 4)
+
+    assert len(endpoint.lines) == 4
+    assert ingestor.processed == 3
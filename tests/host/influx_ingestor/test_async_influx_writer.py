@@ -0,0 +1,177 @@
+import asyncio
+import socket
+
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+from fake_influx_endpoint import FakeInfluxEndpoint
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+from async_influx_writer import AsyncBatchingInfluxWriter  # noqa: E402
+
+
+def make_writer(url: str, **kwargs) -> AsyncBatchingInfluxWriter:
+    kwargs.setdefault("retry_delay_secs", 0.01)
+    return AsyncBatchingInfluxWriter(url=url, token="token", org="org", bucket="bucket", **kwargs)
+
+
+def make_lines(count: int):
+    return [f"PicoWData,host=sensor-{index} temperature={index}" for index in range(count)]
+
+
+def write_all(url: str, lines, **kwargs) -> AsyncBatchingInfluxWriter:
+    """
+    Writes lines and closes writer, returns closed writer
+    """
+
+    async def write():
+        writer = make_writer(url, **kwargs)
+        for line in lines:
+            await writer.write(line)
+
+        await writer.close()
+        return writer
+
+    return asyncio.run(write())
+
+
+def unused_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_full_batches_are_written_concurrently_without_waiting_for_flush_interval():
+    async def write(endpoint: FakeInfluxEndpoint):
+        writer = make_writer(endpoint.url, batch_size=10, flush_interval_secs=60, max_in_flight_batches=2)
+        try:
+            for line in make_lines(20):
+                await writer.write(line)
+
+            assert writer.in_flight_batches == 2
+            await asyncio.get_running_loop().run_in_executor(None, endpoint.wait_for_lines, 20, 5)
+        finally:
+            await writer.close()
+
+        return writer
+
+    with FakeInfluxEndpoint() as endpoint:
+        writer = asyncio.run(write(endpoint))
+
+    assert sorted(endpoint.lines) == sorted(make_lines(20))
+    assert [len(write) for write in endpoint.writes] == [10, 10]
+    assert writer.in_flight_high_watermark == 2
+    assert writer.flushed_points == 20
+
+
+def test_close_writes_more_points_than_in_flight_slots_take_at_once():
+    with FakeInfluxEndpoint() as endpoint:
+        writer = write_all(endpoint.url, make_lines(23), batch_size=5, flush_interval_secs=60, max_in_flight_batches=2)
+
+    assert sorted(endpoint.lines) == sorted(make_lines(23))
+    assert sorted(len(write) for write in endpoint.writes) == [3, 5, 5, 5, 5]
+    assert writer.in_flight_high_watermark == 2
+    assert (writer.flushed_points, writer.in_flight_batches) == (23, 0)
+
+
+def test_partial_batch_is_written_when_flush_interval_elapses():
+    async def write(endpoint: FakeInfluxEndpoint):
+        writer = make_writer(endpoint.url, batch_size=500, flush_interval_secs=0.1)
+        try:
+            for line in make_lines(3):
+                await writer.write(line)
+
+            return await asyncio.get_running_loop().run_in_executor(None, endpoint.wait_for_lines, 3, 5)
+        finally:
+            await writer.close()
+
+    with FakeInfluxEndpoint() as endpoint:
+        assert asyncio.run(write(endpoint)) == make_lines(3)
+
+
+def test_batch_is_retried_while_influx_is_unavailable():
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(503, 429)
+        writer = write_all(endpoint.url, make_lines(5), batch_size=5, flush_interval_secs=60, max_retries=3)
+
+    assert endpoint.rejected_writes == 2
+    assert endpoint.lines == make_lines(5)
+    assert writer.retried_batches == 2
+    assert (writer.flushed_points, writer.failed_points) == (5, 0)
+
+
+def test_batch_is_dropped_after_last_retry():
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(503, 503, 503)
+        writer = write_all(endpoint.url, make_lines(5), batch_size=5, flush_interval_secs=60, max_retries=2)
+
+    assert endpoint.rejected_writes == 3
+    assert endpoint.lines == []
+    assert writer.failed_points == 5
+
+
+def test_batch_rejected_by_influx_is_not_retried():
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(400)
+        writer = write_all(endpoint.url, make_lines(5), batch_size=5, flush_interval_secs=60, max_retries=3)
+
+    assert endpoint.rejected_writes == 1
+    assert writer.retried_batches == 0
+    assert writer.failed_points == 5
+
+
+def test_batch_is_retried_when_influx_is_unreachable():
+    writer = write_all(unused_port_url(), make_lines(5), batch_size=5, flush_interval_secs=60, max_retries=2)
+
+    assert writer.retried_batches == 2
+    assert writer.failed_points == 5
+
+
+def test_oldest_points_are_dropped_while_all_batches_are_in_flight():
+    async def write(endpoint: FakeInfluxEndpoint, lines):
+        writer = make_writer(
+            endpoint.url, batch_size=5, flush_interval_secs=60, max_in_flight_batches=1, retry_delay_secs=0.2,
+            max_pending_points=10
+        )
+        for line in lines[:5]:
+            await writer.write(line)
+
+        # the only batch is being retried, new points pile up meanwhile and write doesn't wait
+        while endpoint.rejected_writes < 1:
+            await asyncio.sleep(0.01)
+
+        for line in lines[5:]:
+            await writer.write(line)
+
+        assert writer.in_flight_batches == 1
+        await writer.close()
+        return writer
+
+    lines = make_lines(20)
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(503, 503)
+        writer = asyncio.run(asyncio.wait_for(write(endpoint, lines), 10))
+
+    assert endpoint.lines == lines[:5] + lines[10:]
+    assert writer.dropped_points == 5
+    assert writer.failed_points == 0
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"batch_size": 0},
+        {"flush_interval_secs": 0},
+        {"max_in_flight_batches": 0},
+        {"max_retries": -1},
+        {"retry_delay_secs": -1},
+        {"batch_size": 10, "max_pending_points": 9}
+    ]
+)
+def test_invalid_arguments_are_rejected(kwargs):
+    async def create():
+        make_writer("http://127.0.0.1:1", **kwargs)
+
+    with pytest.raises(ValueError):
+        asyncio.run(create())
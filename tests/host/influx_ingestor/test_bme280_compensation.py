@@ -0,0 +1,24 @@
+import pytest
+
+from bme280_golden_vectors import GOLDEN_VECTORS
+from bme280_reference import CALIBRATIONS
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+import bme280_compensation  # noqa: E402
+
+
+@pytest.mark.parametrize("calibration_index", range(len(CALIBRATIONS)))
+def test_compensate_matches_golden_vectors(calibration_index):
+    vectors = [vector for vector in GOLDEN_VECTORS if vector[0] == calibration_index]
+    raw_temperature, raw_pressure, raw_humidity = zip(*(vector[1:4] for vector in vectors))
+
+    temperature, pressure, humidity = bme280_compensation.compensate(
+        raw_temperature,
+        raw_pressure,
+        raw_humidity,
+        bme280_compensation.Bme280Calibration(*CALIBRATIONS[calibration_index])
+    )
+
+    assert list(zip(temperature.tolist(), pressure.tolist(), humidity.tolist())) == [vector[4:7] for vector in vectors]
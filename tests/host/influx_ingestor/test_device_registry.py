@@ -0,0 +1,82 @@
+import json
+import threading
+import tracemalloc
+
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+import device_registry  # noqa: E402
+from device_registry import DeviceRegistry  # noqa: E402
+
+DEVICES = {f"e6:61:41:04:03:24:{index:02x}:36": f"sensor-{index}" for index in range(4)}
+MACHINE_UNIQUE_IDS = list(DEVICES)
+
+
+def make_registry(tmp_path) -> DeviceRegistry:
+    file_name = tmp_path / "devices.json"
+    file_name.write_text(json.dumps(DEVICES))
+    return DeviceRegistry(str(file_name))
+
+
+def test_messages_counted_by_worker_threads_are_summed_up(tmp_path):
+    registry = make_registry(tmp_path)
+
+    def worker():
+        for _ in range(1000):
+            registry.lookup(MACHINE_UNIQUE_IDS[0])
+            registry.lookup(MACHINE_UNIQUE_IDS[1])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert registry.lookup(MACHINE_UNIQUE_IDS[1]).messages_count == 0
+    assert registry.update_activity() == 2
+    assert registry.lookup(MACHINE_UNIQUE_IDS[0]).messages_count == 4000
+    assert registry.lookup(MACHINE_UNIQUE_IDS[1]).messages_count == 4001
+
+
+def test_only_devices_which_sent_messages_are_seen(tmp_path):
+    registry = make_registry(tmp_path)
+    first = registry.lookup(MACHINE_UNIQUE_IDS[0])
+    second = registry.lookup(MACHINE_UNIQUE_IDS[1])
+    registry.update_activity()
+    first.last_seen_at = second.last_seen_at = 1.0
+
+    registry.lookup(MACHINE_UNIQUE_IDS[0])
+    assert registry.update_activity() == 1
+    assert first.last_seen_at > 1.0
+    assert second.last_seen_at == 1.0
+
+
+def test_lookup_does_not_read_clock(tmp_path, monkeypatch):
+    registry = make_registry(tmp_path)
+
+    def fail():
+        raise AssertionError("clock was read")
+
+    monkeypatch.setattr(device_registry.time, "time", fail)
+    assert registry.lookup(MACHINE_UNIQUE_IDS[0]).name == "sensor-0"
+
+
+def test_lookup_of_known_device_keeps_no_memory(tmp_path):
+    registry = make_registry(tmp_path)
+    for machine_unique_id in MACHINE_UNIQUE_IDS:
+        registry.lookup(machine_unique_id)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(10_000):
+            for machine_unique_id in MACHINE_UNIQUE_IDS:
+                registry.lookup(machine_unique_id)
+
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert after - before < 1024
@@ -0,0 +1,108 @@
+import json
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, fake_secrets, use_component
+from fake_influx_endpoint import FakeInfluxEndpoint
+from fake_mqtt_broker import FakeMqttBroker
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+with fake_secrets(
+        MQTT_BROKER="127.0.0.1",
+        CLIENT_NAME="test-ingestor",
+        USER_NAME=None,
+        PASSWORD=None,
+        TOPIC="test/measurements"
+) as secrets:
+    import influx_data_ingestor  # noqa: E402
+
+
+def make_message(machine_unique_id: str, index: int) -> bytes:
+    return json.dumps(
+        {
+            "metadata": {
+                "machine_unique_id": machine_unique_id,
+                "machine_metrics": {"cpu_temperature": 25.5, "mem_free": 100_000 + index}
+            },
+            "payload": {
+                "bme280": {"temperature": f"{20 + index / 100:.2f}C", "humidity": "45.00%", "pressure": "1000.00hPa"}
+            }
+        }
+    ).encode("utf-8")
+
+
+def wait_for_subscriptions(broker: FakeMqttBroker, count: int, timeout_secs: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout_secs
+    while broker.subscriptions_count < count:
+        assert time.monotonic() < deadline, "Ingestor didn't subscribe in time"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def ingestor_environment(tmp_path, monkeypatch):
+    with FakeMqttBroker() as broker, FakeInfluxEndpoint() as endpoint:
+        devices_file_name = tmp_path / "devices.json"
+        devices_file_name.write_text(json.dumps({"e6:61:41:04:03:24:ab:36": "PicoW-Sensor-1"}))
+
+        monkeypatch.setattr(secrets, "INFLUX_URL", endpoint.url, raising=False)
+        monkeypatch.setattr(secrets, "TOKEN", "token", raising=False)
+        monkeypatch.setattr(secrets, "ORG", "org", raising=False)
+        monkeypatch.setattr(secrets, "BUCKET", "bucket", raising=False)
+        monkeypatch.setattr(influx_data_ingestor, "MQTT_PORT", broker.port)
+        monkeypatch.setattr(influx_data_ingestor, "DEVICES_FILE_NAME", str(devices_file_name))
+        monkeypatch.setattr(influx_data_ingestor, "INFLUX_BATCH_SIZE", 10)
+        monkeypatch.setattr(influx_data_ingestor, "INFLUX_FLUSH_INTERVAL_SECS", 0.1)
+        monkeypatch.setattr(influx_data_ingestor, "INFLUX_RETRY_DELAY_SECS", 0.01)
+
+        yield broker, endpoint
+
+
+def publish_all(broker: FakeMqttBroker, payloads) -> None:
+    client = mqtt.Client("test-sensor")
+    client.connect("127.0.0.1", broker.port)
+    client.loop_start()
+    try:
+        for payload in payloads:
+            client.publish(secrets.TOPIC, payload, qos=1).wait_for_publish()
+    finally:
+        client.disconnect()
+        client.loop_stop()
+
+
+def test_messages_from_mqtt_reach_influx_in_batches_after_retry(ingestor_environment):
+    broker, endpoint = ingestor_environment
+    endpoint.fail_next(503)
+
+    influx_data_ingestor.start()
+    try:
+        wait_for_subscriptions(broker, 1)
+        publish_all(broker, [make_message("e6:61:41:04:03:24:ab:36", index) for index in range(25)])
+        lines = endpoint.wait_for_lines(25)
+    finally:
+        influx_data_ingestor.stop()
+
+    assert len(lines) == 25
+    assert all(line.startswith("PicoWData,host=PicoW-Sensor-1 ") for line in lines)
+    assert all(f"mem_free={100_000 + index}i" in " ".join(lines) for index in range(25))
+    assert all(len(write) <= 10 for write in endpoint.writes)
+    assert endpoint.rejected_writes == 1
+    assert influx_data_ingestor.influx_writer.retried_batches == 1
+    assert influx_data_ingestor.influx_writer.failed_points == 0
+
+
+def test_malformed_messages_are_skipped(ingestor_environment):
+    broker, endpoint = ingestor_environment
+
+    influx_data_ingestor.start()
+    try:
+        wait_for_subscriptions(broker, 1)
+        publish_all(broker, [b"not a json", make_message("e6:61:41:04:03:24:ab:36", 1)])
+        lines = endpoint.wait_for_lines(1)
+    finally:
+        influx_data_ingestor.stop()
+
+    assert len(lines) == 1
+    assert influx_data_ingestor.pipeline.processed == 2
@@ -0,0 +1,141 @@
+import time
+
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+from fake_influx_endpoint import FakeInfluxEndpoint
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+from influx_writer import BatchingInfluxWriter  # noqa: E402
+
+
+def make_writer(endpoint: FakeInfluxEndpoint, **kwargs) -> BatchingInfluxWriter:
+    kwargs.setdefault("retry_delay_secs", 0.01)
+    return BatchingInfluxWriter(url=endpoint.url, token="token", org="org", bucket="bucket", **kwargs)
+
+
+def make_lines(count: int):
+    return [f"PicoWData,host=sensor-{index} temperature={index}" for index in range(count)]
+
+
+def test_full_batches_are_written_without_waiting_for_flush_interval():
+    with FakeInfluxEndpoint() as endpoint:
+        writer = make_writer(endpoint, batch_size=10, flush_interval_secs=60)
+        try:
+            for line in make_lines(20):
+                writer.write(line)
+
+            assert endpoint.wait_for_lines(20, timeout_secs=5) == make_lines(20)
+        finally:
+            writer.close()
+
+        assert [len(write) for write in endpoint.writes] == [10, 10]
+        assert writer.flushed_points == 20
+        assert writer.last_batch_size == 10
+
+
+def test_partial_batch_is_written_when_flush_interval_elapses():
+    with FakeInfluxEndpoint() as endpoint:
+        writer = make_writer(endpoint, batch_size=500, flush_interval_secs=0.1)
+        try:
+            for line in make_lines(3):
+                writer.write(line)
+
+            assert endpoint.wait_for_lines(3, timeout_secs=5) == make_lines(3)
+        finally:
+            writer.close()
+
+
+def test_close_flushes_pending_points():
+    with FakeInfluxEndpoint() as endpoint:
+        writer = make_writer(endpoint, batch_size=500, flush_interval_secs=60)
+        for line in make_lines(7):
+            writer.write(line)
+
+        writer.close()
+
+        assert endpoint.lines == make_lines(7)
+        assert writer.flushed_points == 7
+
+
+def test_batch_is_retried_while_influx_is_unavailable():
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(503, 500)
+        writer = make_writer(endpoint, batch_size=5, flush_interval_secs=60, max_retries=3)
+        for line in make_lines(5):
+            writer.write(line)
+
+        writer.close()
+
+        assert endpoint.rejected_writes == 2
+        assert endpoint.lines == make_lines(5)
+        assert writer.retried_batches == 2
+        assert writer.flushed_points == 5
+        assert writer.failed_points == 0
+
+
+def test_batch_is_dropped_after_last_retry():
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(503, 503, 503)
+        writer = make_writer(endpoint, batch_size=5, flush_interval_secs=60, max_retries=2)
+        for line in make_lines(5):
+            writer.write(line)
+
+        writer.close()
+
+        assert endpoint.rejected_writes == 3
+        assert endpoint.lines == []
+        assert writer.failed_points == 5
+
+
+def test_batch_rejected_by_influx_is_not_retried():
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(400)
+        writer = make_writer(endpoint, batch_size=5, flush_interval_secs=60, max_retries=3)
+        for line in make_lines(5):
+            writer.write(line)
+
+        writer.close()
+
+        assert endpoint.rejected_writes == 1
+        assert writer.retried_batches == 0
+        assert writer.failed_points == 5
+
+
+def test_oldest_points_are_dropped_when_backlog_is_full():
+    with FakeInfluxEndpoint() as endpoint:
+        endpoint.fail_next(503, 503)
+        writer = make_writer(endpoint, batch_size=5, flush_interval_secs=60, retry_delay_secs=0.2, max_pending_points=10)
+        lines = make_lines(20)
+        for line in lines[:5]:
+            writer.write(line)
+
+        # first batch is being retried, new points pile up meanwhile
+        deadline = time.monotonic() + 5
+        while endpoint.rejected_writes < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        for line in lines[5:]:
+            writer.write(line)
+
+        writer.close()
+
+        assert endpoint.lines == lines[:5] + lines[10:]
+        assert writer.dropped_points == 5
+        assert writer.failed_points == 0
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"batch_size": 0},
+        {"flush_interval_secs": 0},
+        {"max_retries": -1},
+        {"retry_delay_secs": -1},
+        {"batch_size": 10, "max_pending_points": 9}
+    ]
+)
+def test_invalid_arguments_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        BatchingInfluxWriter(url="http://127.0.0.1:1", token="token", org="org", bucket="bucket", **kwargs)
@@ -0,0 +1,62 @@
+import json
+
+from components import HOST_INFLUX_INGESTOR_DIR, PICOW_LOW_POWER_DIR, fake_secrets, load_device_module, use_component
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+with fake_secrets(
+        MQTT_BROKER="127.0.0.1",
+        CLIENT_NAME="test-ingestor",
+        USER_NAME=None,
+        PASSWORD=None,
+        TOPIC="test/measurements"
+):
+    import ingestion_supervisor  # noqa: E402
+
+device_frame = load_device_module(PICOW_LOW_POWER_DIR / "telemetry_frame.py", "device_telemetry_frame")
+
+WORKERS_COUNT = 4
+
+
+def device_messages(index: int) -> list:
+    machine_unique_id = bytes.fromhex("e6614104032400") + bytes([index])
+    json_message = json.dumps({
+        "payload": {"bme280": {"temperature": "23.31C"}},
+        "metadata": {"machine_unique_id": machine_unique_id.hex(":"), "journal": {"epoch": 1, "sequence": 7}}
+    }).encode()
+
+    record = device_frame.pack_record(0, (2331, None, None), 27.5, 150_000, 800_000)
+    header = dict(
+        machine_unique_id=machine_unique_id,
+        mac_address=bytes(6),
+        python_version=(1, 19, 1),
+        frequency=125_000_000,
+        wifi_connect_time_ms=850,
+        epoch=1
+    )
+    return [
+        json_message,
+        device_frame.pack_frame(sequence=7, record=record, **header),
+        device_frame.pack_batch(interval_secs=300, first_sequence=5, records=record * 3, **header)
+    ]
+
+
+def test_devices_are_partitioned_by_hash_by_default():
+    assert ingestion_supervisor.PARTITIONING == ingestion_supervisor.PARTITIONING_HASH
+
+
+def test_all_messages_of_device_are_processed_by_one_worker():
+    owners = []
+    for index in range(32):
+        for message in device_messages(index):
+            accepting_workers = [
+                worker_index
+                for worker_index in range(WORKERS_COUNT)
+                if ingestion_supervisor.is_own_message(message, worker_index, WORKERS_COUNT)
+            ]
+            assert len(accepting_workers) == 1
+            owners.append((index, accepting_workers[0]))
+
+    # JSON and binary messages of a device go to the same worker, devices are spread over workers
+    assert len(set(owners)) == 32
+    assert {worker_index for _, worker_index in owners} == set(range(WORKERS_COUNT))
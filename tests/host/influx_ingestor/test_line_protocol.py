@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from influxdb_client import Point
+
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+import line_protocol  # noqa: E402
+from line_protocol_benchmark import HOST, SAMPLE_READING, encode_point  # noqa: E402
+from payload_decoder import PicoWReading  # noqa: E402
+
+# edge cases which must be serialized the same way by influxdb_client Point and line_protocol
+CHECKED_READINGS = (
+    pytest.param(SAMPLE_READING, HOST, id="sample"),
+    pytest.param(
+        PicoWReading(
+            machine_unique_id="e6:61:41:04:03:24:ab:37",
+            temperature=20.0,
+            humidity=float("nan"),
+            pressure=1000,
+            current_voltage=None,
+            charge_percentage=100,
+            cpu_temperature=-1.5e-07,
+            mem_free=0,
+            measured_at=datetime(2023, 1, 1, tzinfo=timezone(timedelta(hours=2)))
+        ),
+        "Sensor, attic=\"north\" \\",
+        id="escaped-host-ints-and-nan"
+    ),
+    pytest.param(
+        PicoWReading(
+            machine_unique_id="e6:61:41:04:03:24:ab:38",
+            temperature=1e+22,
+            humidity=float("inf"),
+            pressure=0.1 + 0.2,
+            current_voltage=3.3,
+            charge_percentage=None,
+            cpu_temperature=25,
+            mem_free=-1,
+            measured_at=datetime(1969, 12, 31, 23, 59, 59, 1)
+        ),
+        "",
+        id="no-host-before-epoch"
+    ),
+    pytest.param(
+        PicoWReading(
+            machine_unique_id="e6:61:41:04:03:24:ab:39",
+            temperature=21.5,
+            humidity=50.0,
+            pressure=1013.25,
+            current_voltage=None,
+            charge_percentage=None,
+            cpu_temperature=24.0,
+            mem_free=150_000,
+            measured_at=datetime(2023, 1, 1),
+            wifi_connect_time_ms=900,
+            epoch=4242,
+            sequence=17
+        ),
+        "Kitchen,north=1 2",
+        id="journaled"
+    ),
+)
+
+
+@pytest.mark.parametrize("reading, host", CHECKED_READINGS)
+def test_reading_is_encoded_like_point(reading, host):
+    assert line_protocol.encode_reading(reading, host) == encode_point(reading, host)
+
+
+def test_journal_position_is_not_written():
+    line = line_protocol.encode_reading(
+        PicoWReading("e6:61:41:04:03:24:ab:36", 21.5, None, None, None, None, 24.0, 150_000, epoch=1, sequence=17),
+        "kitchen"
+    )
+
+    assert "sequence" not in line
+    assert "epoch" not in line
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["Sensor 1", "a,b", "x=1", "a, b=c d", "trailing\\", "multi\nline"],
+    ids=["space", "comma", "equals", "mixed", "backslash", "newline"]
+)
+def test_tag_value_is_escaped_like_point(value):
+    expected = Point("m").tag("host", value).field("f", 1).to_line_protocol()
+
+    assert f"m,host={line_protocol.escape_tag_value(value)} f=1i" == expected
+
+
+@pytest.mark.parametrize(
+    "value",
+    [20.0, 0.1 + 0.2, 1e+22, -1.5e-07, 1000, 0, -1, True, False, 'say "hi", x=1 \\'],
+    ids=["whole-float", "float", "large-float", "small-float", "int", "zero", "negative-int", "true", "false", "str"]
+)
+def test_field_value_is_formatted_like_point(value):
+    expected = Point("m").field("f", value).to_line_protocol()
+
+    assert f"m f={line_protocol.format_field_value(value)}" == expected
+
+
+def test_floats_and_ints_are_told_apart():
+    assert line_protocol.format_field_value(20.0) == "20"
+    assert line_protocol.format_field_value(20) == "20i"
+
+
+@pytest.mark.parametrize("value", [None, float("nan"), float("inf"), float("-inf")])
+def test_values_skipped_by_point_are_not_formatted(value):
+    assert line_protocol.format_field_value(value) is None
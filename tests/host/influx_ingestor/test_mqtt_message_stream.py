@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+from fake_mqtt_broker import FakeMqttBroker
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+import mqtt_message_stream  # noqa: E402
+from mqtt_message_stream import MqttMessageStream  # noqa: E402
+
+TOPIC = "test/measurements"
+
+
+async def wait_until(condition, timeout_secs: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout_secs
+    while not condition():
+        assert time.monotonic() < deadline, "Condition wasn't met in time"
+        await asyncio.sleep(0.01)
+
+
+async def connect(broker: FakeMqttBroker, **kwargs) -> MqttMessageStream:
+    messages = MqttMessageStream(mqtt.Client("test-stream"), TOPIC, **kwargs)
+    messages.connect("127.0.0.1", broker.port)
+    await wait_until(lambda: broker.subscriptions_count == 1)
+    return messages
+
+
+async def take(messages: MqttMessageStream, count: int) -> list:
+    payloads = []
+    async for payload in messages:
+        payloads.append(payload)
+        if len(payloads) == count:
+            break
+
+    return payloads
+
+
+def test_received_payloads_are_iterated_in_order():
+    async def receive(broker: FakeMqttBroker):
+        messages = await connect(broker)
+        for index in range(5):
+            broker.route(TOPIC, b"message %d" % index)
+
+        payloads = await asyncio.wait_for(take(messages, 5), 10)
+        messages.disconnect()
+        return messages, payloads
+
+    with FakeMqttBroker() as broker:
+        messages, payloads = asyncio.run(receive(broker))
+
+    assert payloads == [b"message %d" % index for index in range(5)]
+    assert messages.received == 5
+
+
+def test_iteration_ends_after_queued_payloads_when_disconnected():
+    async def receive(broker: FakeMqttBroker):
+        messages = await connect(broker)
+        for index in range(3):
+            broker.route(TOPIC, b"message %d" % index)
+
+        await wait_until(lambda: messages.queue_depth == 3)
+        messages.disconnect()
+        return [payload async for payload in messages]
+
+    with FakeMqttBroker() as broker:
+        assert asyncio.run(asyncio.wait_for(receive(broker), 10)) == [b"message %d" % index for index in range(3)]
+
+
+def test_socket_isnt_read_while_queue_is_full():
+    async def receive(broker: FakeMqttBroker):
+        messages = await connect(broker, max_queue_size=4)
+        for index in range(20):
+            broker.route(TOPIC, b"message %d" % index)
+
+        await wait_until(lambda: messages.paused == 1)
+        # give the loop a chance to read more if it still could
+        await asyncio.sleep(0.2)
+        depth_while_paused = messages.queue_depth
+
+        payloads = await asyncio.wait_for(take(messages, 20), 10)
+        messages.disconnect()
+        return messages, depth_while_paused, payloads
+
+    with FakeMqttBroker() as broker:
+        messages, depth_while_paused, payloads = asyncio.run(receive(broker))
+
+    assert depth_while_paused == 4
+    assert payloads == [b"message %d" % index for index in range(20)]
+    assert messages.queue_high_watermark == 4
+
+
+def test_subscription_is_restored_after_reconnect(monkeypatch):
+    monkeypatch.setattr(mqtt_message_stream, "RECONNECT_MIN_DELAY_SECS", 0)
+
+    async def receive(broker: FakeMqttBroker):
+        messages = await connect(broker)
+        broker.disconnect_clients()
+        await wait_until(lambda: broker.subscriptions_count == 0)
+        await wait_until(lambda: broker.subscriptions_count == 1)
+
+        broker.route(TOPIC, b"after reconnect")
+        payloads = await asyncio.wait_for(take(messages, 1), 10)
+        messages.disconnect()
+        return payloads
+
+    with FakeMqttBroker() as broker:
+        assert asyncio.run(receive(broker)) == [b"after reconnect"]
+
+
+def test_invalid_queue_size_is_rejected():
+    async def create():
+        MqttMessageStream(mqtt.Client("test-stream"), TOPIC, max_queue_size=0)
+
+    with pytest.raises(ValueError):
+        asyncio.run(create())
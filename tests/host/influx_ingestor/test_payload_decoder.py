@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+import line_protocol  # noqa: E402
+from payload_decoder import PayloadDecodeError, decode_message  # noqa: E402
+from reading_deduplicator import ReadingDeduplicator  # noqa: E402
+
+
+def make_message(bme280: dict, **metadata) -> bytes:
+    return json.dumps({
+        "payload": {"bme280": bme280},
+        "metadata": {
+            "machine_unique_id": "e6:61:41:04:03:24:ab:36",
+            "machine_metrics": {"cpu_temperature": 27.5, "mem_free": 150_000},
+            **metadata
+        }
+    }).encode()
+
+
+def test_channels_skipped_on_device_are_not_written():
+    _, reading = decode_message(make_message({"temperature": "23.31C", "humidity": "45.12%"}))
+
+    assert reading.temperature == pytest.approx(23.31)
+    assert reading.humidity == pytest.approx(45.12)
+    assert reading.pressure is None
+
+    line = line_protocol.encode_reading(reading, "kitchen")
+    assert "humidity=45.12," in line
+    assert "pressure=" not in line
+
+
+def test_message_without_temperature_is_rejected():
+    with pytest.raises(PayloadDecodeError, match="temperature"):
+        decode_message(make_message({"pressure": "1006.53hPa", "humidity": "45.12%"}))
+
+
+def test_buffered_messages_sent_again_are_dropped():
+    deduplicator = ReadingDeduplicator()
+    messages = [
+        make_message({"temperature": "23.31C"}, journal={"epoch": 4242, "sequence": sequence})
+        for sequence in range(3)
+    ]
+
+    # uplink failed after the second message, whole buffer is sent again with a new measurement
+    first_uplink = [decode_message(message)[1] for message in messages[:2]]
+    second_uplink = [decode_message(message)[1] for message in messages]
+
+    assert (first_uplink[1].epoch, first_uplink[1].sequence) == (4242, 1)
+    assert deduplicator.filter(first_uplink) == first_uplink
+    assert deduplicator.filter(second_uplink) == second_uplink[2:]
+
+
+def test_message_with_malformed_journal_is_rejected():
+    with pytest.raises(PayloadDecodeError, match="journal"):
+        decode_message(make_message({"temperature": "23.31C"}, journal={"epoch": 4242, "sequence": "1"}))
@@ -0,0 +1,72 @@
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, use_component
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+from payload_decoder import PicoWReading  # noqa: E402
+from reading_deduplicator import ReadingDeduplicator  # noqa: E402
+
+
+def make_reading(sequence, machine_unique_id: str = "e6:61:41:04:03:24:ab:36", epoch: int = 4242) -> PicoWReading:
+    return PicoWReading(
+        machine_unique_id=machine_unique_id,
+        temperature=23.31,
+        humidity=None,
+        pressure=None,
+        current_voltage=None,
+        charge_percentage=None,
+        cpu_temperature=27.5,
+        mem_free=150_000,
+        epoch=epoch,
+        sequence=sequence
+    )
+
+
+def sequences(readings) -> list:
+    return [reading.sequence for reading in readings]
+
+
+def test_resent_buffer_is_accepted_once():
+    deduplicator = ReadingDeduplicator()
+
+    assert sequences(deduplicator.filter([make_reading(index) for index in range(10)])) == list(range(10))
+    assert sequences(deduplicator.filter([make_reading(index) for index in range(12)])) == [10, 11]
+    assert deduplicator.duplicates == 10
+
+
+def test_reordered_readings_are_accepted():
+    deduplicator = ReadingDeduplicator(window_size=8)
+
+    # second worker finished its batch first
+    assert sequences(deduplicator.filter([make_reading(index) for index in (4, 5, 6, 0, 1, 2, 3)])) == [4, 5, 6, 0, 1, 2, 3]
+    assert sequences(deduplicator.filter([make_reading(index) for index in range(8)])) == [7]
+
+
+def test_readings_older_than_window_are_dropped():
+    deduplicator = ReadingDeduplicator(window_size=8)
+
+    assert sequences(deduplicator.filter([make_reading(100), make_reading(92), make_reading(93)])) == [100, 93]
+
+
+def test_readings_of_new_epoch_and_without_sequence_are_accepted():
+    deduplicator = ReadingDeduplicator()
+    deduplicator.filter([make_reading(5)])
+
+    assert sequences(deduplicator.filter([make_reading(5, epoch=1), make_reading(None), make_reading(None)])) == [5, None, None]
+
+
+def test_least_recently_seen_devices_are_forgotten():
+    deduplicator = ReadingDeduplicator(max_tracked_devices=2)
+    deduplicator.filter([make_reading(0, "a"), make_reading(0, "b")])
+    deduplicator.filter([make_reading(1, "a"), make_reading(0, "c")])
+
+    assert len(deduplicator) == 2
+    assert deduplicator.forgotten_devices == 1
+    assert sequences(deduplicator.filter([make_reading(1, "a"), make_reading(0, "b")])) == [0]
+
+
+@pytest.mark.parametrize("arguments", [{"window_size": 0}, {"max_tracked_devices": 0}])
+def test_invalid_limits_are_rejected(arguments):
+    with pytest.raises(ValueError):
+        ReadingDeduplicator(**arguments)
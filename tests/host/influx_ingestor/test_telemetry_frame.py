@@ -0,0 +1,172 @@
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from components import HOST_INFLUX_INGESTOR_DIR, PICOW_LOW_POWER_DIR, load_device_module, use_component
+
+use_component(HOST_INFLUX_INGESTOR_DIR)
+
+import telemetry_frame  # noqa: E402
+from payload_decoder import PayloadDecodeError  # noqa: E402
+
+device_frame = load_device_module(PICOW_LOW_POWER_DIR / "telemetry_frame.py", "device_telemetry_frame")
+
+MACHINE_UNIQUE_ID = bytes.fromhex("e66141040324ab36")
+MAC_ADDRESS = bytes.fromhex("28cdc1000102")
+HEADER_VALUES = {
+    "machine_unique_id": MACHINE_UNIQUE_ID,
+    "mac_address": MAC_ADDRESS,
+    "python_version": (3, 4, 0),
+    "frequency": 125_000_000,
+    "wifi_connect_time_ms": 850,
+    "epoch": 4242,
+}
+
+
+def make_record(index: int = 0, current_voltage=None, charge_percentage=None, uptime_ms: int = None) -> bytes:
+    return device_frame.pack_record(
+        uptime_ms=60_000 * index if uptime_ms is None else uptime_ms,
+        bme280_reading=(2331 + index, 25697540, 55893),
+        cpu_temperature=27.5,
+        mem_free=150_000 + index,
+        flash_free_space_bytes=800_000,
+        current_voltage=current_voltage,
+        charge_percentage=charge_percentage
+    )
+
+
+def test_device_and_host_layouts_match():
+    assert device_frame.FORMAT_VERSION == telemetry_frame.FORMAT_VERSION
+    assert device_frame.FRAME_HEADER_FORMAT == telemetry_frame.FRAME_HEADER_FORMAT
+    assert device_frame.BATCH_HEADER_FORMAT == telemetry_frame.BATCH_HEADER_FORMAT
+    assert device_frame.RECORD_FORMAT == telemetry_frame.RECORD_FORMAT
+    assert device_frame.FRAME_SIZE == telemetry_frame.FRAME_DTYPE.itemsize
+
+
+def test_frame_packed_on_device_is_decoded():
+    raw_payload = device_frame.pack_frame(sequence=17, record=make_record(0, 3.95, 87.5), **HEADER_VALUES)
+
+    assert telemetry_frame.is_frame(raw_payload)
+    assert telemetry_frame.peek_machine_unique_id(raw_payload) == MACHINE_UNIQUE_ID
+
+    reading = telemetry_frame.decode_frame(raw_payload)
+    assert reading.machine_unique_id == "e6:61:41:04:03:24:ab:36"
+    assert reading.temperature == pytest.approx(23.31)
+    assert reading.pressure == pytest.approx(25697540 / 25600)
+    assert reading.humidity == pytest.approx(55893 / 1024)
+    assert reading.cpu_temperature == pytest.approx(27.5)
+    assert reading.mem_free == 150_000
+    assert reading.current_voltage == pytest.approx(3.95)
+    assert reading.charge_percentage == pytest.approx(87.5)
+    assert reading.wifi_connect_time_ms == 850
+    assert (reading.epoch, reading.sequence) == (4242, 17)
+
+
+def test_values_not_available_on_device_are_decoded_as_none():
+    values = dict(HEADER_VALUES, wifi_connect_time_ms=None)
+    reading = telemetry_frame.decode_frame(device_frame.pack_frame(sequence=0, record=make_record(), **values))
+
+    assert reading.current_voltage is None
+    assert reading.charge_percentage is None
+    assert reading.wifi_connect_time_ms is None
+
+
+def test_batch_packed_on_device_is_decoded_with_consecutive_sequences():
+    records = b"".join(make_record(index) for index in range(3))
+    raw_payload = device_frame.pack_batch(interval_secs=60, first_sequence=0xFFFFFFFF, records=records, **HEADER_VALUES)
+    received_at = datetime(2023, 1, 1, 12, 0, 0)
+
+    assert telemetry_frame.is_batch(raw_payload)
+    assert telemetry_frame.peek_machine_unique_id(raw_payload) == MACHINE_UNIQUE_ID
+
+    readings = telemetry_frame.decode_batch(raw_payload, received_at=received_at)
+    assert [reading.temperature for reading in readings] == pytest.approx([23.31, 23.32, 23.33])
+    assert [reading.sequence for reading in readings] == [0xFFFFFFFF, 0, 1]
+    assert {reading.epoch for reading in readings} == {4242}
+    assert [reading.measured_at for reading in readings] == [
+        received_at - timedelta(seconds=120), received_at - timedelta(seconds=60), received_at
+    ]
+    assert [reading.wifi_connect_time_ms for reading in readings] == [None, None, 850]
+
+
+def test_batch_records_are_timestamped_by_uptime_not_by_interval():
+    # wake-up between the first and the second record was lost, e.g. because of a reset loop,
+    # and uptime wrapped around 32 bits before the last one
+    uptimes = [0xFFFFFFFF - 149_999, 0xFFFFFFFF - 29_999, 30_000]
+    records = b"".join(make_record(index, uptime_ms=uptime) for index, uptime in enumerate(uptimes))
+    raw_payload = device_frame.pack_batch(interval_secs=60, first_sequence=0, records=records, **HEADER_VALUES)
+    received_at = datetime(2023, 1, 1, 12, 0, 0)
+
+    readings = telemetry_frame.decode_batch(raw_payload, received_at=received_at)
+
+    assert [reading.measured_at for reading in readings] == [
+        received_at - timedelta(seconds=180), received_at - timedelta(seconds=60), received_at
+    ]
+
+
+def test_concatenated_frames_are_decoded_like_single_frames():
+    frames = [device_frame.pack_frame(sequence=index, record=make_record(index), **HEADER_VALUES) for index in range(4)]
+
+    readings = telemetry_frame.decode_frames(b"".join(frames))
+    expected = [telemetry_frame.decode_frame(frame) for frame in frames]
+
+    for reading, expected_reading in zip(readings, expected):
+        for name in expected_reading.__slots__:
+            assert getattr(reading, name) == pytest.approx(getattr(expected_reading, name)), name
+
+
+def test_unknown_version_is_rejected():
+    raw_payload = bytearray(device_frame.pack_frame(sequence=0, record=make_record(), **HEADER_VALUES))
+    raw_payload[1] = telemetry_frame.FORMAT_VERSION + 1
+
+    with pytest.raises(PayloadDecodeError, match="Unsupported version"):
+        telemetry_frame.decode_frame(bytes(raw_payload))
+
+
+@pytest.mark.parametrize("size_change", [-1, 1])
+def test_frame_of_unexpected_size_is_rejected(size_change):
+    raw_payload = device_frame.pack_frame(sequence=0, record=make_record(), **HEADER_VALUES)
+    raw_payload = raw_payload[:size_change] if size_change < 0 else raw_payload + b"\x00"
+
+    with pytest.raises(PayloadDecodeError):
+        telemetry_frame.decode_frame(raw_payload)
+
+
+def test_batch_with_wrong_records_count_is_rejected():
+    raw_payload = bytearray(device_frame.pack_batch(interval_secs=60, first_sequence=0, records=make_record(), **HEADER_VALUES))
+    struct.pack_into("<H", raw_payload, struct.calcsize("<BB8s6sBBBIH"), 2)
+
+    with pytest.raises(PayloadDecodeError, match="Unexpected batch size"):
+        telemetry_frame.decode_batch(bytes(raw_payload), received_at=datetime(2023, 1, 1))
+
+
+def test_skipped_channels_are_decoded_as_none():
+    record = device_frame.pack_record(
+        uptime_ms=0,
+        bme280_reading=(2331, None, None),
+        cpu_temperature=27.5,
+        mem_free=150_000,
+        flash_free_space_bytes=800_000
+    )
+
+    frame_reading = telemetry_frame.decode_frame(device_frame.pack_frame(sequence=0, record=record, **HEADER_VALUES))
+    batch_reading, = telemetry_frame.decode_batch(
+        device_frame.pack_batch(interval_secs=60, first_sequence=0, records=record, **HEADER_VALUES),
+        received_at=datetime(2023, 1, 1)
+    )
+
+    for reading in (frame_reading, batch_reading):
+        assert reading.temperature == pytest.approx(23.31)
+        assert reading.pressure is None
+        assert reading.humidity is None
+
+
+@pytest.mark.parametrize("bme280_reading, current_voltage, charge_percentage", [
+    ((2331, 25697540, 55893), 3.95, 87.5),
+    ((-4000, None, None), None, None),
+])
+def test_record_is_unpacked_on_device_for_json_messages(bme280_reading, current_voltage, charge_percentage):
+    values = (12_345, bme280_reading, 27.5, 150_000, 800_000, current_voltage, charge_percentage)
+
+    assert device_frame.unpack_record(device_frame.pack_record(*values)) == values
@@ -0,0 +1,11 @@
+import pytest
+
+from components import HOST_EVENTS_RECEIVER_DIR, HOST_INFLUX_INGESTOR_DIR
+
+# host programs are started from their own directories, so modules they share are copied
+SHARED_MODULES = ["message_pipeline.py"]
+
+
+@pytest.mark.parametrize("module", SHARED_MODULES)
+def test_module_is_the_same_in_events_receiver_and_influx_ingestor(module):
+    assert (HOST_EVENTS_RECEIVER_DIR / module).read_bytes() == (HOST_INFLUX_INGESTOR_DIR / module).read_bytes()
@@ -0,0 +1,72 @@
+"""
+Runs Pico W code on MicroPython (unix port compiled to WebAssembly) when micropython-wasm is
+installed, tests using it are skipped otherwise. It has the same 31-bit small integers as rp2
+port, but no viper and native code emitters, no machine and socket modules and no writable file
+system. Its garbage collector doesn't see objects referenced only from running functions, so code
+run by tests must not trigger collection: gc.collect() crashes it and heap must not get full
+"""
+import shutil
+import textwrap
+import typing
+from pathlib import Path
+
+import pytest
+
+try:
+    import micropython_wasm
+except ImportError:
+    micropython_wasm = None
+
+requires_micropython = pytest.mark.skipif(micropython_wasm is None, reason="micropython-wasm is not installed")
+
+_FAILURE_MARKER = "--- MicroPython traceback ---"
+
+_WRAPPER = """import sys
+sys.path.insert(0, "/input")
+try:
+{code}
+except BaseException as e:
+    print({marker!r})
+    sys.print_exception(e)
+"""
+
+
+def run_micropython(
+        code: str,
+        work_dir: Path,
+        source_files: typing.Iterable[Path] = (),
+        extra_files: typing.Optional[typing.Dict[str, str]] = None,
+        fuel: int = 10 ** 11
+) -> str:
+    """
+    Copies source files and writes extra ones (e.g. stubs of hardware modules) to work_dir,
+    which is importable in MicroPython, runs code and returns its output. Exception raised by
+    code fails the test with MicroPython traceback
+    """
+
+    if micropython_wasm is None:
+        pytest.skip("micropython-wasm is not installed")
+
+    for source_file in source_files:
+        destination = work_dir / source_file.name
+        if source_file.is_dir():
+            shutil.copytree(source_file, destination, ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            shutil.copy(source_file, destination)
+
+    for file_name, content in (extra_files or {}).items():
+        (work_dir / file_name).write_text(textwrap.dedent(content))
+
+    result = micropython_wasm.run_micropython_wasi(
+        _WRAPPER.format(code=textwrap.indent(textwrap.dedent(code), "    "), marker=_FAILURE_MARKER),
+        micropython_wasm.default_wasm_path(),
+        fuel=fuel,
+        wall_timeout_seconds=None,
+        readonly_dir=work_dir
+    )
+
+    output, _, traceback = result.stdout.partition(_FAILURE_MARKER)
+    if traceback:
+        pytest.fail(f"MicroPython code failed:{traceback}\noutput:\n{output}{result.stderr}", pytrace=False)
+
+    return output
@@ -0,0 +1,137 @@
+import sys
+from unittest import mock
+
+import pytest
+
+from bme280_golden_vectors import GOLDEN_VECTORS
+from bme280_reference import CALIBRATIONS
+from components import PICOW_ALWAYS_ON_DIR, load_device_module
+from fake_i2c import FakeBME280, FakeI2C
+from fake_utime import FakeClock
+
+bme280 = load_device_module(PICOW_ALWAYS_ON_DIR / "lib" / "bme280.py", "always_on_bme280")
+with mock.patch.dict(sys.modules, {"bme280": bme280}):
+    bme280_bus = load_device_module(PICOW_ALWAYS_ON_DIR / "bme280_bus.py", "always_on_bme280_bus")
+
+# different calibration and raw readings for every sensor, so mixed up results are noticed
+PRIMARY_VECTOR = GOLDEN_VECTORS[0]
+SECONDARY_VECTOR = next(vector for vector in GOLDEN_VECTORS if vector[0] == 1)
+
+
+def make_device(vector, **kwargs) -> FakeBME280:
+    return FakeBME280(CALIBRATIONS[vector[0]], vector[1:4], **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(bme280, "time", clock)
+    monkeypatch.setattr(bme280_bus, "time", clock)
+    return clock
+
+
+def make_manager(**kwargs):
+    buses = [
+        ("i2c0", FakeI2C({0x76: make_device(PRIMARY_VECTOR)})),
+        ("i2c1", FakeI2C({0x77: make_device(SECONDARY_VECTOR)})),
+    ]
+    return bme280_bus.BME280BusManager(buses, **kwargs), [i2c for _, i2c in buses]
+
+
+def test_sensors_are_keyed_by_bus_name_and_address():
+    manager, _ = make_manager()
+
+    # keys of bme280_sensors in the sensor payload
+    assert [key for key, _ in manager.sensors] == ["i2c0:0x76", "i2c1:0x77"]
+
+
+def test_other_devices_on_sensor_addresses_are_skipped():
+    bmp280 = make_device(PRIMARY_VECTOR, chip_id=0x58)
+    buses = [("i2c0", FakeI2C({0x76: bmp280, 0x77: make_device(SECONDARY_VECTOR)}))]
+
+    manager = bme280_bus.BME280BusManager(buses)
+
+    assert [key for key, _ in manager.sensors] == ["i2c0:0x77"]
+
+
+def test_bus_without_sensors_fails():
+    with pytest.raises(OSError, match="No BME280 sensors found"):
+        bme280_bus.BME280BusManager([("i2c0", FakeI2C({}))])
+
+
+def test_shared_scratch_buffers_dont_leak_readings_between_sensors():
+    manager, _ = make_manager()
+
+    assert manager.read_all() == [
+        ("i2c0:0x76", bme280.BME280Reading(*PRIMARY_VECTOR[4:7])),
+        ("i2c1:0x77", bme280.BME280Reading(*SECONDARY_VECTOR[4:7])),
+    ]
+
+
+def test_int32_compensation_doesnt_leak_readings_between_sensors():
+    manager, _ = make_manager(int32_compensation=True)
+
+    expected = []
+    for key, sensor in manager.sensors:
+        raw = [0, 0, 0]
+        sensor.read_raw_result(raw)
+        expected.append((key, bme280.BME280Reading(*sensor.compensate_int32(raw))))
+
+    readings = manager.read_all()
+
+    assert readings == expected
+    assert readings[0][1] != readings[1][1]
+
+
+def test_conversions_of_all_sensors_are_started_before_waiting(clock):
+    manager, buses = make_manager()
+    for i2c in buses:
+        i2c.log.clear()
+
+    manager.read_all()
+
+    # every sensor was triggered once and the wait happened after both triggers
+    for i2c in buses:
+        assert [register for _, register, _ in i2c.writes()] == [
+            bme280.BME280_REGISTER_CONTROL_HUM, bme280.BME280_REGISTER_CONTROL
+        ]
+
+    assert clock.sleeps[0] == manager.typical_conversion_time()
+
+
+def test_sensor_which_naks_is_left_out_until_it_responds_again(capsys):
+    manager, buses = make_manager()
+    buses[1].devices[0x77].naks = True
+
+    assert manager.read_all() == [("i2c0:0x76", bme280.BME280Reading(*PRIMARY_VECTOR[4:7]))]
+    assert "i2c1:0x77 doesn't respond" in capsys.readouterr().out
+
+    buses[1].devices[0x77].naks = False
+
+    assert [key for key, _ in manager.read_all()] == ["i2c0:0x76", "i2c1:0x77"]
+
+
+def test_sensor_which_naks_during_readout_doesnt_repeat_previous_reading():
+    manager, buses = make_manager()
+    secondary = buses[1].devices[0x77]
+    original_read = secondary.read
+
+    def nak_on_readout(register: int, size: int) -> bytes:
+        if register == 0xF7:
+            raise OSError(5)
+
+        return original_read(register, size)
+
+    secondary.read = nak_on_readout
+
+    assert manager.read_all() == [("i2c0:0x76", bme280.BME280Reading(*PRIMARY_VECTOR[4:7]))]
+
+
+def test_reading_fails_when_no_sensor_responds():
+    manager, buses = make_manager()
+    for i2c in buses:
+        for device in i2c.devices.values():
+            device.naks = True
+
+    with pytest.raises(OSError, match="No BME280 sensor responded"):
+        manager.read_all()
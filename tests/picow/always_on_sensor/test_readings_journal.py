@@ -0,0 +1,76 @@
+import sys
+from unittest import mock
+
+import pytest
+
+from components import PICOW_ALWAYS_ON_DIR, load_device_module
+
+bme280 = load_device_module(PICOW_ALWAYS_ON_DIR / "lib" / "bme280.py", "always_on_bme280")
+measurements_buffer = load_device_module(PICOW_ALWAYS_ON_DIR / "measurements_buffer.py", "always_on_measurements_buffer")
+with mock.patch.dict(sys.modules, {"bme280": bme280, "measurements_buffer": measurements_buffer}):
+    readings_journal = load_device_module(PICOW_ALWAYS_ON_DIR / "readings_journal.py", "always_on_readings_journal")
+
+SENSOR_KEYS = ["i2c0:0x76", "i2c1:0x77"]
+PRIMARY = bme280.BME280Reading(2331, 100_653, 47_445)
+SECONDARY = bme280.BME280Reading(-1250, 98_000, None)
+
+
+@pytest.fixture(autouse=True)
+def flash(tmp_path, monkeypatch):
+    # journal files are created in current directory, like on device
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def make_journal(sensor_keys=SENSOR_KEYS, capacity: int = 48):
+    return readings_journal.ReadingsJournal(sensor_keys, capacity=capacity)
+
+
+def test_readings_survive_reset_with_their_uptime():
+    journal = make_journal()
+    journal.append(5_000, [("i2c0:0x76", PRIMARY), ("i2c1:0x77", SECONDARY)])
+    journal.append(10_000, [("i2c0:0x76", PRIMARY)])
+
+    journal = make_journal()
+
+    assert journal.count() == 2
+    assert list(journal.records()) == [
+        (5_000, [("i2c0:0x76", PRIMARY), ("i2c1:0x77", SECONDARY)]),
+        (10_000, [("i2c0:0x76", PRIMARY)]),
+    ]
+
+
+def test_sensor_which_didnt_respond_is_left_out_and_order_of_sensors_is_kept():
+    journal = make_journal()
+    journal.append(0, [("i2c1:0x77", SECONDARY)])
+
+    assert list(journal.records()) == [(0, [("i2c1:0x77", SECONDARY)])]
+
+
+def test_sequence_numbers_continue_after_journal_is_cleared():
+    journal = make_journal()
+    for uptime_ms in range(3):
+        journal.append(uptime_ms, [("i2c0:0x76", PRIMARY)])
+
+    epoch = journal.epoch
+    journal.clear()
+    journal.append(3, [("i2c0:0x76", PRIMARY)])
+
+    assert (journal.epoch, journal.first_sequence) == (epoch, 3)
+    assert list(journal.records()) == [(3, [("i2c0:0x76", PRIMARY)])]
+
+
+def test_journal_of_other_sensors_count_isnt_misread(flash):
+    make_journal().append(0, [("i2c0:0x76", PRIMARY), ("i2c1:0x77", SECONDARY)])
+
+    journal = make_journal(sensor_keys=SENSOR_KEYS[:1])
+
+    assert journal.count() == 0
+    assert list(journal.records()) == []
+
+
+def test_uptime_is_truncated_to_32_bits():
+    journal = make_journal()
+    journal.append((1 << 32) + 42, [("i2c0:0x76", PRIMARY)])
+
+    assert [uptime_ms for uptime_ms, _ in journal.records()] == [42]
@@ -0,0 +1,266 @@
+import asyncio
+import sys
+import time
+import types
+from unittest import mock
+
+import pytest
+
+from components import PICOW_ALWAYS_ON_DIR, load_device_module
+
+# virtual second of device clock takes 10 ms, so keepalive periods pass quickly
+TIME_SCALE = 0.01
+
+
+class FakeSocket(object):
+    """
+    Non-blocking socket of MQTT connection, broker side queues bytes to be read
+    """
+
+    def __init__(self):
+        self.blocking = True
+        self.sent = bytearray()
+        self.writes = []
+        self.incoming = bytearray()
+        self.closed = False
+        self.received = asyncio.Event()
+
+    def setblocking(self, flag: bool) -> None:
+        self.blocking = flag
+
+    def feed(self, data: bytes) -> None:
+        self.incoming.extend(data)
+        self.received.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.received.set()
+
+
+class StreamWriter(object):
+    """
+    uasyncio.StreamWriter, drain hands written bytes to socket at once
+    """
+
+    def __init__(self, sock: FakeSocket, extra: dict):
+        self.sock = sock
+        self.out_buf = b""
+
+    def write(self, buf) -> None:
+        self.out_buf += bytes(buf)
+
+    async def drain(self) -> None:
+        await asyncio.sleep(0)
+        self.sock.writes.append(self.out_buf)
+        self.sock.sent.extend(self.out_buf)
+        self.out_buf = b""
+
+
+class StreamReader(object):
+    """
+    uasyncio.StreamReader, readexactly raises EOFError when connection is closed
+    """
+
+    def __init__(self, sock: FakeSocket):
+        self.sock = sock
+
+    async def readexactly(self, n: int) -> bytes:
+        while len(self.sock.incoming) < n:
+            if self.sock.closed:
+                raise EOFError
+
+            self.sock.received.clear()
+            await self.sock.received.wait()
+
+        data = bytes(self.sock.incoming[:n])
+        del self.sock.incoming[:n]
+        return data
+
+
+def make_uasyncio() -> types.ModuleType:
+    module = types.ModuleType("uasyncio")
+    module.Lock = asyncio.Lock
+    module.Event = asyncio.Event
+    module.gather = asyncio.gather
+    module.run = asyncio.run
+    module.sleep = lambda secs: asyncio.sleep(secs * TIME_SCALE)
+    module.sleep_ms = lambda msecs: asyncio.sleep(msecs / 1000 * TIME_SCALE)
+    module.wait_for_ms = lambda awaitable, msecs: asyncio.wait_for(awaitable, msecs / 1000 * TIME_SCALE)
+    module.StreamWriter = StreamWriter
+    module.StreamReader = StreamReader
+    return module
+
+
+def ticks_ms() -> int:
+    return int(time.monotonic() * 1000 / TIME_SCALE)
+
+
+def load_sensor_tasks() -> types.ModuleType:
+    stubs = {
+        "machine": types.SimpleNamespace(Pin=object, WDT=object),
+        "uasyncio": make_uasyncio(),
+        "usocket": types.ModuleType("usocket"),
+        "bme280_bus": types.SimpleNamespace(BME280BusManager=object),
+        "consts": load_device_module(PICOW_ALWAYS_ON_DIR / "consts.py", "always_on_consts"),
+    }
+    with mock.patch.dict(sys.modules, stubs):
+        sys.modules["umqtt.simple"] = load_device_module(PICOW_ALWAYS_ON_DIR / "lib" / "umqtt" / "simple.py", "umqtt.simple")
+        sys.modules["umqtt"] = types.SimpleNamespace(simple=sys.modules["umqtt.simple"])
+        module = load_device_module(PICOW_ALWAYS_ON_DIR / "sensor_tasks.py", "always_on_sensor_tasks")
+
+    module.time = types.SimpleNamespace(
+        ticks_ms=ticks_ms,
+        ticks_diff=lambda end, start: end - start,
+        ticks_add=lambda ticks, delta: ticks + delta,
+    )
+    return module
+
+
+sensor_tasks = load_sensor_tasks()
+
+
+def make_client(keepalive: int = 4) -> types.SimpleNamespace:
+    return types.SimpleNamespace(sock=FakeSocket(), keepalive=keepalive, last_ping=0, last_cpacket=ticks_ms())
+
+
+async def answer_pings(client) -> None:
+    """
+    Broker responds to every PINGREQ with PINGRESP
+    """
+
+    answered = 0
+    while True:
+        pings = client.sock.writes.count(b"\xc0\x00")
+        if pings > answered:
+            client.sock.feed(b"\xd0\x00" * (pings - answered))
+            answered = pings
+
+        await asyncio.sleep(0.001)
+
+
+async def run_for(seconds: float, *coroutines):
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=seconds * TIME_SCALE, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@pytest.mark.parametrize(
+    "payload, remaining_length",
+    [
+        ("{}", b"\x0b"),
+        ("x" * 200, b"\xd1\x01"),
+    ],
+    ids=["short", "two-byte-length"]
+)
+def test_publish_sends_same_packet_as_mqtt_client(payload, remaining_length):
+    client = make_client()
+
+    async def publish():
+        await sensor_tasks.MqttWriter(client).publish("sensors", payload)
+
+    asyncio.run(publish())
+
+    assert client.sock.writes == [b"\x30" + remaining_length + b"\x00\x07sensors" + payload.encode()]
+
+
+def test_publish_buffer_is_reused():
+    client = make_client()
+
+    async def publish():
+        writer = sensor_tasks.MqttWriter(client)
+        await writer.publish("t", "x" * 300)
+        grown = writer._publish_buffer
+        await writer.publish("t", "short")
+        return grown is writer._publish_buffer
+
+    assert asyncio.run(publish())
+    assert client.sock.writes[1] == b"\x30\x08\x00\x01tshort"
+
+
+def test_packets_of_concurrent_tasks_are_not_interleaved():
+    client = make_client()
+
+    async def write():
+        writer = sensor_tasks.MqttWriter(client)
+        await asyncio.gather(writer.publish("t", "first"), writer.ping(), writer.publish("t", "second"))
+
+    asyncio.run(write())
+
+    assert client.sock.writes == [b"\x30\x08\x00\x01tfirst", b"\xc0\x00", b"\x30\x09\x00\x01tsecond"]
+
+
+def test_received_packets_refresh_connection_liveness():
+    client = make_client()
+    client.last_cpacket = 0
+    # PINGRESP and SUBACK-like packet with two bytes of remaining length, which is skipped
+    client.sock.feed(b"\xd0\x00" + b"\x90\x80\x01" + b"\x00" * 128)
+    client.sock.close()
+
+    with pytest.raises(EOFError):
+        asyncio.run(sensor_tasks.receive_task(client))
+
+    assert client.sock.incoming == b""
+    assert client.last_cpacket > 0
+
+
+def test_keepalive_pings_without_blocking_event_loop():
+    client = make_client(keepalive=4)
+    ticks = []
+
+    async def other_task():
+        while True:
+            ticks.append(ticks_ms())
+            await asyncio.sleep(0.1 * TIME_SCALE)
+
+    async def run():
+        writer = sensor_tasks.MqttWriter(client)
+        await run_for(
+            9,
+            sensor_tasks.receive_task(client),
+            sensor_tasks.keepalive_task(client, writer, client.keepalive),
+            answer_pings(client),
+            other_task()
+        )
+
+    asyncio.run(run())
+
+    # pings are sent every keepalive / 2 seconds
+    assert client.sock.writes == [b"\xc0\x00"] * 4
+    assert len(ticks) > 50
+
+
+def test_keepalive_fails_when_broker_stops_responding():
+    client = make_client(keepalive=4)
+
+    async def run():
+        writer = sensor_tasks.MqttWriter(client)
+        await run_for(
+            20,
+            sensor_tasks.receive_task(client),
+            sensor_tasks.keepalive_task(client, writer, client.keepalive)
+        )
+
+    with pytest.raises(OSError, match="No PINGRESP"):
+        asyncio.run(run())
+
+    # broker had keepalive / 2 seconds to respond to the ping
+    assert client.sock.writes == [b"\xc0\x00"]
+
+
+def test_readings_are_stamped_with_uptime_and_the_oldest_is_dropped_when_queue_is_full():
+    uptime = iter(range(0, 1_000_000, 5_000))
+    state = sensor_tasks.SensorState(types.SimpleNamespace(uptime_ms=lambda: next(uptime)))
+
+    for index in range(sensor_tasks.consts.MAX_PENDING_READINGS + 1):
+        state.add_reading([("i2c0:0x76", index)])
+
+    assert len(state.readings) == sensor_tasks.consts.MAX_PENDING_READINGS
+    assert state.readings[0] == (5_000, [("i2c0:0x76", 1)])
+    assert state.new_readings.is_set()
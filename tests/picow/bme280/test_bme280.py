@@ -0,0 +1,43 @@
+import pytest
+
+from components import PICOW_LOW_POWER_DIR, load_device_module
+
+bme280 = load_device_module(PICOW_LOW_POWER_DIR / "lib" / "bme280.py", "device_bme280")
+
+# calibration and raw readings from the BME280 datasheet example
+CALIBRATION = (27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000, 75, 362, 0, 313, 50, 30)
+RAW = (519888, 415148, 27000)
+
+
+def make_sensor(**kwargs) -> bme280.BME280:
+    return bme280.BME280(
+        i2c=object(),
+        calibration=bme280.pack(bme280.BME280_CALIBRATION_FORMAT, *CALIBRATION),
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize("skipped", [
+    {"osrs_p": bme280.BME280_OSAMPLE_SKIP},
+    {"osrs_h": bme280.BME280_OSAMPLE_SKIP},
+    {"osrs_p": bme280.BME280_OSAMPLE_SKIP, "osrs_h": bme280.BME280_OSAMPLE_SKIP},
+])
+def test_skipped_channels_are_none(skipped):
+    measured = make_sensor().compensate(RAW)
+    reading = make_sensor(**skipped).compensate(RAW)
+
+    expected = [
+        measured[0],
+        None if "osrs_p" in skipped else measured[1],
+        None if "osrs_h" in skipped else measured[2]
+    ]
+    assert reading == expected
+
+    formatted = bme280.format_reading(measured)
+    assert bme280.format_reading(reading) == tuple(
+        None if value is None else text for value, text in zip(expected, formatted)
+    )
+
+
+def test_measured_channels_are_formatted():
+    assert bme280.format_reading((2508, 25767236, 51940)) == ("25.08C", "1006.53hPa", "50.72%")
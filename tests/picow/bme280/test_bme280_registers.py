@@ -0,0 +1,137 @@
+import pytest
+
+from bme280_golden_vectors import GOLDEN_VECTORS
+from bme280_reference import CALIBRATIONS
+from components import PICOW_LOW_POWER_DIR, load_device_module
+from fake_i2c import FakeBME280, FakeI2C
+from fake_utime import FakeClock
+
+bme280 = load_device_module(PICOW_LOW_POWER_DIR / "lib" / "bme280.py", "device_bme280")
+
+ADDRESS = 0x76
+MEASURING = bme280.BME280_STATUS_MEASURING
+DATASHEET_VECTOR = GOLDEN_VECTORS[0]
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(bme280, "time", clock)
+    return clock
+
+
+def make_sensor(status_sequence=(0,), **kwargs):
+    device = FakeBME280(CALIBRATIONS[0], DATASHEET_VECTOR[1:4], status_sequence=status_sequence)
+    i2c = FakeI2C({ADDRESS: device})
+    sensor = bme280.BME280(address=ADDRESS, i2c=i2c, **kwargs)
+    i2c.log.clear()
+    return sensor, i2c
+
+
+def test_calibration_is_read_from_registers():
+    sensor, _ = make_sensor()
+
+    assert sensor.calibration == bme280.pack(bme280.BME280_CALIBRATION_FORMAT, *CALIBRATIONS[0])
+
+
+def test_normal_mode_is_configured_in_sleep_mode_with_ctrl_hum_before_ctrl_meas():
+    sensor, i2c = make_sensor()
+
+    sensor.configure_normal_mode(
+        standby=bme280.BME280_STANDBY_1000,
+        iir_filter=bme280.BME280_IIR_FILTER_4,
+        osrs_t=bme280.BME280_OSAMPLE_2,
+        osrs_p=bme280.BME280_OSAMPLE_16,
+        osrs_h=bme280.BME280_OSAMPLE_1
+    )
+
+    osrs = bme280.BME280_OSAMPLE_2 << 5 | bme280.BME280_OSAMPLE_16 << 2
+    assert i2c.writes() == [
+        (ADDRESS, bme280.BME280_REGISTER_CONTROL_HUM, bytes([bme280.BME280_OSAMPLE_1])),
+        (ADDRESS, bme280.BME280_REGISTER_CONTROL, bytes([osrs | bme280.BME280_MODE_SLEEP])),
+        # t_sb bits 7:5, filter bits 4:2
+        (ADDRESS, bme280.BME280_REGISTER_CONFIG, bytes([0b101_010_00])),
+        (ADDRESS, bme280.BME280_REGISTER_CONTROL_HUM, bytes([bme280.BME280_OSAMPLE_1])),
+        (ADDRESS, bme280.BME280_REGISTER_CONTROL, bytes([osrs | bme280.BME280_MODE_NORMAL])),
+    ]
+
+
+@pytest.mark.parametrize(
+    "standby, iir_filter, config",
+    [
+        (bme280.BME280_STANDBY_0_5, bme280.BME280_IIR_FILTER_OFF, 0x00),
+        (bme280.BME280_STANDBY_20, bme280.BME280_IIR_FILTER_16, 0b111_100_00),
+        (bme280.BME280_STANDBY_62_5, bme280.BME280_IIR_FILTER_2, 0b001_001_00),
+    ]
+)
+def test_config_register_holds_standby_and_filter(standby, iir_filter, config):
+    sensor, i2c = make_sensor()
+
+    sensor.configure_normal_mode(standby=standby, iir_filter=iir_filter)
+
+    assert i2c.devices[ADDRESS].registers[bme280.BME280_REGISTER_CONFIG] == config
+
+
+def test_normal_mode_returns_time_until_first_result_and_skips_forced_conversions(clock):
+    sensor, i2c = make_sensor()
+
+    assert sensor.configure_normal_mode(osrs_h=bme280.BME280_OSAMPLE_SKIP) == sensor.conversion_time()
+    i2c.log.clear()
+
+    assert sensor.start_conversion() == 0
+    sensor.wait_for_conversion(0)
+    raw = [0, 0, 0]
+    sensor.read_raw_result(raw)
+
+    # only data registers are read, sensor converts on its own
+    assert i2c.log == [("read", ADDRESS, 0xF7, i2c.devices[ADDRESS].registers[0xF7:0xFF])]
+    assert raw == list(DATASHEET_VECTOR[1:4])
+    assert clock.sleeps == []
+    assert sensor.last_conversion_us == 0
+
+
+def test_forced_conversion_writes_ctrl_hum_before_ctrl_meas():
+    sensor, i2c = make_sensor(osrs_h=bme280.BME280_OSAMPLE_4)
+
+    assert sensor.start_conversion() == sensor.conversion_time()
+    assert i2c.writes() == [
+        (ADDRESS, bme280.BME280_REGISTER_CONTROL_HUM, bytes([bme280.BME280_OSAMPLE_4])),
+        (ADDRESS, bme280.BME280_REGISTER_CONTROL, bytes([0b001_001_00 | bme280.BME280_MODE_FORCED])),
+    ]
+
+
+def test_wait_for_conversion_polls_status_until_measuring_bit_clears(clock):
+    sensor, i2c = make_sensor(status_sequence=(MEASURING, MEASURING, 0))
+
+    max_time_us = sensor.start_conversion()
+    sensor.wait_for_conversion(max_time_us)
+
+    typical_us = sensor.typical_conversion_time()
+    interval_us = bme280.BME280_STATUS_POLL_INTERVAL
+    assert clock.sleeps == [typical_us, interval_us, interval_us]
+    assert i2c.reads(bme280.BME280_REGISTER_STATUS) == 3
+    assert sensor.last_conversion_us == typical_us + 2 * interval_us
+    assert typical_us + 2 * interval_us < max_time_us
+
+
+def test_wait_for_conversion_gives_up_at_max_time(clock):
+    sensor, i2c = make_sensor(status_sequence=(MEASURING,))
+
+    max_time_us = sensor.start_conversion()
+    sensor.wait_for_conversion(max_time_us)
+
+    typical_us = sensor.typical_conversion_time()
+    polls, last_poll_us = divmod(max_time_us - typical_us, bme280.BME280_STATUS_POLL_INTERVAL)
+    # the last sleep is shortened, so waiting never exceeds the worst case time
+    assert clock.sleeps == [typical_us] + [bme280.BME280_STATUS_POLL_INTERVAL] * polls + [last_poll_us]
+    assert sensor.last_conversion_us == max_time_us
+    assert i2c.reads(bme280.BME280_REGISTER_STATUS) == len(clock.sleeps)
+
+
+def test_wait_for_conversion_without_conversion_doesnt_touch_sensor(clock):
+    sensor, i2c = make_sensor()
+
+    sensor.wait_for_conversion(0)
+
+    assert i2c.log == []
+    assert clock.sleeps == []
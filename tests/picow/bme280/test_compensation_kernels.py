@@ -0,0 +1,185 @@
+import subprocess
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+from bme280_golden_vectors import GOLDEN_VECTORS
+from bme280_reference import CALIBRATIONS, compensate, humidity_double, pressure_double, t_fine_double
+from components import PICOW_LOW_POWER_DIR, load_device_module
+from micropython_runner import requires_micropython, run_micropython
+
+try:
+    import mpy_cross
+except ImportError:
+    mpy_cross = None
+
+BME280_LIB = PICOW_LOW_POWER_DIR / "lib" / "bme280.py"
+BME280_NATIVE_LIB = PICOW_LOW_POWER_DIR / "lib" / "bme280_native.py"
+
+bme280 = load_device_module(BME280_LIB, "device_bme280")
+
+
+class ViperInt(int):
+    """
+    Machine word of viper code, results of arithmetic wrap around to signed 32 bits like on rp2
+    """
+
+    @staticmethod
+    def wrap(value: int) -> "ViperInt":
+        return ViperInt((value + 0x80000000) % 0x100000000 - 0x80000000)
+
+    def __add__(self, other):
+        return self.wrap(int(self) + int(other))
+
+    def __radd__(self, other):
+        return self.wrap(int(other) + int(self))
+
+    def __sub__(self, other):
+        return self.wrap(int(self) - int(other))
+
+    def __rsub__(self, other):
+        return self.wrap(int(other) - int(self))
+
+    def __mul__(self, other):
+        return self.wrap(int(self) * int(other))
+
+    def __rmul__(self, other):
+        return self.wrap(int(other) * int(self))
+
+    def __lshift__(self, other):
+        return self.wrap(int(self) << int(other))
+
+    def __rlshift__(self, other):
+        return self.wrap(int(other) << int(self))
+
+    def __rshift__(self, other):
+        return self.wrap(int(self) >> int(other))
+
+    def __rrshift__(self, other):
+        return self.wrap(int(other) >> int(self))
+
+
+class Ptr32(object):
+    """
+    Viper ptr32 to array("i"), loads machine words
+    """
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, index):
+        return ViperInt.wrap(self.values[index])
+
+
+def emulate_viper(function):
+    """
+    Runs viper function as Python code with viper integer semantics, arguments are converted
+    according to their annotations
+    """
+
+    annotations = function.__annotations__
+    argument_types = [annotations[name] for name in function.__code__.co_varnames[:function.__code__.co_argcount]]
+
+    def wrapper(*args):
+        converted = [Ptr32(arg) if kind is Ptr32 else ViperInt.wrap(arg) for kind, arg in zip(argument_types, args)]
+        return int(function(*converted))
+
+    return wrapper
+
+
+def load_compiled_kernels() -> types.ModuleType:
+    """
+    Loads bme280_native with emulated viper emitter, native functions run as regular Python code
+    which has the same integer semantics
+    """
+
+    micropython_stub = types.ModuleType("micropython")
+    micropython_stub.viper = emulate_viper
+    micropython_stub.native = lambda function: function
+
+    module = types.ModuleType("bme280_native")
+    module.ptr32 = Ptr32
+    with mock.patch.dict(sys.modules, {"micropython": micropython_stub}):
+        exec(compile(BME280_NATIVE_LIB.read_text(), str(BME280_NATIVE_LIB), "exec"), module.__dict__)
+
+    return module
+
+
+def make_sensor(calibration) -> bme280.BME280:
+    return bme280.BME280(i2c=object(), calibration=bme280.pack(bme280.BME280_CALIBRATION_FORMAT, *calibration))
+
+
+def vector_id(vector) -> str:
+    return f"calibration{vector[0]}-raw{vector[1]}:{vector[2]}:{vector[3]}"
+
+
+@pytest.mark.parametrize("vector", GOLDEN_VECTORS, ids=vector_id)
+def test_golden_vectors_are_datasheet_results(vector):
+    calibration = CALIBRATIONS[vector[0]]
+    raw, expected = vector[1:4], vector[4:7]
+
+    assert compensate(raw, calibration) == expected
+
+    t_fine = t_fine_double(raw[0], calibration)
+    assert expected[0] / 100 == pytest.approx(t_fine / 5120, abs=0.01)
+    assert expected[1] / 256 == pytest.approx(pressure_double(raw[1], t_fine, calibration), abs=1)
+    assert expected[2] / 1024 == pytest.approx(humidity_double(raw[2], t_fine, calibration), abs=0.05)
+
+
+def test_datasheet_example_is_the_first_vector():
+    assert GOLDEN_VECTORS[0][1:5] == (519888, 415148, 27000, 2508)
+
+
+@pytest.mark.parametrize("vector", GOLDEN_VECTORS, ids=vector_id)
+def test_interpreted_kernels_match_golden_vectors(vector):
+    assert bme280.bme280_native is None
+    assert tuple(make_sensor(CALIBRATIONS[vector[0]]).compensate(vector[1:4])) == vector[4:7]
+
+
+@pytest.mark.parametrize("vector", GOLDEN_VECTORS, ids=vector_id)
+def test_compiled_kernels_match_golden_vectors(vector, monkeypatch):
+    kernels = load_compiled_kernels()
+    sensor = make_sensor(CALIBRATIONS[vector[0]])
+    raw_temp, raw_press, raw_hum = vector[1:4]
+
+    t_fine = kernels.t_fine(raw_temp, sensor._calibration)
+    assert (t_fine * 5 + 128) >> 8 == vector[4]
+    assert kernels.pressure(raw_press, t_fine, sensor._calibration) == vector[5]
+    assert kernels.humidity(raw_hum, t_fine, sensor._calibration) == vector[6]
+
+    # driver picks compiled kernels when they could be imported
+    monkeypatch.setattr(bme280, "bme280_native", kernels)
+    assert tuple(sensor.compensate(vector[1:4])) == vector[4:7]
+
+
+@requires_micropython
+def test_interpreted_kernels_match_golden_vectors_on_micropython(tmp_path):
+    code = f"""
+        import bme280
+
+        for calibration_index, raw_temp, raw_press, raw_hum, *expected in {GOLDEN_VECTORS!r}:
+            calibration = {CALIBRATIONS!r}[calibration_index]
+            sensor = bme280.BME280(
+                i2c=object(),
+                calibration=bme280.pack(bme280.BME280_CALIBRATION_FORMAT, *calibration)
+            )
+            print(sensor.compensate((raw_temp, raw_press, raw_hum)) == expected)
+    """
+
+    output = run_micropython(code, tmp_path, source_files=[BME280_LIB])
+    assert output.split() == ["True"] * len(GOLDEN_VECTORS)
+
+
+@pytest.mark.skipif(mpy_cross is None, reason="mpy-cross is not installed")
+def test_compiled_kernels_compile_for_rp2(tmp_path):
+    # viper type errors are reported by compiler, so kernels are compiled for Cortex-M0+ of RP2040
+    process = mpy_cross.run(
+        "-march=armv6m", "-o", str(tmp_path / "bme280_native.mpy"), str(BME280_NATIVE_LIB),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT
+    )
+    output, _ = process.communicate()
+
+    assert process.returncode == 0, output.decode()
@@ -0,0 +1,91 @@
+import pytest
+
+from bme280_reference import CALIBRATIONS, operating_range_readings, pressure_int32
+from components import PICOW_LOW_POWER_DIR, load_device_module
+from micropython_runner import requires_micropython, run_micropython
+
+BME280_LIB = PICOW_LOW_POWER_DIR / "lib" / "bme280.py"
+
+bme280 = load_device_module(BME280_LIB, "device_bme280")
+
+I2C_STUB = """
+class I2C:
+    \"\"\"
+    Sensor which always reports the same burst readout and is never busy
+    \"\"\"
+
+    def __init__(self, readout):
+        self.readout = readout
+
+    def writeto_mem(self, address, register, buf):
+        pass
+
+    def readfrom_mem_into(self, address, register, buf):
+        if register == 0xF7:
+            buf[:] = self.readout
+        else:
+            buf[0] = 0
+"""
+
+
+def make_sensor(calibration) -> bme280.BME280:
+    return bme280.BME280(i2c=object(), calibration=bme280.pack(bme280.BME280_CALIBRATION_FORMAT, *calibration))
+
+
+def burst_readout(raw) -> bytes:
+    raw_temp, raw_press, raw_hum = raw
+    return bytes((
+        raw_press >> 12, (raw_press >> 4) & 0xFF, (raw_press & 0xF) << 4,
+        raw_temp >> 12, (raw_temp >> 4) & 0xFF, (raw_temp & 0xF) << 4,
+        raw_hum >> 8, raw_hum & 0xFF
+    ))
+
+
+@pytest.mark.parametrize("calibration", CALIBRATIONS)
+def test_pressure_matches_datasheet_int32_formula(calibration):
+    sensor = make_sensor(calibration)
+    for raw in operating_range_readings(calibration):
+        temperature, pressure, humidity = sensor.compensate_int32(raw)
+        expected_pressure = pressure_int32(raw[1], sensor.t_fine, calibration)
+
+        assert pressure == expected_pressure << 8
+        assert [temperature, humidity] == [sensor.compensate(raw)[index] for index in (0, 2)]
+        # 64-bit formula has fraction of Pa
+        assert abs(pressure - sensor.compensate(raw)[1]) <= 8 * 256
+
+
+@requires_micropython
+def test_compensation_does_not_allocate(tmp_path):
+    cases = [(calibration, operating_range_readings(calibration)) for calibration in CALIBRATIONS]
+    code = f"""
+        import gc
+        from array import array
+
+        import bme280
+        from i2c_stub import I2C
+
+        def allocated_by(method, readings, result):
+            count = len(readings)
+            allocated = gc.mem_alloc()
+            index = 0
+            while index < count:
+                method(readings[index], result)
+                index += 1
+
+            return gc.mem_alloc() - allocated
+
+        # nothing may be collected, so every allocation shows up in mem_alloc()
+        gc.disable()
+        for calibration, readings in {cases!r}:
+            sensor = bme280.BME280(
+                i2c=I2C(bytes({list(burst_readout(cases[0][1][-1]))!r})),
+                calibration=bme280.pack(bme280.BME280_CALIBRATION_FORMAT, *calibration)
+            )
+            readings = [array("i", reading) for reading in readings]
+            result = [0, 0, 0]
+            print("compensate_int32", allocated_by(sensor.compensate_int32, readings, result))
+            print("read_int32", allocated_by(lambda _, result: sensor.read_int32(result), readings, result))
+    """
+
+    output = run_micropython(code, tmp_path, source_files=[BME280_LIB], extra_files={"i2c_stub.py": I2C_STUB})
+    assert output.split() == ["compensate_int32", "0", "read_int32", "0"] * len(CALIBRATIONS)
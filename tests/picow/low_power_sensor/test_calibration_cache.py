@@ -0,0 +1,125 @@
+import sys
+from unittest import mock
+
+import pytest
+
+from bme280_golden_vectors import GOLDEN_VECTORS
+from bme280_reference import CALIBRATIONS
+from components import PICOW_LOW_POWER_DIR, load_device_module
+from fake_i2c import FakeBME280, FakeI2C
+from fake_utime import FakeClock
+
+bme280 = load_device_module(PICOW_LOW_POWER_DIR / "lib" / "bme280.py", "low_power_bme280")
+with mock.patch.dict(sys.modules, {"bme280": bme280}):
+    calibration_cache = load_device_module(PICOW_LOW_POWER_DIR / "calibration_cache.py", "low_power_calibration_cache")
+
+ADDRESS = bme280.BME280_I2CADDR
+VECTOR = GOLDEN_VECTORS[0]
+# sensor with other calibration coefficients, including dig_T1 and dig_T2 checked on every load
+OTHER_VECTOR = next(vector for vector in GOLDEN_VECTORS if vector[0] == 1)
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(bme280, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return calibration_cache.CalibrationCache(file_name=str(tmp_path / "bme280_calibration.bin"))
+
+
+def make_i2c(vector=VECTOR) -> FakeI2C:
+    return FakeI2C({ADDRESS: FakeBME280(CALIBRATIONS[vector[0]], vector[1:4])})
+
+
+def calibration_reads(i2c: FakeI2C) -> list:
+    """
+    Reads of whole calibration registers, spot check reads only the first 4 bytes
+    """
+
+    return [
+        (register, len(data)) for operation, _, register, data in i2c.log
+        if operation == "read" and (register, len(data)) in ((0x88, 26), (0xE1, 7))
+    ]
+
+
+def create_cached_sensor(cache, vector=VECTOR):
+    i2c = make_i2c(vector)
+    cache.create_sensor(i2c, ADDRESS)
+    return i2c
+
+
+def test_calibration_is_read_from_sensor_and_cached_on_the_first_wake_up(cache):
+    i2c = make_i2c()
+
+    sensor = cache.create_sensor(i2c, ADDRESS)
+
+    assert calibration_reads(i2c) == [(0x88, 26), (0xE1, 7)]
+    assert sensor.read_snapshot() == VECTOR[4:7]
+    assert cache.load(i2c, ADDRESS) == sensor.calibration
+
+
+def test_cached_calibration_is_used_without_reading_calibration_registers(cache):
+    create_cached_sensor(cache)
+    i2c = make_i2c()
+
+    sensor = cache.create_sensor(i2c, ADDRESS)
+
+    assert calibration_reads(i2c) == []
+    # chip id and spot check of dig_T1 and dig_T2
+    reads = [(register, len(data)) for operation, _, register, data in i2c.log if operation == "read"]
+    assert reads == [(0xD0, 1), (0x88, 4)]
+    assert sensor.read_snapshot() == VECTOR[4:7]
+
+
+def corrupt(path) -> None:
+    data = bytearray(path.read_bytes())
+    # one of calibration coefficients
+    data[10] ^= 0x01
+    path.write_bytes(data)
+
+
+def truncate(path) -> None:
+    path.write_bytes(path.read_bytes()[:-3])
+
+
+@pytest.mark.parametrize("damage", [corrupt, truncate], ids=["crc-mismatch", "truncated"])
+def test_damaged_cache_falls_back_to_sensor(cache, tmp_path, damage, capsys):
+    create_cached_sensor(cache)
+    damage(tmp_path / "bme280_calibration.bin")
+    i2c = make_i2c()
+
+    sensor = cache.create_sensor(i2c, ADDRESS)
+
+    assert calibration_reads(i2c) == [(0x88, 26), (0xE1, 7)]
+    assert sensor.read_snapshot() == VECTOR[4:7]
+    # cache is repaired
+    assert cache.load(make_i2c(), ADDRESS) == sensor.calibration
+    if damage is corrupt:
+        assert "corrupted" in capsys.readouterr().out
+
+
+def test_swapped_sensor_falls_back_to_its_own_calibration(cache, capsys):
+    create_cached_sensor(cache, VECTOR)
+    i2c = make_i2c(OTHER_VECTOR)
+
+    sensor = cache.create_sensor(i2c, ADDRESS)
+
+    assert "sensor was changed" in capsys.readouterr().out
+    assert calibration_reads(i2c) == [(0x88, 26), (0xE1, 7)]
+    assert sensor.read_snapshot() == OTHER_VECTOR[4:7]
+    assert cache.load(make_i2c(OTHER_VECTOR), ADDRESS) == sensor.calibration
+
+
+def test_sensor_at_other_address_doesnt_use_cached_calibration(cache):
+    create_cached_sensor(cache)
+    i2c = FakeI2C({0x77: FakeBME280(CALIBRATIONS[VECTOR[0]], VECTOR[1:4])})
+
+    assert cache.load(i2c, 0x77) is None
+
+
+def test_missing_cache_file_falls_back_to_sensor(cache):
+    assert cache.load(make_i2c(), ADDRESS) is None
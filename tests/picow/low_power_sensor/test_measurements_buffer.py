@@ -0,0 +1,110 @@
+import os
+
+from components import PICOW_LOW_POWER_DIR, load_device_module
+
+measurements_buffer = load_device_module(PICOW_LOW_POWER_DIR / "measurements_buffer.py", "device_measurements_buffer")
+
+
+def make_buffer(tmp_path, capacity: int = 3, segment_size: int = 1):
+    return measurements_buffer.MeasurementsBuffer(
+        record_size=4,
+        capacity=capacity,
+        segment_size=segment_size,
+        file_name_prefix=str(tmp_path / "measurements_"),
+        state_file_name=str(tmp_path / "measurements_state.bin")
+    )
+
+
+def segment_files(tmp_path) -> list:
+    return sorted(path.name for path in tmp_path.glob("measurements_*.bin") if path.name != "measurements_state.bin")
+
+
+def test_records_survive_reset_until_cleared(tmp_path):
+    buffer = make_buffer(tmp_path)
+    buffer.append(b"rec0")
+    buffer.append(b"rec1")
+
+    # failed uplink, board is reset and takes the next measurement
+    buffer = make_buffer(tmp_path)
+    buffer.append(b"rec2")
+
+    assert buffer.read_all() == b"rec0rec1rec2"
+    assert buffer.first_sequence == 0
+
+    buffer.clear()
+    buffer = make_buffer(tmp_path)
+    buffer.append(b"rec3")
+
+    assert buffer.read_all() == b"rec3"
+    assert buffer.first_sequence == 3
+
+
+def test_oldest_records_are_dropped_without_reusing_sequences(tmp_path):
+    buffer = make_buffer(tmp_path)
+    for index in range(5):
+        buffer.append(b"rec%d" % index)
+
+    assert buffer.read_all() == b"rec2rec3rec4"
+    assert buffer.first_sequence == 2
+
+    buffer = make_buffer(tmp_path)
+    assert buffer.count() == 3
+    assert buffer.first_sequence == 2
+
+
+def test_full_buffer_drops_whole_segments_without_rewriting_them(tmp_path):
+    buffer = make_buffer(tmp_path, capacity=4, segment_size=2)
+    for index in range(4):
+        buffer.append(b"rec%d" % index)
+
+    newest_segment = tmp_path / "measurements_1.bin"
+    newest_segment_modified_at = os.stat(newest_segment).st_mtime_ns
+    buffer.append(b"rec4")
+
+    assert segment_files(tmp_path) == ["measurements_1.bin", "measurements_2.bin"]
+    assert os.stat(newest_segment).st_mtime_ns == newest_segment_modified_at
+    assert buffer.read_all() == b"rec2rec3rec4"
+    assert buffer.first_sequence == 2
+
+    buffer.append(b"rec5")
+    buffer.append(b"rec6")
+
+    assert segment_files(tmp_path) == ["measurements_2.bin", "measurements_3.bin"]
+    assert buffer.read_all() == b"rec4rec5rec6"
+    assert buffer.first_sequence == 4
+
+
+def test_capacity_is_rounded_down_to_whole_segments(tmp_path):
+    buffer = make_buffer(tmp_path, capacity=5, segment_size=2)
+
+    assert buffer.capacity == 4
+
+
+def test_segment_left_after_power_loss_during_drop_is_removed(tmp_path):
+    buffer = make_buffer(tmp_path, capacity=2, segment_size=1)
+    for index in range(3):
+        buffer.append(b"rec%d" % index)
+
+    # power was lost after the state was saved, but before the oldest segment was removed
+    (tmp_path / "measurements_0.bin").write_bytes(b"rec0")
+    buffer = make_buffer(tmp_path, capacity=2, segment_size=1)
+
+    assert segment_files(tmp_path) == ["measurements_1.bin", "measurements_2.bin"]
+    assert buffer.read_all() == b"rec1rec2"
+    assert buffer.first_sequence == 1
+
+
+def test_partially_written_record_is_ignored(tmp_path):
+    buffer = make_buffer(tmp_path, capacity=6, segment_size=3)
+    buffer.append(b"rec0")
+    with open(tmp_path / "measurements_0.bin", "ab") as f:
+        f.write(b"re")
+
+    assert buffer.read_all() == b"rec0"
+    assert buffer.count() == 1
+
+    # the next record starts a new segment, so it isn't misaligned by the partial one
+    buffer.append(b"rec1")
+
+    assert buffer.read_all() == b"rec0rec1"
+    assert buffer.count() == 2
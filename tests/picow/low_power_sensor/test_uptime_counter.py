@@ -0,0 +1,106 @@
+import types
+
+import pytest
+
+from components import PICOW_LOW_POWER_DIR, load_device_module
+
+uptime_counter = load_device_module(PICOW_LOW_POWER_DIR / "uptime_counter.py", "device_uptime_counter")
+
+# utime.ticks_ms wraps at 2 ** 30 on rp2
+TICKS_PERIOD = 1 << 30
+
+
+class FakeTicks(object):
+    """
+    utime millisecond ticks, which start from 0 on every boot
+    """
+
+    def __init__(self):
+        self.now = 0
+
+    def ticks_ms(self) -> int:
+        return self.now % TICKS_PERIOD
+
+    @staticmethod
+    def ticks_diff(end: int, start: int) -> int:
+        return ((end - start + TICKS_PERIOD // 2) % TICKS_PERIOD) - TICKS_PERIOD // 2
+
+
+@pytest.fixture
+def ticks(monkeypatch) -> FakeTicks:
+    ticks = FakeTicks()
+    monkeypatch.setattr(uptime_counter, "time", types.SimpleNamespace(ticks_ms=ticks.ticks_ms, ticks_diff=ticks.ticks_diff))
+    return ticks
+
+
+def boot(tmp_path, ticks: FakeTicks, ms_since_boot: int = 0):
+    ticks.now = ms_since_boot
+    return uptime_counter.UptimeCounter(file_name=str(tmp_path / "uptime.bin"))
+
+
+def test_uptime_continues_after_deep_sleep(tmp_path, ticks):
+    counter = boot(tmp_path, ticks, 1_500)
+    first_record_uptime = counter.uptime_ms()
+    counter.save(sleep_ms=300_000)
+
+    counter = boot(tmp_path, ticks, 1_200)
+
+    assert counter.uptime_ms() == 302_700
+    assert counter.ms_since(first_record_uptime) == 301_200
+
+
+def test_failed_wake_ups_dont_shift_older_records(tmp_path, ticks):
+    counter = boot(tmp_path, ticks, 1_000)
+    record_uptime = counter.uptime_ms()
+    counter.save(sleep_ms=300_000)
+
+    # two wake-ups without records, e.g. failed reads, and a longer sleep after error
+    for sleep_ms in (300_000, 600_000):
+        counter = boot(tmp_path, ticks, 1_000)
+        counter.save(sleep_ms=sleep_ms)
+
+    counter = boot(tmp_path, ticks, 1_000)
+
+    assert counter.ms_since(record_uptime) == 1_203_000
+
+
+def test_uptime_is_accumulated_across_ticks_wrap(tmp_path, ticks):
+    counter = boot(tmp_path, ticks)
+
+    for _ in range(5):
+        ticks.now += TICKS_PERIOD // 4
+        counter.uptime_ms()
+
+    assert counter.uptime_ms() == 5 * TICKS_PERIOD // 4
+
+
+def test_elapsed_time_of_32_bit_record_uptime_is_computed_across_wrap(tmp_path, ticks):
+    counter = boot(tmp_path, ticks)
+    counter.save(sleep_ms=0xFFFFFFFF - 999)
+    counter = boot(tmp_path, ticks, 3_000)
+
+    # uptime of the record was truncated to 32 bits when it was packed
+    assert counter.ms_since((0xFFFFFFFF - 999) & 0xFFFFFFFF) == 3_000
+    assert counter.uptime_ms() & 0xFFFFFFFF == 2_000
+
+
+def test_uptime_ahead_of_counter_after_power_loss_is_taken_as_now(tmp_path, ticks):
+    counter = boot(tmp_path, ticks, 1_000)
+    counter.save(sleep_ms=300_000)
+    counter = boot(tmp_path, ticks, 1_000)
+    record_uptime = counter.uptime_ms()
+
+    # power was lost before save(), so the next boot continues from the previous saved value
+    counter = boot(tmp_path, ticks, 500)
+
+    assert counter.ms_since(record_uptime) == 0
+
+
+@pytest.mark.parametrize("content", [None, b"", b"\x01\x02\x03"], ids=["missing", "empty", "truncated"])
+def test_counter_starts_from_zero_without_valid_state(tmp_path, ticks, content):
+    if content is not None:
+        (tmp_path / "uptime.bin").write_bytes(content)
+
+    counter = boot(tmp_path, ticks, 700)
+
+    assert counter.uptime_ms() == 700
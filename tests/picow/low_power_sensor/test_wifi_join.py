@@ -0,0 +1,196 @@
+import ast
+
+import pytest
+
+from components import PICOW_LOW_POWER_DIR, load_device_module
+from micropython_runner import requires_micropython, run_micropython
+
+NETWORK_STUB = """
+STA_IF = 0
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+STAT_NO_AP_FOUND = -2
+
+DHCP_IFCONFIG = ("192.168.1.50", "255.255.255.0", "192.168.1.1", "8.8.8.8")
+
+
+class WLAN:
+    \"\"\"
+    Station interface which sees given access points (ssid, bssid, channel, rssi, security,
+    hidden) and records every call
+    \"\"\"
+
+    def __init__(self, access_points):
+        self.access_points = access_points
+        self.calls = []
+        self._status = STAT_IDLE
+        self._ifconfig = ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+        self._static_ifconfig = None
+
+    def scan(self):
+        self.calls.append("scan")
+        # SSID of hidden network isn't reported
+        return [(b"" if ap[5] else ap[0],) + ap[1:] for ap in self.access_points]
+
+    def connect(self, ssid, key, bssid=None):
+        self.calls.append(("connect", bssid))
+        visible = [ap for ap in self.access_points if ap[0].decode() == ssid and bssid in (None, ap[1])]
+        if not visible:
+            self._status = STAT_NO_AP_FOUND
+            return
+
+        self._status = STAT_GOT_IP
+        self._ifconfig = self._static_ifconfig or DHCP_IFCONFIG
+
+    def disconnect(self):
+        self.calls.append("disconnect")
+        self._status = STAT_IDLE
+
+    def isconnected(self):
+        return self._status == STAT_GOT_IP
+
+    def status(self):
+        return self._status
+
+    def ifconfig(self, config=None):
+        if config is None:
+            return self._ifconfig
+
+        self.calls.append(("ifconfig", config))
+        self._static_ifconfig = None if config == "dhcp" else config
+"""
+
+SECRETS_STUB = """
+WIFI_SSID = "sensors"
+WIFI_PASSWORD = "password"
+"""
+
+RUN_JOIN = """
+import network
+import wifi_join
+
+
+class MemoryCache:
+    def __init__(self, cached):
+        self.cached = cached
+        self.saved = []
+
+    def load(self):
+        return self.cached
+
+    def save(self, bssid, ifconfig):
+        self.saved.append((bssid, ifconfig))
+        self.cached = (bssid, ifconfig)
+
+    def clear(self):
+        self.cached = None
+
+
+wlan = network.WLAN({access_points!r})
+cache = MemoryCache({cached!r})
+used_cache = wifi_join.join_wifi(wlan, cache)
+print(repr((used_cache, wlan.calls, cache.saved, cache.cached, wlan.ifconfig())))
+"""
+
+OTHER_AP = (b"neighbours", b"\x00\x00\x00\x00\x00\x01", 1, -30, 3, False)
+NEAR_AP = (b"sensors", b"\xaa\xaa\xaa\xaa\xaa\x01", 6, -45, 3, False)
+FAR_AP = (b"sensors", b"\xaa\xaa\xaa\xaa\xaa\x02", 11, -80, 3, False)
+GONE_BSSID = b"\xbb\xbb\xbb\xbb\xbb\x01"
+
+DHCP_IFCONFIG = ("192.168.1.50", "255.255.255.0", "192.168.1.1", "8.8.8.8")
+CACHED_IFCONFIG = ("192.168.1.77", "255.255.255.0", "192.168.1.1", "8.8.8.8")
+
+
+def join(tmp_path, access_points, cached):
+    output = run_micropython(
+        RUN_JOIN.format(access_points=access_points, cached=cached),
+        tmp_path,
+        source_files=[
+            PICOW_LOW_POWER_DIR / "wifi_join.py",
+            PICOW_LOW_POWER_DIR / "wifi_cache.py",
+            PICOW_LOW_POWER_DIR / "consts.py"
+        ],
+        extra_files={"network.py": NETWORK_STUB, "secrets.py": SECRETS_STUB}
+    )
+    return ast.literal_eval(output.strip().splitlines()[-1])
+
+
+@requires_micropython
+def test_cache_miss_joins_strongest_access_point_found_by_single_scan(tmp_path):
+    used_cache, calls, saved, _, ifconfig = join(tmp_path, [OTHER_AP, FAR_AP, NEAR_AP], cached=None)
+
+    assert used_cache is False
+    assert calls == ["scan", ("connect", NEAR_AP[1])]
+    assert saved == [(NEAR_AP[1], DHCP_IFCONFIG)]
+    assert ifconfig == DHCP_IFCONFIG
+
+
+@requires_micropython
+def test_cache_hit_joins_cached_access_point_without_scan_and_dhcp(tmp_path):
+    used_cache, calls, saved, cached, ifconfig = join(
+        tmp_path, [NEAR_AP, FAR_AP], cached=(FAR_AP[1], CACHED_IFCONFIG)
+    )
+
+    assert used_cache is True
+    assert calls == [("ifconfig", CACHED_IFCONFIG), ("connect", FAR_AP[1])]
+    assert saved == []
+    assert cached == (FAR_AP[1], CACHED_IFCONFIG)
+    assert ifconfig == CACHED_IFCONFIG
+
+
+@requires_micropython
+def test_stale_bssid_drops_cache_and_caches_access_point_from_fallback_scan(tmp_path):
+    used_cache, calls, saved, cached, ifconfig = join(
+        tmp_path, [FAR_AP, NEAR_AP], cached=(GONE_BSSID, CACHED_IFCONFIG)
+    )
+
+    assert used_cache is False
+    assert calls == [
+        ("ifconfig", CACHED_IFCONFIG),
+        ("connect", GONE_BSSID),
+        "disconnect",
+        ("ifconfig", "dhcp"),
+        "scan",
+        ("connect", NEAR_AP[1])
+    ]
+    assert saved == [(NEAR_AP[1], DHCP_IFCONFIG)]
+    assert cached == (NEAR_AP[1], DHCP_IFCONFIG)
+    assert ifconfig == DHCP_IFCONFIG
+
+
+@requires_micropython
+def test_hidden_access_point_is_joined_by_ssid(tmp_path):
+    hidden_ap = NEAR_AP[:5] + (True,)
+
+    used_cache, calls, saved, _, _ = join(tmp_path, [hidden_ap], cached=None)
+
+    assert used_cache is False
+    assert calls == ["scan", ("connect", None)]
+    assert saved == [(None, DHCP_IFCONFIG)]
+
+
+@pytest.fixture
+def wifi_cache_module():
+    return load_device_module(PICOW_LOW_POWER_DIR / "wifi_cache.py", "device_wifi_cache")
+
+
+def test_cache_keeps_bssid_and_ip_configuration(tmp_path, wifi_cache_module):
+    cache = wifi_cache_module.WiFiConnectionCache(str(tmp_path / "wifi_cache.json"))
+    assert cache.load() is None
+
+    cache.save(NEAR_AP[1], CACHED_IFCONFIG)
+    assert cache.load() == (NEAR_AP[1], CACHED_IFCONFIG)
+
+    cache.save(None, CACHED_IFCONFIG)
+    assert cache.load() == (None, CACHED_IFCONFIG)
+
+    cache.clear()
+    assert cache.load() is None
+
+
+def test_corrupted_cache_is_ignored(tmp_path, wifi_cache_module):
+    file_name = tmp_path / "wifi_cache.json"
+    file_name.write_text('{"bssid": "aaaa"')
+
+    assert wifi_cache_module.WiFiConnectionCache(str(file_name)).load() is None
@@ -0,0 +1,29 @@
+import pytest
+
+from components import PICOW_ALWAYS_ON_DIR, PICOW_BATTERY_DIR, PICOW_LOW_POWER_DIR
+
+SHARED_LIBS = sorted(
+    path.relative_to(PICOW_LOW_POWER_DIR)
+    for path in (PICOW_LOW_POWER_DIR / "lib").rglob("*.py")
+)
+
+# modules of battery powered sensor copied from low power one
+BUFFERING_MODULES = ["measurements_buffer.py", "telemetry_frame.py", "uplink_backoff.py", "uptime_counter.py"]
+# modules of always-on sensor copied from low power one, used by its readings journal
+JOURNAL_MODULES = ["measurements_buffer.py", "uptime_counter.py"]
+
+
+@pytest.mark.parametrize("lib", SHARED_LIBS, ids=str)
+@pytest.mark.parametrize("variant_dir", [PICOW_ALWAYS_ON_DIR, PICOW_BATTERY_DIR], ids=lambda path: path.name)
+def test_lib_is_the_same_in_every_variant(variant_dir, lib):
+    assert (variant_dir / lib).read_bytes() == (PICOW_LOW_POWER_DIR / lib).read_bytes()
+
+
+@pytest.mark.parametrize("module", BUFFERING_MODULES)
+def test_buffering_module_is_the_same_in_battery_powered_variant(module):
+    assert (PICOW_BATTERY_DIR / module).read_bytes() == (PICOW_LOW_POWER_DIR / module).read_bytes()
+
+
+@pytest.mark.parametrize("module", JOURNAL_MODULES)
+def test_journal_module_is_the_same_in_always_on_variant(module):
+    assert (PICOW_ALWAYS_ON_DIR / module).read_bytes() == (PICOW_LOW_POWER_DIR / module).read_bytes()
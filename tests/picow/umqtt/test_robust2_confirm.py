@@ -0,0 +1,178 @@
+import ast
+
+from components import PICOW_LOW_POWER_DIR
+from micropython_runner import requires_micropython, run_micropython
+
+FAKE_CONNECTION = """
+def puback(pid):
+    return bytes((0x40, 0x02, pid >> 8, pid & 0xFF))
+
+
+class FakeSocket:
+    \"\"\"
+    Broker side of connection: writes are accepted, PUBACKs given to deliver() are read one per
+    check_msg
+    \"\"\"
+
+    def __init__(self):
+        self.incoming = b""
+
+    def deliver(self, *pids):
+        for pid in pids:
+            self.incoming += puback(pid)
+
+    def settimeout(self, timeout):
+        pass
+
+    def readinto(self, buffer):
+        if not self.incoming:
+            return None
+        size = min(len(buffer), len(self.incoming))
+        buffer[:size] = self.incoming[:size]
+        self.incoming = self.incoming[size:]
+        return size
+
+    def write(self, data, length=-1):
+        return len(data) if length < 0 else length
+
+
+class FakePoller:
+    def __init__(self, sock, readable):
+        self.sock = sock
+        self.readable = readable
+
+    def poll(self, timeout):
+        ready = self.sock.incoming or not self.readable
+        return [(self.sock, 1)] if ready else []
+
+
+def make_client():
+    from umqtt.robust2 import MQTTClient
+
+    client = MQTTClient("test", "127.0.0.1")
+    client.sock = FakeSocket()
+    client.poller_r = FakePoller(client.sock, True)
+    client.poller_w = FakePoller(client.sock, False)
+    client.statuses = []
+    client.set_callback_status(lambda pid, status: client.statuses.append((pid, status)))
+    return client
+
+
+def confirm_all(client):
+    while client.sock.incoming:
+        client.check_msg()
+
+
+def state(client):
+    return {
+        "msg_to_confirm": sorted((key[0], pids) for key, pids in client.msg_to_confirm.items()),
+        "pid_to_confirm": sorted((pid, key[0]) for pid, (_, key) in client.pid_to_confirm.items()),
+        "msg_to_send": [key[0] for key in client.msg_to_send],
+        "statuses": client.statuses,
+    }
+"""
+
+
+def run_client(tmp_path, code: str):
+    output = run_micropython(
+        code,
+        tmp_path,
+        source_files=[PICOW_LOW_POWER_DIR / "lib" / "umqtt"],
+        extra_files={"usocket.py": "", "fake_connection.py": FAKE_CONNECTION}
+    )
+    return ast.literal_eval(output.strip().splitlines()[-1])
+
+
+@requires_micropython
+def test_out_of_order_pubacks_confirm_their_own_messages(tmp_path):
+    pids, result = run_client(
+        tmp_path,
+        """
+        from fake_connection import confirm_all, make_client, state
+        client = make_client()
+        pids = [client.publish("t%d" % i, b"m", qos=1) for i in range(3)]
+        client.sock.deliver(pids[2], pids[0])
+        confirm_all(client)
+        print(repr((pids, state(client))))
+        """
+    )
+
+    assert pids == [1, 2, 3]
+    assert result == {
+        "msg_to_confirm": [("t1", [2])],
+        "pid_to_confirm": [(2, "t1")],
+        "msg_to_send": [],
+        "statuses": [(3, 1), (1, 1)],
+    }
+
+
+@requires_micropython
+def test_unconfirmed_message_is_queued_again_and_its_pid_is_forgotten(tmp_path):
+    result = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client, state
+        client = make_client()
+        first = client.publish("t0", b"m", qos=1)
+        client.publish("t1", b"m", qos=1)
+        # message timeout
+        client.cbstat(first, 0)
+        # late PUBACK of the same pid changes nothing
+        client.cbstat(first, 1)
+        print(repr(state(client)))
+        """
+    )
+
+    assert result == {
+        "msg_to_confirm": [("t1", [2])],
+        "pid_to_confirm": [(2, "t1")],
+        "msg_to_send": ["t0"],
+        "statuses": [(1, 0), (1, 1)],
+    }
+
+
+@requires_micropython
+def test_packet_ids_wrap_around_at_65535(tmp_path):
+    pids, result = run_client(
+        tmp_path,
+        """
+        from fake_connection import confirm_all, make_client, state
+        from umqtt.simple2 import pid_gen
+        client = make_client()
+        client.newpid = pid_gen(65534)
+        pids = [client.publish("t%d" % i, b"m", qos=1) for i in range(3)]
+        client.sock.deliver(1, 65535)
+        confirm_all(client)
+        print(repr((pids, state(client))))
+        """
+    )
+
+    assert pids == [65535, 1, 2]
+    assert result == {
+        "msg_to_confirm": [("t2", [2])],
+        "pid_to_confirm": [(2, "t2")],
+        "msg_to_send": [],
+        "statuses": [(1, 1), (65535, 1)],
+    }
+
+
+@requires_micropython
+def test_trimmed_confirm_queue_forgets_pid_of_dropped_message(tmp_path):
+    max_queue, result = run_client(
+        tmp_path,
+        """
+        from fake_connection import confirm_all, make_client, state
+        client = make_client()
+        for _ in range(client.CONFIRM_QUEUE_MAX + 1):
+            client.publish("t", b"m", qos=1)
+        # PUBACK of the dropped pid is unknown
+        client.sock.deliver(1)
+        confirm_all(client)
+        print(repr((client.CONFIRM_QUEUE_MAX, state(client))))
+        """
+    )
+
+    pids = list(range(2, max_queue + 2))
+    assert result["msg_to_confirm"] == [("t", pids)]
+    assert result["pid_to_confirm"] == [(pid, "t") for pid in pids]
+    assert result["statuses"] == [(1, 1)]
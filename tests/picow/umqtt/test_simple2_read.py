@@ -0,0 +1,231 @@
+import ast
+
+from components import PICOW_LOW_POWER_DIR
+from micropython_runner import requires_micropython, run_micropython
+
+FAKE_CONNECTION = """
+LATE = "late"
+
+
+class FakeSocket:
+    \"\"\"
+    Socket with timeout set: readinto returns what arrived so far in one TCP segment, None when
+    nothing arrived yet and 0 when peer closed connection, raises ETIMEDOUT when segments run out.
+    LATE segment arrives after socket timeout, so only blocking socket waits for it
+    \"\"\"
+
+    def __init__(self, segments):
+        self.segments = list(segments)
+        self.timeout = None
+        self.log = []
+
+    def settimeout(self, timeout):
+        self.log.append(("settimeout", timeout))
+        self.timeout = timeout
+
+    def readinto(self, buffer):
+        self.log.append("readinto")
+        if not self.segments:
+            raise OSError(110)
+
+        segment = self.segments.pop(0)
+        if segment is None:
+            return None
+
+        if segment == LATE:
+            if self.timeout is not None:
+                raise OSError(110)
+
+            segment = self.segments.pop(0)
+
+        if not segment:
+            return 0
+
+        size = min(len(buffer), len(segment))
+        buffer[:size] = segment[:size]
+        if size < len(segment):
+            self.segments.insert(0, segment[size:])
+
+        return size
+
+    def write(self, data, length=-1):
+        return len(data) if length < 0 else length
+
+
+class FakePoller:
+    def __init__(self, sock):
+        self.sock = sock
+
+    def poll(self, timeout):
+        self.sock.log.append("poll")
+        return [(self.sock, 1)] if self.sock.segments else []
+
+
+def make_client(segments):
+    from umqtt.simple2 import MQTTClient
+
+    client = MQTTClient("test", "127.0.0.1")
+    client.sock = FakeSocket(segments)
+    # like connect does
+    client.sock.settimeout(client.socket_timeout)
+    client.sock.log.clear()
+    client.poller_r = FakePoller(client.sock)
+    client.poller_w = FakePoller(client.sock)
+    client.received = []
+    client.statuses = []
+    client.set_callback(lambda topic, msg, retained, dup: client.received.append((topic, msg)))
+    client.set_callback_status(lambda pid, status: client.statuses.append((pid, status)))
+    return client
+"""
+
+PUBLISH_PACKET = b"\x30\x0f\x00\x05topic" + b"payload!"
+
+
+def run_client(tmp_path, code: str):
+    output = run_micropython(
+        code,
+        tmp_path,
+        source_files=[PICOW_LOW_POWER_DIR / "lib" / "umqtt"],
+        extra_files={"usocket.py": "", "fake_connection.py": FAKE_CONNECTION}
+    )
+    return ast.literal_eval(output.strip().splitlines()[-1])
+
+
+@requires_micropython
+def test_packet_arriving_at_once_is_read_without_polling(tmp_path):
+    received, log = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import make_client
+        client = make_client([{PUBLISH_PACKET!r}])
+        client.check_msg()
+        print(repr((client.received, client.sock.log)))
+        """
+    )
+
+    assert received == [(b"topic", b"payload!")]
+    # single poll is made by check_msg to see whether anything arrived at all
+    assert log == ["poll", "readinto", "readinto", "readinto", "readinto", "readinto"]
+
+
+@requires_micropython
+def test_socket_is_polled_only_after_short_read(tmp_path):
+    segments = [PUBLISH_PACKET[:4], None, PUBLISH_PACKET[4:10], PUBLISH_PACKET[10:]]
+    received, log = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import make_client
+        client = make_client({segments!r})
+        client.check_msg()
+        print(repr((client.received, client.sock.log)))
+        """
+    )
+
+    assert received == [(b"topic", b"payload!")]
+    assert log == [
+        "poll",
+        "readinto",  # packet type
+        "readinto",  # remaining length
+        "readinto",  # topic length
+        "readinto", "poll", "readinto",  # topic, nothing arrived on the first attempt
+        "readinto", "poll", "readinto"  # payload, its first byte came with the topic
+    ]
+
+
+@requires_micropython
+def test_read_timeout_while_idle_only_expires_unconfirmed_messages(tmp_path):
+    result, statuses = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client
+        from utime import ticks_add, ticks_ms
+
+        client = make_client([])
+        client.rcv_pids[7] = ticks_add(ticks_ms(), -1)
+        # poll reports data, but it doesn't arrive before socket timeout
+        client.poller_r.poll = lambda timeout: [(client.sock, 1)]
+        result = client.check_msg()
+        print(repr((result, client.statuses)))
+        """
+    )
+
+    assert result is None
+    assert statuses == [(7, 0)]
+
+
+@requires_micropython
+def test_connection_closed_in_the_middle_of_packet_raises(tmp_path):
+    error = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import make_client
+        from umqtt.simple2 import MQTTException
+
+        client = make_client([{PUBLISH_PACKET[:8]!r}, b""])
+        try:
+            client.check_msg()
+            error = None
+        except MQTTException as e:
+            error = e.args
+        print(repr(error))
+        """
+    )
+
+    assert error == (2,)
+
+
+@requires_micropython
+def test_wait_msg_blocks_until_packet_arrives(tmp_path):
+    received, log, socket_timeout = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import LATE, make_client
+        client = make_client([LATE, {PUBLISH_PACKET!r}])
+        client.wait_msg()
+        print(repr((client.received, client.sock.log, client.socket_timeout)))
+        """
+    )
+
+    assert received == [(b"topic", b"payload!")]
+    assert log[0] == ("settimeout", None)
+    assert log[-1] == ("settimeout", 5)
+    assert socket_timeout == 5
+
+
+@requires_micropython
+def test_socket_timeout_is_restored_when_wait_msg_raises(tmp_path):
+    error, log, socket_timeout = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import make_client
+        from umqtt.simple2 import MQTTException
+
+        client = make_client([{PUBLISH_PACKET[:8]!r}, b""])
+        try:
+            client.wait_msg()
+            error = None
+        except MQTTException as e:
+            error = e.args
+        print(repr((error, client.sock.log, client.socket_timeout)))
+        """
+    )
+
+    assert error == (2,)
+    assert log[-1] == ("settimeout", 5)
+    assert socket_timeout == 5
+
+
+@requires_micropython
+def test_check_msg_keeps_socket_timeout_for_late_continuation(tmp_path):
+    result, statuses = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import LATE, make_client
+        client = make_client([LATE])
+        client.poller_r.poll = lambda timeout: [(client.sock, 1)]
+        print(repr((client.check_msg(), client.statuses)))
+        """
+    )
+
+    assert result is None
+    assert statuses == []
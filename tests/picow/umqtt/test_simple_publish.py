@@ -0,0 +1,344 @@
+import ast
+
+import pytest
+
+from components import PICOW_LOW_POWER_DIR
+from micropython_runner import requires_micropython, run_micropython
+
+FAKE_CONNECTION = """
+def parse_publish_packets(data):
+    \"\"\"
+    Returns (packet id, packet) of every PUBLISH packet in data, packet id is 0 for QoS 0
+    \"\"\"
+
+    packets = []
+    i = 0
+    while i < len(data):
+        start = i
+        qos = data[i] >> 1 & 3
+        size = 0
+        shift = 0
+        i += 1
+        while 1:
+            size |= (data[i] & 0x7F) << shift
+            shift += 7
+            i += 1
+            if not data[i - 1] & 0x80:
+                break
+        end = i + size
+        topic_len = data[i] << 8 | data[i + 1]
+        pid = data[i + 2 + topic_len] << 8 | data[i + 3 + topic_len] if qos else 0
+        packets.append((pid, bytes(data[start:end])))
+        i = end
+    return packets
+
+
+class FakeSocket:
+    \"\"\"
+    Broker side of connection: every written QoS 1 PUBLISH is confirmed with PUBACK, which is
+    readable right after the write. ack_order can reorder confirmations of a single write. Slow
+    broker sends the next PUBACK only when client blocks waiting for it. Number of unconfirmed
+    messages after every write is kept in in_flight
+    \"\"\"
+
+    def __init__(self, ack_order=None, slow_broker=False):
+        self.writes = []
+        self.incoming = b""
+        self.pending_acks = []
+        self.blocking = True
+        self.ack_order = ack_order
+        self.slow_broker = slow_broker
+        self.published = 0
+        self.read_bytes = 0
+        self.in_flight = []
+
+    def write(self, data, length=-1):
+        data = bytes(data if length < 0 else data[:length])
+        self.writes.append(data)
+        pids = [pid for pid, _ in parse_publish_packets(data) if pid]
+        self.published += len(pids)
+        # only PUBACKs are read, 4 bytes each
+        self.in_flight.append(self.published - self.read_bytes // 4)
+        if self.ack_order:
+            pids = [pids[index] for index in self.ack_order(len(pids))]
+        for pid in pids:
+            self.pending_acks.append(bytes((0x40, 0x02, pid >> 8, pid & 0xFF)))
+        if not self.slow_broker:
+            self.incoming += b"".join(self.pending_acks)
+            self.pending_acks = []
+        return len(data)
+
+    def setblocking(self, flag):
+        self.blocking = flag
+
+    def settimeout(self, timeout):
+        # socket with timeout blocks too, fake broker never makes it wait
+        self.blocking = True
+
+    def read(self, n):
+        if not self.incoming and self.blocking and self.pending_acks:
+            self.incoming = self.pending_acks.pop(0)
+        if not self.incoming:
+            if self.blocking:
+                raise OSError(110)
+            return None
+        data = self.incoming[:n]
+        self.incoming = self.incoming[n:]
+        self.read_bytes += len(data)
+        return data
+
+
+def make_client(ack_order=None, slow_broker=False):
+    from umqtt.simple import MQTTClient
+
+    client = MQTTClient("test", "127.0.0.1")
+    client.sock = FakeSocket(ack_order, slow_broker)
+    return client
+
+
+def packets_per_write(client):
+    return [len(parse_publish_packets(data)) for data in client.sock.writes]
+
+
+def published_messages(client):
+    return [packet[-2:] for data in client.sock.writes for _, packet in parse_publish_packets(data)]
+"""
+
+
+def run_client(tmp_path, code: str):
+    output = run_micropython(
+        code,
+        tmp_path,
+        source_files=[PICOW_LOW_POWER_DIR / "lib" / "umqtt"],
+        extra_files={"usocket.py": "", "fake_connection.py": FAKE_CONNECTION}
+    )
+    return ast.literal_eval(output.strip().splitlines()[-1])
+
+
+@requires_micropython
+@pytest.mark.parametrize(
+    "qos, expected",
+    [
+        (0, b"\x30\x0d\x00\x06sensor" + b"hello"),
+        (1, b"\x32\x0f\x00\x06sensor" + b"\x00\x01" + b"hello"),
+    ],
+    ids=["qos0", "qos1"]
+)
+def test_publish_writes_whole_packet_at_once(tmp_path, qos, expected):
+    writes = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import make_client
+        client = make_client()
+        client.publish("sensor", b"hello", qos={qos})
+        print(repr(client.sock.writes))
+        """
+    )
+
+    assert writes == [expected]
+
+
+@requires_micropython
+def test_retained_publish_sets_retain_flag(tmp_path):
+    writes = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client
+        client = make_client()
+        client.publish(b"t", "x", retain=True)
+        print(repr(client.sock.writes))
+        """
+    )
+
+    assert writes == [b"\x31\x04\x00\x01tx"]
+
+
+@requires_micropython
+@pytest.mark.parametrize(
+    "payload_size, remaining_length",
+    [
+        # topic length field, topic and payload fill one byte of remaining length
+        (124, b"\x7f"),
+        # the next byte makes remaining length take two bytes
+        (125, b"\x80\x01"),
+        (16_380, b"\xff\x7f"),
+        (16_381, b"\x80\x80\x01"),
+    ],
+    ids=["127", "128", "16383", "16384"]
+)
+def test_remaining_length_is_encoded_at_boundaries(tmp_path, payload_size, remaining_length):
+    writes = run_client(
+        tmp_path,
+        f"""
+        from fake_connection import make_client
+        client = make_client()
+        client.publish(b"t", b"p" * {payload_size})
+        print(repr(client.sock.writes))
+        """
+    )
+
+    assert writes == [b"\x30" + remaining_length + b"\x00\x01t" + b"p" * payload_size]
+
+
+@requires_micropython
+def test_messages_are_packed_one_after_another_into_publish_buffer(tmp_path):
+    end, pids, packed, writes = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client
+        client = make_client()
+        buf = client._publish_buffer(2 * (client._PUBLISH_OVERHEAD + 1 + 2))
+        end, first_pid = client._pack_publish(buf, 0, b"t", b"m0", False, 1)
+        end, second_pid = client._pack_publish(buf, end, b"t", b"m1", False, 1)
+        print(repr((end, [first_pid, second_pid], bytes(buf[:end]), client.sock.writes)))
+        """
+    )
+
+    assert end == 18
+    assert pids == [1, 2]
+    assert packed == b"\x32\x07\x00\x01t\x00\x01m0" + b"\x32\x07\x00\x01t\x00\x02m1"
+    # packing doesn't write to socket
+    assert writes == []
+
+
+@requires_micropython
+def test_publish_buffer_is_reused_and_grows_only_when_needed(tmp_path):
+    initial_size, reused, grown_size, reused_after_growth = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client
+        client = make_client()
+        initial = client._pub_buf
+        client.publish(b"t", b"p" * 100)
+        reused = client._pub_buf is initial
+        client.publish(b"t", b"p" * 200)
+        grown = client._pub_buf
+        client.publish(b"t", b"p" * 10)
+        print(repr((len(initial), reused, len(grown), client._pub_buf is grown)))
+        """
+    )
+
+    assert initial_size == 128
+    assert reused
+    assert grown_size == 200 + 1 + 9
+    assert reused_after_growth
+
+
+@requires_micropython
+def test_pipelined_publish_keeps_at_most_window_messages_unconfirmed(tmp_path):
+    packets, in_flight, messages = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client, packets_per_write, published_messages
+        client = make_client(slow_broker=True)
+        client.publish_pipelined("t", [b"m%d" % i for i in range(10)], window=4)
+        print(repr((packets_per_write(client), client.sock.in_flight, published_messages(client))))
+        """
+    )
+
+    # window is filled at once, then every PUBACK frees room for one more message
+    assert packets == [4, 1, 1, 1, 1, 1, 1]
+    assert max(in_flight) == 4
+    assert messages == [b"m%d" % i for i in range(10)]
+
+
+@requires_micropython
+def test_pipelined_publish_drains_all_arrived_pubacks_before_refilling_window(tmp_path):
+    packets, in_flight, unread, blocking = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client, packets_per_write
+        client = make_client()
+        client.publish_pipelined("t", [b"m%02d" % i for i in range(40)], window=16)
+        print(repr((packets_per_write(client), client.sock.in_flight, client.sock.incoming, client.sock.blocking)))
+        """
+    )
+
+    # PUBACKs of the whole window arrive together and are all taken before the next write
+    assert packets == [16, 16, 8]
+    assert in_flight == [16, 16, 8]
+    assert unread == b""
+    # polling for PUBACKs doesn't leave socket non-blocking, its timeout is set again
+    assert blocking
+
+
+@requires_micropython
+def test_pipelined_publish_accepts_out_of_order_pubacks(tmp_path):
+    messages, pids, unread = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client, parse_publish_packets, published_messages
+        client = make_client(ack_order=lambda count: reversed(range(count)))
+        client.publish_pipelined("t", [b"m%d" % i for i in range(7)], window=3)
+        pids = [pid for data in client.sock.writes for pid, _ in parse_publish_packets(data)]
+        print(repr((published_messages(client), pids, client.sock.incoming)))
+        """
+    )
+
+    # every message is sent once, none of them is resent because of PUBACK order
+    assert messages == [b"m%d" % i for i in range(7)]
+    assert pids == list(range(1, 8))
+    assert unread == b""
+
+
+@requires_micropython
+def test_pipelined_publish_packet_ids_wrap_around_without_zero(tmp_path):
+    pids, next_pid = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client, parse_publish_packets
+        client = make_client(slow_broker=True)
+        client.pid = 65533
+        client.publish_pipelined("t", [b"m%d" % i for i in range(5)], window=2)
+        pids = [pid for data in client.sock.writes for pid, _ in parse_publish_packets(data)]
+        print(repr((pids, client.pid)))
+        """
+    )
+
+    assert pids == [65534, 65535, 1, 2, 3]
+    assert next_pid == 3
+
+
+@requires_micropython
+def test_pipelined_publish_takes_messages_from_generator_only_when_window_has_room(tmp_path):
+    taken_before_write, messages = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client, published_messages
+        client = make_client(slow_broker=True)
+        taken = []
+        taken_before_write = []
+        write = client.sock.write
+
+        def counting_write(data, length=-1):
+            taken_before_write.append(len(taken))
+            return write(data, length)
+
+        def messages():
+            for i in range(6):
+                taken.append(i)
+                yield b"m%d" % i
+
+        client.sock.write = counting_write
+        client.publish_pipelined("t", messages(), window=2)
+        print(repr((taken_before_write, published_messages(client))))
+        """
+    )
+
+    assert taken_before_write == [2, 3, 4, 5, 6]
+    assert messages == [b"m%d" % i for i in range(6)]
+
+
+@requires_micropython
+def test_pipelined_publish_of_no_messages_doesnt_wait_for_pubacks(tmp_path):
+    writes = run_client(
+        tmp_path,
+        """
+        from fake_connection import make_client
+        client = make_client()
+        client.publish_pipelined("t", iter(()))
+        print(repr(client.sock.writes))
+        """
+    )
+
+    assert writes == []